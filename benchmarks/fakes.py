@@ -0,0 +1,521 @@
+# -*- coding: utf-8 -*-
+"""
+压测用的本地替身
+- FakeDidaServer: 基于 httpx.MockTransport 的滴答清单模拟服务（项目、任务、番茄钟操作），可配置延迟和错误率
+- ScriptedChatProvider: 按脚本输出工具调用序列的AI聊天提供者，模拟首token延迟和流式输出速度
+- FakeTelegramRequest: Telegram Bot API 请求替身，记录 Bot 发出的消息
+- make_text_update: 构造用户文本消息更新
+"""
+
+import asyncio
+import copy
+import json
+import random
+import re
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+
+# 添加项目根路径和kosong路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root / "kosong" / "src"))
+
+from kosong.chat_provider import ChatProvider, StreamedMessage, StreamedMessagePart, TokenUsage
+from kosong.message import Message, TextPart, ToolCall
+from kosong.tooling import Tool
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+
+# ===== 滴答清单模拟服务 =====
+
+class FakeDidaServer:
+    """
+    滴答清单模拟服务
+
+    同时覆盖开放API（/open/v1/...）和番茄钟Web接口（/focus/batch/focusOp 等），
+    每个请求先等待 latency±jitter 秒，再按 error_rate 概率返回 503
+
+    用法：
+        server = FakeDidaServer(latency=0.05)
+        client = DidaClient("token", transport=server.transport())
+    """
+
+    def __init__(
+        self,
+        projects: int = 5,
+        tasks_per_project: int = 20,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            projects: 项目数量（ID为 proj-0, proj-1, ...）
+            tasks_per_project: 每个项目的任务数量（ID为 task-<项目序号>-<任务序号>）
+            latency: 平均响应延迟（秒）
+            jitter: 延迟抖动（秒）
+            error_rate: 返回 503 的概率（0-1）
+            seed: 随机种子
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.requests: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.projects: Dict[str, dict] = {}
+        self.tasks: Dict[str, Dict[str, dict]] = {}
+        self._point = int(time.time() * 1000)
+        self._focus_current: Dict[str, Any] = {}
+        # 专注时间线：截至 _timeline_origin 的 timeline_records 条历史记录
+        self.timeline_records = 2000
+        self._timeline_origin = int(time.time() * 1000)
+
+        now = datetime.now(timezone.utc)
+        for p in range(projects):
+            project_id = f"proj-{p}"
+            self.projects[project_id] = {
+                "id": project_id,
+                "name": f"项目{p}",
+                "color": "#4772FA",
+                "closed": False,
+                "sortOrder": p,
+                "viewMode": "list",
+                "kind": "TASK",
+            }
+            self.tasks[project_id] = {}
+            for t in range(tasks_per_project):
+                task_id = f"task-{p}-{t}"
+                due = now + timedelta(days=t % 7, hours=t % 5)
+                self.tasks[project_id][task_id] = {
+                    "id": task_id,
+                    "projectId": project_id,
+                    "title": f"任务{p}-{t}",
+                    "content": "",
+                    "priority": [0, 1, 3, 5][t % 4],
+                    "status": 0,
+                    "isAllDay": False,
+                    "dueDate": due.strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+                    "timeZone": "Asia/Shanghai",
+                    "sortOrder": t,
+                }
+
+        self._routes: List[Tuple[str, "re.Pattern[str]", Any]] = [
+            ("GET", re.compile(r"^/open/v1/project$"), self._list_projects),
+            ("GET", re.compile(r"^/open/v1/project/(?P<pid>[^/]+)$"), self._get_project),
+            ("GET", re.compile(r"^/open/v1/project/(?P<pid>[^/]+)/data$"), self._get_project_data),
+            ("GET", re.compile(r"^/open/v1/project/(?P<pid>[^/]+)/task/(?P<tid>[^/]+)$"), self._get_task),
+            ("POST", re.compile(r"^/open/v1/project/(?P<pid>[^/]+)/task/(?P<tid>[^/]+)/complete$"), self._complete_task),
+            ("DELETE", re.compile(r"^/open/v1/project/(?P<pid>[^/]+)/task/(?P<tid>[^/]+)$"), self._delete_task),
+            ("POST", re.compile(r"^/open/v1/task$"), self._create_task),
+            ("POST", re.compile(r"^/open/v1/task/(?P<tid>[^/]+)$"), self._update_task),
+            ("POST", re.compile(r"^/focus/batch/focusOp$"), self._focus_operation),
+            ("GET", re.compile(r"^/pomodoros/statistics/generalForDesktop$"), self._focus_general),
+            ("GET", re.compile(r"^/pomodoros/timeline$"), self._focus_timeline),
+            ("GET", re.compile(r"^/pomodoros/statistics/heatmap/(?P<start>\d{8})/(?P<end>\d{8})$"), self._focus_heatmap),
+            ("GET", re.compile(r"^/pomodoros/statistics/dist/clockByDay/(?P<start>\d{8})/(?P<end>\d{8})$"), self._focus_clock_by_day),
+            ("GET", re.compile(r"^/pomodoros/statistics/dist/(?P<start>\d{8})/(?P<end>\d{8})$"), self._focus_distribution),
+        ]
+
+    def transport(self) -> httpx.MockTransport:
+        """创建指向本服务的 httpx 传输"""
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        """处理一个请求"""
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        for method, pattern, handler in self._routes:
+            match = pattern.match(request.url.path)
+            if match and request.method == method:
+                endpoint = f"{method} {pattern.pattern}"
+                self.requests[endpoint] += 1
+                if self.error_rate and self._random.random() < self.error_rate:
+                    self.errors[endpoint] += 1
+                    return httpx.Response(503, json={"errorMessage": "service unavailable"})
+                return handler(request, **match.groupdict())
+
+        self.requests["unknown"] += 1
+        return httpx.Response(404, json={"errorMessage": f"not found: {request.url.path}"})
+
+    # --- 开放API ---
+
+    def _list_projects(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=list(self.projects.values()))
+
+    def _get_project(self, request: httpx.Request, pid: str) -> httpx.Response:
+        project = self.projects.get(pid)
+        if project is None:
+            return httpx.Response(404, json={"errorMessage": "project not found"})
+        return httpx.Response(200, json=project)
+
+    def _get_project_data(self, request: httpx.Request, pid: str) -> httpx.Response:
+        project = self.projects.get(pid)
+        if project is None:
+            return httpx.Response(404, json={"errorMessage": "project not found"})
+        tasks = [task for task in self.tasks[pid].values() if task["status"] == 0]
+        return httpx.Response(200, json={"project": project, "tasks": tasks, "columns": []})
+
+    def _get_task(self, request: httpx.Request, pid: str, tid: str) -> httpx.Response:
+        task = self.tasks.get(pid, {}).get(tid)
+        if task is None:
+            return httpx.Response(404, json={"errorMessage": "task not found"})
+        return httpx.Response(200, json=task)
+
+    def _complete_task(self, request: httpx.Request, pid: str, tid: str) -> httpx.Response:
+        task = self.tasks.get(pid, {}).get(tid)
+        if task is None:
+            return httpx.Response(404, json={"errorMessage": "task not found"})
+        task["status"] = 2
+        return httpx.Response(200)
+
+    def _delete_task(self, request: httpx.Request, pid: str, tid: str) -> httpx.Response:
+        if self.tasks.get(pid, {}).pop(tid, None) is None:
+            return httpx.Response(404, json={"errorMessage": "task not found"})
+        return httpx.Response(200)
+
+    def _create_task(self, request: httpx.Request) -> httpx.Response:
+        data = json.loads(request.content or b"{}")
+        pid = data.get("projectId")
+        if pid not in self.projects:
+            return httpx.Response(400, json={"errorMessage": "project not found"})
+        task = {"status": 0, "priority": 0, "isAllDay": False, **data, "id": uuid.uuid4().hex[:24]}
+        self.tasks[pid][task["id"]] = task
+        return httpx.Response(200, json=task)
+
+    def _update_task(self, request: httpx.Request, tid: str) -> httpx.Response:
+        data = json.loads(request.content or b"{}")
+        task = self.tasks.get(data.get("projectId"), {}).get(tid)
+        if task is None:
+            return httpx.Response(404, json={"errorMessage": "task not found"})
+        task.update({key: value for key, value in data.items() if value is not None})
+        return httpx.Response(200, json=task)
+
+    # --- 番茄钟Web接口 ---
+
+    def _focus_operation(self, request: httpx.Request) -> httpx.Response:
+        data = json.loads(request.content or b"{}")
+        self._point += 1
+        # 没有操作时返回当前番茄钟，结束类操作后不再有当前番茄钟
+        current = self._focus_current
+        for op in data.get("opList", []):
+            if op.get("op") in ("finish", "drop", "exit"):
+                current = {}
+                continue
+            start = datetime.now(timezone.utc)
+            duration = op.get("duration") or 25
+            current = {
+                "id": op.get("oId"),
+                "firstId": op.get("firstFocusId") or op.get("oId"),
+                "duration": duration,
+                "status": 1 if op.get("op") == "pause" else 0,
+                "startTime": start.strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+                "endTime": (start + timedelta(minutes=duration)).strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+                "focusOnLogs": [],
+            }
+        self._focus_current = current
+        return httpx.Response(200, json={"point": self._point, "current": current, "updates": []})
+
+    def _focus_general(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"todayPomoCount": 0, "todayPomoDuration": 0, "totalPomoCount": 0})
+
+    # 统计接口：每天的专注数据由日期确定，同一天多次请求结果一致
+
+    @staticmethod
+    def _stat_days(start: str, end: str) -> List[str]:
+        first = datetime.strptime(start, "%Y%m%d")
+        count = (datetime.strptime(end, "%Y%m%d") - first).days + 1
+        return [(first + timedelta(days=offset)).strftime("%Y%m%d") for offset in range(max(0, count))]
+
+    @staticmethod
+    def _day_minutes(day: str) -> int:
+        return (int(day) * 7919) % 150 // 25 * 25
+
+    def _focus_heatmap(self, request: httpx.Request, start: str, end: str) -> httpx.Response:
+        days = self._stat_days(start, end)
+        return httpx.Response(200, json=[{"day": day, "duration": self._day_minutes(day)} for day in days])
+
+    def _focus_clock_by_day(self, request: httpx.Request, start: str, end: str) -> httpx.Response:
+        result = {}
+        for day in self._stat_days(start, end):
+            minutes = self._day_minutes(day)
+            result[day] = {str(9 + index): 25 for index in range(minutes // 25)}
+        return httpx.Response(200, json=result)
+
+    def _focus_timeline(self, request: httpx.Request) -> httpx.Response:
+        """每 3 小时一条 25 分钟的专注记录，从新到旧每页 31 条，to 为开始时间上限（毫秒）"""
+        step = 3 * 3600 * 1000
+        newest = self._timeline_origin // step * step
+        to = int(request.url.params.get("to") or newest + 1)
+        first = min(newest, (to - 1) // step * step)
+        page = []
+        for index in range(31):
+            start_ms = first - index * step
+            if start_ms < newest - self.timeline_records * step:
+                break
+            start = datetime.fromtimestamp(start_ms / 1000, timezone.utc)
+            end = start + timedelta(minutes=25)
+            task_id = f"task-0-{start_ms // step % 3}"
+            page.append({
+                "id": f"pomo-{start_ms}",
+                "startTime": start.strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+                "endTime": end.strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+                "pauseDuration": 0,
+                "status": 1,
+                "tasks": [{
+                    "taskId": task_id,
+                    "title": f"任务{task_id}",
+                    "projectName": "项目0",
+                    "startTime": start.strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+                    "endTime": end.strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+                }],
+            })
+        return httpx.Response(200, json=page)
+
+    def _focus_distribution(self, request: httpx.Request, start: str, end: str) -> httpx.Response:
+        minutes = sum(self._day_minutes(day) for day in self._stat_days(start, end))
+        return httpx.Response(200, json={
+            "projectDurations": {"proj-0": minutes},
+            "taskDurations": {"task-0-0": minutes},
+            "tagDurations": {},
+        })
+
+
+# ===== 脚本化AI聊天提供者 =====
+
+# 一个步骤：工具调用列表（name, arguments）或最终回复文本
+ScriptStep = Union[List[Tuple[str, Dict[str, Any]]], str]
+
+
+def _tomorrow_at(hour: int) -> str:
+    tomorrow = datetime.now(BEIJING_TZ) + timedelta(days=1)
+    return tomorrow.replace(hour=hour, minute=0, second=0, microsecond=0).isoformat()
+
+
+# 场景：用户消息 -> 每一步的模型输出（与真实对话中常见的工具调用序列一致）
+SCENARIOS: Dict[str, List[ScriptStep]] = {
+    "今天有什么任务？": [
+        [("get_projects", {})],
+        [("get_tasks", {"project_id": "proj-0"})],
+        "你今天在项目0中有几个待办任务，优先处理高优先级的任务。",
+    ],
+    "帮我创建一个明天下午3点的会议任务": [
+        [("get_current_time", {})],
+        [("create_task", {"title": "会议", "project_id": "proj-1", "due_date": _tomorrow_at(15),
+                          "priority": 3, "reminders": ["TRIGGER:P0DT15M0S"]})],
+        "已为你创建明天下午3点的会议任务，并设置了提前15分钟提醒。",
+    ],
+    "把项目2的第一个任务标记为完成": [
+        [("get_tasks", {"project_id": "proj-2"})],
+        [("complete_task", {"project_id": "proj-2", "task_id": "task-2-0"})],
+        "已将任务2-0标记为完成。",
+    ],
+    "为任务0-1开始一个番茄钟": [
+        [("start_task_pomodoro", {"task_id": "task-0-1", "project_id": "proj-0", "duration": 25})],
+        "已开始25分钟的番茄钟，专注结束后我会提醒你。",
+    ],
+    "谢谢": [
+        "不客气！还有什么需要帮忙的吗？",
+    ],
+}
+
+
+class ScriptedChatProvider(ChatProvider):
+    """
+    按脚本输出的AI聊天提供者
+
+    根据最后一条用户消息选择 SCENARIOS 中的场景，按本轮已有的AI消息数决定输出第几步；
+    先等待首token延迟，再按 tokens_per_second 流式输出文本（约2个字符一个token）
+    """
+
+    name = "scripted"
+
+    def __init__(
+        self,
+        scenarios: Optional[Dict[str, List[ScriptStep]]] = None,
+        ttft: float = 0.4,
+        tokens_per_second: float = 80.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            scenarios: 场景脚本（默认 SCENARIOS），未匹配的用户消息按最后一个场景处理
+            ttft: 首token延迟（秒）
+            tokens_per_second: 输出速度
+            seed: 随机种子（用于延迟抖动）
+        """
+        self.scenarios = scenarios or SCENARIOS
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    @property
+    def model_name(self) -> str:
+        return "scripted"
+
+    async def generate(
+        self,
+        system_prompt: str,
+        tools: Sequence[Tool],
+        history: Sequence[Message],
+    ) -> "ScriptedStreamedMessage":
+        self.calls += 1
+        user_index = max((i for i, msg in enumerate(history) if msg.role == "user"), default=-1)
+        user_text = history[user_index].content if user_index >= 0 else ""
+        if not isinstance(user_text, str):
+            user_text = "".join(part.text for part in user_text if isinstance(part, TextPart))
+        steps = self.scenarios.get(user_text) or list(self.scenarios.values())[-1]
+        step_index = sum(1 for msg in history[user_index + 1:] if msg.role == "assistant")
+        step = steps[min(step_index, len(steps) - 1)]
+
+        parts: List[StreamedMessagePart] = []
+        if isinstance(step, str):
+            # 按约8个字符一段流式输出
+            parts.extend(TextPart(text=step[i:i + 8]) for i in range(0, len(step), 8))
+            output_tokens = max(1, len(step) // 2)
+        else:
+            for name, arguments in step:
+                parts.append(ToolCall(
+                    id=f"call_{uuid.uuid4().hex[:12]}",
+                    function=ToolCall.FunctionBody(name=name, arguments=json.dumps(arguments, ensure_ascii=False)),
+                ))
+            output_tokens = 20 * len(step)
+
+        input_chars = len(system_prompt) + sum(len(str(msg.content or "")) for msg in history)
+        usage = TokenUsage(input_other=input_chars // 2, output=output_tokens)
+        ttft = max(0.0, self.ttft * self._random.uniform(0.8, 1.2))
+        return ScriptedStreamedMessage(parts, ttft, output_tokens / self.tokens_per_second, usage)
+
+    def with_thinking(self, effort) -> "ScriptedChatProvider":
+        return copy.copy(self)
+
+
+class ScriptedStreamedMessage(StreamedMessage):
+    """ScriptedChatProvider 的流式消息"""
+
+    def __init__(self, parts: List[StreamedMessagePart], ttft: float, duration: float, usage: TokenUsage):
+        self._iter = self._stream(parts, ttft, duration)
+        self._usage = usage
+        self._id = f"scripted-{uuid.uuid4().hex[:8]}"
+
+    def __aiter__(self) -> AsyncIterator[StreamedMessagePart]:
+        return self
+
+    async def __anext__(self) -> StreamedMessagePart:
+        return await self._iter.__anext__()
+
+    async def _stream(
+        self, parts: List[StreamedMessagePart], ttft: float, duration: float
+    ) -> AsyncIterator[StreamedMessagePart]:
+        await asyncio.sleep(ttft)
+        interval = duration / len(parts) if parts else 0
+        for i, part in enumerate(parts):
+            if i and interval:
+                await asyncio.sleep(interval)
+            yield part
+
+    @property
+    def id(self) -> str:
+        return self._id
+
+    @property
+    def usage(self) -> Optional[TokenUsage]:
+        return self._usage
+
+
+# ===== Telegram 替身 =====
+
+class FakeTelegramRequest(BaseRequest):
+    """
+    Telegram Bot API 请求替身
+
+    对 Bot 调用的接口返回最小的成功响应，每个请求等待 latency 秒；
+    sendMessage 的文本按 chat_id 记录在 messages 中
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.messages: Dict[int, List[str]] = defaultdict(list)
+        self._message_id = 0
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> Tuple[int, bytes]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        params = request_data.parameters if request_data else {}
+
+        if endpoint == "getMe":
+            result: Any = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+                           "can_join_groups": False, "can_read_all_group_messages": False,
+                           "supports_inline_queries": False}
+        elif endpoint in ("sendMessage", "sendDocument"):
+            chat_id = int(params.get("chat_id", 0))
+            text = str(params.get("text", params.get("caption", "")))
+            self.messages[chat_id].append(text)
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "Bench"},
+                "text": text,
+            }
+        elif endpoint == "getUpdates":
+            result = []
+        else:
+            # sendChatAction / setMyCommands / deleteWebhook 等
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+
+def make_text_update(bot, update_id: int, chat_id: int, user_id: int, text: str) -> Update:
+    """构造一条私聊文本消息更新"""
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else []
+    data = {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Bench"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+            "entities": entities,
+        },
+    }
+    return Update.de_json(data, bot)
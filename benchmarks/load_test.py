@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+端到端压测
+用本地替身（滴答清单模拟服务、脚本化AI、Telegram请求替身）驱动完整的 DidaBot：
+更新经过 Bot 实际使用的更新处理器和 ConversationHandler，AI对话经过 AgentLoop、工具和持久化历史
+
+运行命令：
+    python benchmarks/load_test.py --chats 8 --turns 5
+    python benchmarks/load_test.py --suite 1,4,16 --output results.jsonl
+
+输出每组并发下的吞吐量、轮次延迟分位数（从收到更新到处理完成）、CPU 和内存占用
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import tempfile
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fakes import (
+    SCENARIOS,
+    FakeDidaServer,
+    FakeTelegramRequest,
+    ScriptedChatProvider,
+    make_text_update,
+)
+
+ADMIN_USER_ID = 10000
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def configure_environment(store_dir: str):
+    """用压测配置覆盖环境变量（优先于 .env）"""
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": "123456:bench-token",
+        "BOT_ADMIN_USER_ID": str(ADMIN_USER_ID),
+        "DIDA_ACCESS_TOKEN": "bench-access-token",
+        "DIDA_T_COOKIE": "bench-t-cookie-0123456789abcdef",
+        "DIDA_CSRF_TOKEN": "bench-csrf-0123456789",
+        "CONVERSATION_STORE_DIR": store_dir,
+        "LEDGER_PATH": "",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "LOG_FILE": "",
+    })
+
+
+class LoopLagSampler:
+    """采样事件循环延迟（定时唤醒的实际延迟）"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, loop.time() - start - self.interval)
+
+
+async def run_load(
+    chats: int,
+    turns: int,
+    dida_latency: float,
+    dida_error_rate: float,
+    llm_ttft: float,
+    llm_tps: float,
+    telegram_latency: float,
+    think_time: float,
+    seed: int,
+) -> Dict[str, Any]:
+    """
+    以 chats 个并发聊天、每个聊天 turns 条消息压测一次
+
+    Returns:
+        压测结果
+    """
+    from bot import DidaBot
+    from src.observability.metrics import MetricsTransport
+    from src.services.pomodoro_service import pomodoro_service
+    import httpx
+
+    dida = FakeDidaServer(latency=dida_latency, error_rate=dida_error_rate, seed=seed)
+    telegram = FakeTelegramRequest(latency=telegram_latency)
+    provider = ScriptedChatProvider(ttft=llm_ttft, tokens_per_second=llm_tps, seed=seed)
+
+    # 番茄钟服务是全局单例，替换它的客户端指向模拟服务
+    await pomodoro_service.client.aclose()
+    pomodoro_service.client = httpx.AsyncClient(
+        timeout=30.0, transport=MetricsTransport(dida.transport(), service="dida_web")
+    )
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = DidaBot(dida_transport=dida.transport(), chat_provider=provider, telegram_request=telegram)
+        if not await bot.initialize():
+            raise RuntimeError("Bot 初始化失败")
+    application = bot.application
+    await application.initialize()
+    await application.start()
+
+    prompts = list(SCENARIOS)
+    latencies: List[float] = []
+    failures = 0
+    update_ids = iter(range(1, 1_000_000))
+
+    async def chat_session(index: int):
+        nonlocal failures
+        chat_id = 20000 + index
+        for turn in range(turns):
+            text = prompts[(index + turn) % len(prompts)]
+            update = make_text_update(application.bot, next(update_ids), chat_id, ADMIN_USER_ID, text)
+            sent_before = len(telegram.messages[chat_id])
+            start = time.perf_counter()
+            # 与 Application 从更新队列取出更新后的处理路径一致
+            await application.update_processor.process_update(update, application.process_update(update))
+            latencies.append(time.perf_counter() - start)
+            replies = telegram.messages[chat_id][sent_before:]
+            if not replies or any(reply.startswith(("抱歉", "对话处理失败")) for reply in replies):
+                failures += 1
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    lag = LoopLagSampler()
+    lag.start()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(chat_session(i) for i in range(chats)))
+    wall = time.perf_counter() - wall_start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    await lag.stop()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await bot.stop()
+
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    total = chats * turns
+    return {
+        "chats": chats,
+        "turns": total,
+        "failures": failures,
+        "wall_seconds": round(wall, 3),
+        "throughput": round(total / wall, 3) if wall else 0.0,
+        "latency_p50": round(percentile(latencies, 0.50), 3),
+        "latency_p95": round(percentile(latencies, 0.95), 3),
+        "latency_p99": round(percentile(latencies, 0.99), 3),
+        "latency_max": round(max(latencies, default=0.0), 3),
+        "cpu_seconds": round(cpu, 3),
+        "cpu_percent": round(100 * cpu / wall, 1) if wall else 0.0,
+        "max_rss_mb": round(usage_after.ru_maxrss / 1024, 1),
+        "max_loop_lag_ms": round(lag.max_lag * 1000, 1),
+        "llm_calls": provider.calls,
+        "dida_requests": sum(dida.requests.values()),
+        "dida_errors": sum(dida.errors.values()),
+        "telegram_calls": sum(telegram.calls.values()),
+    }
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    return (
+        f"chats={result['chats']:<4} turns={result['turns']:<5} fail={result['failures']:<3} "
+        f"thr={result['throughput']:7.2f}/s  "
+        f"p50={result['latency_p50']:6.2f}s p95={result['latency_p95']:6.2f}s "
+        f"p99={result['latency_p99']:6.2f}s  "
+        f"cpu={result['cpu_percent']:5.1f}% rss={result['max_rss_mb']:.0f}MB "
+        f"lag={result['max_loop_lag_ms']:.0f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="DidaBot 端到端压测")
+    parser.add_argument("--chats", type=int, default=4, help="并发聊天数")
+    parser.add_argument("--suite", type=str, default=None, help="依次压测多组并发聊天数，如 1,4,16,64")
+    parser.add_argument("--turns", type=int, default=5, help="每个聊天发送的消息数")
+    parser.add_argument("--dida-latency", type=float, default=0.05, help="滴答清单接口延迟（秒）")
+    parser.add_argument("--dida-error-rate", type=float, default=0.0, help="滴答清单接口 503 概率")
+    parser.add_argument("--llm-ttft", type=float, default=0.4, help="AI首token延迟（秒）")
+    parser.add_argument("--llm-tps", type=float, default=80.0, help="AI输出速度（token/秒）")
+    parser.add_argument("--telegram-latency", type=float, default=0.03, help="Telegram接口延迟（秒）")
+    parser.add_argument("--think-time", type=float, default=0.0, help="同一聊天两条消息之间的间隔（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", type=str, default=None, help="把结果追加写入JSONL文件")
+    args = parser.parse_args()
+
+    # 未安装 job-queue 扩展时 ConversationHandler 的超时提示，与压测无关
+    warnings.filterwarnings("ignore", message=".*JobQueue.*")
+
+    with tempfile.TemporaryDirectory(prefix="dida-bench-") as store_dir:
+        levels = [int(n) for n in args.suite.split(",")] if args.suite else [args.chats]
+        for chats in levels:
+            # 每组使用独立的对话历史目录，避免上一组的历史影响结果
+            configure_environment(str(Path(store_dir) / f"chats-{chats}"))
+            result = await run_load(
+                chats=chats,
+                turns=args.turns,
+                dida_latency=args.dida_latency,
+                dida_error_rate=args.dida_error_rate,
+                llm_ttft=args.llm_ttft,
+                llm_tps=args.llm_tps,
+                telegram_latency=args.telegram_latency,
+                think_time=args.think_time,
+                seed=args.seed,
+            )
+            print(format_result(result))
+            if args.output:
+                result.update(timestamp=time.time(), params=vars(args))
+                with open(args.output, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+CPU 密集操作对事件循环延迟的影响
+在事件循环上周期性采样调度延迟，同时反复执行列任务时的热点操作（大项目响应解析、
+format_task_list、format_get_tasks、工具结果 JSON 序列化），
+分别在事件循环上执行（inline）和交给线程池执行（offload），比较两种方式下的延迟分布
+
+运行命令：
+    python benchmarks/loop_lag_bench.py
+    python benchmarks/loop_lag_bench.py --sizes 1000,10000 --rounds 20
+
+输出每种方式下的采样延迟 p50/p99/最大值和操作的总耗时
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加项目根路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "src"))
+
+from micro_bench import generate_fixture
+from src.core.offload import offloader
+from src.dida_client import _parse_project_tasks
+from src.formatter.tool_formatter import format_get_tasks
+from src.utils.formatter import format_task_list
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def sample_lag(interval: float, samples: List[float], stop: asyncio.Event):
+    """按 interval 休眠，记录实际唤醒时间比预期晚了多少"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def workload(fixture: Dict[str, Any], body: bytes, rounds: int):
+    """一次列任务请求涉及的 CPU 密集操作，重复 rounds 次"""
+    tasks = fixture["tasks"]
+    for _ in range(rounds):
+        await offloader.run(
+            "parse_project_data", _parse_project_tasks, body, "proj-0000", nbytes=len(body)
+        )
+        await offloader.run(
+            "format_task_list", format_task_list, list(tasks), fixture["projects"], items=len(tasks)
+        )
+        await format_get_tasks(fixture["task_dicts"])
+        await offloader.json_dumps(fixture["task_dicts"], indent=2)
+        # 不同请求之间让出事件循环
+        await asyncio.sleep(0)
+
+
+async def measure(fixture: Dict[str, Any], body: bytes, rounds: int, interval: float) -> Dict[str, float]:
+    samples: List[float] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_lag(interval, samples, stop))
+    await asyncio.sleep(interval * 5)
+
+    start = time.perf_counter()
+    await workload(fixture, body, rounds)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await sampler
+    return {
+        "p50": percentile(samples, 0.5),
+        "p99": percentile(samples, 0.99),
+        "max": max(samples, default=0.0),
+        "elapsed": elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="CPU 密集操作的事件循环延迟基准")
+    parser.add_argument("--sizes", type=str, default="1000,10000", help="任务数量，逗号分隔")
+    parser.add_argument("--rounds", type=int, default=10, help="每种方式重复执行的次数")
+    parser.add_argument("--interval", type=float, default=0.002, help="延迟采样间隔（秒）")
+    parser.add_argument("--threads", type=int, default=2, help="offload 方式的线程数")
+    args = parser.parse_args()
+
+    print(f"{'任务数':>8} {'方式':>8} {'p50(ms)':>9} {'p99(ms)':>9} {'max(ms)':>9} {'总耗时(s)':>10}")
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        fixture = generate_fixture(size)
+        body = json.dumps({
+            "project": {"id": "proj-0000", "name": "项目0"},
+            "tasks": [{k: v for k, v in t.items() if k != "project_id"} for t in fixture["task_dicts"]],
+            "columns": [],
+        }, ensure_ascii=False).encode("utf-8")
+
+        # inline：阈值设为 0，全部在事件循环上执行；offload：超过 1 条即交给线程池
+        for mode, min_items, min_bytes in (("inline", 0, 0), ("offload", 1, 1)):
+            offloader.configure(
+                min_items=min_items, min_bytes=min_bytes, max_workers=args.threads, slow_inline=float("inf")
+            )
+            result = await measure(fixture, body, args.rounds, args.interval)
+            print(
+                f"{size:>8} {mode:>8} {result['p50'] * 1000:>9.2f} {result['p99'] * 1000:>9.2f} "
+                f"{result['max'] * 1000:>9.2f} {result['elapsed']:>10.2f}"
+            )
+    offloader.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
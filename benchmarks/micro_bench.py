@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+任务列表热点路径的微基准
+覆盖每次列任务都会执行的时间解析和格式化函数，用生成的 100/1k/10k 任务数据测量，
+可以保存基线并与基线比较，超过阈值的退化以非零状态退出（便于在CI中使用）
+在不同机器之间比较时可用 --normalize 按固定参考负载的耗时归一化
+
+运行命令：
+    python benchmarks/micro_bench.py
+    python benchmarks/micro_bench.py --save baseline.json
+    python benchmarks/micro_bench.py --compare baseline.json --threshold 0.15
+    python benchmarks/micro_bench.py --compare baseline.json --normalize
+    python benchmarks/micro_bench.py --sizes 1000 --filter format_
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# 添加项目根路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "src"))
+
+from src.dida_client import Task
+from src.formatter.tool_formatter import format_get_tasks
+from src.utils.formatter import escape_markdown, format_task_list
+from src.utils.message_splitter import split_message
+from src.utils.time_utils import TimeUtils
+
+
+# ===== 数据生成 =====
+
+def _dida_date(dt: datetime, rng: random.Random) -> str:
+    """按滴答清单接口中出现过的几种格式输出时间"""
+    style = rng.random()
+    if style < 0.6:
+        return dt.strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+    if style < 0.8:
+        return dt.strftime("%Y-%m-%dT%H:%M:%S+0000")
+    if style < 0.9:
+        return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def generate_fixture(size: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    生成任务数据
+
+    Returns:
+        {"tasks": Task列表, "task_dicts": 工具输出格式的任务, "projects": 项目ID到名称,
+         "dates": 时间字符串列表, "titles": 标题列表}
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    project_count = max(1, size // 50)
+    projects = {f"proj-{p:04d}": f"项目{p} [工作]_{p}" for p in range(project_count)}
+    project_ids = list(projects)
+
+    tasks: List[Task] = []
+    task_dicts: List[Dict[str, Any]] = []
+    for i in range(size):
+        # 大部分任务在前后两周内，约10%没有截止时间
+        due = None
+        if rng.random() >= 0.1:
+            due = _dida_date(now + timedelta(hours=rng.randint(-14 * 24, 14 * 24)), rng)
+        start = _dida_date(now + timedelta(hours=rng.randint(-48, 0)), rng) if rng.random() < 0.3 else None
+        task = Task(
+            id=f"{i:024x}",
+            project_id=rng.choice(project_ids),
+            title=f"任务{i}: 处理 *需求* (v{i % 7}.{i % 3}) - 见 #{i}",
+            priority=rng.choice([0, 1, 3, 5]),
+            status=2 if rng.random() < 0.2 else 0,
+            due_date=due,
+            start_date=start,
+        )
+        tasks.append(task)
+        task_dict = {
+            "id": task.id,
+            "title": task.title,
+            "project_id": task.project_id,
+            "status": task.status,
+            "priority": task.priority,
+            "is_all_day": False,
+        }
+        if due:
+            task_dict["due_date"] = due
+        if start:
+            task_dict["start_date"] = start
+        task_dicts.append(task_dict)
+
+    return {
+        "tasks": tasks,
+        "task_dicts": task_dicts,
+        "projects": projects,
+        "dates": [task.due_date for task in tasks if task.due_date],
+        "titles": [task.title for task in tasks],
+    }
+
+
+# ===== 基准用例 =====
+
+_loop = asyncio.new_event_loop()
+
+
+def _run_async(coro):
+    return _loop.run_until_complete(coro)
+
+
+# 用例名 -> 生成被测函数（参数为数据）
+CASES: Dict[str, Callable[[Dict[str, Any]], Callable[[], Any]]] = {
+    "parse_dida_datetime": lambda f: lambda: [TimeUtils.parse_dida_datetime(s) for s in f["dates"]],
+    "utc_to_local_date": lambda f: lambda: [TimeUtils.utc_to_local_date(s) for s in f["dates"]],
+    "format_due_date": lambda f: lambda: [TimeUtils.format_due_date(s, "chinese") for s in f["dates"]],
+    "parse_dida_column": lambda f: lambda: TimeUtils.parse_dida_column(f["dates"]),
+    "escape_markdown": lambda f: lambda: [escape_markdown(t) for t in f["titles"]],
+    "format_task_list": lambda f: lambda: format_task_list(list(f["tasks"]), f["projects"]),
+    "format_get_tasks": lambda f: lambda: _run_async(format_get_tasks(f["task_dicts"])),
+    "split_message": lambda f: (lambda text: lambda: split_message(text))(
+        format_task_list(list(f["tasks"]), f["projects"])
+    ),
+}
+
+
+def _reference_workload():
+    """固定的纯Python参考负载（字符串格式化、字典和列表操作），用于归一化"""
+    data = {}
+    for i in range(2000):
+        key = f"key-{i % 97}"
+        data.setdefault(key, []).append(str(i).zfill(6).replace("0", "-"))
+    return sorted(data.items())
+
+
+def measure(fn: Callable[[], Any], repeat: int, min_time: float) -> float:
+    """返回单次调用的最短耗时（秒）：先确定每轮调用次数使一轮不少于 min_time，再取 repeat 轮的最小值"""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def measure_case(key: str, repeat: int, min_time: float) -> float:
+    """测量单个用例，key 形如 format_task_list[1000]"""
+    name, size = key[:-1].split("[")
+    return measure(CASES[name](generate_fixture(int(size))), repeat, min_time)
+
+
+def run(sizes: List[int], name_filter: str, repeat: int, min_time: float) -> Dict[str, float]:
+    """运行所有用例，返回 {"用例[规模]": 单次耗时秒数}，其中 "reference" 为参考负载耗时"""
+    results: Dict[str, float] = {}
+    reference = measure(_reference_workload, repeat, min_time)
+    for size in sizes:
+        fixture = generate_fixture(size)
+        for name, factory in CASES.items():
+            if name_filter and name_filter not in name:
+                continue
+            key = f"{name}[{size}]"
+            seconds = measure(factory(fixture), repeat, min_time)
+            results[key] = seconds
+            print(f"{key:<32} {seconds * 1e3:10.3f} ms   {seconds / size * 1e9:9.0f} ns/task")
+    # 参考负载在首尾各测一次取最小值，减少偶发干扰
+    results["reference"] = min(reference, measure(_reference_workload, repeat, min_time))
+    print(f"{'reference':<32} {results['reference'] * 1e3:10.3f} ms")
+    return results
+
+
+def compare(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    threshold: float,
+    normalize: bool,
+    repeat: int,
+    min_time: float,
+) -> List[Tuple[str, float]]:
+    """
+    与基线比较，返回超过阈值的退化 [(用例, 变化比例)]
+
+    超过阈值的用例会重新测量一次取较小值，排除测量期间的偶发干扰
+    """
+    regressions = []
+    scale = baseline["reference"] / results["reference"] if normalize else 1.0
+    print(f"\n与基线比较（阈值 +{threshold:.0%}，归一化系数 {scale:.2f}）:")
+    for key, seconds in results.items():
+        base = baseline.get(key)
+        if not base or key == "reference":
+            continue
+        change = seconds * scale / base - 1
+        if change > threshold:
+            seconds = min(seconds, measure_case(key, repeat, min_time))
+            change = seconds * scale / base - 1
+        mark = "REGRESSION" if change > threshold else ""
+        print(f"{key:<32} {base * 1e3:10.3f} ms -> {seconds * 1e3:10.3f} ms  {change:+7.1%} {mark}")
+        if change > threshold:
+            regressions.append((key, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务列表热点路径微基准")
+    parser.add_argument("--sizes", type=str, default="100,1000,10000", help="任务数量，逗号分隔")
+    parser.add_argument("--filter", type=str, default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--repeat", type=int, default=5, help="每个用例测量轮数（取最小值）")
+    parser.add_argument("--min-time", type=float, default=0.1, help="每轮最短测量时间（秒）")
+    parser.add_argument("--save", type=str, default=None, help="把结果保存为基线JSON")
+    parser.add_argument("--compare", type=str, default=None, help="与基线JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.15, help="判定为退化的变慢比例")
+    parser.add_argument("--normalize", action="store_true", help="按参考负载耗时归一化（跨机器比较时使用）")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(f"Python {platform.python_version()} on {platform.platform()}\n")
+    results = run(sizes, args.filter, args.repeat, args.min_time)
+
+    if args.save:
+        Path(args.save).write_text(
+            json.dumps({"python": platform.python_version(), "results": results}, indent=2),
+            encoding="utf-8",
+        )
+        print(f"\n基线已保存: {args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))["results"]
+        regressions = compare(
+            results, baseline, args.threshold, args.normalize, args.repeat, args.min_time
+        )
+        if regressions:
+            print(f"\n{len(regressions)} 个用例退化超过 {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+CompositeChatProvider 各路由策略的请求耗时
+三个本地模拟上游：慢（300ms）、总是返回 503、快（50ms），分别用 failover/hedge/latency
+策略各发 10 个请求，输出平均耗时和每个上游的请求数、失败数、取消数和 p50/p95
+
+运行命令：
+    python benchmarks/provider_routing_bench.py
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 添加 kosong 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "kosong" / "src"))
+
+from loguru import logger
+
+from kosong.chat_provider import APIStatusError
+from kosong.chat_provider.composite import CompositeChatProvider
+from kosong.chat_provider.mock import MockChatProvider
+from kosong.message import TextPart
+
+
+class SlowProvider(MockChatProvider):
+    """延迟一段时间后返回固定回复（或 503）的模拟上游"""
+
+    def __init__(self, label: str, delay: float, fail: bool = False):
+        super().__init__([TextPart(text=f"hello from {label}")])
+        self.name = label
+        self._delay = delay
+        self._fail = fail
+
+    async def generate(self, system_prompt, tools, history):  # type: ignore[override]
+        await asyncio.sleep(self._delay)
+        if self._fail:
+            raise APIStatusError(503, "unavailable")
+        return await super().generate(system_prompt, tools, history)
+
+
+async def main():
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+    providers = [
+        SlowProvider("slow", 0.3),
+        SlowProvider("broken", 0.01, fail=True),
+        SlowProvider("fast", 0.05),
+    ]
+    for policy in ("failover", "hedge", "latency"):
+        composite = CompositeChatProvider(providers, policy=policy, hedge_delay=0.1)
+        start = time.monotonic()
+        for _ in range(10):
+            message = await composite.generate("", [], [])
+            _ = [part async for part in message]
+        print(f"{policy:<10} {(time.monotonic() - start) / 10 * 1000:7.1f} ms/request")
+        for key, stats in composite.stats().items():
+            p50, p95 = stats.p50, stats.p95
+            print(
+                f"  {key:<14} requests={stats.requests:<3} failures={stats.failures:<3}"
+                f" cancelled={stats.cancelled:<3}"
+                f" p50={p50 * 1000 if p50 else 0:6.1f}ms p95={p95 * 1000 if p95 else 0:6.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Webhook 更新回放
+把记录的 Telegram 更新（JSONL，每行一个 Update，可由 WEBHOOK_RECORD_PATH 记录）POST 到本地 webhook，
+用于在本地验证 webhook 模式、密钥校验和队列背压
+
+运行命令：
+    python benchmarks/replay_updates.py updates.jsonl --secret $WEBHOOK_SECRET
+    python benchmarks/replay_updates.py updates.jsonl --secret xxx --rate 50 --concurrency 8 --renumber
+
+输出各状态码数量和确认延迟分位数；503 表示队列已满（Telegram 会重发，这里可用 --retry 模拟）
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+
+from load_test import percentile
+
+
+def load_updates(path: str, renumber: bool) -> List[Dict[str, Any]]:
+    """读取 JSONL 更新；renumber 时从 1 开始重新编号 update_id，便于重复回放"""
+    updates = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                updates.append(json.loads(line))
+    if renumber:
+        for index, update in enumerate(updates, start=1):
+            update["update_id"] = index
+    return updates
+
+
+async def replay(
+    updates: List[Dict[str, Any]],
+    url: str,
+    secret: str,
+    rate: float,
+    concurrency: int,
+    retry: int,
+) -> Dict[str, Any]:
+    """
+    按 rate（条/秒，0 表示不限速）以 concurrency 个连接回放更新
+
+    Returns:
+        状态码统计和确认延迟
+    """
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+
+    async with httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=concurrency)) as client:
+
+        async def send(update: Dict[str, Any]):
+            async with semaphore:
+                for attempt in range(retry + 1):
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post(url, json=update, headers=headers)
+                        status = str(response.status_code)
+                    except httpx.HTTPError as e:
+                        status = type(e).__name__
+                    latencies.append(time.perf_counter() - start)
+                    statuses[status] += 1
+                    if status != "503" or attempt == retry:
+                        break
+                    await asyncio.sleep(1.0)
+
+        wall_start = time.perf_counter()
+        tasks = []
+        for index, update in enumerate(updates):
+            if rate:
+                delay = wall_start + index / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(update)))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - wall_start
+
+    return {
+        "updates": len(updates),
+        "statuses": dict(statuses),
+        "wall_seconds": round(wall, 3),
+        "ack_p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "ack_p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放 Telegram 更新到本地 webhook")
+    parser.add_argument("path", help="JSONL 更新文件")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8443/telegram/webhook", help="webhook 地址")
+    parser.add_argument("--secret", type=str, required=True, help="WEBHOOK_SECRET")
+    parser.add_argument("--rate", type=float, default=0.0, help="每秒发送条数（0 表示不限速）")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发连接数")
+    parser.add_argument("--retry", type=int, default=0, help="收到 503 后的重试次数")
+    parser.add_argument("--renumber", action="store_true", help="重新编号 update_id")
+    args = parser.parse_args()
+
+    updates = load_updates(args.path, args.renumber)
+    result = asyncio.run(replay(updates, args.url, args.secret, args.rate, args.concurrency, args.retry))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
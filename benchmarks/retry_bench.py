@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+RetryingChatProvider 在上游故障下的请求成功率
+上游是进程内模拟的 chat completions 接口（5% 的流式响应在第一个分片后断开），
+ChaosChatProvider 按给定概率注入错误响应，比较直接请求和经过重试包装后的成功率
+
+运行命令：
+    python benchmarks/retry_bench.py
+    python benchmarks/retry_bench.py 500 0.3    # 请求数、注入错误的概率
+"""
+
+import asyncio
+import json
+import random
+import sys
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+# 添加 kosong 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "kosong" / "src"))
+
+import httpx
+from loguru import logger
+
+from kosong import generate
+from kosong.chat_provider import ChatProvider, ChatProviderError
+from kosong.chat_provider.chaos import ChaosChatProvider, ChaosConfig
+from kosong.chat_provider.retry import RetryingChatProvider
+from kosong.message import Message
+
+STREAM_BREAK_PROBABILITY = 0.05
+
+
+def chunk(delta: dict[str, object], finish_reason: str | None = None) -> bytes:
+    payload = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "bench",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+class StreamBody(httpx.AsyncByteStream):
+    """流式响应体，broken 时在第一个分片后断开连接"""
+
+    def __init__(self, broken: bool):
+        self._broken = broken
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield chunk({"role": "assistant", "content": "Hello"})
+        if self._broken:
+            raise httpx.RemoteProtocolError("peer closed connection")
+        yield chunk({"content": ", world!"}, finish_reason="stop")
+        yield b"data: [DONE]\n\n"
+
+
+def completion() -> dict[str, object]:
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "bench",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "Hello, world!"},
+                "finish_reason": "stop",
+            }
+        ],
+    }
+
+
+async def handler(request: httpx.Request) -> httpx.Response:
+    if json.loads(request.content).get("stream"):
+        broken = random.random() < STREAM_BREAK_PROBABILITY
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, stream=StreamBody(broken)
+        )
+    return httpx.Response(200, json=completion())
+
+
+def chaos_provider(error_probability: float) -> ChaosChatProvider:
+    return ChaosChatProvider(
+        model="bench",
+        api_key="bench",
+        base_url="http://bench.local/v1",
+        chaos_config=ChaosConfig(error_probability=error_probability, retry_after=0),
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        max_retries=0,
+    )
+
+
+async def bench(name: str, provider: ChatProvider, n: int) -> None:
+    ok = 0
+    start = time.perf_counter()
+    for _ in range(n):
+        try:
+            await generate(provider, "", [], [Message(role="user", content="Hi")])
+            ok += 1
+        except ChatProviderError:
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} success {ok / n:7.1%} ({ok}/{n}) in {elapsed:.2f}s")
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    error_probability = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+
+    logger.remove()
+    random.seed(0)
+    print(f"chaos errors {error_probability:.0%}, stream breaks {STREAM_BREAK_PROBABILITY:.0%}")
+    await bench("ChaosChatProvider", chaos_provider(error_probability), n)
+    retrying = RetryingChatProvider(chaos_provider(error_probability), base_delay=0.001, max_delay=0.01)
+    await bench("RetryingChatProvider", retrying, n)
+    print(f"  {retrying.stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+对话历史 JSONL 存储的写入吞吐
+依次向 JsonlLinearStorage 和三种 fsync 策略的 BatchedJsonlLinearStorage 追加消息
+（每 10 条记录一次 token 数），关闭后重新读取校验条数，输出每秒追加条数
+
+运行命令：
+    python benchmarks/storage_bench.py
+    python benchmarks/storage_bench.py 20000
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加 kosong 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "kosong" / "src"))
+
+from kosong.contrib.context.linear import BatchedJsonlLinearStorage, JsonlLinearStorage
+from kosong.message import Message
+
+
+async def bench(name: str, storage: JsonlLinearStorage, messages: list[Message]) -> None:
+    start = time.perf_counter()
+    for i, message in enumerate(messages):
+        await storage.append_message(message)
+        if i % 10 == 9:
+            await storage.mark_token_count(i * 20)
+    await storage.aclose()
+    elapsed = time.perf_counter() - start
+
+    restored = JsonlLinearStorage(storage._path)
+    await restored.restore()
+    assert len(restored.messages) == len(messages)
+    print(f"{name:<36} {len(messages) / elapsed:>10.0f} appends/s ({elapsed:.3f}s)")
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    messages = [
+        Message(role="user" if i % 2 == 0 else "assistant", content=f"message {i} " * 8)
+        for i in range(n)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        await bench("JsonlLinearStorage", JsonlLinearStorage(Path(tmp) / "plain.jsonl"), messages)
+        for fsync in ("never", "interval", "batch"):
+            await bench(
+                f"BatchedJsonlLinearStorage({fsync})",
+                BatchedJsonlLinearStorage(Path(tmp) / f"batched-{fsync}.jsonl", fsync=fsync),
+                messages,
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
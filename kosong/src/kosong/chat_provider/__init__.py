@@ -1,4 +1,6 @@
-from collections.abc import AsyncIterator, Sequence
+import email.utils
+import time
+from collections.abc import AsyncIterator, Mapping, Sequence
 from dataclasses import dataclass
 from typing import Literal, Protocol, Self, runtime_checkable
 
@@ -69,6 +71,17 @@ class StreamedMessage(Protocol):
         ...
 
 
+async def close_streamed_message(stream: StreamedMessage) -> None:
+    """
+    Close a streamed message that will not be consumed, releasing its HTTP connection.
+
+    Streams without an `aclose()` method are left to the garbage collector.
+    """
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
 @dataclass(frozen=True, kw_only=True, slots=True)
 class TokenUsage:
     """Token usage statistics."""
@@ -116,11 +129,44 @@ class APIStatusError(ChatProviderError):
     """The error raised when the API returns a status code of 4xx or 5xx."""
 
     status_code: int
+    retry_after: float | None
+    """Seconds the server asked to wait before retrying, from the `Retry-After` header."""
 
-    def __init__(self, status_code: int, message: str):
+    def __init__(self, status_code: int, message: str, *, retry_after: float | None = None):
         super().__init__(message)
         self.status_code = status_code
+        self.retry_after = retry_after
 
 
 class APIEmptyResponseError(ChatProviderError):
     """The error raised when the API returns an empty response."""
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> float | None:
+    """
+    Parse the delay in seconds from the `retry-after-ms` or `retry-after` response header.
+
+    >>> parse_retry_after({"retry-after": "2"})
+    2.0
+    >>> parse_retry_after({"retry-after-ms": "1500"})
+    1.5
+    >>> parse_retry_after({}) is None
+    True
+    """
+    if value := headers.get("retry-after-ms"):
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0.0)
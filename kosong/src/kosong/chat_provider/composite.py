@@ -0,0 +1,306 @@
+import asyncio
+import copy
+import random
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Sequence
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Literal, Self, get_args
+
+from loguru import logger
+
+from kosong.chat_provider import (
+    ChatProvider,
+    ChatProviderError,
+    StreamedMessage,
+    StreamedMessagePart,
+    ThinkingEffort,
+    TokenUsage,
+    close_streamed_message,
+)
+from kosong.message import Message
+from kosong.tooling import Tool
+
+if TYPE_CHECKING:
+
+    def type_check(composite: "CompositeChatProvider"):
+        _: ChatProvider = composite
+
+
+type RoutingPolicy = Literal["failover", "hedge", "latency"]
+"""
+How `CompositeChatProvider` picks the provider for a request:
+
+- `"failover"`: try the providers in order, moving to the next one when a provider fails.
+- `"hedge"`: like failover, but also start the next provider when the first part has not arrived
+  within `hedge_delay`; the first provider to produce a part wins and the others are cancelled.
+- `"latency"`: pick the first provider at random, weighted by the inverse of its p50 latency,
+  then fail over to the others from fastest to slowest.
+"""
+
+
+@dataclass(slots=True)
+class ProviderStats:
+    """Request statistics of one provider inside a `CompositeChatProvider`."""
+
+    requests: int = 0
+    """Requests started on the provider."""
+    failures: int = 0
+    """Requests that failed before the first part."""
+    cancelled: int = 0
+    """Hedged requests that were cancelled before their first part because another provider won."""
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=100))
+    """Recent time-to-first-part samples in seconds."""
+
+    def percentile(self, q: float) -> float | None:
+        """The `q`-th percentile (0-100) of the recent latencies, or `None` without samples."""
+        if not self.latencies:
+            return None
+        samples = sorted(self.latencies)
+        index = min(len(samples) - 1, round(q / 100 * (len(samples) - 1)))
+        return samples[index]
+
+    @property
+    def p50(self) -> float | None:
+        return self.percentile(50)
+
+    @property
+    def p95(self) -> float | None:
+        return self.percentile(95)
+
+
+class CompositeChatProvider(ChatProvider):
+    """
+    A chat provider that routes each request across several underlying providers.
+
+    A provider counts as successful once its stream yields the first part, so failover and hedging
+    only cover failures before that point. An error in the middle of a stream is raised as is.
+
+    The latency statistics are shared with the copies returned by `with_thinking`.
+    """
+
+    name = "composite"
+
+    def __init__(
+        self,
+        providers: Sequence[ChatProvider],
+        *,
+        policy: RoutingPolicy = "failover",
+        hedge_delay: float = 1.0,
+        stats_window: int = 100,
+    ):
+        """
+        Args:
+            providers: The underlying providers, in order of preference.
+            policy: The routing policy, see `RoutingPolicy`.
+            hedge_delay: Seconds to wait for the first part before hedging (`"hedge"` only).
+            stats_window: Number of recent latency samples kept per provider.
+
+        Raises:
+            ValueError: If `providers` is empty or `policy` is not a known routing policy.
+        """
+        if not providers:
+            raise ValueError("At least one provider is required")
+        if policy not in get_args(RoutingPolicy.__value__):
+            raise ValueError(f"Unknown routing policy: {policy!r}")
+        self._providers = list(providers)
+        self._policy: RoutingPolicy = policy
+        self._hedge_delay = hedge_delay
+        self._stats = [ProviderStats(latencies=deque(maxlen=stats_window)) for _ in providers]
+
+    @property
+    def model_name(self) -> str:
+        return f"{self._policy}({', '.join(p.model_name for p in self._providers)})"
+
+    @property
+    def providers(self) -> list[ChatProvider]:
+        return list(self._providers)
+
+    def stats(self) -> dict[str, ProviderStats]:
+        """The statistics of each provider, keyed by `name:model_name`."""
+        return {
+            f"{provider.name}:{provider.model_name}": stats
+            for provider, stats in zip(self._providers, self._stats, strict=True)
+        }
+
+    async def generate(
+        self,
+        system_prompt: str,
+        tools: Sequence[Tool],
+        history: Sequence[Message],
+    ) -> "CompositeStreamedMessage":
+        delay = self._hedge_delay if self._policy == "hedge" else None
+        return await self._race(self._order(), delay, system_prompt, tools, history)
+
+    def with_thinking(self, effort: ThinkingEffort) -> Self:
+        return self.map_providers(lambda provider: provider.with_thinking(effort))
+
+    def map_providers(self, fn: Callable[[ChatProvider], ChatProvider]) -> Self:
+        """Return a copy of self with `fn` applied to every underlying provider."""
+        new_self = copy.copy(self)
+        new_self._providers = [fn(provider) for provider in self._providers]
+        return new_self
+
+    def _order(self) -> list[int]:
+        indices = list(range(len(self._providers)))
+        if self._policy != "latency":
+            return indices
+
+        # providers never tried go first, so that every provider gets measured
+        untried = [i for i in indices if self._stats[i].requests == 0]
+        if untried:
+            return untried + [i for i in indices if i not in untried]
+        scores = [self._score(i) for i in indices]
+        weights = [1.0 / score for score in scores]
+        first = random.choices(indices, weights=weights)[0]
+        rest = sorted((i for i in indices if i != first), key=lambda i: scores[i])
+        return [first, *rest]
+
+    def _score(self, index: int) -> float:
+        """The p50 latency of a provider divided by its success rate, lower is better."""
+        stats = self._stats[index]
+        p50 = stats.p50
+        if p50 is None:
+            return 1e6
+        success_rate = max(1 - stats.failures / stats.requests, 1e-3)
+        return max(p50, 1e-3) / success_rate
+
+    async def _race(
+        self,
+        order: list[int],
+        hedge_delay: float | None,
+        system_prompt: str,
+        tools: Sequence[Tool],
+        history: Sequence[Message],
+    ) -> "CompositeStreamedMessage":
+        """
+        Start the providers in `order` until one of them yields its first part.
+
+        The next provider is started when an attempt fails, or when `hedge_delay` passes without
+        any attempt finishing. Without a delay this is plain failover.
+        """
+        pending = iter(order)
+        running: dict[asyncio.Task[CompositeStreamedMessage], int] = {}
+        last_error: ChatProviderError | None = None
+
+        def start_next() -> bool:
+            index = next(pending, None)
+            if index is None:
+                return False
+            task = asyncio.create_task(self._attempt(index, system_prompt, tools, history))
+            running[task] = index
+            return True
+
+        start_next()
+        try:
+            while running:
+                done, _ = await asyncio.wait(
+                    running, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if start_next():
+                        logger.debug(
+                            "Hedging request after {delay}s on {provider}",
+                            delay=hedge_delay,
+                            provider=self._providers[list(running.values())[-1]].name,
+                        )
+                    continue
+                for task in done:
+                    index = running.pop(task)
+                    try:
+                        return task.result()
+                    except ChatProviderError as e:
+                        last_error = e
+                        logger.warning(
+                            "Provider {provider} failed, trying the next one: {error}",
+                            provider=self._providers[index].name,
+                            error=e,
+                        )
+                        start_next()
+        finally:
+            # tasks that finished together with the winner are not cancelled, but their streams
+            # still hold a connection
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            for task, index in running.items():
+                if task.cancelled():
+                    self._stats[index].cancelled += 1
+                elif task.exception() is None:
+                    await close_streamed_message(task.result())
+
+        assert last_error is not None
+        raise last_error
+
+    async def _attempt(
+        self,
+        index: int,
+        system_prompt: str,
+        tools: Sequence[Tool],
+        history: Sequence[Message],
+    ) -> "CompositeStreamedMessage":
+        stats = self._stats[index]
+        stats.requests += 1
+        start = time.monotonic()
+        stream: StreamedMessage | None = None
+        try:
+            stream = await self._providers[index].generate(system_prompt, tools, history)
+            iterator = aiter(stream)
+            try:
+                first = await anext(iterator)
+            except StopAsyncIteration:
+                first = None
+        except ChatProviderError:
+            stats.failures += 1
+            if stream is not None:
+                await close_streamed_message(stream)
+            raise
+        except asyncio.CancelledError:
+            if stream is not None:
+                await close_streamed_message(stream)
+            raise
+        stats.latencies.append(time.monotonic() - start)
+        return CompositeStreamedMessage(stream, iterator, first, self._providers[index])
+
+
+class CompositeStreamedMessage(StreamedMessage):
+    """The streamed message of the provider that won a `CompositeChatProvider` request."""
+
+    def __init__(
+        self,
+        stream: StreamedMessage,
+        iterator: AsyncIterator[StreamedMessagePart],
+        first: StreamedMessagePart | None,
+        provider: ChatProvider,
+    ):
+        self._stream = stream
+        self._iter = self._chain(iterator, first)
+        self.provider = provider
+        """The provider that produced this message."""
+
+    def __aiter__(self) -> AsyncIterator[StreamedMessagePart]:
+        return self
+
+    async def __anext__(self) -> StreamedMessagePart:
+        return await self._iter.__anext__()
+
+    async def _chain(
+        self, iterator: AsyncIterator[StreamedMessagePart], first: StreamedMessagePart | None
+    ) -> AsyncIterator[StreamedMessagePart]:
+        if first is None:
+            return
+        yield first
+        async for part in iterator:
+            yield part
+
+    async def aclose(self) -> None:
+        """Close the stream of the winning provider."""
+        await close_streamed_message(self._stream)
+
+    @property
+    def id(self) -> str | None:
+        return self._stream.id
+
+    @property
+    def usage(self) -> TokenUsage | None:
+        return self._stream.usage
@@ -203,9 +203,11 @@ class KimiStreamedMessage(StreamedMessage):
     """The streamed message of the Kimi chat provider."""
 
     def __init__(self, response: ChatCompletion | AsyncStream[ChatCompletionChunk]):
+        self._response: AsyncStream[ChatCompletionChunk] | None = None
         if isinstance(response, ChatCompletion):
             self._iter = self._convert_non_stream_response(response)
         else:
+            self._response = response
             self._iter = self._convert_stream_response(response)
         self._id: str | None = None
         self._usage: CompletionUsage | None = None
@@ -216,6 +218,11 @@ class KimiStreamedMessage(StreamedMessage):
     async def __anext__(self) -> StreamedMessagePart:
         return await self._iter.__anext__()
 
+    async def aclose(self) -> None:
+        """Close the underlying HTTP response without consuming the rest of the stream."""
+        if self._response is not None:
+            await self._response.close()
+
     @property
     def id(self) -> str | None:
         return self._id
@@ -0,0 +1,259 @@
+import asyncio
+import copy
+import random
+import time
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Self
+
+from loguru import logger
+
+from kosong.chat_provider import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    ChatProvider,
+    ChatProviderError,
+    StreamedMessage,
+    StreamedMessagePart,
+    ThinkingEffort,
+    TokenUsage,
+    close_streamed_message,
+)
+from kosong.chat_provider.composite import CompositeChatProvider
+from kosong.message import Message
+from kosong.tooling import Tool
+
+if TYPE_CHECKING:
+
+    def type_check(retrying: "RetryingChatProvider"):
+        _: ChatProvider = retrying
+
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+"""Status codes that are worth retrying: timeouts, conflicts, rate limits and server errors."""
+
+
+def is_retryable(error: ChatProviderError) -> bool:
+    """Whether the error is transient, i.e. the same request may succeed later."""
+    if isinstance(error, APIConnectionError | APITimeoutError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def without_streaming(provider: ChatProvider) -> ChatProvider | None:
+    """
+    Return a copy of the provider that requests complete (non-streamed) responses, or `None` if
+    the provider has no such switch.
+    """
+    if isinstance(provider, CompositeChatProvider):
+        return provider.map_providers(lambda p: without_streaming(p) or p)
+    # `Kimi` and `OpenAILegacy` call the flag `stream`, `Anthropic` and `OpenAIResponses` `_stream`
+    for attr in ("stream", "_stream"):
+        if isinstance(getattr(provider, attr, None), bool):
+            new_provider = copy.copy(provider)
+            setattr(new_provider, attr, False)
+            return new_provider
+    return None
+
+
+@dataclass(slots=True)
+class RetryStats:
+    """Counters of a `RetryingChatProvider`."""
+
+    requests: int = 0
+    """Calls to `generate`."""
+    attempts: int = 0
+    """Requests sent to the wrapped provider, including retries."""
+    failures: int = 0
+    """Calls to `generate` that raised after all the attempts."""
+    stream_breaks: int = 0
+    """Streams that failed after the first part."""
+
+
+class RetryingChatProvider(ChatProvider):
+    """
+    A chat provider that retries transient failures of another provider.
+
+    A request is retried with exponential backoff and jitter when it fails with a connection
+    error, a timeout or a retryable status code (see `RETRYABLE_STATUS_CODES`) before its first
+    streamed part. A `Retry-After` from the server takes precedence over the backoff; if it asks
+    for more than `max_retry_after` seconds, the error is raised right away.
+
+    Once the first part has been yielded it may already have reached the caller (and tool calls
+    may be running), so a stream that breaks after that point is not replayed. Instead the error
+    is raised and the following requests use non-streaming responses for `stream_fallback`
+    seconds, which avoids long-lived connections to a flaky upstream.
+
+    The SDK clients of the built-in providers retry on their own by default; pass
+    `max_retries=0` to them to leave retrying to this wrapper.
+    """
+
+    def __init__(
+        self,
+        provider: ChatProvider,
+        *,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        max_retry_after: float = 30.0,
+        stream_fallback: float = 300.0,
+    ):
+        """
+        Args:
+            provider: The provider to wrap.
+            max_attempts: Maximum number of requests per `generate` call, including the first.
+            base_delay: Backoff before the first retry, doubled for every further retry.
+            max_delay: Upper bound of the backoff.
+            max_retry_after: Longest `Retry-After` that is waited for instead of failing.
+            stream_fallback: Seconds to use non-streaming responses after a stream breaks.
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self._provider = provider
+        self.name = provider.name
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._max_retry_after = max_retry_after
+        self._stream_fallback = stream_fallback
+        self._fallback_provider = without_streaming(provider)
+        self._fallback_until = 0.0
+        self.stats = RetryStats()
+
+    @property
+    def model_name(self) -> str:
+        return self._provider.model_name
+
+    @property
+    def provider(self) -> ChatProvider:
+        """The wrapped provider."""
+        return self._provider
+
+    @property
+    def streaming(self) -> bool:
+        """Whether requests are currently streamed, i.e. not in the fallback period."""
+        return self._fallback_provider is None or time.monotonic() >= self._fallback_until
+
+    async def generate(
+        self,
+        system_prompt: str,
+        tools: Sequence[Tool],
+        history: Sequence[Message],
+    ) -> "RetryingStreamedMessage":
+        self.stats.requests += 1
+        attempt = 1
+        while True:
+            provider = self._provider if self.streaming else self._fallback_provider
+            assert provider is not None
+            self.stats.attempts += 1
+            stream: StreamedMessage | None = None
+            try:
+                stream = await provider.generate(system_prompt, tools, history)
+                iterator = aiter(stream)
+                try:
+                    first = await anext(iterator)
+                except StopAsyncIteration:
+                    first = None
+                return RetryingStreamedMessage(self, stream, iterator, first)
+            except ChatProviderError as e:
+                if stream is not None:
+                    await close_streamed_message(stream)
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    self.stats.failures += 1
+                    raise
+                logger.warning(
+                    "Attempt {attempt}/{max_attempts} on {provider} failed, retrying in "
+                    "{delay:.2f}s: {error}",
+                    attempt=attempt,
+                    max_attempts=self._max_attempts,
+                    provider=self.name,
+                    delay=delay,
+                    error=e,
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+            except BaseException:
+                if stream is not None:
+                    await close_streamed_message(stream)
+                raise
+
+    def with_thinking(self, effort: ThinkingEffort) -> Self:
+        new_self = copy.copy(self)
+        new_self._provider = self._provider.with_thinking(effort)
+        new_self._fallback_provider = without_streaming(new_self._provider)
+        return new_self
+
+    def _retry_delay(self, attempt: int, error: ChatProviderError) -> float | None:
+        """Seconds to wait before the next attempt, or `None` to give up."""
+        if attempt >= self._max_attempts or not is_retryable(error):
+            return None
+        if isinstance(error, APIStatusError) and error.retry_after is not None:
+            if error.retry_after > self._max_retry_after:
+                return None
+            return error.retry_after
+        backoff = min(self._base_delay * 2 ** (attempt - 1), self._max_delay)
+        return random.uniform(backoff / 2, backoff)
+
+    def _on_stream_break(self, error: ChatProviderError) -> None:
+        self.stats.stream_breaks += 1
+        if self._fallback_provider is None or not is_retryable(error):
+            return
+        if self.streaming:
+            logger.warning(
+                "Stream from {provider} broke, using non-streaming responses for {seconds}s: "
+                "{error}",
+                provider=self.name,
+                seconds=self._stream_fallback,
+                error=error,
+            )
+        self._fallback_until = time.monotonic() + self._stream_fallback
+
+
+class RetryingStreamedMessage(StreamedMessage):
+    """The streamed message of a `RetryingChatProvider`."""
+
+    def __init__(
+        self,
+        owner: RetryingChatProvider,
+        stream: StreamedMessage,
+        iterator: AsyncIterator[StreamedMessagePart],
+        first: StreamedMessagePart | None,
+    ):
+        self._owner = owner
+        self._stream = stream
+        self._iter = self._chain(iterator, first)
+
+    def __aiter__(self) -> AsyncIterator[StreamedMessagePart]:
+        return self
+
+    async def __anext__(self) -> StreamedMessagePart:
+        return await self._iter.__anext__()
+
+    async def _chain(
+        self, iterator: AsyncIterator[StreamedMessagePart], first: StreamedMessagePart | None
+    ) -> AsyncIterator[StreamedMessagePart]:
+        if first is None:
+            return
+        yield first
+        try:
+            async for part in iterator:
+                yield part
+        except ChatProviderError as e:
+            self._owner._on_stream_break(e)  # pyright: ignore[reportPrivateUsage]
+            raise
+
+    async def aclose(self) -> None:
+        """Close the stream of the underlying provider."""
+        await close_streamed_message(self._stream)
+
+    @property
+    def id(self) -> str | None:
+        return self._stream.id
+
+    @property
+    def usage(self) -> TokenUsage | None:
+        return self._stream.usage
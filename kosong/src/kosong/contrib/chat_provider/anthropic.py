@@ -63,6 +63,7 @@ from kosong.chat_provider import (
     StreamedMessagePart,
     ThinkingEffort,
     TokenUsage,
+    parse_retry_after,
 )
 from kosong.message import (
     ImageURLPart,
@@ -128,6 +129,11 @@ class Anthropic(ChatProvider):
     def model_name(self) -> str:
         return self._model
 
+    @property
+    def client(self) -> AsyncAnthropic:
+        """The underlying `AsyncAnthropic` client."""
+        return self._client
+
     async def generate(
         self,
         system_prompt: str,
@@ -239,9 +245,11 @@ class Anthropic(ChatProvider):
 
 class AnthropicStreamedMessage:
     def __init__(self, response: AnthropicMessage | AsyncStream[RawMessageStreamEvent]):
+        self._response: AsyncStream[RawMessageStreamEvent] | None = None
         if isinstance(response, AnthropicMessage):
             self._iter = self._convert_non_stream_response(response)
         else:
+            self._response = response
             self._iter = self._convert_stream_response(response)
         self._id: str | None = None
         self._usage: Usage | None = None
@@ -252,6 +260,11 @@ class AnthropicStreamedMessage:
     async def __anext__(self) -> StreamedMessagePart:
         return await self._iter.__anext__()
 
+    async def aclose(self) -> None:
+        """Close the underlying HTTP response without consuming the rest of the stream."""
+        if self._response is not None:
+            await self._response.close()
+
     @property
     def id(self) -> str | None:
         return self._id
@@ -478,7 +491,11 @@ def _image_url_part_to_anthropic(part: ImageURLPart) -> ImageBlockParam:
 
 def _convert_error(error: AnthropicError) -> ChatProviderError:
     if isinstance(error, AnthropicAPIStatusError):
-        return APIStatusError(error.status_code, str(error))
+        return APIStatusError(
+            error.status_code,
+            str(error),
+            retry_after=parse_retry_after(error.response.headers),
+        )
     if isinstance(error, AnthropicAuthenticationError):
         return APIStatusError(getattr(error, "status_code", 401), str(error))
     if isinstance(error, AnthropicPermissionDeniedError):
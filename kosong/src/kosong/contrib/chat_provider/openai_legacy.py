@@ -24,6 +24,7 @@ from kosong.chat_provider import (
     StreamedMessagePart,
     ThinkingEffort,
     TokenUsage,
+    parse_retry_after,
 )
 from kosong.message import Message, TextPart, ToolCall, ToolCallPart
 from kosong.tooling import Tool
@@ -138,9 +139,11 @@ def tool_to_openai(tool: Tool) -> ChatCompletionToolParam:
 
 class OpenAILegacyStreamedMessage:
     def __init__(self, response: ChatCompletion | AsyncStream[ChatCompletionChunk]):
+        self._response: AsyncStream[ChatCompletionChunk] | None = None
         if isinstance(response, ChatCompletion):
             self._iter = self._convert_non_stream_response(response)
         else:
+            self._response = response
             self._iter = self._convert_stream_response(response)
         self._id: str | None = None
         self._usage: CompletionUsage | None = None
@@ -151,6 +154,11 @@ class OpenAILegacyStreamedMessage:
     async def __anext__(self) -> StreamedMessagePart:
         return await self._iter.__anext__()
 
+    async def aclose(self) -> None:
+        """Close the underlying HTTP response without consuming the rest of the stream."""
+        if self._response is not None:
+            await self._response.close()
+
     @property
     def id(self) -> str | None:
         return self._id
@@ -238,7 +246,11 @@ class OpenAILegacyStreamedMessage:
 
 def convert_error(error: OpenAIError) -> ChatProviderError:
     if isinstance(error, openai.APIStatusError):
-        return APIStatusError(error.status_code, error.message)
+        return APIStatusError(
+            error.status_code,
+            error.message,
+            retry_after=parse_retry_after(error.response.headers),
+        )
     elif isinstance(error, openai.APIConnectionError):
         return APIConnectionError(error.message)
     elif isinstance(error, openai.APITimeoutError):
@@ -39,6 +39,7 @@ from kosong.chat_provider import (
     StreamedMessagePart,
     ThinkingEffort,
     TokenUsage,
+    parse_retry_after,
 )
 from kosong.contrib.chat_provider.openai_legacy import thinking_effort_to_reasoning_effort
 from kosong.message import (
@@ -108,6 +109,11 @@ class OpenAIResponses(ChatProvider):
     def model_name(self) -> str:
         return self._model
 
+    @property
+    def client(self) -> AsyncOpenAI:
+        """The underlying `AsyncOpenAI` client."""
+        return self._client
+
     async def generate(
         self,
         system_prompt: str,
@@ -409,9 +415,11 @@ def _map_audio_url_to_file_content(url: str) -> ResponseInputFileContentParam |
 
 class OpenAIResponsesStreamedMessage:
     def __init__(self, response: Response | AsyncStream[ResponseStreamEvent]):
+        self._response: AsyncStream[ResponseStreamEvent] | None = None
         if isinstance(response, Response):
             self._iter = self._convert_non_stream_response(response)
         else:
+            self._response = response
             self._iter = self._convert_stream_response(response)
         self._id: str | None = None
         self._usage: ResponseUsage | None = None
@@ -422,6 +430,11 @@ class OpenAIResponsesStreamedMessage:
     async def __anext__(self) -> StreamedMessagePart:
         return await self._iter.__anext__()
 
+    async def aclose(self) -> None:
+        """Close the underlying HTTP response without consuming the rest of the stream."""
+        if self._response is not None:
+            await self._response.close()
+
     @property
     def id(self) -> str | None:
         return self._id
@@ -505,7 +518,11 @@ class OpenAIResponsesStreamedMessage:
 
 def convert_error(error: OpenAIError) -> ChatProviderError:
     if isinstance(error, openai.APIStatusError):
-        return APIStatusError(error.status_code, error.message)
+        return APIStatusError(
+            error.status_code,
+            error.message,
+            retry_after=parse_retry_after(error.response.headers),
+        )
     elif isinstance(error, openai.APIConnectionError):
         return APIConnectionError(error.message)
     elif isinstance(error, openai.APITimeoutError):
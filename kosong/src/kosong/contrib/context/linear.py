@@ -1,9 +1,55 @@
 import asyncio
 import json
+import os
+import time
 from pathlib import Path
-from typing import IO, Protocol, runtime_checkable
+from typing import IO, Any, Literal, Protocol, runtime_checkable
 
-from kosong.message import Message
+import pydantic
+from loguru import logger
+
+from kosong.message import AudioURLPart, ImageURLPart, Message, TextPart, ThinkPart, ToolCall
+
+_MESSAGE_OVERHEAD_TOKENS = 4
+"""Role and delimiter tokens that every message costs regardless of its content."""
+_MEDIA_PART_TOKENS = 1000
+"""Rough cost of an image or audio part, which has no text to estimate from."""
+
+
+def estimate_token_count(message: Message) -> int:
+    """
+    Estimate the token count of a message without a tokenizer.
+
+    ASCII text is counted at about 4 characters per token and other characters (e.g. CJK) at
+    about one token each. The result is only meant to bridge the gap between two exact counts
+    reported by the API, not to replace them.
+
+    >>> estimate_token_count(Message(role="user", content="Hello, world!"))
+    8
+    """
+    texts: list[str] = []
+    tokens = _MESSAGE_OVERHEAD_TOKENS
+    if isinstance(message.content, str):
+        texts.append(message.content)
+    else:
+        for part in message.content:
+            if isinstance(part, TextPart):
+                texts.append(part.text)
+            elif isinstance(part, ThinkPart):
+                texts.append(part.think)
+            elif isinstance(part, (ImageURLPart, AudioURLPart)):
+                tokens += _MEDIA_PART_TOKENS
+    for tool_call in message.tool_calls or []:
+        texts.append(_tool_call_text(tool_call))
+
+    for text in texts:
+        ascii_chars = len(text.encode("ascii", "ignore"))
+        tokens += (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+    return tokens
+
+
+def _tool_call_text(tool_call: ToolCall) -> str:
+    return tool_call.function.name + (tool_call.function.arguments or "")
 
 
 class LinearContext:
@@ -20,12 +66,20 @@ class LinearContext:
 
     @property
     def token_count(self) -> int:
+        """
+        The token count of the history: the last exact count marked with `mark_token_count`,
+        plus an estimate for the messages added after it. This is O(1).
+        """
         return self._storage.token_count
 
     async def add_message(self, message: Message):
         await self._storage.append_message(message)
 
     async def mark_token_count(self, token_count: int):
+        """
+        Mark the exact token count of the current history, e.g. `StepResult.usage.total` right
+        after adding the message generated by that step.
+        """
         await self._storage.mark_token_count(token_count)
 
 
@@ -42,7 +96,8 @@ class LinearStorage(Protocol):
     def token_count(self) -> int:
         """
         The total token count of the messages in the storage.
-        This may not be the precise token count, depending on the caller of `mark_token_count`.
+        This is the last marked token count plus an estimate (see `estimate_token_count`) for
+        the messages appended after it, so it is only precise right after `mark_token_count`.
         """
         ...
 
@@ -58,6 +113,8 @@ class MemoryLinearStorage:
     def __init__(self):
         self._messages: list[Message] = []
         self._token_count: int | None = None
+        self._estimated_token_count = 0
+        """Estimated tokens of the messages appended after the last marked token count."""
 
     @property
     def messages(self) -> list[Message]:
@@ -65,13 +122,21 @@ class MemoryLinearStorage:
 
     @property
     def token_count(self) -> int:
-        return self._token_count or 0
+        return (self._token_count or 0) + self._estimated_token_count
 
     async def append_message(self, message: Message):
-        self._messages.append(message)
+        self._append(message)
 
     async def mark_token_count(self, token_count: int):
+        self._mark(token_count)
+
+    def _append(self, message: Message) -> None:
+        self._messages.append(message)
+        self._estimated_token_count += estimate_token_count(message)
+
+    def _mark(self, token_count: int) -> None:
         self._token_count = token_count
+        self._estimated_token_count = 0
 
 
 class JsonlLinearStorage(MemoryLinearStorage):
@@ -85,31 +150,66 @@ class JsonlLinearStorage(MemoryLinearStorage):
         self._file: IO[str] | None = None
 
     async def restore(self):
-        """Restore all messages from the JSONL file."""
+        """
+        Restore all messages from the JSONL file.
+
+        A truncated or corrupted last line (e.g. left by a crash in the middle of a write) is
+        dropped and cut off from the file, so that later appends start on a clean line.
+        Corruption anywhere else is still an error.
+        """
         if self._messages:
             raise RuntimeError("The storage is already modified")
         if not self._path.exists():
             return
 
         def _restore():
-            with open(self._path, encoding="utf-8") as f:
-                for line in f:
-                    if not line.strip():
-                        continue
-                    line_json = json.loads(line)
-                    if "token_count" in line_json:
-                        self._token_count = line_json["token_count"]
-                        continue
-                    message = Message.model_validate(line_json)
-                    self._messages.append(message)
+            with open(self._path, "rb") as f:
+                lines = f.readlines()
+            size = sum(len(line) for line in lines)
+            valid_end = 0
+            for i, raw_line in enumerate(lines):
+                try:
+                    line = raw_line.decode("utf-8")
+                    if line.strip():
+                        self._restore_line(json.loads(line))
+                except (UnicodeDecodeError, json.JSONDecodeError, pydantic.ValidationError):
+                    if i != len(lines) - 1:
+                        raise
+                    logger.warning(
+                        "Dropping truncated last line of {path}: {line!r}",
+                        path=self._path,
+                        line=raw_line[:100],
+                    )
+                    break
+                valid_end += len(raw_line)
+
+            # make sure later appends start on a clean line
+            if valid_end < size:
+                with open(self._path, "r+b") as f:
+                    f.truncate(valid_end)
+            elif lines and not lines[-1].endswith(b"\n"):
+                with open(self._path, "ab") as f:
+                    f.write(b"\n")
 
         await asyncio.to_thread(_restore)
 
+    def _restore_line(self, line_json: dict[str, Any]) -> None:
+        if "token_count" in line_json:
+            self._mark(line_json["token_count"])
+            return
+        self._append(Message.model_validate(line_json))
+
     def _get_file(self) -> IO[str]:
         if self._file is None:
             self._file = open(self._path, "a", encoding="utf-8")  # noqa: SIM115
         return self._file
 
+    async def aclose(self):
+        """Close the underlying file. The storage must not be written after closing."""
+        if self._file is not None:
+            file, self._file = self._file, None
+            await asyncio.to_thread(file.close)
+
     def __del__(self):
         if self._file:
             self._file.close()
@@ -143,3 +243,143 @@ class JsonlLinearStorage(MemoryLinearStorage):
             file.write("\n")
 
         await asyncio.to_thread(_write)
+
+
+type FsyncPolicy = Literal["never", "batch", "interval"]
+"""
+When `BatchedJsonlLinearStorage` calls `fsync` on the file:
+
+- `"never"`: only flush to the OS, leave durability to the page cache.
+- `"batch"`: fsync after every group commit.
+- `"interval"`: fsync at most once per `fsync_interval`; records written in between are fsynced
+  when the interval expires, even if nothing else is appended.
+"""
+
+
+class BatchedJsonlLinearStorage(JsonlLinearStorage):
+    """
+    A JSONL linear storage that persists records through a single background writer.
+
+    `append_message` and `mark_token_count` update the in-memory state, serialize the record and
+    put it on a queue without waiting for the disk. One writer task drains the queue and writes
+    everything pending as a single group commit, so a burst of appends costs one thread hop and
+    one write (and at most one fsync) instead of one per record.
+
+    Call `flush` to wait until everything appended so far is written, and `aclose` to flush and
+    release the file. Writer errors are re-raised from `flush`, `aclose` and the next append.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        *,
+        fsync: FsyncPolicy = "batch",
+        fsync_interval: float = 1.0,
+        max_batch_size: int = 1024,
+    ):
+        super().__init__(path)
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self._fsync: FsyncPolicy = fsync
+        self._fsync_interval = fsync_interval
+        self._max_batch_size = max_batch_size
+        self._last_fsync = 0.0
+        self._dirty = False
+        """Whether records were written but not fsynced yet (only with `fsync="interval"`)."""
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._writer: asyncio.Task[None] | None = None
+        self._error: BaseException | None = None
+        self._closed = False
+
+    async def append_message(self, message: Message):
+        self._enqueue(message.model_dump(exclude_none=True))
+        self._append(message)
+
+    async def mark_token_count(self, token_count: int):
+        self._enqueue({"role": "_usage", "token_count": token_count})
+        self._mark(token_count)
+
+    async def flush(self):
+        """Wait until all the records appended so far are written to the file."""
+        if self._writer is not None:
+            await self._queue.join()
+        self._raise_writer_error()
+
+    async def aclose(self):
+        """Flush pending records, stop the writer and close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.flush()
+        finally:
+            if self._writer is not None:
+                self._writer.cancel()
+                await asyncio.gather(self._writer, return_exceptions=True)
+                self._writer = None
+            if self._dirty and self._error is None:
+                await asyncio.to_thread(self._fsync_now)
+            await super().aclose()
+
+    def _enqueue(self, record: dict[str, Any]) -> None:
+        if self._closed:
+            raise RuntimeError("The storage is already closed")
+        self._raise_writer_error()
+        self._queue.put_nowait(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run_writer())
+
+    def _raise_writer_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"Failed to write {self._path}") from self._error
+
+    async def _run_writer(self) -> None:
+        while True:
+            if self._dirty:
+                # Wait for more records only until the pending fsync is due
+                timeout = self._last_fsync + self._fsync_interval - time.monotonic()
+                try:
+                    first = await asyncio.wait_for(self._queue.get(), max(timeout, 0.0))
+                except TimeoutError:
+                    try:
+                        await asyncio.to_thread(self._fsync_now)
+                    except Exception as e:
+                        logger.error("Failed to fsync {path}: {error}", path=self._path, error=e)
+                        self._error = e
+                        self._dirty = False
+                    continue
+            else:
+                first = await self._queue.get()
+            batch = [first]
+            while len(batch) < self._max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                if self._error is None:
+                    await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                logger.error("Failed to write {path}: {error}", path=self._path, error=e)
+                self._error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: list[str]) -> None:
+        file = self._get_file()
+        file.write("\n".join(batch))
+        file.write("\n")
+        file.flush()
+        match self._fsync:
+            case "never":
+                return
+            case "batch":
+                os.fsync(file.fileno())
+            case "interval":
+                if time.monotonic() - self._last_fsync >= self._fsync_interval:
+                    self._fsync_now()
+                else:
+                    self._dirty = True
+
+    def _fsync_now(self) -> None:
+        os.fsync(self._get_file().fileno())
+        self._last_fsync = time.monotonic()
+        self._dirty = False
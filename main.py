@@ -5,7 +5,6 @@
 """
 
 import asyncio
-import signal
 import sys
 import logging
 from pathlib import Path
@@ -15,32 +14,16 @@ src_path = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_path))
 
 from bot import main as bot_main
+from src.observability.logging_setup import setup_logging
 
-# 配置日志
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('dida_bot.log', encoding='utf-8')
-    ]
-)
+# 配置日志（队列化写入终端和 dida_bot.log；读取配置后 Bot 会按 LOG_* 配置重新设置）
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
 
-def signal_handler(sig, frame):
-    """处理系统信号"""
-    logger.info(f"收到信号 {sig}，正在优雅关闭 Bot...")
-    sys.exit(0)
-
-
 async def main():
-    """主入口函数"""
-    # 注册信号处理
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-
+    """主入口函数（SIGINT/SIGTERM 由 Bot 在事件循环内处理，先排空再退出）"""
     logger.info("BOT 滴答清单 Bot 正在启动...")
 
     # 启动 Bot（现在会正常结束）
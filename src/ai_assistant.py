@@ -14,6 +14,7 @@ sys.path.insert(0, str(kosong_path))
 
 import asyncio
 import logging
+from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date
 
@@ -30,7 +31,13 @@ from kosong.tooling.simple import SimpleToolset
 from kosong import StepResult
 
 # 修复导入路径
+from kosong.chat_provider import ChatProvider, ChatProviderError
+from kosong.chat_provider.composite import CompositeChatProvider
+from kosong.chat_provider.retry import RetryingChatProvider
+from kosong.chat_provider.kimi import Kimi
 from kosong.contrib.chat_provider.anthropic import Anthropic
+from kosong.contrib.chat_provider.openai_legacy import OpenAILegacy
+from kosong.contrib.chat_provider.openai_responses import OpenAIResponses
 from kosong.contrib.context.linear import LinearContext
 
 from src.dida_client import DidaClient
@@ -38,6 +45,7 @@ from src.dida_client import DidaClient
 # 导入重构后的模块
 from src.context.conversation_context import ConversationContext
 from src.loop.agent_loop import AgentLoop
+from src.observability.ledger import InstrumentedToolset, ledger
 from src.prompts import system_prompt
 from src.formatter import (
     format_get_projects,
@@ -50,7 +58,7 @@ from src.formatter import (
     format_current_time,
     format_get_project_columns,
 )
-from src.formatter.pomodoro_formatter import format_start_task_pomodoro
+from src.formatter.pomodoro_formatter import format_focus_stats, format_start_task_pomodoro
 from src.tools.dida_tools import (
     GetCurrentTimeTool,
     GetProjectsTool,
@@ -62,12 +70,25 @@ from src.tools.dida_tools import (
     DeleteTaskTool,
     GetProjectColumnsTool,
     StartTaskPomodoroTool,
+    GetFocusStatsTool,
 )
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
 
+class AITurnError(Exception):
+    """一轮AI对话失败（异常信息是可以直接回复给用户的提示，本轮不应写入对话历史）"""
+
+
+@dataclass
+class AIReply:
+    """一轮AI对话的结果"""
+    text: str
+    # 第一次调用模型时的输入token数（系统提示 + 对话历史 + 本轮用户消息），没有用量数据时为 None
+    prompt_token_count: Optional[int] = None
+
+
 class AIAssistant:
     """滴答清单AI助手"""
 
@@ -79,6 +100,17 @@ class AIAssistant:
         dida_client: Optional[DidaClient] = None,
         max_iterations: int = 20,
         max_history_length: Optional[int] = None,
+        max_context_tokens: Optional[int] = None,
+        kimi_api_key: Optional[str] = None,
+        kimi_base_url: Optional[str] = None,
+        kimi_model: str = "kimi-k2-turbo-preview",
+        openai_api_key: Optional[str] = None,
+        openai_base_url: Optional[str] = None,
+        openai_model: str = "gpt-4o-mini",
+        openai_api: str = "chat",
+        routing_policy: str = "failover",
+        hedge_delay: float = 1.5,
+        chat_provider: Optional[ChatProvider] = None,
     ):
         """初始化AI助手
 
@@ -89,23 +121,69 @@ class AIAssistant:
             dida_client: 滴答清单客户端实例
             max_iterations: 最多循环次数，避免无限循环（工具调用最大轮数）
             max_history_length: 对话历史最大长度（设置为None表示不限制，保持完整对话）
+            max_context_tokens: 模型上下文窗口（token），对话接近上限时输出警告（None表示不检查）
+            kimi_api_key: Kimi API密钥（配置后作为备用提供者）
+            kimi_base_url: Kimi API基础URL
+            kimi_model: Kimi模型名称
+            openai_api_key: OpenAI兼容API密钥（配置后作为备用提供者）
+            openai_base_url: OpenAI兼容API基础URL
+            openai_model: OpenAI兼容模型名称
+            openai_api: OpenAI备用提供者使用的接口（chat: Chat Completions，responses: Responses API）
+            routing_policy: 多个提供者之间的路由策略（failover/hedge/latency）
+            hedge_delay: hedge策略下等待首个token多少秒后向下一个提供者发起请求
+            chat_provider: 直接指定聊天提供者（指定后忽略以上提供者配置）
         """
         self.dida_client = dida_client
         self.max_iterations = max_iterations  # 最多工具调用轮数
         self.max_history_length = max_history_length  # 对话历史最大长度（None=不限制）
+        self.max_context_tokens = max_context_tokens  # 模型上下文窗口（None=不检查）
+        # 各 LLM 上游的 SDK 客户端（启动时预热连接、定期保活）
+        self.llm_clients: Dict[str, Any] = {}
 
         # 初始化聊天提供者（需要优先创建，供AgentLoop使用）
-        if anthropic_api_key:
+        if chat_provider is not None:
+            self.chat_provider = chat_provider
+            self.provider_type = chat_provider.name
+        elif anthropic_api_key:
             self.chat_provider = Anthropic(
                 model=anthropic_model,
                 api_key=anthropic_api_key,
                 base_url=anthropic_base_url,
                 default_max_tokens=4096,  # 设置默认最大token数
+                max_retries=0,  # 重试统一由 RetryingChatProvider 处理
             )
+            self.llm_clients["anthropic"] = self.chat_provider.client
             self.provider_type = "anthropic(glm)"
         else:
             raise ValueError("请配置ANTHROPIC_API_KEY")
 
+        # 配置了备用提供者时，用组合提供者在多个上游之间故障转移/对冲请求
+        fallback_providers: List[ChatProvider] = []
+        if chat_provider is None and kimi_api_key:
+            kimi = Kimi(model=kimi_model, api_key=kimi_api_key, base_url=kimi_base_url, max_retries=0)
+            self.llm_clients["kimi"] = kimi.client
+            fallback_providers.append(kimi)
+        if chat_provider is None and openai_api_key:
+            # Responses API 只有 OpenAI 官方支持，默认使用兼容面更广的 Chat Completions
+            openai_class = OpenAIResponses if openai_api == "responses" else OpenAILegacy
+            openai_provider = openai_class(
+                model=openai_model, api_key=openai_api_key, base_url=openai_base_url, max_retries=0
+            )
+            self.llm_clients["openai"] = openai_provider.client
+            fallback_providers.append(openai_provider)
+        if fallback_providers:
+            self.chat_provider = CompositeChatProvider(
+                [self.chat_provider, *fallback_providers],
+                policy=routing_policy,
+                hedge_delay=hedge_delay,
+            )
+            self.provider_type = f"{self.provider_type}+{'+'.join(p.name for p in fallback_providers)}({routing_policy})"
+
+        # 首个token之前的瞬时错误（429/5xx/超时）自动退避重试，流中断后暂时改用非流式请求
+        if chat_provider is None:
+            self.chat_provider = RetryingChatProvider(self.chat_provider)
+        logger.info("聊天提供者: %s", self.provider_type)
+
         # 创建工具集
         self.toolset = SimpleToolset()
         
@@ -126,20 +204,17 @@ class AIAssistant:
         # 添加番茄钟相关工具
         if dida_client:
             self.toolset += StartTaskPomodoroTool(dida_client)
-
-        # 创建对话上下文管理器（Phase 1: 替代手动pending_tool_calls）
-        # 借鉴neu-translator设计：自动推导状态，不手动维护
-        self.context = ConversationContext(max_history_length=max_history_length)
-        logger.info(f"ConversationContext创建完成（Phase 1）")
+            self.toolset += GetFocusStatsTool(dida_client)
 
         # 创建Agent循环控制器（Phase 3: 抽取循环逻辑）
         # 借鉴neu-translator的AgentLoop设计
+        # 工具集包装一层，记录每次工具调用的耗时和返回大小
         self.agent_loop = AgentLoop(
             chat_provider=self.chat_provider,
-            toolset=self.toolset,
+            toolset=InstrumentedToolset(self.toolset),
             max_iterations=self.max_iterations
         )
-        logger.info(f"AgentLoop创建完成（Phase 3）")
+        logger.info("AgentLoop创建完成（Phase 3）")
 
         # 创建工具格式化器映射（Phase 4: 消除if/elif重复）
         # 借鉴neu-translator设计：通过字典映射代替条件分支
@@ -155,8 +230,24 @@ class AIAssistant:
             "update_task": format_update_task,
             "create_task": format_create_task,
             "start_task_pomodoro": format_start_task_pomodoro,
+            "get_focus_stats": format_focus_stats,
         }
-        logger.info(f"Tool formatter映射创建完成（Phase 4）")
+        logger.info("Tool formatter映射创建完成（Phase 4）")
+
+    async def ping_llm(self, name: str) -> None:
+        """
+        检查 LLM 上游的连接和密钥（请求模型列表，不消耗 token）
+
+        Raises:
+            Exception: 网络错误或密钥无效
+        """
+        try:
+            await self.llm_clients[name].models.list()
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            if status is None or status in (401, 403):
+                raise
+            # 兼容接口可能没有模型列表（404等），能收到响应说明连接可用
 
     def _is_today_task(self, task: Dict[str, Any]) -> bool:
         """判断任务是否是今天的任务
@@ -194,7 +285,7 @@ class AIAssistant:
             return False
 
         except Exception as e:
-            logger.warning(f"判断任务日期失败: {e}, task={task}")
+            logger.warning("判断任务日期失败: %s, task=%s", e, task)
             return False
 
     async def chat(
@@ -204,28 +295,57 @@ class AIAssistant:
         history: Optional[List[Message]] = None,
         telegram_bot=None,
         telegram_chat_id=None,
-    ) -> str:
+        notifier=None,
+    ) -> AIReply:
         """与用户对话，处理自然语言请求
 
         Args:
             user_message: 用户输入的消息
-            context: 可选的对话上下文，用于保持多轮对话历史（Telegram ConversationHandler使用）
+            context: 可选的对话上下文（ConversationStore 提供的持久化历史），只读取不修改
             history: 对话历史（仅当没有context时使用）
             telegram_bot: Telegram Bot 实例（用于发送工具调用通知）
             telegram_chat_id: Telegram 聊天ID
+            notifier: 通知发送器（NotificationSender），提供时工具调用通知在后台合并发送
 
         Returns:
-            AI的回复
+            AI的回复和本轮的输入token数（调用方用来校准持久化历史的token数）
+
+        Raises:
+            AITurnError: 本轮对话失败（异常信息是给用户的提示）
         """
+        # 每轮对话的耗时、token用量和工具调用记入用量账本
+        async with ledger.turn(telegram_chat_id, self.max_iterations):
+            return await self._chat(
+                user_message, context, history, telegram_bot, telegram_chat_id, notifier
+            )
+
+    async def _chat(
+        self,
+        user_message: str,
+        context: Optional[LinearContext],
+        history: Optional[List[Message]],
+        telegram_bot,
+        telegram_chat_id,
+        notifier=None,
+    ) -> AIReply:
+        """chat() 的实现，在用量账本的对话轮次内执行"""
+        # 对话上下文管理器（Phase 1: 替代手动pending_tool_calls）
+        # 每轮对话单独创建：不同聊天的对话会并发处理，不能共用同一个上下文
+        conversation = ConversationContext(
+            max_history_length=self.max_history_length,
+            max_context_tokens=self.max_context_tokens,
+        )
         try:
-            # 准备历史消息：优先使用context（Telegram传递的history），否则使用history
+            # 准备历史消息：优先使用context（持久化的对话历史），否则使用history
+            # 复制一份，本轮的工具调用过程不写回调用方的历史
+            # 持久化历史自带增量token统计，直接作为基准，不再逐条估算
             if context:
-                self.context.messages = context.history
+                conversation.reset(list(context.history), token_count=context.token_count)
             else:
-                self.context.messages = history or []
+                conversation.messages = list(history or [])
 
             # 添加用户消息到上下文（不裁剪，保持对话完整性）
-            self.context.add_user_message(user_message)
+            conversation.add_user_message(user_message)
 
             # 多轮循环调用：使用AgentLoop进行循环控制
             final_response = ""
@@ -233,11 +353,12 @@ class AIAssistant:
             while iteration < self.max_iterations:
                 # 使用AgentLoop执行一轮调用（包含kosong.step和基础工具处理）
                 actor, response_text, tool_results = await self.agent_loop.next(
-                    messages=self.context.get_messages(),
-                    context=self.context,
+                    messages=conversation.get_messages(),
+                    context=conversation,
                     system_prompt=system_prompt,
                     telegram_bot=telegram_bot,
-                    telegram_chat_id=telegram_chat_id
+                    telegram_chat_id=telegram_chat_id,
+                    notifier=notifier,
                 )
 
                 # 保存AI回复（最后一轮的回复）
@@ -246,18 +367,19 @@ class AIAssistant:
 
                 # 递增迭代计数器
                 iteration += 1
-                logger.info(f"[循环控制] 已完成第{iteration}轮，actor={actor}")
+                ledger.record_iterations(iteration)
+                logger.debug("[循环控制] 已完成第%d轮，actor=%s", iteration, actor)
 
                 # 处理工具结果（AIAssistant负责格式化等逻辑）
                 if tool_results:
-                    tool_response = await self._process_tool_results(tool_results)
+                    tool_response = await self._process_tool_results(tool_results, conversation)
                     if tool_response:
                         final_response = tool_response
 
                 # 决定下一轮行为
                 if actor == "user":
                     # 无工具调用，结束循环
-                    logger.info("[循环控制] 无更多工具，准备退出")
+                    logger.debug("[循环控制] 无更多工具，准备退出")
                     break
 
                 # 检查是否达到最大迭代次数
@@ -266,24 +388,31 @@ class AIAssistant:
                     break
 
             # 记录最终AI回复
-            logger.info(f"\n{'='*60}")
-            logger.info(f"[AI最终回复] 长度: {len(final_response)} 字符")
-            logger.info(f"内容预览: {final_response[:200]}...")
-            logger.info(f"{'='*60}\n")
-            return final_response
-
+            logger.info(
+                "[AI最终回复] 长度: %d 字符，上下文token数: %d", len(final_response), conversation.token_count
+            )
+            logger.debug("内容预览: %.200s", final_response)
+            return AIReply(final_response, conversation.prompt_token_count)
+
+        except ChatProviderError as e:
+            # 重试后仍失败（上游持续不可用或流中断），调用方不写入历史，用户可以直接重新发送
+            logger.error("AI服务请求失败: %s: %s", type(e).__name__, e)
+            ledger.record_error(e)
+            raise AITurnError("抱歉，AI服务暂时不可用，请稍后重新发送这条消息。") from e
         except Exception as e:
-            logger.error(f"AI助手错误: {e}")
-            import traceback
-            traceback.print_exc()
-            return f"抱歉，处理请求时出错: {str(e)}"
+            logger.exception("AI助手错误: %s", e)
+            ledger.record_error(e)
+            raise AITurnError(f"抱歉，处理请求时出错: {str(e)}") from e
 
-    async def _process_tool_results(self, tool_results: list) -> Optional[str]:
+    async def _process_tool_results(
+        self, tool_results: list, conversation: ConversationContext
+    ) -> Optional[str]:
         """
         处理工具结果（从主循环中提取）
 
         Args:
             tool_results: 工具结果列表
+            conversation: 本轮对话的上下文（工具结果追加到其中）
 
         Returns:
             处理后的回复文本
@@ -291,12 +420,12 @@ class AIAssistant:
         if not tool_results:
             return None
 
-        logger.info(f"[工具结果] 收到 {len(tool_results)} 个工具结果:")
+        logger.debug("[工具结果] 收到 %d 个工具结果", len(tool_results))
 
         # 检测批量操作：如果有多个相同类型的工具调用，进行摘要化处理
         tool_names = []
         for tool_result in tool_results:
-            for msg in self.context.get_messages():
+            for msg in conversation.get_messages():
                 if msg.role == "assistant" and hasattr(msg, "tool_calls") and msg.tool_calls:
                     for tc in msg.tool_calls:
                         if tc.id == tool_result.tool_call_id:
@@ -324,7 +453,7 @@ class AIAssistant:
                 tool_call_name = "unknown"
 
                 # 从历史中查找对应的工具调用
-                for msg in self.context.get_messages():
+                for msg in conversation.get_messages():
                     if msg.role == "assistant" and hasattr(msg, "tool_calls") and msg.tool_calls:
                         for tc in msg.tool_calls:
                             if tc.id == tool_call_id:
@@ -359,18 +488,10 @@ class AIAssistant:
 
             # 批量操作时，也将工具结果添加到历史（模仿原版本）
             # 不同于之前，现在批量创建也需要完整记录到messages中
-            import json
-            from kosong.message import Message
-
-            # 为每个创建任务结果创建Message
             for tool_result in tool_results:
                 actual_output = tool_result.result.output if hasattr(tool_result.result, 'output') else tool_result.result
-                tool_result_str = json.dumps(actual_output, ensure_ascii=False, indent=2)
-                self.context.messages.append(Message(
-                    role="tool",
-                    content=tool_result_str,
-                    tool_call_id=tool_result.tool_call_id
-                ))
+                tool_result_str = await conversation.add_tool_result(tool_result.tool_call_id, actual_output)
+                ledger.record_tool_payload(tool_result.tool_call_id, len(tool_result_str.encode("utf-8")))
 
         # 非批量操作，按原逻辑处理
         else:
@@ -380,7 +501,7 @@ class AIAssistant:
                 tool_call_name = "unknown"
 
                 # 从历史中查找对应的工具调用
-                for msg in self.context.get_messages():
+                for msg in conversation.get_messages():
                     if msg.role == "assistant" and hasattr(msg, "tool_calls") and msg.tool_calls:
                         for tc in msg.tool_calls:
                             if tc.id == tool_call_id:
@@ -388,25 +509,25 @@ class AIAssistant:
                                 break
 
                 if tool_call_name == "unknown":
-                    logger.warning(f"无法找到工具调用信息: {tool_call_id}")
+                    logger.warning("无法找到工具调用信息: %s", tool_call_id)
 
                 # 提取结果
                 actual_output = tool_result.result.output if hasattr(tool_result.result, 'output') else tool_result.result
                 error_msg = getattr(tool_result.result, 'message', None)
 
-                # 记录结果摘要
-                if isinstance(actual_output, list):
-                    result_summary = f"返回列表，包含 {len(actual_output)} 项"
-                elif isinstance(actual_output, dict):
-                    result_summary = f"返回字典，包含 {len(actual_output)} 个字段"
-                    if 'error' in actual_output:
-                        result_summary = f"错误: {actual_output['error']}"
-                elif error_msg:
-                    result_summary = f"错误: {error_msg}"
-                else:
-                    result_summary = f"返回: {str(actual_output)[:100]}..."
-
-                logger.info(f"  {i}. {tool_call_name}: {result_summary}")
+                # 记录结果摘要（仅调试级别开启时计算）
+                if logger.isEnabledFor(logging.DEBUG):
+                    if isinstance(actual_output, list):
+                        result_summary = f"返回列表，包含 {len(actual_output)} 项"
+                    elif isinstance(actual_output, dict):
+                        result_summary = f"返回字典，包含 {len(actual_output)} 个字段"
+                        if 'error' in actual_output:
+                            result_summary = f"错误: {actual_output['error']}"
+                    elif error_msg:
+                        result_summary = f"错误: {error_msg}"
+                    else:
+                        result_summary = f"返回: {str(actual_output)[:100]}..."
+                    logger.debug("  %d. %s: %s", i, tool_call_name, result_summary)
 
                 # 使用formatter映射处理结果
                 formatter = self.tool_formatters.get(tool_call_name)
@@ -426,15 +547,9 @@ class AIAssistant:
 
                 # 将工具结果添加到上下文历史（模仿原版本：转换为Message对象）
                 # 这是关键：需要将工具结果作为Message对象添加到context，而不是普通字典
-                import json
-                tool_result_str = json.dumps(actual_output, ensure_ascii=False, indent=2)
-                from kosong.message import Message
-                self.context.messages.append(Message(
-                    role="tool",
-                    content=tool_result_str,
-                    tool_call_id=tool_result.tool_call_id
-                ))
-                logger.debug(f"工具 {tool_call_name} 结果已添加到messages历史")
+                tool_result_str = await conversation.add_tool_result(tool_result.tool_call_id, actual_output)
+                ledger.record_tool_payload(tool_result.tool_call_id, len(tool_result_str.encode("utf-8")))
+                logger.debug("工具 %s 结果已添加到messages历史", tool_call_name)
 
         return "\n\n".join(response_parts) if response_parts else None
 
@@ -478,12 +593,12 @@ if __name__ == "__main__":
             # 测试1：查看今日任务
             print("\n测试1：询问今日任务")
             response = await ai.chat("我今天有什么任务？")
-            print(f"回复：\n{response}\n")
+            print(f"回复：\n{response.text}\n")
 
             # 测试2：查看所有项目
             print("测试2：查看所有项目")
             response = await ai.chat("显示所有项目")
-            print(f"回复：\n{response}\n")
+            print(f"回复：\n{response.text}\n")
 
             print("=" * 60)
             print("测试完成！")
@@ -5,15 +5,20 @@ Telegram Bot 主入口
 """
 
 import asyncio
+import functools
+import json
 import logging
+import signal
+import sys
 from datetime import datetime
 from pathlib import Path
+from typing import List, Set
 from dotenv import load_dotenv
 
 # 加载环境变量（确保 os.getenv() 可以读取 .env 文件）
 load_dotenv(Path(__file__).parent.parent / ".env")
 
-from telegram import Update
+from telegram import Bot, Update
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -38,21 +43,41 @@ from handlers.pomodoro_handlers import (
     handle_pomodoro_help
 )
 from handlers.task_pomodoro_handlers import TaskPomodoroHandlers
-from utils.formatter import format_help_message, format_error_message
+from handlers.account_handlers import AccountHandlers
+from src.context.conversation_store import ConversationStore
+from src.core import pomodoro_urls
+from src.core.http_clients import HttpClientOptions, http_clients, parse_pool_sizes
+from src.core.http_server import HttpRequest, HttpResponse, HttpServer
+from src.core.offload import offloader
+from src.core.send_scheduler import NotificationSender, TelegramRateLimiter
+from src.core.update_processor import PerChatUpdateProcessor
+from src.core.warmup import UpstreamCheck, UpstreamWarmer
+from src.core.webhook import ForwardingWebhookReceiver, WebhookReceiver
+from src.core.workers import WorkerPool, WorkerServer, shard_owner
+from src.formatter.pomodoro_formatter import format_focus_event
+from src.handlers.access import check_permission
+from src.observability import metrics
+from src.observability.ledger import ledger
+from src.observability.logging_setup import set_process_fields, setup_logging
+from src.services.account_pool import Account, CurrentAccountClient, account_pool
+from src.services.credential_store import CredentialStore, UserCredentials
+from src.services.focus_timer import FocusTimer, FocusTimerEvent
+from src.services.pomodoro_analytics import pomodoro_analytics
+from src.services.pomodoro_service import pomodoro_service
+from utils.formatter import format_help_message, format_error_message, format_usage_stats
+from utils.message_splitter import PAGE_HEADER_RESERVE, TELEGRAM_MAX_LENGTH, split_message, utf16_len
 
 # AI Assistant（可选）
 try:
-    from ai_assistant import AIAssistant
+    from ai_assistant import AIAssistant, AITurnError
     AI_AVAILABLE = True
 except ImportError:
     AI_AVAILABLE = False
     AIAssistant = None
 
-# 配置日志
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+    class AITurnError(Exception):
+        pass
+
 logger = logging.getLogger(__name__)
 
 # 对话状态常量
@@ -62,19 +87,79 @@ logger = logging.getLogger(__name__)
 # 设置为 300 表示5分钟无对话自动超时，清除对话历史
 CONVERSATION_TIMEOUT = 300
 
+# 触发优雅停止的信号
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+def add_stop_signal_handlers(stop_event: asyncio.Event) -> List[int]:
+    """
+    收到 SIGINT/SIGTERM 时设置停止事件，让调用方先排空再清理（而不是取消所有任务）
+
+    Returns:
+        实际注册的信号（不支持的平台上为空，此时保持默认的 KeyboardInterrupt 行为）
+    """
+    loop = asyncio.get_running_loop()
+
+    def on_signal(signum: int):
+        logger.info("收到信号 %s，正在优雅关闭...", signal.Signals(signum).name)
+        stop_event.set()
+
+    installed = []
+    for signum in STOP_SIGNALS:
+        try:
+            loop.add_signal_handler(signum, on_signal, signum)
+        except (NotImplementedError, RuntimeError):
+            continue
+        installed.append(signum)
+    return installed
+
+
+def remove_signal_handlers(signums: List[int]):
+    loop = asyncio.get_running_loop()
+    for signum in signums:
+        loop.remove_signal_handler(signum)
+
 
 class DidaBot:
     """Telegram Bot 主类"""
 
-    def __init__(self):
-        """初始化 Bot"""
-        self.config = get_config()
+    def __init__(self, dida_transport=None, chat_provider=None, telegram_request=None, config=None):
+        """
+        初始化 Bot
+
+        Args:
+            dida_transport: 滴答清单客户端的 httpx 传输（默认真实网络，压测时替换为本地模拟服务）
+            chat_provider: 直接指定AI聊天提供者（指定后无需配置 ANTHROPIC_API_KEY）
+            telegram_request: Telegram Bot API 请求对象（telegram.request.BaseRequest）
+            config: 已加载的配置（默认读取环境变量）
+        """
+        self.config = config or get_config()
+        setup_logging(
+            level=self.config.log_level,
+            log_file=self.config.log_file,
+            log_format=self.config.log_format,
+            component_levels=self.config.log_levels,
+            debug_sample_rate=self.config.log_debug_sample_rate,
+        )
         self.dida_client = None
         self.application = None
         self.task_handlers = None
         self.project_handlers = None
+        self.account_handlers = None
         self.ai_assistant = None
+        self.conversation_store = None
+        self.metrics_server = None
+        self.loop_lag_monitor = None
+        self.webhook_receiver = None
+        self.worker_server = None
+        self.notifier = None
+        self.focus_timer = None
+        self.upstream_warmer = None
         self._stop_event = None
+        self._cleaned_up = False
+        self._dida_transport = dida_transport
+        self._chat_provider = chat_provider
+        self._telegram_request = telegram_request
 
     async def initialize(self):
         """异步初始化"""
@@ -84,28 +169,85 @@ class DidaBot:
             print(f"Admin ID: {self.config.bot_admin_user_id}")
             print(f"Dida Token: {self.config.dida_access_token[:20]}...")
 
+            # 上游 HTTP 连接池（滴答清单客户端和番茄钟服务共用配置）
+            http_clients.configure(
+                HttpClientOptions(
+                    max_connections=self.config.http_max_connections,
+                    max_keepalive_connections=self.config.http_max_keepalive,
+                    keepalive_expiry=self.config.http_keepalive_expiry,
+                    connect_timeout=self.config.http_connect_timeout,
+                    read_timeout=self.config.http_read_timeout,
+                    write_timeout=self.config.http_read_timeout,
+                    pool_timeout=self.config.http_pool_timeout,
+                    http2=self.config.http_http2,
+                    dns_ttl=self.config.http_dns_ttl,
+                ),
+                pool_sizes=parse_pool_sizes(self.config.http_pool_sizes),
+            )
+
+            # 大数据量的格式化和解析在线程池中执行
+            offloader.configure(
+                min_items=self.config.offload_min_items,
+                min_bytes=self.config.offload_min_bytes,
+                max_workers=self.config.offload_threads,
+                slow_inline=self.config.offload_slow_inline_ms / 1000,
+            )
+
             # 初始化滴答清单客户端
             print("正在初始化滴答清单客户端...")
             self.dida_client = DidaClient(
                 access_token=self.config.dida_access_token,
-                base_url=self.config.dida_base_url
+                base_url=self.config.dida_base_url,
+                transport=self._dida_transport,
             )
 
+            # 多用户账号池：管理员使用上面的客户端，其他用户使用各自绑定的账号
+            self._configure_accounts()
+            # 处理器和 AI 工具持有代理，每次调用时使用当前更新所属用户的客户端
+            user_client = CurrentAccountClient(self.dida_client)
+
             # 初始化命令处理器
             print("正在初始化命令处理器...")
-            self.task_handlers = TaskHandlers(self.dida_client)
-            self.project_handlers = ProjectHandlers(self.dida_client)
-            self.task_pomodoro_handlers = TaskPomodoroHandlers(self.dida_client)
+            self.task_handlers = TaskHandlers(user_client)
+            self.project_handlers = ProjectHandlers(user_client)
+            self.task_pomodoro_handlers = TaskPomodoroHandlers(user_client)
+            self.account_handlers = AccountHandlers()
 
             # 初始化AI助手（如果配置了API密钥）
-            if AI_AVAILABLE and self.config.anthropic_api_key:
+            if AI_AVAILABLE and (self.config.anthropic_api_key or self._chat_provider):
                 print("正在初始化AI助手...")
                 self.ai_assistant = AIAssistant(
                     anthropic_api_key=self.config.anthropic_api_key,
                     anthropic_base_url=self.config.anthropic_base_url,
                     anthropic_model=self.config.anthropic_model,
-                    dida_client=self.dida_client,
+                    dida_client=user_client,
                     max_history_length=None,  # 不限制对话历史长度，保持完整对话
+                    max_context_tokens=self.config.ai_max_context_tokens or None,
+                    kimi_api_key=self.config.kimi_api_key,
+                    kimi_base_url=self.config.kimi_base_url,
+                    kimi_model=self.config.kimi_model,
+                    openai_api_key=self.config.openai_api_key,
+                    openai_base_url=self.config.openai_base_url,
+                    openai_model=self.config.openai_model,
+                    openai_api=self.config.openai_api,
+                    routing_policy=self.config.ai_routing_policy,
+                    hedge_delay=self.config.ai_hedge_delay_ms / 1000,
+                    chat_provider=self._chat_provider,
+                )
+
+                # 对话历史按聊天持久化，重启和超时后可继续
+                store_dir = self._resolve_path(self.config.conversation_store_dir)
+                self.conversation_store = ConversationStore(
+                    store_dir,
+                    idle_offload_seconds=self.config.conversation_idle_offload_seconds,
+                )
+                metrics.active_conversations.set_function(lambda: self.conversation_store.loaded_count)
+                # 每轮对话的用量记录
+                ledger.configure(
+                    path=self._resolve_path(self.config.ledger_path) if self.config.ledger_path else None,
+                    price_input=self.config.llm_price_input,
+                    price_output=self.config.llm_price_output,
+                    price_cache_read=self.config.llm_price_cache_read,
                 )
                 print("AI助手已启用")
             elif AI_AVAILABLE:
@@ -115,12 +257,41 @@ class DidaBot:
 
             # 创建 Telegram Application
             print("正在创建Telegram应用...")
-            self.application = Application.builder().token(self.config.telegram_bot_token).build()
+            # 不同聊天的更新并发处理，同一聊天内按顺序处理（保证 ConversationHandler 状态一致）
+            builder = (
+                Application.builder()
+                .token(self.config.telegram_bot_token)
+                .concurrent_updates(PerChatUpdateProcessor(
+                    concurrency=self.config.update_concurrency,
+                    max_pending=self.config.update_max_pending,
+                    scope=self._account_scope,
+                ))
+                # 所有发往聊天的请求按每聊天和全局速率排队，遇到 flood control 时暂停重试
+                .rate_limiter(TelegramRateLimiter(
+                    per_chat_rate=self.config.telegram_chat_rate,
+                    per_chat_burst=self.config.telegram_chat_burst,
+                    global_rate=self.config.telegram_global_rate,
+                ))
+            )
+            if self._telegram_request is not None:
+                builder = builder.request(self._telegram_request).get_updates_request(self._telegram_request)
+            self.application = builder.build()
+            self.notifier = NotificationSender(self.application.bot)
 
             # 注册命令处理器
             print("正在注册命令处理器...")
             self._register_handlers()
 
+            # 预热上游连接，第一个用户请求不再承担 DNS/TCP/TLS 握手
+            self.upstream_warmer = UpstreamWarmer(
+                self._upstream_checks(),
+                timeout=self.config.upstream_warmup_timeout,
+                ping_interval=self.config.upstream_ping_interval,
+            )
+            if self.config.upstream_warmup:
+                print("正在预热上游连接...")
+                await self.upstream_warmer.warm_up()
+
             print("Bot 初始化成功!")
             return True
 
@@ -130,6 +301,71 @@ class DidaBot:
             traceback.print_exc()
             return False
 
+    def _upstream_checks(self) -> List[UpstreamCheck]:
+        """需要预热和保活的上游"""
+        checks = [UpstreamCheck("dida_open", self.dida_client.base_url, self.dida_client.ping)]
+        # ping 会为管理员账号创建番茄会话，多进程时只在负责管理员私聊的进程里做
+        if self.config.dida_t_cookie and self.config.dida_csrf_token and self._owns_admin_chat():
+            checks.append(UpstreamCheck(
+                "dida_web",
+                pomodoro_urls.DIDA_API_BASE["ms_domain"],
+                functools.partial(pomodoro_service.ping, self.config.dida_t_cookie, self.config.dida_csrf_token),
+            ))
+        if self.ai_assistant:
+            # LLM SDK 使用自己的连接池，预热请求也经由 SDK 发出
+            for name, client in self.ai_assistant.llm_clients.items():
+                checks.append(UpstreamCheck(
+                    f"llm_{name}", str(client.base_url), functools.partial(self.ai_assistant.ping_llm, name),
+                ))
+        return checks
+
+    def _configure_accounts(self):
+        """配置账号池（设置了 CREDENTIAL_KEY 时允许其他用户绑定账号）"""
+        admin = Account(
+            credentials=UserCredentials(
+                user_id=self.config.bot_admin_user_id,
+                dida_access_token=self.config.dida_access_token,
+                dida_t_cookie=self.config.dida_t_cookie,
+                dida_csrf_token=self.config.dida_csrf_token,
+            ),
+            dida_client=self.dida_client,
+        )
+        store = None
+        allowed = [int(item) for item in self.config.bot_allowed_user_ids.split(",") if item.strip()]
+        if self.config.credential_key:
+            try:
+                store = CredentialStore(
+                    self._resolve_path(self.config.credential_store_path), self.config.credential_key
+                )
+            except (RuntimeError, ValueError) as e:
+                logger.error("无法启用多用户: %s", e)
+        elif allowed:
+            logger.warning("设置了 BOT_ALLOWED_USER_IDS 但没有设置 CREDENTIAL_KEY，只有管理员可以使用")
+        account_pool.configure(
+            admin,
+            store=store,
+            allowed_user_ids=allowed,
+            max_size=self.config.account_pool_size,
+            idle_seconds=self.config.account_idle_seconds,
+            base_url=self.config.dida_base_url,
+            transport=self._dida_transport,
+        )
+        metrics.loaded_accounts.set_function(lambda: len(account_pool))
+
+    @staticmethod
+    def _account_scope(update: object):
+        """处理更新期间绑定发送者的账号"""
+        user = update.effective_user if isinstance(update, Update) else None
+        return account_pool.scope(user.id if user is not None else None)
+
+    @staticmethod
+    def _resolve_path(path: str) -> Path:
+        """相对路径按项目根目录解析"""
+        resolved = Path(path)
+        if not resolved.is_absolute():
+            resolved = Path(__file__).parent.parent / resolved
+        return resolved
+
     def _register_handlers(self):
         """注册所有命令处理器"""
         # 基础命令
@@ -137,6 +373,11 @@ class DidaBot:
         self.application.add_handler(CommandHandler("help", self._cmd_help))
         self.application.add_handler(CommandHandler("reset", self._cmd_reset))
 
+        # 账号绑定命令
+        self.application.add_handler(CommandHandler("register", self.account_handlers.cmd_register))
+        self.application.add_handler(CommandHandler("unregister", self.account_handlers.cmd_unregister))
+        self.application.add_handler(CommandHandler("stats", self._cmd_stats))
+
         # 项目命令
         self.application.add_handler(CommandHandler("projects", self.project_handlers.cmd_projects))
         self.application.add_handler(CommandHandler("project_info", self.project_handlers.cmd_project_info))
@@ -160,6 +401,7 @@ class DidaBot:
         self.application.add_handler(CommandHandler("task_pomodoro", self.task_pomodoro_handlers.cmd_task_pomodoro))
         self.application.add_handler(CommandHandler("task_pomodoro_status", self.task_pomodoro_handlers.cmd_task_pomodoro_status))
         self.application.add_handler(CommandHandler("create_task_pomodoro", self.task_pomodoro_handlers.cmd_create_task_pomodoro))
+        self.application.add_handler(CommandHandler("focus_stats", self.task_pomodoro_handlers.cmd_focus_stats))
 
         # AI对话处理器（使用ConversationHandler实现上下文窗口）
         if self.ai_assistant:
@@ -246,6 +488,33 @@ class DidaBot:
         help_message = format_help_message()
         await update.message.reply_text(help_message)
 
+    async def _cmd_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/stats 命令 - 查看AI用量统计，/stats export 导出JSON"""
+        # 验证用户权限
+        if not await self._check_permission(update):
+            return
+
+        if context.args and context.args[0] == "export":
+            # 导出内容包含所有聊天的轮次、用量和费用，只允许管理员导出
+            if update.effective_user.id != self.config.bot_admin_user_id:
+                await update.message.reply_text("只有管理员可以导出统计数据")
+                return
+            snapshot = ledger.snapshot()
+            data = json.dumps(snapshot, ensure_ascii=False, indent=2).encode("utf-8")
+            await update.message.reply_document(
+                document=data,
+                filename=f"ai_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            )
+            return
+
+        # 全局总计、按天和按工具的统计包含所有聊天，其他用户只能看到自己聊天的用量
+        chat_only = update.effective_user.id != self.config.bot_admin_user_id
+        snapshot = ledger.snapshot(chat_id=update.effective_chat.id, chat_only=chat_only)
+        today = datetime.now().date().isoformat()
+        await self._send_long_message(
+            update, format_usage_stats(snapshot, today, update.effective_chat.id, chat_only=chat_only)
+        )
+
     async def _handle_ai_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理AI对话启动（IDLE状态）"""
         # 验证用户权限
@@ -263,77 +532,16 @@ class DidaBot:
             )
             return ConversationHandler.END
 
-        # 获取用户消息
-        user_message = update.message.text
-        logger.info(f"AI对话开始: {user_message[:100]}...")
+        logger.info("AI对话开始: %s...", update.message.text[:100])
 
         # 强制清理旧状态（防御性编程，防止超时后残留数据）
+        # 对话历史保存在 ConversationStore 中，不受影响
         context.user_data.clear()
 
-        # 初始化对话历史
-        context.user_data['conversation_history'] = []
-
         # 设置状态为ACTIVE
         context.user_data['state'] = ACTIVE
 
-        # 显示正在输入状态（添加异常处理）
-        try:
-            await update.message.chat.send_action("typing")
-        except TelegramError as e:
-            logger.warning(f"发送typing状态失败（继续处理）: {e}")
-
-        try:
-            # 调用AI助手处理消息，传递对话历史
-            from kosong.message import Message
-            history = context.user_data['conversation_history']
-
-            # 记录用户输入和开始处理
-            logger.info(f"[用户输入] {user_message}")
-            logger.info(f"[开始处理] 正在调用AI助手...")
-
-            # 调用AI助手处理消息（传递 Telegram bot 实例用于发送工具调用通知）
-            response = await self.ai_assistant.chat(
-                user_message,
-                history=history,
-                telegram_bot=context.application.bot,
-                telegram_chat_id=update.effective_chat.id
-            )
-
-            # 发送回复（自动分页）
-            await self._send_long_message(update, response)
-
-            # 将用户消息和AI回复添加到对话历史
-            # 保持对话完整性，不裁剪
-            history.append(Message(role="user", content=user_message))
-            history.append(Message(role="assistant", content=response))
-
-            # 保存回context.user_data（不裁剪，保持完整对话历史）
-            context.user_data['conversation_history'] = history
-            logger.info(f"对话历史已更新，当前共 {len(history)} 条消息")
-
-            # 处理完成后保持ACTIVE状态，继续等待下一条消息
-            return ACTIVE
-
-        except TelegramError as e:
-            logger.error(f"Telegram API错误: {e}")
-            try:
-                await update.message.reply_text("网络连接不稳定，请稍后再试...")
-            except TelegramError:
-                logger.error("无法发送错误消息，网络完全断开")
-            # 出错时结束对话
-            context.user_data.clear()
-            return ConversationHandler.END
-        except Exception as e:
-            logger.error(f"AI对话出错: {e}")
-            import traceback
-            traceback.print_exc()
-            try:
-                await update.message.reply_text(f"对话处理失败: {str(e)}")
-            except TelegramError:
-                logger.error("无法发送错误消息")
-            # 出错时结束对话
-            context.user_data.clear()
-            return ConversationHandler.END
+        return await self._run_ai_turn(update, context)
 
     async def _handle_ai_active(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理AI对话继续（ACTIVE状态）"""
@@ -348,71 +556,85 @@ class DidaBot:
         if user_message.lower() in ['/cancel', '/stop', '取消', '结束']:
             return await self._handle_ai_cancel(update, context)
 
-        logger.info(f"AI对话继续: {user_message[:100]}...")
+        logger.info("AI对话继续: %s...", user_message[:100])
+
+        return await self._run_ai_turn(update, context)
+
+    async def _run_ai_turn(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """执行一轮AI对话：读取持久化历史、调用AI、回复并追加历史"""
+        user_message = update.message.text
+        chat_id = update.effective_chat.id
 
         # 显示正在输入状态（添加异常处理）
         try:
             await update.message.chat.send_action("typing")
         except TelegramError as e:
-            logger.warning(f"发送typing状态失败（继续处理）: {e}")
+            logger.warning("发送typing状态失败（继续处理）: %s", e)
 
         try:
-            # 调用AI助手处理消息（使用累积的对话历史）
             from kosong.message import Message
-            history = context.user_data.get('conversation_history', [])
 
             # 记录用户输入和开始处理
-            logger.info(f"[用户输入] {user_message}")
-            logger.info(f"[继续对话] 正在调用AI助手...")
-
-            # 调用AI助手处理消息（传递 Telegram bot 实例用于发送工具调用通知）
-            response = await self.ai_assistant.chat(
-                user_message,
-                history=history,
-                telegram_bot=context.application.bot,
-                telegram_chat_id=update.effective_chat.id
-            )
-
-            # 发送回复（自动分页）
-            await self._send_long_message(update, response)
-
-            # 将用户消息和AI回复添加到对话历史，实现上下文累积
-            # 保持对话完整性，不裁剪
-            history.append(Message(role="user", content=user_message))
-            history.append(Message(role="assistant", content=response))
-
-            # 保存回context.user_data（不裁剪，保持完整对话历史）
-            context.user_data['conversation_history'] = history
-            logger.info(f"对话历史已更新，当前共 {len(history)} 条消息")
+            logger.info("[用户输入] %s", user_message)
+            logger.info("[开始处理] 正在调用AI助手...")
+
+            # 本轮对话期间持有该聊天的历史，避免被空闲卸载
+            async with self.conversation_store.session(chat_id) as history:
+                # 调用AI助手处理消息（传递 Telegram bot 实例用于发送工具调用通知）
+                try:
+                    reply = await self.ai_assistant.chat(
+                        user_message,
+                        context=history,
+                        telegram_bot=context.application.bot,
+                        telegram_chat_id=chat_id,
+                        notifier=self.notifier,
+                    )
+                except AITurnError as e:
+                    # 失败的一轮不写入历史，避免道歉提示进入之后的上下文；保持对话，用户可以重新发送
+                    await update.message.reply_text(str(e))
+                    return ACTIVE
+
+                # 发送回复（自动分页）
+                await self._send_long_message(update, reply.text)
+
+                # 将用户消息和AI回复追加到持久化历史，实现上下文累积；
+                # 用本轮的实际输入token数校准历史的token数，AI回复按估算累加
+                await history.add_message(Message(role="user", content=user_message))
+                if reply.prompt_token_count is not None:
+                    await history.mark_token_count(reply.prompt_token_count)
+                await history.add_message(Message(role="assistant", content=reply.text))
+                logger.info("对话历史已更新，当前共 %d 条消息", len(history.history))
 
             # 处理完成后保持ACTIVE状态，继续等待下一条消息
             return ACTIVE
 
         except TelegramError as e:
-            logger.error(f"Telegram API错误: {e}")
+            logger.error("Telegram API错误: %s", e)
             try:
                 await update.message.reply_text("网络连接不稳定，请稍后再试...")
             except TelegramError:
                 logger.error("无法发送错误消息，网络完全断开")
-            # 出错时结束对话
+            # 出错时结束对话（历史已持久化，不清除）
             context.user_data.clear()
             return ConversationHandler.END
         except Exception as e:
-            logger.error(f"AI对话出错: {e}")
+            logger.error("AI对话出错: %s", e)
             import traceback
             traceback.print_exc()
             try:
                 await update.message.reply_text(f"对话处理失败: {str(e)}")
             except TelegramError:
                 logger.error("无法发送错误消息")
-            # 出错时结束对话
+            # 出错时结束对话（历史已持久化，不清除）
             context.user_data.clear()
             return ConversationHandler.END
 
     async def _handle_ai_cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理AI对话取消"""
-        # 清理用户数据
+        # 清理用户数据和持久化的对话历史
         context.user_data.clear()
+        if self.conversation_store:
+            await self.conversation_store.clear(update.effective_chat.id)
 
         # 发送结束消息
         await update.message.reply_text("对话已结束。如需继续，请直接发送新消息。")
@@ -426,66 +648,77 @@ class DidaBot:
         if not await self._check_permission(update):
             return
 
-        # 检查是否在AI对话状态中
+        # 检查是否在AI对话状态中（重启后状态丢失，但可能还有持久化的历史）
         current_state = context.user_data.get('state')
-        if current_state not in [IDLE, ACTIVE]:
+        has_saved_history = bool(
+            self.conversation_store and self.conversation_store.has_history(update.effective_chat.id)
+        )
+        if current_state not in [IDLE, ACTIVE] and not has_saved_history:
             # 没有活跃对话，直接回复
             await update.message.reply_text("No active AI conversation to reset. Send any message to start a new conversation.")
             return
 
-        # 清理对话历史
+        # 清理对话历史（包括持久化的历史）
         context.user_data.clear()
+        if self.conversation_store:
+            await self.conversation_store.clear(update.effective_chat.id)
 
         # 发送确认消息
         await update.message.reply_text("AI对话历史已重置，让我们开始新的对话吧！")
 
         # 保持在ACTIVE状态，准备接收新消息
         context.user_data['state'] = ACTIVE
-        context.user_data['conversation_history'] = []
 
     async def _handle_ai_timeout(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理AI对话超时"""
-        logger.info(f"对话超时清理 - 用户 {update.effective_user.id}")
+        logger.info("对话超时清理 - 用户 %s", update.effective_user.id)
 
-        # 清理用户数据
+        # 清理用户数据；对话历史写盘并从内存卸载，下次发消息时自动恢复
         context.user_data.clear()
+        if self.conversation_store and update.effective_chat:
+            await self.conversation_store.offload(update.effective_chat.id)
 
         # 发送超时消息
         if update.effective_message:
             await update.effective_message.reply_text(
-                "对话已超时（5分钟无活动）。如需继续，请直接发送新消息。"
+                "对话已超时（5分钟无活动），对话历史已保存。\n"
+                "直接发送新消息即可继续，使用 /reset 可清空历史。"
             )
 
         return ConversationHandler.END
 
+    def _on_focus_event(self, event: FocusTimerEvent):
+        """番茄阶段切换时通知账号所属的用户（私聊的 chat_id 即用户ID）"""
+        user_id = account_pool.user_for_cookie(event.key)
+        if user_id is None:
+            return
+        self.notifier.notify(
+            user_id,
+            ("focus", event.focus_id, event.kind),
+            format_focus_event(event),
+        )
+
     async def _send_long_message(self, update: Update, message: str):
-        """发送长消息（自动分页，带节奏控制）"""
-        if len(message) > 4000:
-            chunks = [message[i:i+3800] for i in range(0, len(message), 3800)]
+        """发送长消息（按行分页，发送节奏由限流器控制）"""
+        if utf16_len(message) > TELEGRAM_MAX_LENGTH:
+            chunks = split_message(message, TELEGRAM_MAX_LENGTH - PAGE_HEADER_RESERVE)
             for i, chunk in enumerate(chunks):
-                if i == 0:
-                    await update.message.reply_text(f"第 {i+1}/{len(chunks)} 部分:\n\n{chunk}")
-                else:
-                    # 添加小延迟避免Telegram速率限制
-                    await asyncio.sleep(0.5)
-                    await update.message.reply_text(f"第 {i+1}/{len(chunks)} 部分:\n\n{chunk}")
+                await update.message.reply_text(f"第 {i+1}/{len(chunks)} 部分:\n\n{chunk}")
         else:
             await update.message.reply_text(message)
 
     async def _check_permission(self, update: Update) -> bool:
         """检查用户权限"""
-        if update.effective_user.id != self.config.bot_admin_user_id:
-            await update.message.reply_text("你没有权限使用此机器人")
-            return False
-        return True
+        return await check_permission(update)
 
     async def start(self):
         """启动机器人"""
         if not await self.initialize():
             raise Exception("Bot 初始化失败")
 
-        # 创建停止事件
+        # 创建停止事件（SIGINT/SIGTERM 也通过它停止）
         self._stop_event = asyncio.Event()
+        stop_signals = add_stop_signal_handlers(self._stop_event)
 
         try:
             # 初始化应用
@@ -497,6 +730,7 @@ class DidaBot:
                 BotCommand("start", "启动机器人"),
                 BotCommand("help", "显示帮助信息"),
                 BotCommand("reset", "重置AI对话历史"),
+                BotCommand("stats", "AI用量统计"),
                 BotCommand("projects", "查看所有项目"),
                 BotCommand("addtask", "添加任务"),
                 BotCommand("listtasks", "查看任务列表"),
@@ -513,14 +747,53 @@ class DidaBot:
                 BotCommand("task_pomodoro", "任务番茄钟"),
                 BotCommand("task_pomodoro_status", "任务番茄钟状态"),
                 BotCommand("create_task_pomodoro", "创建任务并启动番茄钟"),
+                BotCommand("focus_stats", "专注统计"),
+                BotCommand("register", "绑定滴答清单账号"),
+                BotCommand("unregister", "解绑滴答清单账号"),
             ]
-            await self.application.bot.set_my_commands(commands)
-            logger.info("Telegram命令菜单已设置完成")
+            if self.config.worker_index in (None, 0):
+                await self.application.bot.set_my_commands(commands)
+                logger.info("Telegram命令菜单已设置完成")
 
             await self.application.start()
 
-            # 启动轮询
-            await self.application.updater.start_polling(drop_pending_updates=True)
+            # 启动对话历史的空闲卸载
+            if self.conversation_store:
+                self.conversation_store.start()
+
+            # 番茄状态后台增量同步和阶段通知（管理员账号始终同步，其他用户使用番茄钟后开始同步）
+            if self.config.pomodoro_notify:
+                self.focus_timer = FocusTimer(
+                    self._on_focus_event, break_minutes=self.config.pomodoro_break_minutes
+                )
+                pomodoro_service.timer = self.focus_timer
+                metrics.focus_timers.set_function(lambda: len(self.focus_timer))
+            if self.config.dida_t_cookie and self.config.dida_csrf_token and self._owns_admin_chat():
+                pomodoro_service.watch(self.config.dida_t_cookie, self.config.dida_csrf_token)
+            pomodoro_analytics.configure(cache_dir=self._resolve_path(self.config.focus_stats_dir))
+            pomodoro_service.start_sync(
+                interval=self.config.pomodoro_sync_interval,
+                idle_interval=self.config.pomodoro_idle_sync_interval,
+                max_age=self.config.pomodoro_status_max_age,
+            )
+
+            # 定期关闭空闲用户的客户端
+            account_pool.start()
+
+            # 定期保活上游连接
+            if self.upstream_warmer:
+                self.upstream_warmer.start()
+
+            # 启动指标接口
+            await self._start_metrics()
+
+            # 开始接收更新
+            if self.config.worker_socket:
+                await self._start_worker()
+            elif self.config.update_mode == "webhook":
+                await self._start_webhook()
+            else:
+                await self.application.updater.start_polling(drop_pending_updates=True)
 
             logger.info("Bot 已启动，开始处理消息...")
 
@@ -528,61 +801,278 @@ class DidaBot:
             await self._stop_event.wait()
 
         except Exception as e:
-            logger.error(f"Bot 启动失败: {e}")
+            logger.error("Bot 启动失败: %s", e)
             raise
         finally:
+            remove_signal_handlers(stop_signals)
             await self._cleanup()
             self._stop_event = None
 
     async def stop(self):
-        """停止机器人"""
+        """停止机器人（start() 运行中时让它退出并清理资源，否则直接清理）"""
         logger.info("正在停止 Bot...")
+        if self._stop_event is not None:
+            self._stop_event.set()
+            return
+        await self._cleanup()
+
+    async def _start_metrics(self):
+        """启动指标接口和事件循环延迟监控（未配置 METRICS_PORT 时不启动）"""
+        if self.config.metrics_port is None:
+            return
+
+        async def handle_metrics(request: HttpRequest) -> HttpResponse:
+            return HttpResponse.text(
+                metrics.registry.render(),
+                content_type="text/plain; version=0.0.4; charset=utf-8",
+            )
+
+        async def handle_health(request: HttpRequest) -> HttpResponse:
+            return HttpResponse.text("ok")
+
+        port = self.config.metrics_port
+        if self.config.worker_index is not None:
+            # 前端使用 METRICS_PORT，工作进程依次使用后面的端口
+            port += 1 + self.config.worker_index
+        self.metrics_server = HttpServer(self.config.metrics_host, port)
+        self.metrics_server.route("GET", "/metrics", handle_metrics)
+        self.metrics_server.route("GET", "/healthz", handle_health)
+        await self.metrics_server.start()
+
+        self.loop_lag_monitor = metrics.EventLoopLagMonitor()
+        self.loop_lag_monitor.start()
+
+    async def _start_webhook(self):
+        """
+        以 webhook 方式接收更新
+
+        setWebhook 时保留 Telegram 端积压的更新（drop_pending_updates=False），
+        停止时也不删除 webhook，重启期间的更新由 Telegram 暂存并在新进程启动后重新推送
+        """
+        config = self.config
+        record_path = self._resolve_path(config.webhook_record_path) if config.webhook_record_path else None
+        self.webhook_receiver = WebhookReceiver(
+            self.application,
+            HttpServer(config.webhook_host, config.webhook_port),
+            path=config.webhook_path,
+            secret_token=config.webhook_secret,
+            queue_size=config.webhook_queue_size,
+            record_path=record_path,
+        )
+        await self.webhook_receiver.start()
+
+        if config.webhook_url:
+            await self.application.bot.set_webhook(
+                url=config.webhook_url,
+                secret_token=config.webhook_secret,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=config.webhook_max_connections,
+                drop_pending_updates=False,
+            )
+            logger.info("Webhook 已设置: %s", config.webhook_url)
+        else:
+            logger.info("未配置 WEBHOOK_URL，跳过 setWebhook（仅接收本地推送）")
+
+    def _owns_admin_chat(self) -> bool:
+        """管理员的私聊是否分配给本进程（多进程时只有这个工作进程同步管理员的番茄状态）"""
+        if self.config.worker_index is None:
+            return True
+        admin_chat = ("chat", self.config.bot_admin_user_id)
+        return shard_owner(admin_chat, range(self.config.bot_workers)) == self.config.worker_index
+
+    async def _start_worker(self):
+        """作为工作进程接收前端转发的更新（前端退出时随之停止）"""
+        self.worker_server = WorkerServer(
+            self.application,
+            Path(self.config.worker_socket),
+            drain_timeout=self.config.worker_drain_timeout,
+            on_disconnect=self._on_front_disconnect,
+        )
+        await self.worker_server.start()
+
+    def _on_front_disconnect(self):
+        logger.warning("前端进程已断开，停止工作进程")
         if self._stop_event and not self._stop_event.is_set():
             self._stop_event.set()
 
     async def _cleanup(self):
-        """清理资源"""
+        """清理资源（只执行一次，重复调用直接返回）"""
+        if self._cleaned_up:
+            return
+        self._cleaned_up = True
         try:
-            if self.dida_client:
-                await self.dida_client.close()
+            if self.webhook_receiver:
+                # 先停止接收并处理完已接收的更新，再关闭其他资源
+                await self.webhook_receiver.close()
+                self.webhook_receiver = None
+
+            if self.worker_server:
+                await self.worker_server.close()
+                self.worker_server = None
 
             if self.application:
-                # 先停止 updater（如果存在）
+                # 先停止 updater（如果存在），再停止 application 并等待处理中的更新完成，
+                # 之后才能关闭它们使用的对话历史和客户端
                 if hasattr(self.application, 'updater') and self.application.updater:
                     try:
                         await self.application.updater.stop()
                     except:
                         pass
+                if self.application.running:
+                    await self.application.stop()
+
+            if self.loop_lag_monitor:
+                await self.loop_lag_monitor.stop()
+                self.loop_lag_monitor = None
+
+            if self.metrics_server:
+                await self.metrics_server.close()
+                self.metrics_server = None
+
+            if self.notifier:
+                await self.notifier.close()
+
+            if self.upstream_warmer:
+                await self.upstream_warmer.stop()
+
+            await pomodoro_service.stop_sync()
+            if self.focus_timer:
+                pomodoro_service.timer = None
+                self.focus_timer.close()
+                self.focus_timer = None
+
+            if self.conversation_store:
+                await self.conversation_store.close()
 
-                # 然后停止和关闭 application
-                await self.application.stop()
+            await account_pool.close()
+            if self.dida_client:
+                await self.dida_client.close()
+            await pomodoro_service.close()
+            await http_clients.aclose()
+            offloader.close()
+
+            if self.application:
+                # 最后关闭 application（通知发送器关闭前仍需使用 bot 发送）
                 await self.application.shutdown()
 
             logger.info("Bot 资源清理完成")
         except Exception as e:
-            logger.error(f"清理资源时出错: {e}")
-
-    async def stop(self):
-        """停止机器人"""
-        logger.info("正在停止 Bot...")
-        await self._cleanup()
+            logger.error("清理资源时出错: %s", e)
 
 
 # 全局 Bot 实例（延迟初始化）
 bot_instance = None
 
 
-async def get_bot() -> DidaBot:
+async def get_bot(config=None) -> DidaBot:
     """获取 Bot 实例"""
     global bot_instance
     if bot_instance is None:
-        bot_instance = DidaBot()
+        bot_instance = DidaBot(config=config)
     return bot_instance
 
 
+async def run_front(config):
+    """
+    多进程模式的前端进程：接收 webhook 并按聊天转发给工作进程
+
+    工作进程用同样的命令启动（通过 WORKER_INDEX/WORKER_SOCKET 区分），各自是完整的 Bot
+    """
+    setup_logging(
+        level=config.log_level,
+        log_file=config.log_file,
+        log_format=config.log_format,
+        component_levels=config.log_levels,
+        debug_sample_rate=config.log_debug_sample_rate,
+    )
+    root = Path(__file__).parent.parent
+    socket_dir = DidaBot._resolve_path(config.worker_socket_dir)
+    pool = WorkerPool(
+        config.bot_workers,
+        socket_dir,
+        [sys.executable, "-u", str(root / "main.py")],
+        queue_size=config.webhook_queue_size,
+        drain_timeout=config.worker_drain_timeout,
+    )
+    receiver = ForwardingWebhookReceiver(
+        pool,
+        HttpServer(config.webhook_host, config.webhook_port),
+        path=config.webhook_path,
+        secret_token=config.webhook_secret,
+        record_path=DidaBot._resolve_path(config.webhook_record_path) if config.webhook_record_path else None,
+    )
+    metrics_server = None
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    stop_signals = add_stop_signal_handlers(stop_event)
+    try:
+        await pool.start()
+        await receiver.start()
+        if config.metrics_port is not None:
+            async def handle_metrics(request: HttpRequest) -> HttpResponse:
+                return HttpResponse.text(
+                    metrics.registry.render(),
+                    content_type="text/plain; version=0.0.4; charset=utf-8",
+                )
+
+            async def handle_health(request: HttpRequest) -> HttpResponse:
+                if not pool.live_workers():
+                    return HttpResponse.text("no workers", 503)
+                return HttpResponse.text("ok")
+
+            metrics_server = HttpServer(config.metrics_host, config.metrics_port)
+            metrics_server.route("GET", "/metrics", handle_metrics)
+            metrics_server.route("GET", "/healthz", handle_health)
+            await metrics_server.start()
+
+        if config.webhook_url:
+            async with Bot(config.telegram_bot_token) as bot:
+                await bot.set_webhook(
+                    url=config.webhook_url,
+                    secret_token=config.webhook_secret,
+                    allowed_updates=Update.ALL_TYPES,
+                    max_connections=config.webhook_max_connections,
+                    drop_pending_updates=False,
+                )
+            logger.info("Webhook 已设置: %s", config.webhook_url)
+
+        # SIGHUP：逐个重启工作进程（如更新代码后）
+        restarts: Set[asyncio.Task] = set()
+
+        def on_sighup():
+            logger.info("收到 SIGHUP，开始滚动重启工作进程")
+            task = asyncio.create_task(pool.rolling_restart())
+            restarts.add(task)
+            task.add_done_callback(restarts.discard)
+
+        if hasattr(signal, "SIGHUP"):
+            loop.add_signal_handler(signal.SIGHUP, on_sighup)
+        logger.info("前端已启动，%d 个工作进程", config.bot_workers)
+        # 一直运行到收到 SIGINT/SIGTERM
+        await stop_event.wait()
+    finally:
+        if hasattr(signal, "SIGHUP"):
+            loop.remove_signal_handler(signal.SIGHUP)
+        remove_signal_handlers(stop_signals)
+        # 先停止接收，再等已转发的更新处理完并停止工作进程
+        await receiver.close()
+        await pool.close()
+        if metrics_server:
+            await metrics_server.close()
+        logger.info("前端已停止")
+
+
 async def main():
     """主入口函数"""
-    bot = await get_bot()  # 获取Bot实例
+    config = get_config()
+    if config.bot_workers > 1 and config.worker_socket is None:
+        await run_front(config)
+        return
+
+    if config.worker_index is not None:
+        # 多进程时每条日志带上工作进程序号
+        set_process_fields(worker=config.worker_index)
+    bot = await get_bot(config)  # 获取Bot实例
     try:
         await bot.start()
     except KeyboardInterrupt:
@@ -592,4 +1082,5 @@ async def main():
 
 
 if __name__ == "__main__":
+    setup_logging(log_file=None)
     asyncio.run(main())
\ No newline at end of file
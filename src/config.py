@@ -22,12 +22,105 @@ class Config(BaseSettings):
     # 滴答清单番茄钟认证配置 (Web Cookie)
     dida_t_cookie: Optional[str] = None
     dida_csrf_token: Optional[str] = None
+    pomodoro_sync_interval: float = 30.0         # 有活跃番茄钟时的后台同步间隔（秒）
+    pomodoro_idle_sync_interval: float = 300.0   # 没有活跃番茄钟时的后台同步间隔（秒）
+    pomodoro_status_max_age: float = 60.0        # 状态查询直接使用内存状态的最长时间（秒）
+    pomodoro_notify: bool = True                 # 专注结束、休息结束时发送通知
+    pomodoro_break_minutes: float = 5.0          # 番茄之间的休息时长（分钟）
+    focus_stats_dir: str = "data/focus_stats"    # 专注统计的每日数据缓存目录
+
+    # 多用户：允许绑定自己滴答清单账号的 Telegram 用户（管理员始终使用上面的配置）
+    bot_allowed_user_ids: str = ""           # 逗号分隔的用户ID
+    credential_key: Optional[str] = None     # 用户令牌的加密密钥，未设置时不启用多用户
+    credential_store_path: str = "data/credentials.json"
+    account_pool_size: int = 100             # 同时保持客户端的用户数上限（最久未使用的先关闭）
+    account_idle_seconds: float = 600.0      # 用户空闲多久后关闭其客户端（秒）
 
     # AI Assistant 配置（GLM）
     anthropic_api_key: Optional[str] = None
     anthropic_base_url: str = "https://open.bigmodel.cn/api/anthropic"
     anthropic_model: str = "glm-4.6"
 
+    # 备用AI提供者配置（可选，配置后与GLM组成多提供者路由）
+    kimi_api_key: Optional[str] = None
+    kimi_base_url: Optional[str] = None
+    kimi_model: str = "kimi-k2-turbo-preview"
+    openai_api_key: Optional[str] = None
+    openai_base_url: Optional[str] = None
+    openai_model: str = "gpt-4o-mini"
+    openai_api: str = "chat"  # chat（Chat Completions）/ responses（Responses API）
+    ai_routing_policy: str = "failover"  # failover / hedge / latency
+    ai_hedge_delay_ms: int = 1500
+    ai_max_context_tokens: int = 128000  # 模型上下文窗口（取所配置模型中最小的），接近时输出警告，0 表示不检查
+
+    # 用量账本配置（价格为每百万token的费用，用于估算花费）
+    ledger_path: str = "data/ledger.jsonl"
+    llm_price_input: float = 0.0
+    llm_price_output: float = 0.0
+    llm_price_cache_read: float = 0.0
+
+    # 指标导出配置（设置端口后在 http://METRICS_HOST:METRICS_PORT/metrics 提供 Prometheus 格式指标）
+    metrics_host: str = "127.0.0.1"
+    metrics_port: Optional[int] = None
+
+    # 更新处理并发：不同聊天的更新并发处理，同一聊天内按顺序处理（1 表示全部逐个处理）
+    update_concurrency: int = 8
+    update_max_pending: int = 256            # 处理中和排队的更新总数上限
+
+    # Telegram 发送限流（Telegram 建议同一聊天每秒不超过1条、全局每秒不超过30条）
+    telegram_chat_rate: float = 1.0
+    telegram_chat_burst: float = 3.0         # 同一聊天空闲后允许连续发送的条数
+    telegram_global_rate: float = 30.0
+
+    # 更新接收方式：polling（长轮询）或 webhook（Telegram 推送到本地 HTTP 接口，需反向代理提供 HTTPS）
+    update_mode: str = "polling"
+    webhook_url: Optional[str] = None        # Telegram 推送的公网地址，留空则不调用 setWebhook（如本地回放测试）
+    webhook_host: str = "127.0.0.1"
+    webhook_port: int = 8443
+    webhook_path: str = "/telegram/webhook"
+    webhook_secret: Optional[str] = None     # 1-256 位字母、数字、_ 或 -
+    webhook_queue_size: int = 100            # 已接收未处理的更新上限，超过后返回 503 让 Telegram 重发
+    webhook_max_connections: int = 40
+    webhook_record_path: Optional[str] = None  # 把收到的原始更新写入此 JSONL 文件，用于本地回放
+
+    # 多进程：前端进程接收 webhook，按聊天分给多个工作进程处理（需要 UPDATE_MODE=webhook）
+    bot_workers: int = 1
+    worker_socket_dir: str = "data/workers"  # 前端与工作进程通信的 Unix socket 目录
+    worker_drain_timeout: float = 30.0       # 停止、滚动重启时等待已转发更新处理完的时间（秒）
+    worker_index: Optional[int] = None       # 以下两项由前端进程设置，不需要手动配置
+    worker_socket: Optional[str] = None
+
+    # 上游 HTTP 连接池（滴答清单 Open API / Web API）
+    http_max_connections: int = 20           # 每个服务的最大连接数
+    http_pool_sizes: str = ""                # 按服务设置最大连接数，如 dida_open=20,dida_web=5
+    http_max_keepalive: int = 10             # 保留的空闲连接数
+    http_keepalive_expiry: float = 120.0     # 空闲连接保留时间（秒）
+    http_connect_timeout: float = 5.0
+    http_read_timeout: float = 30.0
+    http_pool_timeout: float = 10.0          # 连接池满时等待空闲连接的时间（秒）
+    http_http2: bool = False                 # 需要安装 h2（pip install httpx[http2]）
+    http_dns_ttl: float = 300.0              # DNS 解析结果缓存时间（秒），0 表示不缓存
+    upstream_warmup: bool = True             # 启动时预热到各上游的连接并验证凭据
+    upstream_warmup_timeout: float = 10.0    # 单个上游预热的超时时间（秒）
+    upstream_ping_interval: float = 60.0     # 保活检查间隔（秒，应小于 HTTP_KEEPALIVE_EXPIRY），0 表示不检查
+
+    # CPU 密集操作卸载：大任务列表的格式化、大响应的解析、大工具结果的 JSON 序列化在线程池中执行
+    offload_min_items: int = 500             # 达到此任务数/元素数时卸载，0 表示始终在事件循环上执行
+    offload_min_bytes: int = 262144          # 响应体达到此字节数时卸载，0 表示不按字节数判断
+    offload_threads: int = 2
+    offload_slow_inline_ms: float = 20.0     # 在事件循环上执行超过此时间时输出警告
+
+    # 日志配置
+    log_level: str = "INFO"
+    log_file: str = "dida_bot.log"           # 留空则只输出到终端
+    log_format: str = "text"                 # text / json
+    log_levels: str = "httpx=WARNING"        # 按组件设置级别，如 httpx=WARNING,src.loop=DEBUG
+    log_debug_sample_rate: float = 1.0       # DEBUG日志采样率（0-1）
+
+    # 对话持久化配置
+    conversation_store_dir: str = "data/conversations"
+    conversation_idle_offload_seconds: int = 600
+
     class Config:
         env_file = str(Path(__file__).parent.parent / ".env")
         env_file_encoding = "utf-8"
@@ -47,10 +140,35 @@ class Config(BaseSettings):
         if not self.bot_admin_user_id:
             raise ValueError("BOT_ADMIN_USER_ID 未设置")
 
+        if self.update_concurrency < 1:
+            raise ValueError("UPDATE_CONCURRENCY 必须大于 0")
+
+        if self.update_mode not in ("polling", "webhook"):
+            raise ValueError("UPDATE_MODE 只能是 polling 或 webhook")
+
+        if self.update_mode == "webhook" and not self.webhook_secret:
+            raise ValueError("UPDATE_MODE=webhook 时必须设置 WEBHOOK_SECRET")
+
+        if self.bot_workers < 1:
+            raise ValueError("BOT_WORKERS 必须大于 0")
+
+        if self.bot_workers > 1 and self.update_mode != "webhook":
+            raise ValueError("BOT_WORKERS 大于 1 时必须使用 UPDATE_MODE=webhook")
+
+        if self.offload_threads < 1:
+            raise ValueError("OFFLOAD_THREADS 必须大于 0")
+
+        if self.openai_api not in ("chat", "responses"):
+            raise ValueError("OPENAI_API 只能是 chat 或 responses")
+
         print(f"配置加载成功:")
         print(f"  Bot Token: {self.telegram_bot_token[:20]}...")
         print(f"  Admin User ID: {self.bot_admin_user_id}")
         print(f"  Dida Token: {self.dida_access_token[:20]}...")
+        print(f"  更新接收: {self.update_mode}")
+        if self.bot_workers > 1:
+            role = "前端" if self.worker_socket is None else f"工作进程 {self.worker_index}"
+            print(f"  多进程: {self.bot_workers} 个工作进程（当前为{role}）")
 
         # 番茄钟配置检查
         if self.dida_t_cookie and self.dida_csrf_token:
@@ -61,6 +179,9 @@ class Config(BaseSettings):
         # AI助手配置检查
         if self.anthropic_api_key:
             print(f"  GLM AI: 已启用 ({self.anthropic_model})")
+            fallbacks = [name for name, key in (("Kimi", self.kimi_api_key), ("OpenAI", self.openai_api_key)) if key]
+            if fallbacks:
+                print(f"  备用AI: {', '.join(fallbacks)} (路由策略: {self.ai_routing_policy})")
         else:
             print(f"  AI Assistant: 未启用 (请配置 ANTHROPIC_API_KEY)")
 
@@ -5,7 +5,6 @@
 """
 
 from typing import List, Dict, Any, Optional
-import json
 import logging
 from pathlib import Path
 import sys
@@ -18,8 +17,11 @@ sys.path.insert(0, str(project_root))
 kosong_path = project_root / "kosong" / "src"
 sys.path.insert(0, str(kosong_path))
 
+from kosong.contrib.context.linear import estimate_token_count
 from kosong.message import Message
 
+from src.core.offload import offloader
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,25 +33,110 @@ class ConversationContext:
     1. 管理消息历史列表
     2. 自动维护滑动窗口（避免历史过长）
     3. 自动推导未处理工具调用（核心功能，替代手动pending字典）
+    4. 增量统计上下文token数（token_count 为O(1)，不需要重新分词）
 
     借鉴neu-translator的设计：不手动维护pending状态，而是从消息历史自动推导
+
+    token统计方式：以最近一次 mark_token_count 的精确值（来自 StepResult.usage）为基准，
+    之后新增的消息按 estimate_token_count 估算并累加，每条消息只估算一次
     """
 
-    def __init__(self, max_history_length: Optional[int] = None):
+    def __init__(
+        self,
+        max_history_length: Optional[int] = None,
+        max_context_tokens: Optional[int] = None,
+    ):
         """
         初始化对话上下文
 
         Args:
             max_history_length: 消息历史最大长度（设置为None表示不限制，保持完整对话）
+            max_context_tokens: 上下文token上限（用于判断上下文是否快满，None表示不限制）
         """
-        self.messages: List[Message] = []
+        self._messages: List[Message] = []
         self.max_history_length = max_history_length
-        logger.info(f"ConversationContext初始化，max_history_length={max_history_length or '不限制'}")
+        self.max_context_tokens = max_context_tokens
+        self._reset_token_count()
+        # 本轮第一次调用模型时的输入token数（覆盖系统提示、对话历史和本轮用户消息），由 AgentLoop 记录，
+        # 调用方用它校准持久化历史的token数
+        self.prompt_token_count: Optional[int] = None
+        logger.info("ConversationContext初始化，max_history_length=%s", max_history_length or '不限制')
+
+    @property
+    def messages(self) -> List[Message]:
+        """消息历史列表"""
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages: List[Message]):
+        """整体替换消息历史（token统计随之重置）"""
+        self._messages = messages
+        self._reset_token_count()
+
+    def reset(self, messages: List[Message], token_count: Optional[int] = None):
+        """
+        整体替换消息历史
+
+        Args:
+            messages: 新的消息历史
+            token_count: 这些消息已知的token数（如 LinearContext.token_count），
+                         提供时不再逐条估算已有消息
+        """
+        self.messages = messages
+        if token_count is not None:
+            self.mark_token_count(token_count)
+
+    def _reset_token_count(self):
+        """重置token统计，下次读取 token_count 时重新估算全部消息"""
+        self._marked_token_count = 0
+        self._counted_messages = 0
+        self._estimated_token_count = 0
+
+    @property
+    def token_count(self) -> int:
+        """
+        当前上下文的token数：最近一次精确值 + 之后新增消息的估算值
+
+        直接 append 到 messages 的消息也会被统计，每条消息只估算一次
+        """
+        if len(self._messages) < self._counted_messages:
+            # 消息被就地删除（如clear），之前的统计不再有效
+            self._reset_token_count()
+        for message in self._messages[self._counted_messages:]:
+            self._estimated_token_count += estimate_token_count(message)
+        self._counted_messages = len(self._messages)
+        return self._marked_token_count + self._estimated_token_count
+
+    def mark_token_count(self, token_count: int):
+        """
+        记录当前消息历史的精确token数
+
+        Args:
+            token_count: 精确token数（通常是刚添加的AI消息所在那一步的 usage.total）
+        """
+        self._marked_token_count = token_count
+        self._counted_messages = len(self._messages)
+        self._estimated_token_count = 0
+        logger.debug("上下文token数校准为: %d", token_count)
+
+    def is_almost_full(self, threshold: float = 0.9) -> bool:
+        """
+        上下文是否快满（token数达到 max_context_tokens 的 threshold 比例）
+
+        Args:
+            threshold: 比例阈值（0-1）
+
+        Returns:
+            未设置 max_context_tokens 时始终返回False
+        """
+        if not self.max_context_tokens:
+            return False
+        return self.token_count >= self.max_context_tokens * threshold
 
     def add_user_message(self, content: str):
         """添加用户消息到历史"""
         self.add_message(Message(role="user", content=content))
-        logger.debug(f"添加用户消息: {content[:50]}...")
+        logger.debug("添加用户消息: %.50s", content)
 
     def add_ai_message(self, content: Any, tool_calls: Optional[List] = None):
         """添加AI助手的回复到历史"""
@@ -57,18 +144,25 @@ class ConversationContext:
         if tool_calls:
             msg.tool_calls = tool_calls
         self.add_message(msg)
-        logger.debug(f"添加AI消息，工具调用数: {len(tool_calls) if tool_calls else 0}")
+        logger.debug("添加AI消息，工具调用数: %d", len(tool_calls) if tool_calls else 0)
 
-    def add_tool_result(self, tool_call_id: str, result: Any):
-        """添加工具执行结果到历史"""
-        # 将结果序列化为JSON字符串
-        content = json.dumps(result, ensure_ascii=False, indent=2)
+    async def add_tool_result(self, tool_call_id: str, result: Any) -> str:
+        """
+        添加工具执行结果到历史
+
+        结果序列化为JSON字符串（大的结果在线程池中序列化，见 offloader.json_dumps）
+
+        Returns:
+            写入历史的JSON字符串（调用方可以复用，不必再序列化一次）
+        """
+        content = await offloader.json_dumps(result, indent=2)
         self.add_message(Message(
             role="tool",
             content=content,
             tool_call_id=tool_call_id
         ))
-        logger.debug(f"添加工具结果，tool_call_id={tool_call_id}")
+        logger.debug("添加工具结果，tool_call_id=%s", tool_call_id)
+        return content
 
     def add_message(self, message: Message):
         """
@@ -78,7 +172,6 @@ class ConversationContext:
             message: 要添加的消息
         """
         self.messages.append(message)
-        logger.debug(f"消息历史长度: {len(self.messages)}")
 
     def get_unprocessed_tools(self) -> Dict[str, Any]:
         """
@@ -96,20 +189,16 @@ class ConversationContext:
         tool_calls: Dict[str, Any] = {}
         tool_results: set = set()
 
-        logger.debug(f"开始推导未处理工具，消息历史长度: {len(self.messages)}")
-
         # 遍历所有消息
         for msg in self.messages:
             # 收集工具调用（assistant消息中的tool_calls字段）
             if msg.role == "assistant" and hasattr(msg, "tool_calls") and msg.tool_calls:
                 for tc in msg.tool_calls:
                     tool_calls[tc.id] = tc
-                    logger.debug(f"收集工具调用: {tc.function.name} ({tc.id})")
 
             # 收集工具结果ID（tool消息中的tool_call_id字段）
             if msg.role == "tool" and hasattr(msg, "tool_call_id") and msg.tool_call_id:
                 tool_results.add(msg.tool_call_id)
-                logger.debug(f"收集工具结果: {msg.tool_call_id}")
 
         # 移除已有结果的工具调用
         processed = 0
@@ -118,15 +207,12 @@ class ConversationContext:
                 tool_calls.pop(tool_call_id)
                 processed += 1
 
-        unprocessed_count = len(tool_calls)
-        logger.info(f"未处理工具推导完成: 总计={len(self.messages)}条消息, "
-                   f"工具调用={len(tool_calls) + processed}个, "
-                   f"已处理={processed}个, "
-                   f"未处理={unprocessed_count}个")
-
-        if unprocessed_count > 0:
-            tool_names = [tc.function.name for tc in tool_calls.values()]
-            logger.info(f"未处理工具列表: {tool_names}")
+        logger.debug(
+            "未处理工具推导完成: 总计=%d条消息, 工具调用=%d个, 已处理=%d个, 未处理=%d个",
+            len(self.messages), len(tool_calls) + processed, processed, len(tool_calls),
+        )
+        if tool_calls and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("未处理工具列表: %s", [tc.function.name for tc in tool_calls.values()])
 
         return tool_calls
 
@@ -137,6 +223,7 @@ class ConversationContext:
     def clear(self):
         """清空消息历史（重置对话）"""
         self.messages.clear()
+        self._reset_token_count()
         logger.info("对话上下文已清空")
 
     def validate_consistency(self) -> bool:
@@ -160,7 +247,7 @@ class ConversationContext:
         # 检查孤立的工具结果
         orphaned_results = tool_results - tool_calls
         if orphaned_results:
-            logger.error(f"[一致性检查] 发现孤立的工具结果: {orphaned_results}")
+            logger.error("[一致性检查] 发现孤立的工具结果: %s", orphaned_results)
             return False
 
         logger.debug("[一致性检查] 消息历史一致")
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+对话持久化存储模块
+按聊天ID把对话历史落盘，重启或超时后可以继续之前的对话
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Optional
+
+# 添加项目根路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+# 添加kosong路径
+kosong_path = project_root / "kosong" / "src"
+sys.path.insert(0, str(kosong_path))
+
+from kosong.contrib.context.linear import (
+    BatchedJsonlLinearStorage,
+    JsonlLinearStorage,
+    LinearContext,
+)
+
+from src.observability.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _default_storage_factory(path: Path) -> JsonlLinearStorage:
+    """默认存储后端：每个聊天一个JSONL分段文件，后台批量写入"""
+    return BatchedJsonlLinearStorage(path, fsync="interval")
+
+
+@dataclass
+class _StoreEntry:
+    """已加载到内存中的单个聊天的对话"""
+    storage: JsonlLinearStorage
+    context: LinearContext
+    last_used: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+
+
+class ConversationStore:
+    """
+    按聊天ID管理的持久化对话存储
+
+    职责：
+    1. 第一条消息到来时才从磁盘加载该聊天的历史（懒加载）
+    2. 新消息通过 LinearStorage 追加写入磁盘
+    3. 长时间空闲的聊天从内存卸载，只保留磁盘上的历史，聊天数量多时内存保持平稳
+
+    存储后端可替换：storage_factory 接收文件路径，返回任意 JsonlLinearStorage 实现
+    """
+
+    def __init__(
+        self,
+        base_dir: Path | str,
+        idle_offload_seconds: float = 600,
+        storage_factory: Optional[Callable[[Path], JsonlLinearStorage]] = None,
+    ):
+        """
+        初始化对话存储
+
+        Args:
+            base_dir: 对话文件目录，每个聊天一个 {chat_id}.jsonl 文件
+            idle_offload_seconds: 空闲多少秒后从内存卸载
+            storage_factory: 存储后端工厂（默认使用 BatchedJsonlLinearStorage）
+        """
+        self.base_dir = Path(base_dir)
+        self.idle_offload_seconds = idle_offload_seconds
+        self._storage_factory = storage_factory or _default_storage_factory
+        self._entries: Dict[int, _StoreEntry] = {}
+        self._load_locks: Dict[int, asyncio.Lock] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @property
+    def loaded_count(self) -> int:
+        """当前加载在内存中的聊天数"""
+        return len(self._entries)
+
+    def _path_for(self, chat_id: int) -> Path:
+        return self.base_dir / f"{chat_id}.jsonl"
+
+    def has_history(self, chat_id: int) -> bool:
+        """聊天是否有保存的对话历史（已加载或在磁盘上）"""
+        entry = self._entries.get(chat_id)
+        if entry is not None:
+            return bool(entry.storage.messages)
+        path = self._path_for(chat_id)
+        return path.exists() and path.stat().st_size > 0
+
+    async def _load(self, chat_id: int) -> _StoreEntry:
+        """加载聊天历史（同一聊天并发加载时只读一次磁盘）"""
+        entry = self._entries.get(chat_id)
+        record_cache("conversation_store", hit=entry is not None)
+        if entry is not None:
+            return entry
+
+        lock = self._load_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                self.base_dir.mkdir(parents=True, exist_ok=True)
+                storage = self._storage_factory(self._path_for(chat_id))
+                await storage.restore()
+                entry = _StoreEntry(storage=storage, context=LinearContext(storage))
+                self._entries[chat_id] = entry
+                logger.info("对话历史已加载 - 聊天 %s，共 %d 条消息", chat_id, len(storage.messages))
+        self._load_locks.pop(chat_id, None)
+        return entry
+
+    async def get(self, chat_id: int) -> LinearContext:
+        """获取聊天的对话上下文（必要时从磁盘加载）"""
+        entry = await self._load(chat_id)
+        entry.last_used = time.monotonic()
+        return entry.context
+
+    @asynccontextmanager
+    async def session(self, chat_id: int) -> AsyncIterator[LinearContext]:
+        """
+        在一轮对话期间持有聊天上下文，期间不会被空闲卸载
+
+        用法：
+            async with store.session(chat_id) as context:
+                ...
+        """
+        entry = await self._load(chat_id)
+        entry.in_use += 1
+        try:
+            yield entry.context
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    async def offload(self, chat_id: int) -> bool:
+        """把聊天历史写盘并从内存卸载，返回是否卸载"""
+        entry = self._entries.get(chat_id)
+        if entry is None or entry.in_use:
+            return False
+        del self._entries[chat_id]
+        await entry.storage.aclose()
+        logger.info("对话历史已卸载到磁盘 - 聊天 %s", chat_id)
+        return True
+
+    async def clear(self, chat_id: int) -> None:
+        """删除聊天的全部对话历史（内存和磁盘）"""
+        entry = self._entries.pop(chat_id, None)
+        if entry is not None:
+            await entry.storage.aclose()
+        self._path_for(chat_id).unlink(missing_ok=True)
+        logger.info("对话历史已清空 - 聊天 %s", chat_id)
+
+    async def offload_idle(self) -> int:
+        """卸载所有空闲超时的聊天，返回卸载数量"""
+        deadline = time.monotonic() - self.idle_offload_seconds
+        idle = [
+            chat_id for chat_id, entry in self._entries.items()
+            if not entry.in_use and entry.last_used < deadline
+        ]
+        offloaded = 0
+        for chat_id in idle:
+            try:
+                if await self.offload(chat_id):
+                    offloaded += 1
+            except Exception as e:
+                logger.error("卸载对话历史失败 - 聊天 %s: %s", chat_id, e)
+        return offloaded
+
+    async def _sweep_loop(self):
+        """后台定期卸载空闲聊天"""
+        interval = max(1.0, min(60.0, self.idle_offload_seconds / 2))
+        while True:
+            await asyncio.sleep(interval)
+            await self.offload_idle()
+
+    def start(self):
+        """启动后台空闲卸载任务"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def close(self):
+        """停止后台任务并把所有对话写盘"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+        entries, self._entries = self._entries, {}
+        for chat_id, entry in entries.items():
+            try:
+                await entry.storage.aclose()
+            except Exception as e:
+                logger.error("关闭对话存储失败 - 聊天 %s: %s", chat_id, e)
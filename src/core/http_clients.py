@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 客户端工厂
+统一创建访问上游（滴答开放 API、滴答 Web/番茄接口等）的 httpx 客户端：
+
+- 连接池：按服务设置连接数上限，空闲连接保持一段时间后再关闭，TCP 层开启 keepalive
+- 超时：连接、读取、写入、等待连接池分别设置，连接超时短、读取超时长
+- DNS 缓存：解析结果在进程内缓存（容器中默认 DNS 转发较慢时尤其明显，见 NETWORK_OPTIMIZATION.md）
+- HTTP/2：可选，需要安装 h2（pip install httpx[http2]），未安装时退回 HTTP/1.1
+- 指标：请求经过 MetricsTransport 记录；新建连接的耗时（含 DNS）按主机记录
+
+客户端由工厂统一关闭（DidaBot 清理资源时调用 aclose）
+"""
+
+import asyncio
+import logging
+import socket
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import httpcore
+import httpx
+
+from src.observability.metrics import MetricsTransport, http_connect_latency, record_cache
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@dataclass
+class HttpClientOptions:
+    """连接池和超时配置"""
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 120.0          # 空闲连接保留时间（秒）
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 10.0               # 连接池满时等待空闲连接的时间
+    http2: bool = False
+    dns_ttl: float = 300.0                   # DNS 缓存时间（秒），0 表示不缓存
+    retries: int = 1                         # 建立连接失败时的重试次数
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+
+def parse_pool_sizes(value: str) -> Dict[str, int]:
+    """解析按服务设置的连接数，如 "dida_open=20,dida_web=5" """
+    sizes: Dict[str, int] = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, size = item.split("=", 1)
+        try:
+            sizes[name.strip()] = int(size)
+        except ValueError:
+            logger.warning("连接数配置无效: %s", item)
+    return sizes
+
+
+def _keepalive_socket_options() -> List[Tuple[int, int, int]]:
+    """TCP keepalive：空闲 60 秒后每 20 秒探测一次，NAT/防火墙不会悄悄丢弃长连接"""
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    for name, value in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 20), ("TCP_KEEPCNT", 3)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    带 DNS 缓存的网络后端
+
+    建立连接前先查缓存中的地址，再直接连接 IP；TLS 的 SNI 和证书校验仍使用原始主机名
+    （httpcore 按请求 URL 的主机名握手）。连接失败时清除该主机的缓存，下次重新解析
+    """
+
+    def __init__(self, ttl: float = 300.0, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.ttl = ttl
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._resolving: Dict[Tuple[str, int], asyncio.Task] = {}
+        # 每个主机成功建立的连接数和最近一次建连耗时（启动预热时报告）
+        self._connects: Dict[str, Tuple[int, float]] = {}
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        """
+        解析主机地址（同一主机并发解析时只查询一次）
+
+        查询在单独的任务中执行，某个调用方被取消（如对冲请求的落败方、超时）不会影响其他调用方
+        """
+        key = (host, port)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            record_cache("dns", hit=True)
+            return cached[1]
+        record_cache("dns", hit=False)
+
+        task = self._resolving.get(key)
+        if task is None:
+            task = asyncio.create_task(self._lookup(host, port))
+            self._resolving[key] = task
+            task.add_done_callback(lambda done: self._lookup_done(key, done))
+        return await asyncio.shield(task)
+
+    async def _lookup(self, host: str, port: int) -> List[str]:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    def _lookup_done(self, key: Tuple[str, int], task: asyncio.Task):
+        if self._resolving.get(key) is task:
+            del self._resolving[key]
+        if not task.cancelled():
+            # 所有调用方都已取消时避免 "exception was never retrieved"
+            task.exception()
+
+    def invalidate(self, host: str, port: int):
+        self._cache.pop((host, port), None)
+
+    def connect_count(self, host: str) -> int:
+        """主机累计成功建立的连接数"""
+        return self._connects.get(host, (0, 0.0))[0]
+
+    def last_connect_seconds(self, host: str) -> Optional[float]:
+        """主机最近一次建立连接的耗时（秒）"""
+        entry = self._connects.get(host)
+        return entry[1] if entry else None
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        start = time.monotonic()
+        try:
+            if self.ttl > 0 and not _is_ip(host):
+                addresses = await self.resolve(host, port)
+                last_error: Optional[Exception] = None
+                for address in addresses:
+                    try:
+                        stream = await self._backend.connect_tcp(
+                            address, port, timeout=timeout,
+                            local_address=local_address, socket_options=socket_options,
+                        )
+                        break
+                    except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                        last_error = e
+                else:
+                    self.invalidate(host, port)
+                    raise last_error or httpcore.ConnectError(f"无法解析 {host}")
+            else:
+                stream = await self._backend.connect_tcp(
+                    host, port, timeout=timeout, local_address=local_address, socket_options=socket_options,
+                )
+        except Exception:
+            http_connect_latency.labels(host=host, result="error").observe(time.monotonic() - start)
+            raise
+        elapsed = time.monotonic() - start
+        http_connect_latency.labels(host=host, result="ok").observe(elapsed)
+        self._connects[host] = (self.connect_count(host) + 1, elapsed)
+        return stream
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+        return True
+    except OSError:
+        return False
+
+
+class HttpClientFactory:
+    """
+    HTTP 客户端工厂
+
+    用法：
+        http_clients.configure(HttpClientOptions(...), pool_sizes={"dida_open": 20})
+        client = http_clients.create("dida_open", base_url="https://api.dida365.com")
+        ...
+        await http_clients.aclose()
+    """
+
+    def __init__(self, options: Optional[HttpClientOptions] = None, pool_sizes: Optional[Dict[str, int]] = None):
+        self.options = options or HttpClientOptions()
+        self.pool_sizes = pool_sizes or {}
+        self.backend = CachingNetworkBackend(self.options.dns_ttl)
+        self._clients: List[httpx.AsyncClient] = []
+        self._warned_http2 = False
+
+    def configure(self, options: HttpClientOptions, pool_sizes: Optional[Dict[str, int]] = None):
+        """设置连接池配置（只影响之后创建的客户端）"""
+        self.options = options
+        self.pool_sizes = pool_sizes or {}
+        self.backend.ttl = options.dns_ttl
+
+    def _transport(self, service: str) -> httpx.AsyncHTTPTransport:
+        options = self.options
+        max_connections = self.pool_sizes.get(service, options.max_connections)
+        http2 = options.http2 and HTTP2_AVAILABLE
+        if options.http2 and not HTTP2_AVAILABLE and not self._warned_http2:
+            logger.warning("HTTP_HTTP2 已开启但未安装 h2，使用 HTTP/1.1（pip install httpx[http2]）")
+            self._warned_http2 = True
+
+        transport = httpx.AsyncHTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=min(options.max_keepalive_connections, max_connections),
+                keepalive_expiry=options.keepalive_expiry,
+            ),
+            retries=options.retries,
+            socket_options=_keepalive_socket_options(),
+        )
+        # httpx 不提供替换网络后端的参数，这里替换连接池的后端以接入 DNS 缓存和建连耗时统计
+        transport._pool._network_backend = self.backend
+        return transport
+
+    def create(
+        self,
+        service: str,
+        *,
+        base_url: str = "",
+        headers: Optional[Dict[str, str]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> httpx.AsyncClient:
+        """
+        创建客户端（持有者可以自行关闭，未关闭的由 aclose 统一关闭）
+
+        Args:
+            service: 服务名（用于指标标签和按服务设置连接数）
+            base_url: 基础URL
+            headers: 默认请求头
+            transport: 替换底层传输（压测时指向本地模拟服务）
+        """
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=self.options.timeout,
+            transport=MetricsTransport(transport or self._transport(service), service=service),
+        )
+        self._clients = [c for c in self._clients if not c.is_closed]
+        self._clients.append(client)
+        return client
+
+    async def aclose(self):
+        """关闭所有创建过的客户端"""
+        clients = [client for client in self._clients if not client.is_closed]
+        self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+
+# 全局 HTTP 客户端工厂
+http_clients = HttpClientFactory()
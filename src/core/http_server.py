@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+轻量 HTTP 服务模块
+基于 asyncio.start_server，与 Bot 运行在同一个事件循环中，用于指标导出等内部接口
+只实现 HTTP/1.1 的最小子集：Content-Length 请求体、keep-alive、按方法+路径路由
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HttpRequest:
+    """HTTP 请求"""
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]          # 键为小写
+    body: bytes = b""
+
+
+@dataclass
+class HttpResponse:
+    """HTTP 响应"""
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def text(cls, text: str, status: int = 200, content_type: str = "text/plain; charset=utf-8"):
+        return cls(status=status, body=text.encode("utf-8"), content_type=content_type)
+
+
+Handler = Callable[[HttpRequest], Awaitable[HttpResponse]]
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class HttpServer:
+    """
+    最小 HTTP 服务
+
+    用法：
+        server = HttpServer("127.0.0.1", 9100)
+        server.route("GET", "/metrics", handler)
+        await server.start()
+        ...
+        await server.close()
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        max_body_size: int = 1024 * 1024,
+        idle_timeout: float = 30.0,
+    ):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口（0 表示随机端口，启动后可从 port 读取）
+            max_body_size: 请求体最大字节数
+            idle_timeout: keep-alive 连接空闲多久后关闭（秒）
+        """
+        self.host = host
+        self.port = port
+        self.max_body_size = max_body_size
+        self.idle_timeout = idle_timeout
+        self._routes: Dict[Tuple[str, str], Handler] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    def route(self, method: str, path: str, handler: Handler):
+        """注册路由（精确匹配路径）"""
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self):
+        """开始监听"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("HTTP服务已启动: http://%s:%s", self.host, self.port)
+
+    async def close(self):
+        """停止监听并关闭所有连接"""
+        if self._server is not None:
+            self._server.close()
+            # 关闭空闲的 keep-alive 连接，等待正在处理的请求结束
+            connections, self._connections = self._connections, {}
+            for writer in connections:
+                writer.close()
+            await asyncio.gather(*connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+            logger.info("HTTP服务已停止")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.idle_timeout)
+                except _BadRequest as e:
+                    await self._write_response(writer, HttpResponse.text(str(e), e.status), keep_alive=False)
+                    return
+                if request is None:
+                    return
+
+                response = await self._dispatch(request)
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                await self._write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error("HTTP连接处理失败: %s", e)
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[HttpRequest]:
+        """读取一个请求，连接已关闭时返回None"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _version = request_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        except ValueError:
+            raise _BadRequest(400, "Bad Request")
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, sep, value = line.decode("latin-1").partition(":")
+            if not sep:
+                raise _BadRequest(400, "Bad Header")
+            headers[name.strip().lower()] = value.strip()
+
+        body = b""
+        length = headers.get("content-length")
+        if length:
+            try:
+                size = int(length)
+            except ValueError:
+                raise _BadRequest(400, "Bad Content-Length")
+            if size > self.max_body_size:
+                raise _BadRequest(413, "Payload Too Large")
+            body = await reader.readexactly(size)
+        elif headers.get("transfer-encoding"):
+            raise _BadRequest(411, "Length Required")
+
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return HttpRequest(method=method.upper(), path=url.path, query=query, headers=headers, body=body)
+
+    async def _dispatch(self, request: HttpRequest) -> HttpResponse:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self._routes):
+                return HttpResponse.text("Method Not Allowed", 405)
+            return HttpResponse.text("Not Found", 404)
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error("HTTP处理失败 %s %s: %s", request.method, request.path, e)
+            return HttpResponse.text("Internal Server Error", 500)
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, response: HttpResponse, keep_alive: bool):
+        try:
+            reason = HTTPStatus(response.status).phrase
+        except ValueError:
+            reason = ""
+        headers = {
+            "Content-Type": response.content_type,
+            "Content-Length": str(len(response.body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+            **response.headers,
+        }
+        head = f"HTTP/1.1 {response.status} {reason}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + response.body)
+        await writer.drain()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+CPU 密集任务卸载
+格式化大任务列表、解析大项目的任务、把大的工具结果序列化为 JSON 都是同步的纯 Python 代码，
+在事件循环上执行时会让所有聊天和 Telegram 更新接收一起停顿（1 万个任务约 20-40ms）。
+
+- 小数据直接在事件循环上执行（线程切换的开销比计算本身大）
+- 超过阈值（条数或字节数）的交给线程池执行，事件循环在计算期间继续调度
+  （GIL 每隔几毫秒切换一次，纯 Python 代码不会长时间占住事件循环）
+- 指标：按操作和执行位置记录次数和耗时；在事件循环上执行超过 slow_inline 秒时输出警告，
+  配合 didabot_event_loop_lag_seconds 判断阈值是否合适
+
+线程中执行的函数不能修改事件循环中其他协程同时在用的对象；调用时复制当前的 contextvars，
+线程中的日志仍带有 update/chat 关联字段
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from src.observability.metrics import offload_duration, offload_tasks
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def payload_size(value: Any) -> int:
+    """
+    JSON 数据的大致条数（与任务数同一量级）：列表按元素数；
+    字典按字段数，其中列表字段（如 {"tasks": [...]}）按列表长度计
+    """
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(item) if isinstance(item, (list, tuple)) else 1 for item in value.values())
+    return 1
+
+
+class Offloader:
+    """
+    按数据量选择在事件循环上还是线程池中执行同步函数
+
+    用法：
+        offloader.configure(min_items=500, min_bytes=256 * 1024, max_workers=2)
+        text = await offloader.run("format_task_list", format_task_list, tasks, projects, items=len(tasks))
+        content = await offloader.json_dumps(output, indent=2)
+        offloader.close()
+    """
+
+    def __init__(self):
+        self.min_items = 500
+        self.min_bytes = 256 * 1024
+        self.max_workers = 2
+        self.slow_inline = 0.02
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def configure(
+        self,
+        min_items: int = 500,
+        min_bytes: int = 256 * 1024,
+        max_workers: int = 2,
+        slow_inline: float = 0.02,
+    ):
+        """
+        Args:
+            min_items: 达到此条数（任务数、JSON 元素数）时在线程池中执行，0 表示始终在事件循环上执行
+            min_bytes: 达到此字节数（响应体大小）时在线程池中执行，0 表示不按字节数判断
+            max_workers: 线程数
+            slow_inline: 在事件循环上执行超过此时间（秒）时输出警告
+        """
+        self.close()
+        self.min_items = min_items
+        self.min_bytes = min_bytes
+        self.max_workers = max_workers
+        self.slow_inline = slow_inline
+
+    def should_offload(self, items: int = 0, nbytes: int = 0) -> bool:
+        """数据量是否达到在线程池中执行的阈值"""
+        if self.min_items > 0 and items >= self.min_items:
+            return True
+        return self.min_bytes > 0 and nbytes >= self.min_bytes
+
+    async def run(
+        self, op: str, func: Callable[..., T], *args: Any, items: int = 0, nbytes: int = 0, **kwargs: Any
+    ) -> T:
+        """
+        执行同步函数 func(*args, **kwargs)
+
+        Args:
+            op: 操作名（指标标签，取值应有限）
+            items: 数据条数
+            nbytes: 数据字节数
+        """
+        start = time.monotonic()
+        if not self.should_offload(items, nbytes):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.monotonic() - start
+                offload_tasks.labels(op=op, where="inline").inc()
+                offload_duration.labels(op=op, where="inline").observe(elapsed)
+                if elapsed >= self.slow_inline:
+                    logger.warning("%s 在事件循环上执行了 %.0fms（%d 条），可以调低 OFFLOAD_MIN_ITEMS",
+                                   op, elapsed * 1000, items)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="offload")
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            offload_tasks.labels(op=op, where="thread").inc()
+            offload_duration.labels(op=op, where="thread").observe(time.monotonic() - start)
+
+    async def json_dumps(self, value: Any, **kwargs: Any) -> str:
+        """json.dumps（ensure_ascii=False），大的结果在线程池中序列化"""
+        kwargs.setdefault("ensure_ascii", False)
+        return await self.run("json_dumps", json.dumps, value, items=payload_size(value), **kwargs)
+
+    def close(self):
+        """关闭线程池（正在执行的任务会执行完）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# 全局卸载器
+offloader = Offloader()
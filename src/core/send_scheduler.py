@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Telegram 发送调度模块
+- TelegramRateLimiter：接入 python-telegram-bot 的 rate_limiter 扩展点，所有发往聊天的请求
+  按每个聊天和全局两级令牌桶排队，遇到 RetryAfter（flood control）时全局暂停后重试
+- NotificationSender：后台发送可合并的通知（如"AI 正在调用工具"），调用方不等待发送完成；
+  同一组通知只对应一条消息，后续内容通过编辑该消息追加
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, Hashable, List, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from src.observability.metrics import telegram_retry_after, telegram_send_wait
+
+logger = logging.getLogger(__name__)
+
+# 不参与聊天限流的接口（不产生消息，或需要尽快响应）
+UNLIMITED_ENDPOINTS = {"sendChatAction", "answerCallbackQuery", "answerInlineQuery"}
+
+
+class TokenBucket:
+    """
+    令牌桶：每秒补充 rate 个令牌，最多积攒 capacity 个
+
+    reserve() 允许透支：先预约令牌再按返回的时间等待，多个调用方按预约顺序依次放行，
+    等待期间不需要持锁
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """预约一个令牌，返回需要等待的秒数"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def idle(self) -> bool:
+        """令牌已补满（可以丢弃该桶）"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    value = error.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class TelegramRateLimiter(BaseRateLimiter[None]):
+    """
+    Telegram 发送限流
+
+    Telegram 建议同一聊天每秒不超过 1 条消息、全局每秒不超过 30 条；超过后返回 429 并要求等待。
+    这里在发送前按两级令牌桶排队，尽量不触发限流；仍然触发时按 retry_after 暂停所有发送后重试
+    """
+
+    def __init__(
+        self,
+        per_chat_rate: float = 1.0,
+        per_chat_burst: float = 3.0,
+        global_rate: float = 30.0,
+        max_retries: int = 2,
+    ):
+        """
+        Args:
+            per_chat_rate: 每个聊天每秒发送条数
+            per_chat_burst: 每个聊天允许的突发条数（空闲后可连续发送的条数）
+            global_rate: 全局每秒发送条数
+            max_retries: 遇到 RetryAfter 后的最大重试次数
+        """
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._chats: Dict[Hashable, TokenBucket] = {}
+        self._paused_until = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= 1000:
+                # 丢弃已经补满的桶，效果与重新创建相同
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle()}
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: None,
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        limited = chat_id is not None and endpoint not in UNLIMITED_ENDPOINTS
+
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                start = time.monotonic()
+                # 先排本聊天的队，再占全局名额，避免一个聊天的积压占满全局名额；
+                # 重试时沿用已预约的聊天名额，不排到本聊天后续消息之后
+                if attempt == 0:
+                    delay = self._chat_bucket(chat_id).reserve()
+                    if delay:
+                        await asyncio.sleep(delay)
+                delay = max(self._global.reserve(), self._paused_until - time.monotonic())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                telegram_send_wait.observe(time.monotonic() - start)
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                retry_after = _retry_after_seconds(e)
+                telegram_retry_after.inc()
+                if attempt == self.max_retries:
+                    raise
+                logger.warning("Telegram 限流 %s，%.0f 秒后重试 (%s)", endpoint, retry_after, chat_id)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if not limited:
+                    await asyncio.sleep(retry_after)
+
+
+@dataclass
+class _Notification:
+    """一组合并的通知，对应一条 Telegram 消息"""
+    chat_id: int
+    title: str
+    lines: List[str] = field(default_factory=list)
+    message_id: Optional[int] = None
+    sent_text: str = ""
+
+    def render(self) -> str:
+        return "\n".join([self.title, *self.lines]) if self.title else "\n".join(self.lines)
+
+
+class NotificationSender:
+    """
+    可合并通知的后台发送器
+
+    用法：
+        sender = NotificationSender(bot)
+        sender.notify(chat_id, key, "  • get_tasks", title="🔍 AI 正在调用工具:")
+        ...
+        await sender.close()
+
+    同一个 (chat_id, key) 的通知合并成一条消息：第一次发送，之后编辑这条消息追加内容；
+    还没发出去时到达的新内容直接合并进同一次发送或编辑。发送失败只记录日志
+    """
+
+    def __init__(self, bot: Bot, max_notifications: int = 256):
+        """
+        Args:
+            bot: Telegram Bot（请求经过 Application 配置的限流器）
+            max_notifications: 保留的通知组数量（超过后丢弃最早的，之后同一组会发新消息）
+        """
+        self.bot = bot
+        self.max_notifications = max_notifications
+        self._notifications: "OrderedDict[tuple, _Notification]" = OrderedDict()
+        # 聊天 -> 有待发送内容的通知组（按首次变化的顺序）；每个聊天一个发送任务，按顺序发送
+        self._dirty: Dict[int, Dict[tuple, None]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def notify(self, chat_id: int, key: Hashable, line: str, title: str = "") -> None:
+        """追加一行通知内容（立即返回，不等待发送）"""
+        notification_key = (chat_id, key)
+        notification = self._notifications.get(notification_key)
+        if notification is None:
+            notification = self._notifications[notification_key] = _Notification(chat_id, title)
+            while len(self._notifications) > self.max_notifications:
+                self._notifications.popitem(last=False)
+        notification.lines.append(line)
+
+        self._dirty.setdefault(chat_id, {})[notification_key] = None
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._flush(chat_id))
+
+    async def _flush(self, chat_id: int):
+        try:
+            while self._dirty.get(chat_id):
+                dirty = self._dirty[chat_id]
+                notification_key = next(iter(dirty))
+                del dirty[notification_key]
+                notification = self._notifications.get(notification_key)
+                if notification is not None:
+                    await self._deliver(notification)
+        finally:
+            self._dirty.pop(chat_id, None)
+            self._tasks.pop(chat_id, None)
+
+    async def _deliver(self, notification: _Notification):
+        text = notification.render()
+        if text == notification.sent_text:
+            return
+        try:
+            if notification.message_id is None:
+                message = await self.bot.send_message(chat_id=notification.chat_id, text=text)
+                notification.message_id = message.message_id
+            else:
+                await self.bot.edit_message_text(
+                    text=text, chat_id=notification.chat_id, message_id=notification.message_id
+                )
+            notification.sent_text = text
+        except BadRequest as e:
+            # 内容未变化等情况，不影响后续通知
+            logger.debug("更新通知失败: %s", e)
+        except Exception as e:
+            logger.warning("发送 Telegram 通知失败: %s", e)
+
+    async def close(self, timeout: float = 5.0):
+        """等待正在发送的通知完成"""
+        tasks = list(self._tasks.values())
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Telegram 更新处理器模块
+替换 python-telegram-bot 默认的 SimpleUpdateProcessor，在处理每个更新时记录指标，
+并支持不同聊天的更新并发处理、同一聊天内按顺序处理
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.observability.logging_setup import log_context
+from src.observability.metrics import (
+    update_latency,
+    update_queue_wait,
+    updates_in_flight,
+    updates_queued,
+)
+
+
+def update_kind(update: object) -> str:
+    """更新类型（指标标签用，取值有限）"""
+    if not isinstance(update, Update):
+        return "other"
+    if update.callback_query:
+        return "callback_query"
+    if update.edited_message:
+        return "edited_message"
+    if update.message:
+        text = update.message.text or ""
+        return "command" if text.startswith("/") else "message"
+    return "other"
+
+
+def ordering_key(update: object) -> Optional[Hashable]:
+    """
+    更新的排序键：同一个键的更新按到达顺序逐个处理
+
+    按聊天排序（与 ConversationHandler 默认的 per_chat 一致）；没有聊天的更新按用户；
+    两者都没有（如部分 poll 更新）时返回 None，不参与排序
+    """
+    if isinstance(update, Update):
+        if update.effective_chat:
+            return ("chat", update.effective_chat.id)
+        if update.effective_user:
+            return ("user", update.effective_user.id)
+    return None
+
+
+def raw_ordering_key(data: Dict[str, Any]) -> Optional[Hashable]:
+    """
+    从未解析的更新 JSON 中取排序键，结果与 ordering_key 一致
+
+    多进程前端按此分片，不需要为每个更新构造 Update 对象
+    """
+    for field, payload in data.items():
+        if field == "update_id" or not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat")
+        if chat is None and isinstance(payload.get("message"), dict):
+            # callback_query 的聊天在其所属消息中
+            chat = payload["message"].get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return ("chat", chat["id"])
+        user = payload.get("from") or payload.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return ("user", user["id"])
+        return None
+    return None
+
+
+class MetricsUpdateProcessor(BaseUpdateProcessor):
+    """
+    记录处理耗时的更新处理器，并把 update_id 和 chat_id 绑定到处理期间的日志上
+
+    max_concurrent_updates 为 1 时与默认处理器行为一致（逐个处理更新）
+    """
+
+    # 处理每个更新期间进入的上下文（如绑定当前用户的账号），为空时不使用
+    scope: Optional[Callable[[object], AsyncContextManager]] = None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        start = time.monotonic()
+        updates_in_flight.inc()
+        fields = {}
+        if isinstance(update, Update):
+            fields["update"] = update.update_id
+            if update.effective_chat:
+                fields["chat"] = update.effective_chat.id
+        try:
+            with log_context(**fields):
+                if self.scope is None:
+                    await coroutine
+                else:
+                    async with self.scope(update):
+                        await coroutine
+        finally:
+            updates_in_flight.dec()
+            update_latency.labels(kind=update_kind(update)).observe(time.monotonic() - start)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class PerChatUpdateProcessor(MetricsUpdateProcessor):
+    """
+    并发处理不同聊天的更新，同一聊天内严格按到达顺序逐个处理
+
+    - 同一聊天的更新排成一条链，前一个处理完（无论成功或失败）才开始下一个，
+      ConversationHandler 的状态转换因此与逐个处理时一致
+    - concurrency：同时处理的更新数上限；在本聊天排队等待的更新不占用名额，
+      一个聊天的长对话不会占满名额而阻塞其他聊天
+    - max_pending：交给处理器（处理中 + 排队）的更新上限，即 Application 层面的并发数，
+      超过后新更新留在 Application 的更新队列中
+
+    排序依赖 Application 按更新到达顺序调用 process_update：未达到 max_pending 时
+    进入 do_process_update 前不会让出事件循环，因此登记顺序就是到达顺序
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        max_pending: int = 256,
+        scope: Optional[Callable[[object], AsyncContextManager]] = None,
+    ):
+        """
+        Args:
+            concurrency: 同时处理的更新数上限（为 1 时与逐个处理等价）
+            max_pending: 处理中和排队的更新总数上限
+            scope: 处理每个更新期间进入的上下文（在排队结束后进入）
+        """
+        super().__init__(max(concurrency, max_pending))
+        self.scope = scope
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        # 排序键 -> 该聊天最后登记的更新处理完成时置位的 Future
+        self._tails: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def active_chats(self) -> int:
+        """有更新在处理或排队的聊天数"""
+        return len(self._tails)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        key = ordering_key(update)
+        done = asyncio.get_running_loop().create_future()
+        previous = None
+        if key is not None:
+            previous = self._tails.get(key)
+            self._tails[key] = done
+
+        queued_at = time.monotonic()
+        started = False
+        updates_queued.inc()
+        try:
+            if previous is not None:
+                # 用 wait 而不是直接 await：本更新被取消时不能连带取消前一个更新的完成信号
+                await asyncio.wait([previous])
+            async with self._slots:
+                updates_queued.dec()
+                started = True
+                update_queue_wait.observe(time.monotonic() - queued_at)
+                await super().do_process_update(update, coroutine)
+        finally:
+            if not started:
+                updates_queued.dec()
+                # 排队期间被取消（如停止时），关闭未执行的协程，避免 "never awaited" 警告
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+            if previous is not None and not previous.done():
+                # 排队期间被取消：前一个更新处理完后才放行本聊天后面的更新，保持顺序
+                previous.add_done_callback(lambda _: self._release(key, done))
+            else:
+                self._release(key, done)
+
+    def _release(self, key: Optional[Hashable], done: asyncio.Future):
+        """标记更新处理完成，放行同一聊天的下一个更新"""
+        done.set_result(None)
+        if key is not None and self._tails.get(key) is done:
+            del self._tails[key]
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+上游连接预热
+启动时并发访问所有上游（滴答清单 Open API、番茄钟接口、LLM 接口），提前完成 DNS 解析、
+TCP 和 TLS 握手，连接留在连接池中供第一个用户请求复用；同时用低成本请求验证凭据，
+配置错误在启动日志中就能看到，而不是等到用户第一次使用
+
+之后定期重复这些检查（间隔应小于连接池的空闲连接保留时间），保持连接不被回收，
+并通过指标反映各上游是否可用
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from src.core.http_clients import CachingNetworkBackend, http_clients
+from src.observability.metrics import upstream_check_latency, upstream_up
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UpstreamCheck:
+    """一个上游的检查请求"""
+    name: str
+    url: str                                 # 上游地址（用于查找该主机的建连耗时）
+    check: Callable[[], Awaitable[Any]]      # 低成本请求（同时验证凭据），失败时抛出异常
+
+
+@dataclass
+class UpstreamResult:
+    """一次检查的结果"""
+    name: str
+    ok: bool
+    seconds: float
+    connect_seconds: Optional[float] = None  # 本次检查中新建连接的耗时（复用连接时为空）
+    error: Optional[str] = None
+
+    def describe(self) -> str:
+        parts = [f"{self.seconds * 1000:.0f}ms"]
+        if self.connect_seconds is not None:
+            parts.append(f"建连 {self.connect_seconds * 1000:.0f}ms")
+        text = f"{self.name}: {'正常' if self.ok else '失败'}（{'，'.join(parts)}）"
+        return f"{text}: {self.error}" if self.error else text
+
+
+class UpstreamWarmer:
+    """
+    上游连接预热和保活
+
+    用法：
+        warmer = UpstreamWarmer([UpstreamCheck("dida_open", url, dida_client.ping), ...])
+        await warmer.warm_up()       # 启动时
+        warmer.start()               # 定期保活
+        ...
+        await warmer.stop()
+    """
+
+    def __init__(
+        self,
+        checks: List[UpstreamCheck],
+        timeout: float = 10.0,
+        ping_interval: float = 60.0,
+        backend: Optional[CachingNetworkBackend] = None,
+    ):
+        """
+        Args:
+            checks: 上游检查列表
+            timeout: 单个检查的超时时间（秒）
+            ping_interval: 保活检查间隔（秒），0 表示不定期检查
+            backend: 记录建连耗时的网络后端（默认 http_clients 的后端）
+        """
+        self.checks = checks
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.backend = backend or http_clients.backend
+        self._status: Dict[str, bool] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_check(self, check: UpstreamCheck) -> UpstreamResult:
+        host = httpx.URL(check.url).host
+        connects = self.backend.connect_count(host)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(check.check(), self.timeout)
+            ok, error = True, None
+        except asyncio.TimeoutError:
+            ok, error = False, f"超时（{self.timeout:g}秒）"
+        except Exception as e:
+            ok, error = False, str(e) or type(e).__name__
+        seconds = time.monotonic() - start
+
+        upstream_check_latency.labels(upstream=check.name).observe(seconds)
+        upstream_up.labels(upstream=check.name).set(1 if ok else 0)
+        connect_seconds = None
+        if self.backend.connect_count(host) > connects:
+            connect_seconds = self.backend.last_connect_seconds(host)
+        return UpstreamResult(check.name, ok, seconds, connect_seconds, error)
+
+    async def check_all(self) -> List[UpstreamResult]:
+        """并发检查所有上游"""
+        return list(await asyncio.gather(*(self._run_check(check) for check in self.checks)))
+
+    async def warm_up(self) -> List[UpstreamResult]:
+        """启动预热：并发检查所有上游并记录结果"""
+        if not self.checks:
+            return []
+        start = time.monotonic()
+        results = await self.check_all()
+        for result in results:
+            self._status[result.name] = result.ok
+            if result.ok:
+                logger.info("上游预热 %s", result.describe())
+            else:
+                logger.error("上游预热 %s，请检查网络和凭据配置", result.describe())
+        logger.info(
+            "上游预热完成：%d/%d 正常，耗时 %.0fms",
+            sum(result.ok for result in results), len(results), (time.monotonic() - start) * 1000,
+        )
+        return results
+
+    def start(self):
+        """开始定期保活检查"""
+        if self.ping_interval > 0 and self.checks and self._task is None:
+            self._task = asyncio.create_task(self._ping_loop())
+
+    async def stop(self):
+        """停止保活检查"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _ping_loop(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                results = await self.check_all()
+            except Exception:
+                logger.exception("上游保活检查失败")
+                continue
+            # 只在状态变化时记录，避免每次检查都写日志
+            for result in results:
+                previous = self._status.get(result.name)
+                self._status[result.name] = result.ok
+                if previous is not False and not result.ok:
+                    logger.warning("上游不可用 %s", result.describe())
+                elif previous is False and result.ok:
+                    logger.info("上游已恢复 %s", result.describe())
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Telegram Webhook 接收模块
+替代长轮询：Telegram 把更新 POST 到本地 HTTP 接口，校验密钥后按到达顺序交给 Bot 的更新处理器
+（与 Application 从更新队列取出更新后的处理路径一致，同一聊天仍按顺序处理）
+
+- 密钥校验：请求头 X-Telegram-Bot-Api-Secret-Token 必须与 setWebhook 时设置的密钥一致
+- 背压：已接收未处理完的更新达到上限时返回 503，Telegram 会稍后重发该更新，不会丢失
+- 平滑重启：停止时先关闭监听，再处理完已接收的更新；不删除 webhook，
+  重启期间的更新由 Telegram 暂存，新进程启动后继续推送
+- 多进程模式下前端进程使用 ForwardingWebhookReceiver，只按聊天转发原始更新，不在本进程处理
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+from pathlib import Path
+from typing import List, Optional, Set
+
+from telegram import Update
+from telegram.ext import Application
+
+from src.core.http_server import HttpRequest, HttpResponse, HttpServer
+from src.core.update_processor import raw_ordering_key
+from src.core.workers import WorkerPool
+from src.observability.metrics import webhook_queue_depth, webhook_requests
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+def _authorized(request: HttpRequest, secret_token: str) -> bool:
+    token = request.headers.get(SECRET_HEADER, "")
+    return hmac.compare_digest(token.encode(), secret_token.encode())
+
+
+class UpdateRecorder:
+    """
+    把收到的原始更新追加写入 JSONL 文件（用于本地回放）
+
+    请求处理中只把更新放入队列，由一个后台任务按接收顺序批量写入（文件操作在线程中执行），
+    不阻塞事件循环；写入跟不上、队列满时丢弃记录并输出警告（记录只用于回放，不影响更新处理）
+    """
+
+    def __init__(self, path: Path, queue_size: int = 1000):
+        self.path = path
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(queue_size)
+        self._writer: Optional[asyncio.Task] = None
+        self._dropped = 0
+
+    def record(self, body: bytes):
+        """记录一个更新（不等待写入）"""
+        try:
+            self._queue.put_nowait(body.strip())
+        except asyncio.QueueFull:
+            self._dropped += 1
+            if self._dropped == 1 or self._dropped % 1000 == 0:
+                logger.warning("webhook 更新记录队列已满，已丢弃 %d 条记录", self._dropped)
+            return
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+
+    async def close(self):
+        """写完已记录的更新后停止后台任务"""
+        if self._writer is None:
+            return
+        await self._queue.join()
+        self._writer.cancel()
+        await asyncio.gather(self._writer, return_exceptions=True)
+        self._writer = None
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.warning("记录 webhook 更新失败: %s", e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List[bytes]):
+        with open(self.path, "ab") as f:
+            f.write(b"\n".join(batch) + b"\n")
+
+
+class WebhookReceiver:
+    """
+    Webhook 接收器
+
+    用法：
+        receiver = WebhookReceiver(application, server, "/telegram/webhook", secret)
+        await receiver.start()
+        ...
+        await receiver.close()
+    """
+
+    def __init__(
+        self,
+        application: Application,
+        server: HttpServer,
+        path: str,
+        secret_token: str,
+        queue_size: int = 100,
+        record_path: Optional[Path] = None,
+        drain_timeout: float = 30.0,
+    ):
+        """
+        Args:
+            application: 已初始化的 Telegram Application
+            server: 监听 webhook 的 HTTP 服务（由接收器负责启动和关闭）
+            path: webhook 路径
+            secret_token: 与 setWebhook 一致的密钥
+            queue_size: 已接收未处理完的更新上限，超过后返回 503
+            record_path: 把收到的原始更新追加写入此 JSONL 文件（用于本地回放）
+            drain_timeout: 停止时等待已接收更新处理完的最长时间（秒）
+        """
+        self.application = application
+        self.server = server
+        self.path = path
+        self.secret_token = secret_token
+        self.queue_size = queue_size
+        self.record_path = record_path
+        self.drain_timeout = drain_timeout
+        self._recorder = UpdateRecorder(record_path) if record_path else None
+        # 已接收、尚未处理完的更新
+        self._pending: Set[asyncio.Task] = set()
+
+        self.server.route("POST", path, self.handle)
+        webhook_queue_depth.set_function(lambda: len(self._pending))
+
+    async def start(self):
+        """开始 HTTP 监听"""
+        await self.server.start()
+        logger.info("Webhook 已监听: %s:%s%s", self.server.host, self.server.port, self.path)
+
+    async def close(self):
+        """停止接收新更新，处理完已接收的更新后退出"""
+        await self.server.close()
+        if self._pending:
+            _, unfinished = await asyncio.wait(set(self._pending), timeout=self.drain_timeout)
+            if unfinished:
+                logger.warning("Webhook 更新未在 %.0f 秒内处理完，取消 %d 个更新",
+                               self.drain_timeout, len(unfinished))
+                for task in unfinished:
+                    task.cancel()
+                await asyncio.gather(*unfinished, return_exceptions=True)
+        if self._recorder is not None:
+            await self._recorder.close()
+
+    async def handle(self, request: HttpRequest) -> HttpResponse:
+        """处理 Telegram 推送的一个更新"""
+        if not _authorized(request, self.secret_token):
+            webhook_requests.labels(result="unauthorized").inc()
+            return HttpResponse.text("Forbidden", 403)
+
+        try:
+            data = json.loads(request.body)
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            webhook_requests.labels(result="invalid").inc()
+            logger.warning("Webhook 更新解析失败: %s", e)
+            return HttpResponse.text("Bad Request", 400)
+
+        if len(self._pending) >= self.queue_size:
+            # Telegram 收到非 2xx 响应后会重发，这里不需要自己保存
+            webhook_requests.labels(result="overloaded").inc()
+            return HttpResponse(status=503, body=b"Service Unavailable", headers={"Retry-After": "1"})
+
+        # 按接收顺序创建任务，更新处理器据此保证同一聊天内的顺序
+        task = asyncio.create_task(self._process(update))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+        webhook_requests.labels(result="accepted").inc()
+        if self._recorder is not None:
+            self._recorder.record(request.body)
+        return HttpResponse.text("ok")
+
+    async def _process(self, update: Update):
+        application = self.application
+        try:
+            # 处理器中的错误由 Application 的错误处理器处理，这里只兜底
+            await application.update_processor.process_update(update, application.process_update(update))
+        except Exception:
+            logger.exception("Webhook 更新处理失败")
+
+
+class ForwardingWebhookReceiver:
+    """
+    多进程模式前端的 Webhook 接收器
+
+    只校验密钥并从原始 JSON 取出聊天ID，更新原样转发给负责该聊天的工作进程（见 workers.py）；
+    没有可用的工作进程或其队列已满时返回 503，Telegram 会稍后重发
+    """
+
+    def __init__(
+        self,
+        pool: WorkerPool,
+        server: HttpServer,
+        path: str,
+        secret_token: str,
+        record_path: Optional[Path] = None,
+    ):
+        """
+        Args:
+            pool: 工作进程组
+            server: 监听 webhook 的 HTTP 服务（由接收器负责启动和关闭）
+            path: webhook 路径
+            secret_token: 与 setWebhook 一致的密钥
+            record_path: 把收到的原始更新追加写入此 JSONL 文件（用于本地回放）
+        """
+        self.pool = pool
+        self.server = server
+        self.path = path
+        self.secret_token = secret_token
+        self.record_path = record_path
+        self._recorder = UpdateRecorder(record_path) if record_path else None
+
+        self.server.route("POST", path, self.handle)
+        webhook_queue_depth.set_function(lambda: sum(len(worker.pending) for worker in pool.workers))
+
+    async def start(self):
+        """开始 HTTP 监听"""
+        await self.server.start()
+        logger.info("Webhook 已监听: %s:%s%s", self.server.host, self.server.port, self.path)
+
+    async def close(self):
+        """停止接收新更新（已转发的更新由 WorkerPool.close 等待处理完）"""
+        await self.server.close()
+        if self._recorder is not None:
+            await self._recorder.close()
+
+    async def handle(self, request: HttpRequest) -> HttpResponse:
+        """转发 Telegram 推送的一个更新"""
+        if not _authorized(request, self.secret_token):
+            webhook_requests.labels(result="unauthorized").inc()
+            return HttpResponse.text("Forbidden", 403)
+
+        try:
+            data = json.loads(request.body)
+            key = raw_ordering_key(data)
+            if key is None:
+                # 没有聊天和用户的更新不需要排序，按 update_id 分散
+                key = ("update", data["update_id"])
+        except Exception as e:
+            webhook_requests.labels(result="invalid").inc()
+            logger.warning("Webhook 更新解析失败: %s", e)
+            return HttpResponse.text("Bad Request", 400)
+
+        if not self.pool.dispatch(request.body, key):
+            webhook_requests.labels(result="overloaded").inc()
+            return HttpResponse(status=503, body=b"Service Unavailable", headers={"Retry-After": "1"})
+
+        webhook_requests.labels(result="accepted").inc()
+        if self._recorder is not None:
+            self._recorder.record(request.body)
+        return HttpResponse.text("ok")
@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+"""
+多进程分片模块
+单个进程只有一个事件循环，JSON 解析、格式化等 CPU 开销和所有聊天共用一个核。
+多进程模式（BOT_WORKERS > 1，需要 webhook）下：
+
+- 前端进程只接收 webhook：校验密钥，从原始 JSON 取出聊天ID，按一致性哈希转发给某个工作进程，
+  不构造 Update、不运行处理器
+- 每个工作进程是一个完整的 Bot（处理器、AI 对话、缓存、账号池），只处理分给自己的聊天；
+  同一个聊天总是落在同一个工作进程，对话状态和缓存留在该进程内存中
+- 重新分配：工作进程退出（崩溃或滚动重启）时，它的聊天按一致性哈希分给其余进程，恢复后迁回，
+  其他聊天不受影响；迁移的聊天先等前一个更新在原进程处理完再转发，聊天内顺序不变
+- 平滑停止：前端先停止接收，等已转发的更新处理完（工作进程逐个确认）再停止工作进程；
+  收到 SIGHUP 时逐个排空并重启工作进程（更新代码时不中断服务）
+
+转发协议（Unix socket，二进制帧，原始更新 JSON 原样转发）：
+    前端 -> 工作进程: 8 字节序号 + 4 字节长度 + 更新 JSON
+    工作进程 -> 前端: 8 字节序号（该更新已处理完）
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import signal
+import struct
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Set
+
+from telegram import Update
+from telegram.ext import Application
+
+from src.observability.metrics import worker_pending, worker_restarts, worker_up, worker_updates
+
+logger = logging.getLogger(__name__)
+
+_FRAME = struct.Struct(">QI")   # 序号 + 长度
+_ACK = struct.Struct(">Q")      # 序号
+
+
+def shard_owner(key: Hashable, workers: Sequence[int]) -> int:
+    """
+    一致性哈希（rendezvous hashing）：从 workers 中选出负责 key 的工作进程
+
+    每个 (key, 工作进程) 组合算一个分数，分数最高者负责；某个工作进程不可用时
+    只有它负责的 key 改由其余进程中分数最高者接管，其他 key 不受影响。
+    不使用内置 hash()（每个进程的随机种子不同）
+    """
+    def score(worker: int) -> bytes:
+        return hashlib.blake2b(f"{key!r}|{worker}".encode(), digest_size=8).digest()
+
+    return max(workers, key=score)
+
+
+# ===== 工作进程侧 =====
+
+class WorkerServer:
+    """
+    工作进程的更新接收端
+
+    监听 Unix socket，把前端转发的更新交给更新处理器（与 webhook 的处理路径一致），
+    处理完后回复序号
+    """
+
+    def __init__(
+        self,
+        application: Application,
+        socket_path: Path,
+        drain_timeout: float = 30.0,
+        on_disconnect: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Args:
+            application: 已初始化的 Telegram Application
+            socket_path: 监听的 Unix socket 路径
+            drain_timeout: 停止时等待已接收更新处理完的最长时间（秒）
+            on_disconnect: 前端断开连接时调用（前端退出后工作进程随之停止）
+        """
+        self.application = application
+        self.socket_path = socket_path
+        self.drain_timeout = drain_timeout
+        self.on_disconnect = on_disconnect
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._pending: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """开始监听（删除上次遗留的 socket 文件）"""
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self._server = await asyncio.start_unix_server(self._handle_connection, str(self.socket_path))
+        logger.info("工作进程已监听: %s", self.socket_path)
+
+    async def close(self):
+        """停止接收新更新，处理完已接收的更新并确认后退出"""
+        if self._server is None:
+            return
+        self._server.close()
+        connections, self._connections = self._connections, {}
+        for task in connections.values():
+            task.cancel()
+        await asyncio.gather(*connections.values(), return_exceptions=True)
+
+        if self._pending:
+            _, unfinished = await asyncio.wait(set(self._pending), timeout=self.drain_timeout)
+            if unfinished:
+                logger.warning("更新未在 %.0f 秒内处理完，取消 %d 个更新", self.drain_timeout, len(unfinished))
+                for task in unfinished:
+                    task.cancel()
+                await asyncio.gather(*unfinished, return_exceptions=True)
+
+        for writer in connections:
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                seq, length = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+                body = await reader.readexactly(length)
+                try:
+                    update = Update.de_json(json.loads(body), self.application.bot)
+                except Exception as e:
+                    logger.warning("转发的更新解析失败: %s", e)
+                    self._ack(writer, seq)
+                    continue
+                # 按接收顺序创建任务，更新处理器据此保证同一聊天内的顺序
+                task = asyncio.create_task(self._process(update, seq, writer))
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # 前端关闭了连接（停止或异常退出）
+            self._connections.pop(writer, None)
+            writer.close()
+            if self.on_disconnect is not None:
+                self.on_disconnect()
+        except asyncio.CancelledError:
+            # close() 停止读取；连接留到已接收的更新确认完再关闭
+            pass
+
+    async def _process(self, update: Update, seq: int, writer: asyncio.StreamWriter):
+        application = self.application
+        try:
+            # 处理器中的错误由 Application 的错误处理器处理，这里只兜底
+            await application.update_processor.process_update(update, application.process_update(update))
+        except Exception:
+            logger.exception("转发的更新处理失败")
+        finally:
+            self._ack(writer, seq)
+
+    @staticmethod
+    def _ack(writer: asyncio.StreamWriter, seq: int):
+        if not writer.is_closing():
+            writer.write(_ACK.pack(seq))
+
+
+# ===== 前端侧 =====
+
+@dataclass
+class _Forwarded:
+    """一个已分配给工作进程的更新"""
+    worker: int
+    sent: asyncio.Future            # 已写入 socket（或放弃发送）
+    done: asyncio.Future            # 工作进程已确认（True）或进程退出、更新丢失（False）
+
+
+@dataclass
+class WorkerProcess:
+    """一个工作进程的状态"""
+    index: int
+    socket_path: Path
+    process: Optional[asyncio.subprocess.Process] = None
+    writer: Optional[asyncio.StreamWriter] = None
+    draining: bool = False
+    pending: Dict[int, asyncio.Future] = field(default_factory=dict)
+    connected: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def live(self) -> bool:
+        """是否接收新的更新"""
+        return self.writer is not None and not self.draining
+
+
+class WorkerPool:
+    """
+    前端进程管理的工作进程组
+
+    用法：
+        pool = WorkerPool(4, Path("data/workers"), [sys.executable, "main.py"])
+        await pool.start()
+        pool.dispatch(body, key)       # 返回 False 表示没有可用进程或队列已满
+        await pool.rolling_restart()
+        await pool.close()
+    """
+
+    def __init__(
+        self,
+        count: int,
+        socket_dir: Path,
+        command: Sequence[str],
+        env: Optional[Dict[str, str]] = None,
+        queue_size: int = 100,
+        drain_timeout: float = 30.0,
+        start_timeout: float = 120.0,
+    ):
+        """
+        Args:
+            count: 工作进程数
+            socket_dir: Unix socket 所在目录
+            command: 启动工作进程的命令（进程号和 socket 路径通过环境变量 WORKER_INDEX/WORKER_SOCKET 传入）
+            env: 工作进程的环境变量（默认继承当前进程）
+            queue_size: 每个工作进程已转发未处理完的更新上限，超过后 dispatch 返回 False
+            drain_timeout: 停止或重启时等待已转发更新处理完的最长时间（秒）
+            start_timeout: 等待工作进程开始监听的最长时间（秒）
+        """
+        self.workers = [WorkerProcess(index, socket_dir / f"worker-{index}.sock") for index in range(count)]
+        self.command = list(command)
+        self.env = dict(env if env is not None else os.environ)
+        self.queue_size = queue_size
+        self.drain_timeout = drain_timeout
+        self.start_timeout = start_timeout
+        self._seq = itertools.count(1)
+        # 排序键 -> 该聊天最后转发的更新
+        self._tails: Dict[Hashable, _Forwarded] = {}
+        self._waiting: Set[asyncio.Task] = set()
+        self._supervisors: List[asyncio.Task] = []
+        self._closing = False
+
+        for worker in self.workers:
+            labels = {"worker": str(worker.index)}
+            worker_up.labels(**labels).set_function(lambda worker=worker: 1 if worker.live else 0)
+            worker_pending.labels(**labels).set_function(lambda worker=worker: len(worker.pending))
+
+    def live_workers(self) -> List[int]:
+        return [worker.index for worker in self.workers if worker.live]
+
+    async def start(self):
+        """启动所有工作进程，等待它们开始监听"""
+        self._supervisors = [asyncio.create_task(self._supervise(worker)) for worker in self.workers]
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(worker.connected.wait() for worker in self.workers)), self.start_timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("部分工作进程未在 %.0f 秒内启动，当前可用: %s", self.start_timeout, self.live_workers())
+        logger.info("工作进程已启动: %d/%d", len(self.live_workers()), len(self.workers))
+
+    # ===== 转发 =====
+
+    def dispatch(self, body: bytes, key: Hashable) -> bool:
+        """
+        把原始更新转发给负责该聊天的工作进程
+
+        Returns:
+            False 表示没有可用的工作进程或该进程的队列已满（应返回 503 让 Telegram 重发）
+        """
+        live = self.live_workers()
+        if not live:
+            return False
+        worker = self.workers[shard_owner(key, live)]
+        if len(worker.pending) >= self.queue_size:
+            return False
+
+        loop = asyncio.get_running_loop()
+        seq = next(self._seq)
+        forwarded = _Forwarded(worker.index, loop.create_future(), loop.create_future())
+        worker.pending[seq] = forwarded.done
+        previous = self._tails.get(key)
+        self._tails[key] = forwarded
+        forwarded.done.add_done_callback(lambda _: self._forget(key, forwarded))
+
+        # 同一聊天的前一个更新：同一进程内只需按顺序写入；换了进程（迁移）则等它处理完
+        if previous is not None and previous.worker != worker.index:
+            worker_updates.labels(result="moved").inc()
+            wait_for = previous.done
+        else:
+            wait_for = previous.sent if previous is not None else None
+        if wait_for is None or wait_for.done():
+            self._send(worker, seq, body, forwarded)
+        else:
+            task = asyncio.create_task(self._send_after(wait_for, worker, seq, body, forwarded))
+            self._waiting.add(task)
+            task.add_done_callback(self._waiting.discard)
+        return True
+
+    async def _send_after(
+        self, wait_for: asyncio.Future, worker: WorkerProcess, seq: int, body: bytes, forwarded: _Forwarded
+    ):
+        await asyncio.wait([wait_for])
+        self._send(worker, seq, body, forwarded)
+
+    def _send(self, worker: WorkerProcess, seq: int, body: bytes, forwarded: _Forwarded):
+        if not forwarded.done.done():
+            if worker.writer is None:
+                # 等待期间工作进程退出
+                self._finish(worker, seq, ok=False)
+            else:
+                worker.writer.write(_FRAME.pack(seq, len(body)) + body)
+                worker_updates.labels(result="forwarded").inc()
+        if not forwarded.sent.done():
+            forwarded.sent.set_result(None)
+
+    def _finish(self, worker: WorkerProcess, seq: int, ok: bool):
+        done = worker.pending.pop(seq, None)
+        if done is not None and not done.done():
+            done.set_result(ok)
+            if not ok:
+                worker_updates.labels(result="lost").inc()
+
+    def _forget(self, key: Hashable, forwarded: _Forwarded):
+        if self._tails.get(key) is forwarded:
+            del self._tails[key]
+
+    # ===== 进程管理 =====
+
+    async def _supervise(self, worker: WorkerProcess):
+        """启动工作进程并在退出后重启（退避间隔逐渐加长，稳定运行一段时间后重置）"""
+        backoff = 1.0
+        while not self._closing:
+            started = time.monotonic()
+            try:
+                await self._run(worker)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("工作进程 %d 管理失败", worker.index)
+            if self._closing:
+                break
+            if worker.draining:
+                # 滚动重启：立即启动新进程
+                worker.draining = False
+                backoff = 1.0
+            else:
+                backoff = 1.0 if time.monotonic() - started > 60 else min(backoff * 2, 30.0)
+                logger.warning("工作进程 %d 已退出，%.0f 秒后重启", worker.index, backoff)
+                await asyncio.sleep(backoff)
+            worker_restarts.labels(worker=str(worker.index)).inc()
+
+    async def _run(self, worker: WorkerProcess):
+        """运行一个工作进程直到它退出"""
+        env = {**self.env, "WORKER_INDEX": str(worker.index), "WORKER_SOCKET": str(worker.socket_path)}
+        if worker.socket_path.exists():
+            worker.socket_path.unlink()
+        # 独立进程组：终端的 Ctrl+C 只发给前端，由前端按顺序停止工作进程
+        worker.process = await asyncio.create_subprocess_exec(*self.command, env=env, start_new_session=True)
+        try:
+            reader = await self._connect(worker)
+            if reader is None:
+                return
+            worker.connected.set()
+            logger.info("工作进程 %d 已连接 (pid %d)", worker.index, worker.process.pid)
+            try:
+                while True:
+                    (seq,) = _ACK.unpack(await reader.readexactly(_ACK.size))
+                    self._finish(worker, seq, ok=True)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+        finally:
+            self._disconnect(worker)
+            if worker.process.returncode is None and not self._closing:
+                worker.process.terminate()
+            await worker.process.wait()
+
+    async def _connect(self, worker: WorkerProcess) -> Optional[asyncio.StreamReader]:
+        """等待工作进程开始监听后建立连接（进程提前退出时返回 None）"""
+        deadline = time.monotonic() + self.start_timeout
+        while worker.process.returncode is None and time.monotonic() < deadline:
+            if worker.socket_path.exists():
+                try:
+                    reader, worker.writer = await asyncio.open_unix_connection(str(worker.socket_path))
+                    return reader
+                except OSError:
+                    pass
+            await asyncio.sleep(0.2)
+        logger.error("工作进程 %d 未能启动（退出码 %s）", worker.index, worker.process.returncode)
+        return None
+
+    def _disconnect(self, worker: WorkerProcess):
+        """连接断开：未确认的更新记为丢失，它们的聊天之后由其他进程接管"""
+        writer, worker.writer = worker.writer, None
+        worker.connected.clear()
+        if writer is not None:
+            writer.close()
+        if worker.pending:
+            logger.warning("工作进程 %d 断开，%d 个已转发的更新未确认", worker.index, len(worker.pending))
+            for seq in list(worker.pending):
+                self._finish(worker, seq, ok=False)
+
+    async def _drain(self, worker: WorkerProcess):
+        """停止给工作进程分配新更新，等已转发的更新处理完"""
+        worker.draining = True
+        pending = [done for done in worker.pending.values() if not done.done()]
+        if pending:
+            _, unfinished = await asyncio.wait(pending, timeout=self.drain_timeout)
+            if unfinished:
+                logger.warning("工作进程 %d 有 %d 个更新未在 %.0f 秒内处理完",
+                               worker.index, len(unfinished), self.drain_timeout)
+
+    async def rolling_restart(self):
+        """逐个排空并重启工作进程，期间其余进程接管被重启进程的聊天"""
+        for worker in self.workers:
+            if worker.process is None or worker.process.returncode is not None or worker.draining:
+                continue
+            logger.info("滚动重启工作进程 %d", worker.index)
+            await self._drain(worker)
+            worker.process.send_signal(signal.SIGTERM)
+            # 等新进程连接后再重启下一个，始终只有一个进程不可用
+            while worker.connected.is_set():
+                await asyncio.sleep(0.1)
+            try:
+                await asyncio.wait_for(worker.connected.wait(), self.start_timeout)
+            except asyncio.TimeoutError:
+                logger.error("工作进程 %d 重启后未能连接，停止滚动重启", worker.index)
+                return
+        logger.info("滚动重启完成")
+
+    async def close(self):
+        """等所有已转发的更新处理完，再停止全部工作进程"""
+        await asyncio.gather(*(self._drain(worker) for worker in self.workers))
+        self._closing = True
+        for task in list(self._waiting):
+            task.cancel()
+        for worker in self.workers:
+            if worker.process is not None and worker.process.returncode is None:
+                worker.process.send_signal(signal.SIGTERM)
+        if self._supervisors:
+            await asyncio.wait(self._supervisors, timeout=self.drain_timeout)
+        for worker in self.workers:
+            if worker.process is not None and worker.process.returncode is None:
+                logger.warning("工作进程 %d 未在 %.0f 秒内退出，强制结束", worker.index, self.drain_timeout)
+                worker.process.kill()
+        await asyncio.gather(*self._supervisors, return_exceptions=True)
+        self._supervisors = []
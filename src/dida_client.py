@@ -4,10 +4,15 @@
 基于官方 OpenAPI 文档：https://api.dida365.com
 """
 
+import json
+from typing import List, Optional, Tuple
+
 import httpx
-from typing import List, Optional
 from pydantic import BaseModel
 
+from src.core.http_clients import http_clients
+from src.core.offload import offloader
+
 
 class Task(BaseModel):
     """任务模型 - 对应滴答清单API任务对象"""
@@ -61,28 +66,57 @@ class Project(BaseModel):
         populate_by_name = True
 
 
+def _parse_project_tasks(content: bytes, project_id: str) -> Tuple[dict, List[Task]]:
+    """解析 /project/{id}/data 响应体，为每个任务填上 project_id"""
+    data = json.loads(content)
+    tasks = []
+    for task_data in data.get("tasks", []):
+        task_data["project_id"] = project_id
+        tasks.append(Task(**task_data))
+    return data, tasks
+
+
 class DidaClient:
     """滴答清单API客户端"""
 
-    def __init__(self, access_token: str, base_url: str = "https://api.dida365.com"):
+    def __init__(
+        self,
+        access_token: str,
+        base_url: str = "https://api.dida365.com",
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
         """
         初始化客户端
 
         Args:
             access_token: 访问令牌
             base_url: API基础URL
+            transport: 底层传输（默认真实网络连接，压测时可替换为本地模拟服务）
         """
         self.base_url = base_url.rstrip('/')
         self.headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
-        self.client = httpx.AsyncClient(
+        self.client = http_clients.create(
+            "dida_open",
             base_url=self.base_url,
             headers=self.headers,
-            timeout=30.0
+            transport=transport,
         )
 
+    async def ping(self):
+        """
+        检查连接和访问令牌（请求项目列表，不解析响应）
+
+        Raises:
+            Exception: 网络错误或令牌无效
+        """
+        response = await self.client.get("/open/v1/project")
+        if response.status_code in (401, 403):
+            raise Exception(f"访问令牌无效: HTTP {response.status_code}")
+        response.raise_for_status()
+
     # ===== 项目操作 =====
 
     async def get_projects(self) -> List[Project]:
@@ -152,19 +186,13 @@ class DidaClient:
             response = await self.client.get(f"/open/v1/project/{project_id}/data")
             response.raise_for_status()
 
-            data = response.json()
+            # 解析任务列表（大项目在线程池中解析）
+            data, tasks = await self._parse_project_data(response, project_id)
 
             # 解析项目信息
             project_data = data.get("project", {})
             project = Project(**project_data)
 
-            # 解析任务列表
-            tasks_data = data.get("tasks", [])
-            tasks = []
-            for task_data in tasks_data:
-                task_data["project_id"] = project_id
-                tasks.append(Task(**task_data))
-
             # 解析列信息
             columns = data.get("columns", [])
 
@@ -179,6 +207,13 @@ class DidaClient:
         except Exception as e:
             raise Exception(f"获取项目数据失败: {str(e)}")
 
+    @staticmethod
+    async def _parse_project_data(response: httpx.Response, project_id: str) -> Tuple[dict, List[Task]]:
+        """解析项目数据响应，返回原始数据和任务列表（响应较大时在线程池中解析）"""
+        return await offloader.run(
+            "parse_project_data", _parse_project_tasks, response.content, project_id, nbytes=len(response.content)
+        )
+
     async def get_tasks(self, project_id: Optional[str] = None) -> List[Task]:
         """
         获取任务列表
@@ -195,15 +230,7 @@ class DidaClient:
                 response = await self.client.get(f"/open/v1/project/{project_id}/data")
                 response.raise_for_status()
 
-                data = response.json()
-                tasks_data = data.get("tasks", [])
-
-                # 为每个任务添加project_id
-                tasks = []
-                for task_data in tasks_data:
-                    task_data["project_id"] = project_id
-                    tasks.append(Task(**task_data))
-
+                _, tasks = await self._parse_project_data(response, project_id)
                 return tasks
             else:
                 # 获取所有任务 - 遍历所有项目获取任务
@@ -4,7 +4,9 @@
 将AI工具调用的结果格式化为用户友好的文本
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List
+
+from src.services.focus_timer import FOCUS_FINISHED, FocusTimerEvent
 
 
 def format_start_task_pomodoro(result: Dict[str, Any]) -> str:
@@ -29,3 +31,63 @@ def format_start_task_pomodoro(result: Dict[str, Any]) -> str:
         return response
 
     return " 启动任务番茄钟时发生未知错误"
+
+
+def format_focus_event(event: FocusTimerEvent) -> str:
+    """格式化番茄阶段切换通知"""
+    task = f"\n📝 任务: {event.title}" if event.title else ""
+    if event.kind == FOCUS_FINISHED:
+        if event.pomos_left > 0:
+            return f"🍅 专注结束，休息一下吧！{task}\n\n还剩 {event.pomos_left} 个番茄"
+        return f"🍅 专注结束，本轮番茄已全部完成！{task}"
+    return f"☕ 休息结束，准备开始下一个番茄{task}\n\n还剩 {event.pomos_left} 个番茄"
+
+
+_SPARK_LEVELS = "▁▂▃▄▅▆▇█"
+
+
+def _format_minutes(minutes: int) -> str:
+    hours, rest = divmod(int(minutes), 60)
+    return f"{hours}小时{rest}分钟" if hours else f"{rest}分钟"
+
+
+def _sparkline(values: List[int]) -> str:
+    peak = max(values) if values else 0
+    if not peak:
+        return _SPARK_LEVELS[0] * len(values)
+    return "".join(_SPARK_LEVELS[min(7, value * 8 // (peak + 1))] for value in values)
+
+
+def format_focus_stats(result: Dict[str, Any]) -> str:
+    """格式化专注统计（FocusStats.to_dict() 的结果，可带 project_names / task_names 映射）"""
+    if "error" in result:
+        return f"❌ 获取专注统计失败: {result['error']}"
+
+    project_names = result.get("project_names") or {}
+    task_names = result.get("task_names") or {}
+    lines = [
+        f"📊 专注统计（{result['start']} ~ {result['end']}）",
+        "",
+        f"⏱ 总时长: {_format_minutes(result['total_minutes'])}（日均 {_format_minutes(result['average_minutes'])}）",
+        f"📅 专注天数: {result['active_days']}/{result['days']}",
+        f"🔥 连续专注: {result['current_streak']} 天（最长 {result['longest_streak']} 天）",
+    ]
+    if result.get("peak_hour") is not None:
+        lines.append(f"🕘 高峰时段: {result['peak_hour']:02d}:00")
+        lines.append(f"0点 {_sparkline(result['hours'])} 23点")
+
+    if result.get("top_projects"):
+        lines.append("")
+        lines.append("📁 项目:")
+        for project_id, minutes in result["top_projects"]:
+            lines.append(f"  • {project_names.get(project_id, project_id)}: {_format_minutes(minutes)}")
+    if result.get("top_tasks"):
+        lines.append("")
+        lines.append("📝 任务:")
+        for task_id, minutes in result["top_tasks"]:
+            lines.append(f"  • {task_names.get(task_id, task_id)}: {_format_minutes(minutes)}")
+
+    if len(result.get("daily", [])) <= 31:
+        lines.append("")
+        lines.append(f"每日: {_sparkline([minutes for _, minutes in result['daily']])}")
+    return "\n".join(lines)
@@ -5,7 +5,9 @@
 """
 
 import json
+from datetime import date
 from typing import Any, Dict, List
+from src.core.offload import offloader
 from src.utils.time_utils import TimeUtils
 
 
@@ -22,38 +24,34 @@ async def format_get_projects(projects: List[Dict[str, Any]]) -> str:
     return "\n".join(response_parts)
 
 
-async def format_get_tasks(tasks: List[Dict[str, Any]], dida_client=None) -> str:
-    """格式化获取任务列表的结果"""
-    if not tasks:
-        return "没有找到任务"
-
-    # 筛选今日任务
-    today_tasks = [task for task in tasks if TimeUtils.is_today_task(task)]
-
-    if not today_tasks:
-        return "今天没有任务 ✨"
+def _group_today_tasks(tasks: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """筛选今日任务并按项目分组
 
-    response_parts = ["今日任务:"]
+    与 TimeUtils.is_today_task 的规则相同（截止日期优先，没有截止日期时看开始日期），
+    但整列批量换算成本地日期序号后再比较
+    """
+    today = date.today().toordinal()
+    _, days = TimeUtils.parse_dida_column(task.get("due_date") for task in tasks)
+    # 只有没有截止日期的任务才需要看开始日期
+    no_due = [i for i, task in enumerate(tasks) if not task.get("due_date")]
+    if no_due:
+        _, start_days = TimeUtils.parse_dida_column(tasks[i].get("start_date") for i in no_due)
+        for i, day in zip(no_due, start_days):
+            days[i] = day
 
-    # 按项目分组
     tasks_by_project = {}
-    for task in today_tasks:
+    for task, day in zip(tasks, days):
+        if day != today:
+            continue
         project_id = task.get("project_id", "unknown")
         if project_id not in tasks_by_project:
             tasks_by_project[project_id] = []
         tasks_by_project[project_id].append(task)
+    return tasks_by_project
 
-    # 获取项目信息用于显示名称（直接使用 await）
-    project_map = {}
-    if dida_client:
-        try:
-            projects = await dida_client.get_projects()
-            project_map = {p.id: p.name for p in projects}
-        except Exception as e:
-            # 获取失败，使用默认的项目ID显示
-            pass
 
-    # 显示任务
+def _render_today_tasks(tasks_by_project: Dict[str, List[Dict[str, Any]]], project_map: Dict[str, str]) -> str:
+    response_parts = ["今日任务:"]
     for project_id, project_tasks in tasks_by_project.items():
         project_name = project_map.get(project_id, f"项目 {project_id[:8]}...")
         response_parts.append(f"\n项目: {project_name}")
@@ -66,6 +64,34 @@ async def format_get_tasks(tasks: List[Dict[str, Any]], dida_client=None) -> str
     return "\n".join(response_parts)
 
 
+async def format_get_tasks(tasks: List[Dict[str, Any]], dida_client=None) -> str:
+    """格式化获取任务列表的结果（任务较多时筛选和格式化在线程池中执行）"""
+    if not tasks:
+        return "没有找到任务"
+
+    # 筛选今日任务并按项目分组
+    tasks_by_project = await offloader.run("group_today_tasks", _group_today_tasks, tasks, items=len(tasks))
+
+    if not tasks_by_project:
+        return "今天没有任务 ✨"
+
+    # 获取项目信息用于显示名称（直接使用 await）
+    project_map = {}
+    if dida_client:
+        try:
+            projects = await dida_client.get_projects()
+            project_map = {p.id: p.name for p in projects}
+        except Exception as e:
+            # 获取失败，使用默认的项目ID显示
+            pass
+
+    # 显示任务
+    count = sum(len(project_tasks) for project_tasks in tasks_by_project.values())
+    return await offloader.run(
+        "format_get_tasks", _render_today_tasks, tasks_by_project, project_map, items=count
+    )
+
+
 async def format_get_task_detail(task_detail: Dict[str, Any]) -> str:
     """格式化获取任务详情的结果"""
     if "error" in task_detail:
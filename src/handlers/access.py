@@ -0,0 +1,22 @@
+"""
+访问控制
+管理员和已绑定滴答清单账号的用户可以使用机器人（当前账号由更新处理器在处理每个更新时绑定）
+"""
+
+from telegram import Update
+
+from src.services.account_pool import account_pool, get_current_account
+
+
+async def check_permission(update: Update) -> bool:
+    """检查当前用户是否可以使用机器人，不可以时回复原因"""
+    if get_current_account() is not None:
+        return True
+    user = update.effective_user
+    if user is not None and account_pool.can_register(user.id):
+        text = "请先私聊机器人发送 /register 绑定你的滴答清单账号"
+    else:
+        text = "你没有权限使用此机器人"
+    if update.effective_message:
+        await update.effective_message.reply_text(text)
+    return False
@@ -0,0 +1,100 @@
+"""
+账号命令处理器
+用户绑定/解绑自己的滴答清单账号（管理员使用 .env 中的配置，不需要绑定）
+"""
+
+import logging
+
+from telegram import Update
+from telegram.constants import ChatType
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+
+from src.services.account_pool import account_pool
+from src.services.credential_store import UserCredentials
+from src.services.pomodoro_service import pomodoro_service
+
+logger = logging.getLogger(__name__)
+
+REGISTER_USAGE = (
+    "用法：/register 访问令牌 [t_cookie csrf_token]\n\n"
+    "• 访问令牌：滴答清单开放平台的 Access Token\n"
+    "• t_cookie、csrf_token（可选）：网页版 Cookie 中的 t 和 _csrf_token，用于番茄钟\n\n"
+    "请在与机器人的私聊中发送，消息会在读取后删除"
+)
+
+
+class AccountHandlers:
+    """账号命令处理器"""
+
+    async def cmd_register(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        /register 命令 - 绑定滴答清单账号
+
+        用法：
+        /register 访问令牌 [t_cookie csrf_token]
+        """
+        user_id = update.effective_user.id
+        if not account_pool.can_register(user_id):
+            await update.message.reply_text("你没有权限绑定账号，请联系管理员")
+            return
+        if update.effective_chat.type != ChatType.PRIVATE:
+            await self._delete_message(update)
+            await update.effective_chat.send_message("请在与机器人的私聊中绑定账号，不要在群组中发送令牌")
+            return
+
+        args = context.args or []
+        if not args:
+            await update.message.reply_text(REGISTER_USAGE)
+            return
+        # 令牌不在聊天记录中保留
+        await self._delete_message(update)
+        if len(args) not in (1, 3):
+            await update.effective_chat.send_message(REGISTER_USAGE)
+            return
+
+        credentials = UserCredentials(
+            user_id=user_id,
+            dida_access_token=args[0],
+            dida_t_cookie=args[1] if len(args) == 3 else None,
+            dida_csrf_token=args[2] if len(args) == 3 else None,
+        )
+
+        # 保存前验证令牌
+        client = account_pool.create_client(credentials.dida_access_token)
+        try:
+            await client.ping()
+        except Exception as e:
+            await update.effective_chat.send_message(f"❌ 访问令牌验证失败: {e}")
+            return
+        finally:
+            await client.close()
+        if credentials.has_pomodoro:
+            try:
+                await pomodoro_service.ping(credentials.dida_t_cookie, credentials.dida_csrf_token)
+            except Exception as e:
+                await update.effective_chat.send_message(f"❌ 番茄钟 Cookie 验证失败: {e}")
+                return
+            finally:
+                pomodoro_service.drop_focus_session(credentials.dida_t_cookie)
+
+        await account_pool.register(credentials)
+        logger.info("用户 %s 绑定了滴答清单账号", user_id)
+        await update.effective_chat.send_message(
+            "✅ 账号绑定成功" + ("（含番茄钟）" if credentials.has_pomodoro else "（未配置番茄钟）")
+        )
+
+    async def cmd_unregister(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/unregister 命令 - 解绑滴答清单账号并删除保存的令牌"""
+        if await account_pool.unregister(update.effective_user.id):
+            logger.info("用户 %s 解绑了滴答清单账号", update.effective_user.id)
+            await update.message.reply_text("✅ 已解绑账号，保存的令牌已删除")
+        else:
+            await update.message.reply_text("你没有绑定账号")
+
+    @staticmethod
+    async def _delete_message(update: Update):
+        try:
+            await update.message.delete()
+        except TelegramError as e:
+            logger.warning("删除含令牌的消息失败: %s", e)
@@ -1,21 +1,24 @@
 """番茄钟命令处理器"""
 
-import os
 import asyncio
 from datetime import datetime
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from src.services.pomodoro_service import pomodoro_service
+from src.handlers.access import check_permission
+from src.services.account_pool import pomodoro_tokens
 from src.utils.time_utils import TimeUtils
 
 
 async def handle_pomodoro_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /pomodoro_status 命令 - 查看当前番茄钟状态"""
+    if not await check_permission(update):
+        return
+
     try:
         # 获取认证令牌
-        auth_token = os.getenv('DIDA_T_COOKIE')
-        csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+        auth_token, csrf_token = pomodoro_tokens()
 
         if not auth_token or not csrf_token:
             await update.message.reply_text(
@@ -33,8 +36,8 @@ async def handle_pomodoro_status(update: Update, context: ContextTypes.DEFAULT_T
             )
             return
 
-        # 查询当前番茄钟状态
-        result = await pomodoro_service.query_focus_state(auth_token, csrf_token)
+        # 查询当前番茄钟状态（最近同步过时直接使用内存状态）
+        result = await pomodoro_service.get_focus_status(auth_token, csrf_token)
 
         if "error" in result:
             await update.message.reply_text(
@@ -103,10 +106,12 @@ async def handle_pomodoro_status(update: Update, context: ContextTypes.DEFAULT_T
 
 async def handle_pomodoro_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /pomodoro_start 命令 - 启动番茄钟"""
+    if not await check_permission(update):
+        return
+
     try:
         # 获取认证令牌
-        auth_token = os.getenv('DIDA_T_COOKIE')
-        csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+        auth_token, csrf_token = pomodoro_tokens()
 
         if not auth_token or not csrf_token:
             await update.message.reply_text(
@@ -190,9 +195,11 @@ async def handle_pomodoro_start(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def handle_pomodoro_pause(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /pomodoro_pause 命令 - 暂停番茄钟"""
+    if not await check_permission(update):
+        return
+
     try:
-        auth_token = os.getenv('DIDA_T_COOKIE')
-        csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+        auth_token, csrf_token = pomodoro_tokens()
 
         if not auth_token or not csrf_token:
             await update.message.reply_text(
@@ -242,9 +249,11 @@ async def handle_pomodoro_pause(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def handle_pomodoro_continue(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /pomodoro_continue 命令 - 继续番茄钟"""
+    if not await check_permission(update):
+        return
+
     try:
-        auth_token = os.getenv('DIDA_T_COOKIE')
-        csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+        auth_token, csrf_token = pomodoro_tokens()
 
         if not auth_token or not csrf_token:
             await update.message.reply_text(
@@ -294,9 +303,11 @@ async def handle_pomodoro_continue(update: Update, context: ContextTypes.DEFAULT
 
 async def handle_pomodoro_finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /pomodoro_finish 命令 - 完成番茄钟"""
+    if not await check_permission(update):
+        return
+
     try:
-        auth_token = os.getenv('DIDA_T_COOKIE')
-        csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+        auth_token, csrf_token = pomodoro_tokens()
 
         if not auth_token or not csrf_token:
             await update.message.reply_text(
@@ -360,9 +371,11 @@ async def handle_pomodoro_finish(update: Update, context: ContextTypes.DEFAULT_T
 
 async def handle_pomodoro_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /pomodoro_stop 命令 - 停止番茄钟"""
+    if not await check_permission(update):
+        return
+
     try:
-        auth_token = os.getenv('DIDA_T_COOKIE')
-        csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+        auth_token, csrf_token = pomodoro_tokens()
 
         if not auth_token or not csrf_token:
             await update.message.reply_text(
@@ -422,7 +435,8 @@ async def handle_pomodoro_help(update: Update, context: ContextTypes.DEFAULT_TYP
         "/pomodoro_continue - 继续番茄钟\n"
         "/pomodoro_finish - 完成番茄钟\n"
         "/pomodoro_stop - 停止番茄钟\n"
-        "/pomodoro_help - 显示此帮助\n\n"
+        "/pomodoro_help - 显示此帮助\n"
+        "/focus_stats [week|month|天数] - 专注统计\n\n"
         "使用示例：\n"
         "/pomodoro_start - 启动25分钟番茄钟\n"
         "/pomodoro_start 45 写论文 - 启动45分钟专注写论文\n"
@@ -7,7 +7,9 @@ from typing import Optional
 from telegram import Update
 from telegram.ext import ContextTypes
 from src.dida_client import DidaClient, Project
+from src.handlers.access import check_permission
 from utils.formatter import format_project_list, format_error_message
+from utils.message_splitter import PAGE_HEADER_RESERVE, TELEGRAM_MAX_LENGTH, split_message
 
 
 class ProjectHandlers:
@@ -39,10 +41,8 @@ class ProjectHandlers:
             project_list_text = format_project_list(projects)
 
             # 分页（如果消息太长）
-            if len(project_list_text) > 4000:
-                # Telegram 消息长度限制为 4096 字符
-                chunks = self._split_long_message(project_list_text, 3800)
-
+            chunks = split_message(project_list_text, TELEGRAM_MAX_LENGTH - PAGE_HEADER_RESERVE)
+            if len(chunks) > 1:
                 # 不使用MarkdownV2，避免转义问题
                 await update.message.reply_text(
                     f"项目列表（{len(projects)} 个）：\n"
@@ -147,32 +147,4 @@ class ProjectHandlers:
 
     async def _check_permission(self, update: Update) -> bool:
         """检查用户权限"""
-        from config import get_config
-        from utils.formatter import escape_markdown
-
-        config = get_config()
-        if update.effective_user.id != config.bot_admin_user_id:
-            await update.message.reply_text("你没有权限使用此机器人")
-            return False
-        return True
-
-    def _split_long_message(self, text: str, max_length: int = 3800) -> list[str]:
-        """分割长消息"""
-        lines = text.split('\n')
-        chunks = []
-        current_chunk = ""
-
-        for line in lines:
-            if len(current_chunk) + len(line) + 1 > max_length:
-                chunks.append(current_chunk)
-                current_chunk = line
-            else:
-                if current_chunk:
-                    current_chunk += '\n' + line
-                else:
-                    current_chunk = line
-
-        if current_chunk:
-            chunks.append(current_chunk)
-
-        return chunks
\ No newline at end of file
+        return await check_permission(update)
@@ -9,7 +9,10 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
 from src.dida_client import DidaClient, Task
+from src.core.offload import offloader
+from src.handlers.access import check_permission
 from utils.formatter import format_task_list, format_task, format_error_message, format_success_message
+from utils.message_splitter import PAGE_HEADER_RESERVE, TELEGRAM_MAX_LENGTH, split_message
 
 
 class TaskHandlers:
@@ -154,14 +157,17 @@ class TaskHandlers:
             projects = await self.dida_client.get_projects()
             project_map = {p.id: p.name for p in projects}
 
-            # 格式化任务列表
-            task_list_text = format_task_list(tasks, project_map)
+            # 格式化任务列表（任务较多时在线程池中执行，不阻塞其他聊天）
+            task_list_text = await offloader.run(
+                "format_task_list", format_task_list, tasks, project_map, items=len(tasks)
+            )
 
             # 分页（如果消息太长）
-            if len(task_list_text) > 4000:
-                # Telegram 消息长度限制为 4096 字符
-                chunks = self._split_long_message(task_list_text, 3800)
-
+            chunks = await offloader.run(
+                "split_message", split_message, task_list_text, TELEGRAM_MAX_LENGTH - PAGE_HEADER_RESERVE,
+                nbytes=len(task_list_text),
+            )
+            if len(chunks) > 1:
                 await update.message.reply_text(
                     f"任务列表（{len(tasks)} 个）：\n"
                     f"第一部分（{len(chunks)} 部分）：\n\n{chunks[0]}"
@@ -259,32 +265,4 @@ class TaskHandlers:
 
     async def _check_permission(self, update: Update) -> bool:
         """检查用户权限"""
-        from config import get_config
-        from utils.formatter import escape_markdown
-
-        config = get_config()
-        if update.effective_user.id != config.bot_admin_user_id:
-            await update.message.reply_text("你没有权限使用此机器人")
-            return False
-        return True
-
-    def _split_long_message(self, text: str, max_length: int = 3800) -> list[str]:
-        """分割长消息"""
-        lines = text.split('\n')
-        chunks = []
-        current_chunk = ""
-
-        for line in lines:
-            if len(current_chunk) + len(line) + 1 > max_length:
-                chunks.append(current_chunk)
-                current_chunk = line
-            else:
-                if current_chunk:
-                    current_chunk += '\n' + line
-                else:
-                    current_chunk = line
-
-        if current_chunk:
-            chunks.append(current_chunk)
-
-        return chunks
\ No newline at end of file
+        return await check_permission(update)
@@ -1,12 +1,15 @@
 """任务与番茄钟联动处理器"""
 
-import os
 import asyncio
-from datetime import datetime
+from datetime import date, datetime
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
 
+from src.formatter.pomodoro_formatter import format_focus_stats
+from src.handlers.access import check_permission
+from src.services.account_pool import pomodoro_tokens
+from src.services.pomodoro_analytics import pomodoro_analytics
 from src.services.pomodoro_service import pomodoro_service
 from src.dida_client import DidaClient
 from src.utils.time_utils import TimeUtils
@@ -21,8 +24,7 @@ class TaskPomodoroHandlers:
 
     async def _check_permission(self, update: Update) -> bool:
         """检查用户权限"""
-        # 这里可以添加权限检查逻辑
-        return True
+        return await check_permission(update)
 
     async def cmd_task_pomodoro(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -55,8 +57,7 @@ class TaskPomodoroHandlers:
             duration = int(context.args[1]) if len(context.args) > 1 and context.args[1].isdigit() else 25
 
             # 获取认证令牌
-            auth_token = os.getenv('DIDA_T_COOKIE')
-            csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+            auth_token, csrf_token = pomodoro_tokens()
 
             if not auth_token or not csrf_token:
                 await update.message.reply_text(
@@ -129,15 +130,14 @@ class TaskPomodoroHandlers:
             if not await self._check_permission(update):
                 return
 
-            auth_token = os.getenv('DIDA_T_COOKIE')
-            csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+            auth_token, csrf_token = pomodoro_tokens()
 
             if not auth_token or not csrf_token:
                 await update.message.reply_text("❌ 未配置番茄钟认证令牌")
                 return
 
-            # 查询番茄钟状态
-            result = await pomodoro_service.query_focus_state(auth_token, csrf_token)
+            # 查询番茄钟状态（最近同步过时直接使用内存状态）
+            result = await pomodoro_service.get_focus_status(auth_token, csrf_token)
 
             if "error" in result:
                 await update.message.reply_text(
@@ -280,11 +280,63 @@ class TaskPomodoroHandlers:
         except Exception as e:
             await update.message.reply_text(f"❌ 创建任务并启动番茄钟时发生错误: {str(e)}")
 
+    async def cmd_focus_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        专注统计命令
+
+        用法：
+        /focus_stats - 最近7天
+        /focus_stats month - 最近30天
+        /focus_stats 90 - 最近90天
+        /focus_stats 2025-11-01 2025-11-30 - 指定日期范围
+        """
+        try:
+            if not await self._check_permission(update):
+                return
+
+            auth_token, csrf_token = pomodoro_tokens()
+
+            if not auth_token or not csrf_token:
+                await update.message.reply_text("❌ 未配置番茄钟认证令牌")
+                return
+
+            args = context.args or []
+            try:
+                if len(args) >= 1 and "-" in args[0]:
+                    start = date.fromisoformat(args[0])
+                    end = date.fromisoformat(args[1]) if len(args) > 1 else None
+                    stats = await pomodoro_analytics.get_stats(auth_token, csrf_token, start, end)
+                else:
+                    period = args[0].lower() if args else "week"
+                    days = {"week": 7, "month": 30, "year": 365}.get(period)
+                    if days is None:
+                        days = int(period)
+                    stats = await pomodoro_analytics.get_period_stats(auth_token, csrf_token, min(max(days, 1), 366))
+            except ValueError as e:
+                await update.message.reply_text(
+                    f"❌ 参数错误: {e}\n\n"
+                    "用法：\n"
+                    "/focus_stats [week|month|天数]\n"
+                    "/focus_stats 开始日期 [结束日期]（YYYY-MM-DD）"
+                )
+                return
+
+            result = stats.to_dict()
+            try:
+                projects = await self.dida_client.get_projects()
+                result["project_names"] = {project.id: project.name for project in projects}
+            except Exception:
+                pass
+
+            await update.message.reply_text(format_focus_stats(result))
+
+        except Exception as e:
+            await update.message.reply_text(f"❌ 获取专注统计时发生错误: {str(e)}")
+
     async def _start_pomodoro_for_task(self, update: Update, task_id: str, task_title: str, duration: int):
         """为指定任务启动番茄钟的辅助方法"""
         try:
-            auth_token = os.getenv('DIDA_T_COOKIE')
-            csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+            auth_token, csrf_token = pomodoro_tokens()
 
             if not auth_token or not csrf_token:
                 await update.message.reply_text("❌ 未配置番茄钟认证令牌")
@@ -6,6 +6,7 @@ Agent循环控制器
 
 import sys
 import logging
+import time
 from pathlib import Path
 from typing import Optional, Dict, Any
 
@@ -20,6 +21,8 @@ sys.path.insert(0, str(kosong_path))
 import kosong
 from kosong import StepResult
 
+from src.observability.ledger import ledger
+
 logger = logging.getLogger(__name__)
 
 
@@ -55,7 +58,7 @@ class AgentLoop:
         self.toolset = toolset
         self.max_iterations = max_iterations
 
-        logger.info(f"AgentLoop初始化，max_iterations={max_iterations}")
+        logger.info("AgentLoop初始化，max_iterations=%d", max_iterations)
 
 
 
@@ -65,7 +68,8 @@ class AgentLoop:
         context: Any,
         system_prompt: str,
         telegram_bot=None,
-        telegram_chat_id=None
+        telegram_chat_id=None,
+        notifier=None,
     ) -> tuple[str, Optional[str], Optional[list]]:
         """
         执行一轮调用
@@ -80,6 +84,8 @@ class AgentLoop:
             system_prompt: 系统提示词（由AIAssistant提供）
             telegram_bot: Telegram Bot 实例（可选）
             telegram_chat_id: Telegram 聊天ID（可选）
+            notifier: 通知发送器（NotificationSender，可选）；提供时工具调用通知在后台发送，
+                同一轮对话的通知合并为一条消息
 
         Returns:
             (actor, response_text, tool_results)
@@ -93,24 +99,36 @@ class AgentLoop:
         # 获取未处理工具
         unprocessed_tools = context.get_unprocessed_tools()
 
-        logger.info(f"\n{'='*60}")
-        logger.info(f"AgentLoop执行一轮调用（剩余{self.max_iterations}次）")
-        logger.info(f"未处理工具数: {len(unprocessed_tools)}")
-        logger.info(f"消息历史长度: {len(messages)}")
-        logger.info(f"{'='*60}")
-
-        # 记录传递给kosong.step的消息（调试用）
-        logger.debug(f"传递给kosong.step的消息:")
-        for i, msg in enumerate(messages[-3:], 1):  # 只记录最近3条
-            logger.debug(f"  {i}. role={msg.role}, content_len={len(str(msg.content)) if msg.content else 0}")
+        logger.debug(
+            "AgentLoop执行一轮调用（剩余%d次），未处理工具数: %d，消息历史长度: %d",
+            self.max_iterations, len(unprocessed_tools), len(messages),
+        )
 
         # 调用kosong.step，让AI决定使用什么工具
         # 传递完整的消息历史给AI（保持上下文完整）
+        step_start = time.monotonic()
+        first_part_at: Optional[float] = None
+
+        def on_message_part(part):
+            nonlocal first_part_at
+            if first_part_at is None:
+                first_part_at = time.monotonic()
+
         result: StepResult = await kosong.step(
             chat_provider=self.chat_provider,
             system_prompt=system_prompt,
             toolset=self.toolset,
             history=messages,
+            on_message_part=on_message_part,
+        )
+
+        # 记录首token延迟、生成耗时和token用量
+        step_duration = time.monotonic() - step_start
+        ttft = first_part_at - step_start if first_part_at is not None else None
+        ledger.record_step(ttft, step_duration, result.usage, provider=self.chat_provider.name)
+        logger.info(
+            "[LLM调用] 耗时 %.2fs，首token %.2fs，用量: %s",
+            step_duration, ttft or 0, result.usage or "未知",
         )
 
         # 提取AI的自然语言回复
@@ -126,20 +144,20 @@ class AgentLoop:
                     if hasattr(part, "text")
                 )
 
-        logger.debug(f"AI回复: {response_text[:100]}...")
-
         # 记录工具调用
         tool_results = None
         if result.message.tool_calls:
-            logger.info(f"[AI决策] 调用 {len(result.message.tool_calls)} 个工具:")
-            tool_names = []
-            for i, tool_call in enumerate(result.message.tool_calls, 1):
-                tool_name = tool_call.function.name
-                tool_names.append(tool_name)
-                logger.info(f"  {i}. {tool_name}")
+            tool_names = [tool_call.function.name for tool_call in result.message.tool_calls]
+            logger.info("[AI决策] 调用 %d 个工具: %s", len(tool_names), tool_names)
 
             # 发送 Telegram 通知
-            if telegram_bot and telegram_chat_id and tool_names:
+            if notifier and telegram_chat_id:
+                # 不等待发送，同一轮对话的工具调用追加到同一条消息
+                turn = ledger.current()
+                key = ("tools", turn.turn_id if turn else None)
+                for name in tool_names:
+                    notifier.notify(telegram_chat_id, key, f"  • {name}", title="🔍 AI 正在调用工具:")
+            elif telegram_bot and telegram_chat_id and tool_names:
                 try:
                     tool_list = "\n".join([f"  • {name}" for name in tool_names])
                     await telegram_bot.send_message(
@@ -147,13 +165,13 @@ class AgentLoop:
                         text=f"🔍 AI 正在调用工具:\n{tool_list}"
                     )
                 except Exception as e:
-                    logger.warning(f"发送 Telegram 通知失败: {e}")
+                    logger.warning("发送 Telegram 通知失败: %s", e)
 
             # 执行工具调用并返回结果
             tool_results = await result.tool_results()
 
             if tool_results:
-                logger.info(f"[工具结果] 收到 {len(tool_results)} 个结果")
+                logger.debug("[工具结果] 收到 %d 个结果", len(tool_results))
 
                 # 注意：不将原始工具结果添加到context（避免大数据导致API错误）
                 # 由AIAssistant在_process_tool_results()中处理并决定是否添加摘要
@@ -163,7 +181,7 @@ class AgentLoop:
 
         else:
             # 没有工具调用，这一轮可以结束
-            logger.info("[AI决策] 无工具调用，本轮结束")
+            logger.debug("[AI决策] 无工具调用，本轮结束")
             actor = "user"
 
         # 在返回前添加AI消息到context（避免过早添加导致格式问题）
@@ -172,6 +190,16 @@ class AgentLoop:
             ai_content = ""
         self._add_ai_message_to_context(context, ai_content, result.message.tool_calls)
 
+        # 用API返回的精确用量校准上下文token数（usage.total 正好覆盖历史+刚添加的AI消息）
+        if result.usage is not None and hasattr(context, "mark_token_count"):
+            if getattr(context, "prompt_token_count", 0) is None:
+                context.prompt_token_count = result.usage.input
+            context.mark_token_count(result.usage.total)
+            if context.is_almost_full():
+                logger.warning(
+                    "[上下文] token数 %d 接近上限 %d", context.token_count, context.max_context_tokens
+                )
+
         return actor, response_text, tool_results
 
     def _add_ai_message_to_context(self, context, content, tool_calls):
@@ -189,7 +217,8 @@ class AgentLoop:
         max_iterations: Optional[int] = None,
         telegram_bot=None,
         telegram_chat_id=None,
-        process_tool_results_callback=None
+        process_tool_results_callback=None,
+        notifier=None,
     ) -> str:
         """
         运行完整的对话循环
@@ -201,6 +230,7 @@ class AgentLoop:
             telegram_bot: Telegram Bot 实例
             telegram_chat_id: Telegram 聊天ID
             process_tool_results_callback: 工具结果处理回调函数
+            notifier: 通知发送器（见 next()）
 
         Returns:
             AI的最终回复
@@ -218,7 +248,8 @@ class AgentLoop:
                 context=context,
                 system_prompt=system_prompt,
                 telegram_bot=telegram_bot,
-                telegram_chat_id=telegram_chat_id
+                telegram_chat_id=telegram_chat_id,
+                notifier=notifier,
             )
 
             # 保存AI回复（最后一轮的回复）
@@ -236,7 +267,7 @@ class AgentLoop:
             # 决定下一轮行为
             if actor == "user":
                 # 无工具调用，结束循环
-                logger.info("[循环控制] 无更多工具，准备退出")
+                logger.debug("[循环控制] 无更多工具，准备退出")
                 break
 
             # 检查是否达到最大迭代次数
@@ -244,9 +275,6 @@ class AgentLoop:
                 logger.warning("[循环控制] 达到最大迭代次数，强制退出")
                 break
 
-        logger.info(f"\n{'='*60}")
-        logger.info(f"对话循环结束，共执行 {iteration} 轮")
-        logger.info(f"最终回复长度: {len(final_response)} 字符")
-        logger.info(f"{'='*60}")
+        logger.info("对话循环结束，共执行 %d 轮，最终回复长度: %d 字符", iteration, len(final_response))
 
         return final_response
@@ -99,4 +99,23 @@ class FocusSessionState:
         self.focus_on_type = None
         self.focus_on_title = None
         self.status = None
-        self.raw_current = {}
\ No newline at end of file
+        self.raw_current = {}
+
+@dataclass(slots=True)
+class FocusRecord:
+    """专注时间线中的一条记录（精简字段，大量记录时占用内存小）"""
+    id: str
+    start: int                      # 开始时间（毫秒时间戳）
+    end: int                        # 结束时间（毫秒时间戳）
+    minutes: int                    # 专注分钟（不含暂停）
+    task_id: str = ""               # 主要任务（专注时长最长的任务）
+    task_title: str = ""
+    project_name: str = ""
+
+    def to_row(self) -> list:
+        """转换为紧凑的 JSON 数组"""
+        return [self.id, self.start, self.end, self.minutes, self.task_id, self.task_title, self.project_name]
+
+    @classmethod
+    def from_row(cls, row: list) -> "FocusRecord":
+        return cls(*row)
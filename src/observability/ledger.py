@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+对话用量账本模块
+记录每轮AI对话的首token延迟、生成耗时、token用量、费用和工具调用耗时，
+并按聊天、按天聚合（含滚动分位数），供 /stats 命令和指标导出使用
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+# 添加项目根路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+# 添加kosong路径
+kosong_path = project_root / "kosong" / "src"
+sys.path.insert(0, str(kosong_path))
+
+from kosong.chat_provider import TokenUsage
+from kosong.message import ToolCall
+from kosong.tooling import HandleResult, ToolError, ToolResult
+
+from src.observability import metrics
+from src.observability.logging_setup import log_context
+
+logger = logging.getLogger(__name__)
+
+# 按天聚合最多保留的天数
+MAX_DAYS = 30
+
+# 按聊天聚合最多保留的聊天数（最久没有对话的先移除，完整记录仍在JSONL中）
+MAX_CHATS = 10000
+
+
+class RollingWindow:
+    """固定窗口的滚动样本，用于计算最近N个样本的分位数"""
+
+    def __init__(self, size: int = 500):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, value: float):
+        self._samples.append(value)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """第q（0-100）百分位数，没有样本时返回None"""
+        if not self._samples:
+            return None
+        samples = sorted(self._samples)
+        index = min(len(samples) - 1, round(q / 100 * (len(samples) - 1)))
+        return samples[index]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """p50/p95/p99 摘要"""
+        return {
+            "count": len(self._samples),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+@dataclass
+class StepRecord:
+    """一次 kosong.step 的记录"""
+    ttft: Optional[float]            # 首个消息片段到达耗时（秒），没有片段时为None
+    duration: float                  # 生成总耗时（秒）
+    input_other: int = 0
+    input_cache_read: int = 0
+    input_cache_creation: int = 0
+    output: int = 0
+
+
+@dataclass
+class ToolRecord:
+    """一次工具调用的记录"""
+    name: str
+    latency: float                   # 耗时（秒）
+    payload_bytes: int               # 返回内容序列化后的大小（字节），由 record_tool_payload 补记
+    ok: bool = True
+    tool_call_id: str = ""
+
+
+@dataclass
+class TurnRecord:
+    """一轮对话（一条用户消息）的记录"""
+    chat_id: Optional[int]
+    max_iterations: int
+    started_at: float = field(default_factory=time.time)
+    duration: float = 0.0
+    iterations: int = 0
+    error: Optional[str] = None
+    steps: List[StepRecord] = field(default_factory=list)
+    tools: List[ToolRecord] = field(default_factory=list)
+    cost: float = 0.0
+    turn_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])   # 与日志中的 turn 字段对应
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """本轮第一次调用的首token延迟"""
+        return self.steps[0].ttft if self.steps else None
+
+    @property
+    def generation_time(self) -> float:
+        return sum(step.duration for step in self.steps)
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(step.input_other for step in self.steps)
+
+    @property
+    def cache_read_tokens(self) -> int:
+        return sum(step.input_cache_read for step in self.steps)
+
+    @property
+    def cache_creation_tokens(self) -> int:
+        return sum(step.input_cache_creation for step in self.steps)
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(step.output for step in self.steps)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.update(
+            ttft=self.ttft,
+            generation_time=self.generation_time,
+            input_tokens=self.input_tokens,
+            cache_read_tokens=self.cache_read_tokens,
+            cache_creation_tokens=self.cache_creation_tokens,
+            output_tokens=self.output_tokens,
+        )
+        return data
+
+
+class UsageAggregate:
+    """一组对话（某个聊天或某一天）的累计用量"""
+
+    def __init__(self):
+        self.turns = 0
+        self.errors = 0
+        self.steps = 0
+        self.iterations = 0
+        self.exhausted = 0           # 用满 max_iterations 的轮数
+        self.input_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_creation_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.tool_calls = 0
+        self.turn_latency = RollingWindow()
+        self.ttft = RollingWindow()
+
+    def add(self, turn: TurnRecord):
+        self.turns += 1
+        self.errors += 1 if turn.error else 0
+        self.steps += len(turn.steps)
+        self.iterations += turn.iterations
+        self.exhausted += 1 if turn.iterations >= turn.max_iterations else 0
+        self.input_tokens += turn.input_tokens
+        self.cache_read_tokens += turn.cache_read_tokens
+        self.cache_creation_tokens += turn.cache_creation_tokens
+        self.output_tokens += turn.output_tokens
+        self.cost += turn.cost
+        self.tool_calls += len(turn.tools)
+        self.turn_latency.add(turn.duration)
+        if turn.ttft is not None:
+            self.ttft.add(turn.ttft)
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        """输入token中命中缓存的比例"""
+        total = self.input_tokens + self.cache_read_tokens + self.cache_creation_tokens
+        return self.cache_read_tokens / total if total else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "errors": self.errors,
+            "steps": self.steps,
+            "iterations": self.iterations,
+            "exhausted_iterations": self.exhausted,
+            "input_tokens": self.input_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_hit_ratio": self.cache_hit_ratio,
+            "cost": round(self.cost, 6),
+            "tool_calls": self.tool_calls,
+            "turn_latency": self.turn_latency.summary(),
+            "ttft": self.ttft.summary(),
+        }
+
+
+class ToolAggregate:
+    """单个工具的累计调用情况"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.payload_bytes = 0
+        self.latency = RollingWindow()
+
+    def add(self, record: ToolRecord):
+        self.calls += 1
+        self.errors += 0 if record.ok else 1
+        self.payload_bytes += record.payload_bytes
+        self.latency.add(record.latency)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "payload_bytes": self.payload_bytes,
+            "latency": self.latency.summary(),
+        }
+
+
+# 当前正在进行的对话轮次（由 TurnLedger.turn() 设置，AgentLoop 和工具调用通过它记录数据）
+_current_turn: ContextVar[Optional[TurnRecord]] = ContextVar("current_turn", default=None)
+
+
+class TurnLedger:
+    """
+    对话用量账本
+
+    用法：
+        async with ledger.turn(chat_id, max_iterations) as turn:
+            ...  # 期间 record_step / InstrumentedToolset 自动记录到 turn
+
+    价格单位为每百万token的费用（与服务商报价一致），未配置时费用为0
+    """
+
+    def __init__(self):
+        self.path: Optional[Path] = None
+        self.price_input = 0.0
+        self.price_output = 0.0
+        self.price_cache_read = 0.0
+        self.total = UsageAggregate()
+        self.per_chat: "OrderedDict[int, UsageAggregate]" = OrderedDict()
+        self.per_day: Dict[str, UsageAggregate] = {}
+        self.per_tool: Dict[str, ToolAggregate] = {}
+
+    def configure(
+        self,
+        path: Optional[Path] = None,
+        price_input: float = 0.0,
+        price_output: float = 0.0,
+        price_cache_read: float = 0.0,
+    ):
+        """
+        配置账本
+
+        Args:
+            path: 每轮记录追加写入的JSONL文件（None表示只在内存中聚合）
+            price_input: 未缓存输入token单价（每百万token）
+            price_output: 输出token单价（每百万token）
+            price_cache_read: 缓存命中输入token单价（每百万token）
+        """
+        self.path = path
+        self.price_input = price_input
+        self.price_output = price_output
+        self.price_cache_read = price_cache_read
+
+    @staticmethod
+    def current() -> Optional[TurnRecord]:
+        """当前上下文中的对话轮次（不在对话中时为None）"""
+        return _current_turn.get()
+
+    @asynccontextmanager
+    async def turn(self, chat_id: Optional[int], max_iterations: int) -> AsyncIterator[TurnRecord]:
+        """记录一轮对话，结束时计入聚合并写入JSONL"""
+        record = TurnRecord(chat_id=chat_id, max_iterations=max_iterations)
+        token = _current_turn.set(record)
+        start = time.monotonic()
+        try:
+            with log_context(turn=record.turn_id):
+                yield record
+        except BaseException as e:
+            # 保留已经通过 record_error 记录的原始错误
+            record.error = record.error or type(e).__name__
+            raise
+        finally:
+            _current_turn.reset(token)
+            record.duration = time.monotonic() - start
+            await self._finish(record)
+
+    def record_step(
+        self,
+        ttft: Optional[float],
+        duration: float,
+        usage: Optional[TokenUsage],
+        provider: str = "",
+    ):
+        """记录一次 kosong.step（不在对话轮次中时只计入指标）"""
+        metrics.llm_step_latency.labels(provider=provider).observe(duration)
+        if ttft is not None:
+            metrics.llm_ttft.labels(provider=provider).observe(ttft)
+        if usage is not None:
+            metrics.llm_tokens.labels(kind="input").inc(usage.input_other)
+            metrics.llm_tokens.labels(kind="cache_read").inc(usage.input_cache_read)
+            metrics.llm_tokens.labels(kind="cache_creation").inc(usage.input_cache_creation)
+            metrics.llm_tokens.labels(kind="output").inc(usage.output)
+
+        record = _current_turn.get()
+        if record is None:
+            return
+        step = StepRecord(ttft=ttft, duration=duration)
+        if usage is not None:
+            step.input_other = usage.input_other
+            step.input_cache_read = usage.input_cache_read
+            step.input_cache_creation = usage.input_cache_creation
+            step.output = usage.output
+        record.steps.append(step)
+
+    def record_iterations(self, iterations: int):
+        """记录当前对话轮次已执行的循环次数"""
+        record = _current_turn.get()
+        if record is not None:
+            record.iterations = iterations
+
+    def record_error(self, error: BaseException):
+        """记录当前对话轮次失败（用于调用方自行处理了异常的情况）"""
+        record = _current_turn.get()
+        if record is not None:
+            record.error = type(error).__name__
+
+    def record_tool(
+        self, name: str, latency: float, payload_bytes: int = 0, ok: bool = True, tool_call_id: str = ""
+    ):
+        """记录一次工具调用（不在对话轮次中时只计入工具聚合）"""
+        tool = ToolRecord(name=name, latency=latency, payload_bytes=payload_bytes, ok=ok, tool_call_id=tool_call_id)
+        metrics.tool_latency.labels(tool=name).observe(latency)
+        metrics.tool_calls.labels(tool=name, status="ok" if ok else "error").inc()
+        self.per_tool.setdefault(name, ToolAggregate()).add(tool)
+        record = _current_turn.get()
+        if record is not None:
+            record.tools.append(tool)
+
+    def record_tool_payload(self, tool_call_id: str, payload_bytes: int):
+        """
+        补记当前对话轮次中一次工具调用的返回大小
+
+        工具结果在加入对话历史时才序列化，由序列化的调用方传入结果字符串的字节数，
+        避免在工具完成回调（事件循环上）中再序列化一次
+        """
+        record = _current_turn.get()
+        if record is None:
+            return
+        for tool in record.tools:
+            if tool.tool_call_id == tool_call_id:
+                tool.payload_bytes += payload_bytes
+                self.per_tool.setdefault(tool.name, ToolAggregate()).payload_bytes += payload_bytes
+                return
+
+    def _cost(self, record: TurnRecord) -> float:
+        return (
+            (record.input_tokens + record.cache_creation_tokens) * self.price_input
+            + record.cache_read_tokens * self.price_cache_read
+            + record.output_tokens * self.price_output
+        ) / 1_000_000
+
+    async def _finish(self, record: TurnRecord):
+        record.cost = self._cost(record)
+        metrics.ai_turns.labels(status="error" if record.error else "ok").inc()
+        metrics.llm_cost.inc(record.cost)
+        self.total.add(record)
+        if record.chat_id is not None:
+            self.per_chat.setdefault(record.chat_id, UsageAggregate()).add(record)
+            self.per_chat.move_to_end(record.chat_id)
+            while len(self.per_chat) > MAX_CHATS:
+                self.per_chat.popitem(last=False)
+        day = date.fromtimestamp(record.started_at).isoformat()
+        self.per_day.setdefault(day, UsageAggregate()).add(record)
+        for old_day in sorted(self.per_day)[:-MAX_DAYS]:
+            del self.per_day[old_day]
+
+        logger.info(
+            "[用量] 聊天 %s: %d/%d 轮, 耗时 %.2fs, 首token %.2fs, 输入 %d+缓存%d / 输出 %d tokens, 工具 %d 次",
+            record.chat_id, record.iterations, record.max_iterations, record.duration, record.ttft or 0,
+            record.input_tokens, record.cache_read_tokens, record.output_tokens, len(record.tools),
+        )
+
+        if self.path is not None:
+            try:
+                await asyncio.to_thread(self._append, record)
+            except Exception as e:
+                logger.error("写入用量账本失败: %s", e)
+
+    def _append(self, record: TurnRecord):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+
+    def snapshot(self, chat_id: Optional[int] = None, chat_only: bool = False) -> Dict[str, Any]:
+        """
+        导出聚合数据
+
+        Args:
+            chat_id: 只导出该聊天的数据（None表示导出所有聊天）
+            chat_only: 连同总计也只用该聊天的数据，不包含按天和按工具的全局聚合（给非管理员查看）
+
+        Returns:
+            可直接JSON序列化的字典
+        """
+        if chat_only:
+            chat = self.per_chat.get(chat_id, UsageAggregate()).to_dict()
+            return {
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "total": chat,
+                "per_day": {},
+                "per_chat": {str(chat_id): chat},
+                "per_tool": {},
+            }
+        if chat_id is None:
+            chats = self.per_chat
+        else:
+            chats = {cid: agg for cid, agg in self.per_chat.items() if cid == chat_id}
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "total": self.total.to_dict(),
+            "per_day": {day: agg.to_dict() for day, agg in sorted(self.per_day.items())},
+            "per_chat": {str(cid): agg.to_dict() for cid, agg in chats.items()},
+            "per_tool": {name: agg.to_dict() for name, agg in sorted(self.per_tool.items())},
+        }
+
+
+class InstrumentedToolset:
+    """
+    包装工具集，记录每次工具调用的耗时和是否成功
+
+    实现 kosong 的 Toolset 协议，可直接传给 kosong.step；返回大小在结果序列化后
+    通过 TurnLedger.record_tool_payload 补记
+    """
+
+    def __init__(self, toolset, turn_ledger: Optional[TurnLedger] = None):
+        self._toolset = toolset
+        self._ledger = turn_ledger or ledger
+
+    @property
+    def tools(self):
+        return self._toolset.tools
+
+    def handle(self, tool_call: ToolCall) -> HandleResult:
+        name = tool_call.function.name
+        start = time.monotonic()
+        result = self._toolset.handle(tool_call)
+
+        if isinstance(result, ToolResult):
+            self._record(name, start, tool_call.id, result)
+            return result
+
+        def _done(future: asyncio.Future):
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._ledger.record_tool(name, time.monotonic() - start, ok=False, tool_call_id=tool_call.id)
+                return
+            self._record(name, start, tool_call.id, future.result())
+
+        # 回调在添加时的上下文中执行，因此能记录到当前对话轮次
+        result.add_done_callback(_done)
+        return result
+
+    def _record(self, name: str, start: float, tool_call_id: str, result: ToolResult):
+        self._ledger.record_tool(
+            name,
+            time.monotonic() - start,
+            ok=not isinstance(result.result, ToolError),
+            tool_call_id=tool_call_id,
+        )
+
+
+# 全局用量账本实例
+ledger = TurnLedger()
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+日志配置模块
+- 队列化输出：业务代码只把日志记录放进队列，格式化和写文件/终端在后台线程完成，不阻塞事件循环
+- 按组件设置日志级别（如 httpx=WARNING,src.loop=DEBUG）
+- 关联ID：通过 contextvars 给同一个更新/对话轮次内的所有日志带上 update/chat/turn 字段
+- 高频日志限流和采样，避免调试日志淹没输出
+- 可选 JSON 行格式，便于日志系统检索
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# 当前上下文的关联字段（update/chat/turn），由 log_context() 设置
+_log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+# 整个进程的关联字段（如多进程模式下的工作进程序号），由 set_process_fields() 设置
+_process_fields: Dict[str, Any] = {}
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s%(context)s"
+
+# LogRecord 自带的属性，JSON 输出时不作为额外字段
+_RECORD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "context"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """
+    在当前上下文中附加关联字段，期间输出的日志都会带上这些字段
+
+    用法：
+        with log_context(chat=chat_id, turn=turn_id):
+            ...
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def set_process_fields(**fields: Any):
+    """设置本进程所有日志都带上的关联字段（包括后台线程的日志）"""
+    _process_fields.update(fields)
+
+
+def current_log_context() -> Dict[str, Any]:
+    """当前上下文的关联字段"""
+    return _log_context.get()
+
+
+class ContextFilter(logging.Filter):
+    """把关联字段写入日志记录（在产生日志的线程/协程中执行，因此能读到 contextvars）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        fields = {**_process_fields, **_log_context.get()} if _process_fields else _log_context.get()
+        record.log_context = fields
+        record.context = (" [" + " ".join(f"{k}={v}" for k, v in fields.items()) + "]") if fields else ""
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    高频日志限流和采样
+
+    - 低于 max_level 的日志（默认 DEBUG）按 sample_rate 随机采样
+    - 同一条日志模板（logger + msg，不含参数）每 interval 秒最多输出 burst 条，
+      被丢弃的条数会在下一条放行的日志后面注明
+    """
+
+    def __init__(
+        self,
+        burst: int = 20,
+        interval: float = 10.0,
+        sample_rate: float = 1.0,
+        max_level: int = logging.DEBUG,
+    ):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.max_level = max_level
+        self._windows: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+
+        # msg 不一定是字符串（如 logger.info(some_dict)），转成字符串才能作为键
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                window = self._windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (前{self.interval:.0f}秒内另有 {suppressed} 条相同日志被限流)"
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+            if len(self._windows) > 10000:
+                self._windows.clear()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON 行格式：时间、级别、组件、消息、关联字段和 extra 字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(getattr(record, "log_context", {}))
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != "log_context":
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+# 放入队列后不会再改变的参数类型，可以推迟到后台线程再展开
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+def _immutable(value: Any) -> bool:
+    if isinstance(value, _IMMUTABLE_ARGS):
+        return True
+    if isinstance(value, tuple):
+        return all(_immutable(item) for item in value)
+    return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    只把记录放入队列，尽量不在调用方格式化
+
+    标准 QueueHandler.prepare() 会在调用方线程里格式化消息；这里只补上关联字段：
+    - 参数全是不可变的基本类型时，%-参数展开推迟到后台线程
+    - 有列表、字典、对象等参数时在调用方立即展开，否则后台线程格式化时
+      可能读到调用方之后修改过的内容
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(_immutable(arg) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def parse_component_levels(spec: str) -> Dict[str, str]:
+    """
+    解析组件级别配置
+
+    Args:
+        spec: 形如 "httpx=WARNING,src.loop=DEBUG" 的字符串
+
+    Returns:
+        {logger名称: 级别}
+    """
+    levels: Dict[str, str] = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(
+    level: str = "INFO",
+    log_file: Optional[str] = "dida_bot.log",
+    log_format: str = "text",
+    component_levels: str = "",
+    debug_burst: int = 20,
+    debug_sample_rate: float = 1.0,
+):
+    """
+    配置全局日志（可重复调用，后一次覆盖前一次）
+
+    Args:
+        level: 根日志级别
+        log_file: 日志文件路径（None或空字符串表示不写文件）
+        log_format: text 或 json
+        component_levels: 组件级别，如 "httpx=WARNING,src.loop=DEBUG"
+        debug_burst: 同一条DEBUG日志每10秒最多输出的条数
+        debug_sample_rate: DEBUG日志采样率（0-1）
+    """
+    global _listener
+    _stop_listener()
+
+    formatter: logging.Formatter
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    handlers: list = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(RateLimitFilter(burst=debug_burst, sample_rate=debug_sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    for name, component_level in parse_component_levels(component_levels).items():
+        logging.getLogger(name).setLevel(component_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    """停止后台写日志线程（先输出队列中剩余的日志），并关闭它的终端和文件输出"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def shutdown_logging():
+    """停止后台写日志线程并输出队列中剩余的日志"""
+    if _listener is not None:
+        _stop_listener()
+        for handler in logging.getLogger().handlers:
+            handler.close()
+
+
+atexit.register(shutdown_logging)
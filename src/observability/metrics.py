@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+"""
+进程内指标模块
+提供 Counter / Gauge / Histogram 和 Prometheus 文本格式导出，
+以及 HTTP 调用指标（MetricsTransport）和事件循环延迟监控
+"""
+
+import asyncio
+import logging
+import math
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 默认延迟分桶（秒），覆盖从毫秒级的本地调用到几十秒的LLM调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """指标基类：按标签值保存子指标"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children: Dict[LabelValues, object] = {}
+
+    def labels(self, *values: str, **kwargs: str):
+        """获取某组标签值对应的子指标"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.label_names)
+        else:
+            values = tuple(str(v) for v in values)
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} 需要标签 {self.label_names}，实际为 {values}")
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _default(self):
+        """无标签指标直接使用的子指标"""
+        if self.label_names:
+            raise ValueError(f"{self.name} 有标签 {self.label_names}，请先调用 labels()")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counter 只能增加")
+        self.value += amount
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}"
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """导出时调用 function 取值（适合从已有对象读取的当前值）"""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception as e:
+                logger.warning("读取指标值失败: %s", e)
+                return math.nan
+        return self.value
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default().set_function(function)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.get())}"
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def time(self) -> "_Timer":
+        """计时上下文管理器：with histogram.time(): ..."""
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._child.observe(time.monotonic() - self._start)
+
+
+class Histogram(_Metric):
+    """分桶直方图（桶计数在导出时累加）"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self) -> _Timer:
+        return self._default().time()
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, values, le)} {cumulative}"
+            labels = _format_labels(self.label_names, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已注册")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        """导出 Prometheus 文本格式（text/plain; version=0.0.4）"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+# Telegram 更新处理
+update_latency = registry.histogram(
+    "didabot_update_duration_seconds", "Telegram 更新处理耗时", ["kind"]
+)
+updates_in_flight = registry.gauge("didabot_updates_in_flight", "正在处理的 Telegram 更新数")
+updates_queued = registry.gauge(
+    "didabot_updates_queued", "已交给更新处理器、在等待同一聊天的前序更新或并发名额的更新数"
+)
+update_queue_wait = registry.histogram(
+    "didabot_update_queue_wait_seconds", "更新从交给更新处理器到开始处理的等待时间"
+)
+webhook_requests = registry.counter(
+    "didabot_webhook_requests_total", "Webhook 收到的更新请求数（按处理结果）", ["result"]
+)
+webhook_queue_depth = registry.gauge("didabot_webhook_queue_depth", "Webhook 已接收待处理的更新数")
+
+# 多进程（前端进程）
+worker_up = registry.gauge("didabot_worker_up", "工作进程是否在接收更新（1/0）", ["worker"])
+worker_pending = registry.gauge("didabot_worker_pending", "已转发给工作进程、尚未处理完的更新数", ["worker"])
+worker_restarts = registry.counter("didabot_worker_restarts_total", "工作进程重启次数", ["worker"])
+worker_updates = registry.counter(
+    "didabot_worker_updates_total", "前端转发的更新数（forwarded/moved/lost）", ["result"]
+)
+
+# Telegram 发送
+telegram_send_wait = registry.histogram(
+    "didabot_telegram_send_wait_seconds", "发送前在限流器中等待的时间"
+)
+telegram_retry_after = registry.counter(
+    "didabot_telegram_retry_after_total", "Telegram 返回 RetryAfter（flood control）的次数"
+)
+
+# 外部 HTTP 调用（滴答清单 Open API / Web API）
+http_requests = registry.counter(
+    "didabot_http_requests_total", "外部HTTP请求数", ["service", "method", "endpoint", "status"]
+)
+http_latency = registry.histogram(
+    "didabot_http_request_duration_seconds", "外部HTTP请求耗时", ["service", "method", "endpoint"]
+)
+http_connect_latency = registry.histogram(
+    "didabot_http_connect_duration_seconds", "新建TCP连接耗时（含DNS解析）", ["host", "result"]
+)
+upstream_up = registry.gauge("didabot_upstream_up", "上游最近一次检查是否成功（1/0）", ["upstream"])
+upstream_check_latency = registry.histogram(
+    "didabot_upstream_check_duration_seconds", "上游预热和保活检查耗时", ["upstream"]
+)
+
+# LLM 和工具调用
+llm_step_latency = registry.histogram(
+    "didabot_llm_step_duration_seconds", "一次 kosong.step 的生成耗时", ["provider"]
+)
+llm_ttft = registry.histogram(
+    "didabot_llm_ttft_seconds", "LLM 首个消息片段到达耗时", ["provider"]
+)
+llm_tokens = registry.counter("didabot_llm_tokens_total", "LLM token用量", ["kind"])
+llm_cost = registry.counter("didabot_llm_cost_total", "LLM 估算费用")
+ai_turns = registry.counter("didabot_ai_turns_total", "AI对话轮数", ["status"])
+tool_latency = registry.histogram("didabot_tool_duration_seconds", "工具调用耗时", ["tool"])
+tool_calls = registry.counter("didabot_tool_calls_total", "工具调用次数", ["tool", "status"])
+
+# 缓存和对话
+cache_requests = registry.counter(
+    "didabot_cache_requests_total", "缓存访问次数（按命中/未命中）", ["cache", "result"]
+)
+active_conversations = registry.gauge(
+    "didabot_active_conversations", "加载在内存中的对话数"
+)
+focus_timers = registry.gauge("didabot_focus_timers", "本地计时中的番茄会话数")
+loaded_accounts = registry.gauge("didabot_loaded_accounts", "已加载客户端的用户账号数")
+account_evictions = registry.counter(
+    "didabot_account_evictions_total", "关闭的用户账号客户端数", ["reason"]
+)
+
+# 事件循环
+event_loop_lag = registry.histogram(
+    "didabot_event_loop_lag_seconds",
+    "事件循环调度延迟",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+event_loop_lag_max = registry.gauge(
+    "didabot_event_loop_lag_max_seconds", "最近一个统计周期内的最大事件循环延迟"
+)
+offload_tasks = registry.counter(
+    "didabot_offload_tasks_total", "CPU 密集操作的执行次数（inline：事件循环上，thread：线程池中）", ["op", "where"]
+)
+offload_duration = registry.histogram(
+    "didabot_offload_duration_seconds",
+    "CPU 密集操作的耗时（线程池中执行时含排队时间）",
+    ["op", "where"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+def record_cache(cache: str, hit: bool):
+    """记录一次缓存访问"""
+    cache_requests.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+# ===== HTTP 调用指标 =====
+
+# 路径中的ID段（滴答清单的24位十六进制ID、数字ID、UUID）统一替换，避免标签基数爆炸
+_ID_SEGMENT = re.compile(r"^(?:[0-9a-fA-F]{24}|\d+|[0-9a-fA-F-]{32,36}|inbox\d+)$")
+
+
+def normalize_endpoint(path: str) -> str:
+    """
+    把请求路径归一化为端点模板
+
+    例如 /open/v1/project/5f1.../task/6a2... -> /open/v1/project/{id}/task/{id}
+    """
+    segments = [("{id}" if _ID_SEGMENT.match(segment) else segment) for segment in path.split("/")]
+    return "/".join(segments)
+
+
+class MetricsTransport(httpx.AsyncBaseTransport):
+    """记录请求数、状态码和耗时的 HTTP 传输层包装（按端点模板聚合）"""
+
+    def __init__(self, wrapped_transport: httpx.AsyncBaseTransport, service: str):
+        self._wrapped = wrapped_transport
+        self._service = service
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = normalize_endpoint(request.url.path)
+        start = time.monotonic()
+        status = "error"
+        try:
+            response = await self._wrapped.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            http_latency.labels(self._service, request.method, endpoint).observe(time.monotonic() - start)
+            http_requests.labels(self._service, request.method, endpoint, status).inc()
+
+    async def aclose(self):
+        await self._wrapped.aclose()
+
+
+# ===== 事件循环延迟监控 =====
+
+class EventLoopLagMonitor:
+    """
+    事件循环延迟监控
+
+    定期 sleep 固定间隔，实际唤醒时间比预期晚多少即为调度延迟；
+    延迟持续偏高说明有同步代码阻塞了事件循环
+    """
+
+    def __init__(self, interval: float = 0.5, report_every: int = 120):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            report_every: 每多少次采样刷新一次最大延迟
+        """
+        self.interval = interval
+        self.report_every = report_every
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        window: List[float] = []
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            event_loop_lag.observe(lag)
+            window.append(lag)
+            if len(window) >= self.report_every:
+                event_loop_lag_max.set(max(window))
+                window.clear()
+            elif lag > event_loop_lag_max.labels().get():
+                event_loop_lag_max.set(lag)
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+多用户账号池
+一个 Bot 进程服务多个 Telegram 用户，每个用户使用自己绑定的滴答清单账号：
+
+- 管理员使用 .env 中配置的令牌（常驻，不会被回收）
+- 其他用户通过 /register 绑定令牌，加密保存在 CredentialStore 中
+- 每个用户的 DidaClient 在第一次使用时创建，按最近使用顺序保留（LRU，有数量上限），
+  空闲超过一定时间自动关闭，连接数和内存不随用户总数增长；
+  番茄钟共用 pomodoro_service（按 Cookie 区分会话、共用一个连接池），回收账号时一并丢弃会话
+
+处理每个更新时由更新处理器调用 scope() 绑定当前账号（contextvars），
+处理器和 AI 工具通过 CurrentAccountClient / pomodoro_tokens() 访问当前用户的账号，无需逐层传递
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+from src.dida_client import DidaClient
+from src.observability.metrics import account_evictions
+from src.services.credential_store import CredentialStore, UserCredentials
+from src.services.pomodoro_service import pomodoro_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Account:
+    """一个已加载的用户账号"""
+    credentials: UserCredentials
+    dida_client: DidaClient
+    pinned: bool = False          # 常驻（管理员账号），不会被回收
+    active: int = 0               # 正在处理的更新数，大于 0 时不会被回收
+    last_used: float = 0.0
+    store_version: Optional[int] = None  # 加载或上次核对凭据时凭据文件的版本
+    retired: bool = False         # 已从账号池移除，最后一个更新处理完后关闭客户端
+
+    @property
+    def user_id(self) -> int:
+        return self.credentials.user_id
+
+
+# 当前更新所属的账号（由 AccountPool.scope 设置；未绑定账号的用户为 None，不在任何更新中时没有值）
+_current_account: ContextVar[Optional[Account]] = ContextVar("current_account")
+_UNBOUND = object()
+
+
+def get_current_account() -> Optional[Account]:
+    """当前更新所属的账号（用户未绑定账号或不在更新处理中时为 None）"""
+    return _current_account.get(None)
+
+
+def pomodoro_tokens() -> Tuple[Optional[str], Optional[str]]:
+    """
+    当前账号的番茄钟认证（t cookie, csrf token），未配置时为 (None, None)
+
+    不在更新处理中时（如命令行脚本）使用环境变量中的配置；
+    用户未绑定账号时不会退回环境变量，避免使用管理员的账号
+    """
+    account = _current_account.get(_UNBOUND)
+    if account is _UNBOUND:
+        return os.getenv("DIDA_T_COOKIE"), os.getenv("DIDA_CSRF_TOKEN")
+    if account is None:
+        return None, None
+    return account.credentials.dida_t_cookie, account.credentials.dida_csrf_token
+
+
+class CurrentAccountClient:
+    """
+    转发到当前账号 DidaClient 的代理
+
+    处理器和 AI 工具在启动时创建、只持有一个客户端；持有这个代理即可在每次调用时
+    使用当前用户的客户端。不在更新处理中时使用默认客户端（管理员账号）
+    """
+
+    def __init__(self, default: DidaClient):
+        self._default = default
+
+    def __getattr__(self, name: str):
+        account = _current_account.get(_UNBOUND)
+        if account is _UNBOUND:
+            return getattr(self._default, name)
+        if account is None:
+            raise PermissionError("当前用户没有绑定滴答清单账号")
+        return getattr(account.dida_client, name)
+
+
+class AccountPool:
+    """
+    用户账号池
+
+    用法：
+        account_pool.configure(admin, store=store, max_size=100, idle_seconds=600)
+        async with account_pool.scope(user_id) as account:
+            ...   # account 为 None 表示用户未绑定账号
+    """
+
+    def __init__(self):
+        self.store: Optional[CredentialStore] = None
+        self.allowed_user_ids: Set[int] = set()
+        self.max_size = 100
+        self.idle_seconds = 600.0
+        self.base_url = "https://api.dida365.com"
+        self._transport: Optional[httpx.AsyncBaseTransport] = None
+        self._accounts: "OrderedDict[int, Account]" = OrderedDict()
+        self._pinned = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(
+        self,
+        admin: Optional[Account] = None,
+        *,
+        store: Optional[CredentialStore] = None,
+        allowed_user_ids: Iterable[int] = (),
+        max_size: int = 100,
+        idle_seconds: float = 600.0,
+        base_url: str = "https://api.dida365.com",
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Args:
+            admin: 管理员账号（常驻）
+            store: 用户凭据存储（为空时只有管理员可以使用）
+            allowed_user_ids: 允许通过 /register 绑定账号的用户
+            max_size: 最多同时加载的账号数（不含常驻账号）
+            idle_seconds: 账号空闲多久后关闭客户端
+            base_url: 滴答清单 API 基础URL
+            transport: 新建 DidaClient 使用的底层传输（压测时指向本地模拟服务）
+        """
+        self.store = store
+        self.allowed_user_ids = set(allowed_user_ids)
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self.base_url = base_url
+        self._transport = transport
+        self._accounts.clear()
+        self._pinned = 0
+        if admin is not None:
+            admin.pinned = True
+            self._accounts[admin.user_id] = admin
+            self._pinned = 1
+
+    def __len__(self) -> int:
+        """已加载的账号数"""
+        return len(self._accounts)
+
+    def can_register(self, user_id: int) -> bool:
+        """用户是否可以绑定自己的账号"""
+        return self.store is not None and user_id in self.allowed_user_ids
+
+    def get_loaded(self, user_id: int) -> Optional[Account]:
+        return self._accounts.get(user_id)
+
+    def user_for_cookie(self, t_cookie: str) -> Optional[int]:
+        """按番茄钟 Cookie 查找已加载账号的用户（番茄通知用）"""
+        for account in self._accounts.values():
+            if account.credentials.dida_t_cookie == t_cookie:
+                return account.user_id
+        return None
+
+    # ===== 获取和释放 =====
+
+    async def acquire(self, user_id: int) -> Optional[Account]:
+        """获取用户账号（未加载时创建客户端），用完后调用 release"""
+        account = self._accounts.get(user_id)
+        if account is not None and self._stale(account):
+            await self.unload(user_id, reason="changed")
+            account = None
+        loaded = account is None
+        if loaded:
+            credentials = self.store.get(user_id) if self.store is not None else None
+            if credentials is None:
+                return None
+            account = self._load(credentials)
+        else:
+            self._accounts.move_to_end(user_id)
+        account.active += 1
+        account.last_used = time.monotonic()
+        if loaded:
+            # 正在使用的账号不会被回收，全部在用时暂时超过上限
+            await self._evict_over_capacity()
+        return account
+
+    def release(self, account: Account):
+        account.active -= 1
+        account.last_used = time.monotonic()
+
+    def _stale(self, account: Account) -> bool:
+        """
+        已加载账号的凭据是否已被删除或更换
+
+        多进程时 /register、/unregister 只在处理该用户私聊的工作进程中卸载账号，
+        其他进程（如处理该用户所在群聊的进程）在凭据文件变化后核对一次
+        """
+        if account.pinned or self.store is None:
+            return False
+        version = self.store.version()
+        if version == account.store_version:
+            return False
+        if self.store.get(account.user_id) != account.credentials:
+            return True
+        account.store_version = version
+        return False
+
+    @asynccontextmanager
+    async def scope(self, user_id: Optional[int]) -> AsyncIterator[Optional[Account]]:
+        """在处理一个更新期间绑定当前账号"""
+        account = await self.acquire(user_id) if user_id is not None else None
+        token = _current_account.set(account)
+        try:
+            yield account
+        finally:
+            _current_account.reset(token)
+            if account is not None:
+                self.release(account)
+                if account.retired and account.active == 0:
+                    await account.dida_client.close()
+                # 加载时全部在用而暂时超过上限的，用完后回收
+                await self._evict_over_capacity()
+
+    def create_client(self, access_token: str) -> DidaClient:
+        """用账号池的配置创建 DidaClient（调用方负责关闭）"""
+        return DidaClient(access_token=access_token, base_url=self.base_url, transport=self._transport)
+
+    def _load(self, credentials: UserCredentials) -> Account:
+        client = self.create_client(credentials.dida_access_token)
+        account = Account(
+            credentials=credentials,
+            dida_client=client,
+            last_used=time.monotonic(),
+            store_version=self.store.version() if self.store is not None else None,
+        )
+        self._accounts[credentials.user_id] = account
+        logger.info("加载用户账号 %s（当前 %d 个）", credentials.user_id, len(self._accounts))
+        return account
+
+    # ===== 绑定和解绑 =====
+
+    async def register(self, credentials: UserCredentials):
+        """保存用户凭据（替换已有凭据时关闭旧客户端）"""
+        await self.store.put(credentials)
+        await self.unload(credentials.user_id)
+
+    async def unregister(self, user_id: int) -> bool:
+        """删除用户凭据并关闭客户端"""
+        removed = await self.store.remove(user_id) if self.store is not None else False
+        await self.unload(user_id)
+        return removed
+
+    # ===== 回收 =====
+
+    def _evictable(self, account: Account) -> bool:
+        if account.pinned or account.active > 0:
+            return False
+        # 有番茄钟在本地计时的账号保留到计时结束，否则通知会丢失
+        cookie = account.credentials.dida_t_cookie
+        timer = pomodoro_service.timer
+        return not (cookie and timer is not None and timer.pending(cookie))
+
+    async def unload(self, user_id: int, reason: str = "unregister"):
+        """
+        从账号池移除账号并丢弃番茄会话
+
+        客户端在没有更新使用时立即关闭，否则在最后一个使用它的更新处理完后关闭
+        """
+        account = self._accounts.get(user_id)
+        if account is None or account.pinned:
+            return
+        del self._accounts[user_id]
+        if account.credentials.dida_t_cookie:
+            pomodoro_service.drop_focus_session(account.credentials.dida_t_cookie)
+        account_evictions.labels(reason=reason).inc()
+        if account.active > 0:
+            account.retired = True
+        else:
+            await account.dida_client.close()
+
+    async def _evict_over_capacity(self):
+        """超过数量上限时回收最久未使用的账号"""
+        unpinned = len(self._accounts) - self._pinned
+        if unpinned <= self.max_size:
+            return
+        victims: List[int] = []
+        for user_id, account in self._accounts.items():
+            if unpinned - len(victims) <= self.max_size:
+                break
+            if self._evictable(account):
+                victims.append(user_id)
+        for user_id in victims:
+            await self.unload(user_id, reason="capacity")
+
+    async def evict_idle(self) -> int:
+        """回收空闲超时的账号，返回回收数量"""
+        deadline = time.monotonic() - self.idle_seconds
+        victims = [
+            user_id for user_id, account in self._accounts.items()
+            if account.last_used < deadline and self._evictable(account)
+        ]
+        for user_id in victims:
+            await self.unload(user_id, reason="idle")
+        if victims:
+            logger.info("回收空闲账号 %d 个（剩余 %d 个）", len(victims), len(self._accounts))
+        return len(victims)
+
+    def start(self):
+        """开始定期回收空闲账号"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._evict_loop())
+
+    async def _evict_loop(self):
+        interval = max(1.0, min(60.0, self.idle_seconds / 4))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception:
+                logger.exception("回收空闲账号失败")
+
+    async def close(self):
+        """停止回收任务并关闭所有非常驻账号"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for user_id in [user_id for user_id, account in self._accounts.items() if not account.pinned]:
+            await self.unload(user_id, reason="shutdown")
+
+
+# 全局账号池
+account_pool = AccountPool()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+用户凭据存储
+保存每个 Telegram 用户绑定的滴答清单令牌（Open API 访问令牌、番茄钟 Web Cookie），
+每个用户的凭据单独用 Fernet（AES-128-CBC + HMAC-SHA256）加密后写入一个 JSON 文件：
+
+    {"users": {"<telegram 用户ID>": "<加密后的凭据>"}}
+
+密钥来自配置（CREDENTIAL_KEY），不写入磁盘；文件只对当前用户可读写。
+多个进程共用一个文件时，修改在旁边的 .lock 文件的排他锁（flock）下重新读取、修改、写入，
+不会互相覆盖。
+加密依赖 cryptography（pip install cryptography），未安装时不能启用多用户
+"""
+
+import asyncio
+import json
+import logging
+import os
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    CRYPTO_AVAILABLE = True
+except ImportError:
+    CRYPTO_AVAILABLE = False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # 非 POSIX 平台没有 flock，只能单进程使用
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def generate_key() -> str:
+    """生成新的加密密钥（用于 CREDENTIAL_KEY）"""
+    return Fernet.generate_key().decode()
+
+
+@dataclass
+class UserCredentials:
+    """一个 Telegram 用户的滴答清单凭据"""
+    user_id: int
+    dida_access_token: str
+    dida_t_cookie: Optional[str] = None
+    dida_csrf_token: Optional[str] = None
+
+    @property
+    def has_pomodoro(self) -> bool:
+        """是否配置了番茄钟接口需要的 Cookie"""
+        return bool(self.dida_t_cookie and self.dida_csrf_token)
+
+
+class CredentialStore:
+    """
+    加密的用户凭据存储
+
+    文件在首次访问时读入内存（只保存密文），读取某个用户时才解密；
+    文件被其他进程修改后（多进程模式）下次访问时重新读取
+    """
+
+    def __init__(self, path: Path, key: str):
+        """
+        Args:
+            path: 凭据文件路径
+            key: Fernet 密钥（generate_key() 生成的 urlsafe base64 字符串）
+
+        Raises:
+            RuntimeError: 未安装 cryptography
+            ValueError: 密钥格式无效
+        """
+        if not CRYPTO_AVAILABLE:
+            raise RuntimeError("保存用户凭据需要安装 cryptography（pip install cryptography）")
+        self.path = path
+        self._fernet = Fernet(key.encode() if isinstance(key, str) else key)
+        self._users: Optional[Dict[str, str]] = None
+        self._mtime: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    def _stat(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self) -> Dict[str, str]:
+        mtime = self._stat()
+        if self._users is None or mtime != self._mtime:
+            users: Dict[str, str] = {}
+            if self.path.exists():
+                try:
+                    users = dict(json.loads(self.path.read_text(encoding="utf-8")).get("users", {}))
+                except (OSError, ValueError) as e:
+                    logger.error("读取用户凭据文件失败: %s", e)
+            self._users = users
+            self._mtime = mtime
+        return self._users
+
+    def version(self) -> Optional[int]:
+        """文件版本（修改时间），文件被修改后变化；文件不存在时为 None"""
+        self._load()
+        return self._mtime
+
+    def user_ids(self) -> List[int]:
+        """已绑定账号的用户ID"""
+        return [int(user_id) for user_id in self._load()]
+
+    def __contains__(self, user_id: int) -> bool:
+        return str(user_id) in self._load()
+
+    def get(self, user_id: int) -> Optional[UserCredentials]:
+        """读取并解密用户凭据（未绑定或无法解密时返回 None）"""
+        token = self._load().get(str(user_id))
+        if token is None:
+            return None
+        try:
+            data = json.loads(self._fernet.decrypt(token.encode()))
+        except (InvalidToken, ValueError):
+            logger.error("用户 %s 的凭据无法解密（CREDENTIAL_KEY 是否更换过？）", user_id)
+            return None
+        return UserCredentials(**data)
+
+    def _write(self, users: Dict[str, str]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_suffix(".tmp")
+        # 先以 0600 权限创建再写入，文件内容不会短暂地对其他用户可读
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"users": users}, f)
+        os.replace(temp, self.path)
+        self._mtime = self._stat()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """跨进程的排他锁（关闭文件时释放）"""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path.with_name(self.path.name + ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _update(self, change: Callable[[Dict[str, str]], bool]) -> bool:
+        """
+        在文件锁下重新读取文件、修改并写回
+
+        Args:
+            change: 修改用户字典，返回是否有修改（没有修改时不写文件）
+        """
+        with self._file_lock():
+            # 其他进程可能刚写入，不依赖修改时间判断，强制重新读取
+            self._users = None
+            users = dict(self._load())
+            changed = change(users)
+            if changed:
+                self._write(users)
+                self._users = users
+            return changed
+
+    async def put(self, credentials: UserCredentials):
+        """保存（或替换）用户凭据"""
+        token = self._fernet.encrypt(json.dumps(asdict(credentials)).encode()).decode()
+
+        def change(users: Dict[str, str]) -> bool:
+            users[str(credentials.user_id)] = token
+            return True
+
+        async with self._lock:
+            await asyncio.to_thread(self._update, change)
+
+    async def remove(self, user_id: int) -> bool:
+        """删除用户凭据，返回之前是否存在"""
+
+        def change(users: Dict[str, str]) -> bool:
+            return users.pop(str(user_id), None) is not None
+
+        async with self._lock:
+            return await asyncio.to_thread(self._update, change)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+专注时间线本地存储
+把 PomodoroService.iter_focus_timeline 读到的记录追加写入 JSONL（每行一个紧凑数组），
+之后的统计直接流式读取本地文件，只向接口请求新产生的记录
+
+同步游标由文件本身推出，不需要单独保存：
+- 最新记录的开始时间：之后只读取比它新的记录
+- 最早记录的开始时间：首次回填历史中断后，从这里继续往前翻页
+只有"历史已全部回填"这一个标记保存在旁边的 .state 文件中；每页记录写入即提交，
+中途退出不会丢失进度，也不会重复写入（写了一半的最后一行在下次扫描时截掉）
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import aclosing
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from src.models.pomodoro_models import FocusRecord
+from src.services.pomodoro_service import PomodoroService
+
+logger = logging.getLogger(__name__)
+
+
+class FocusTimelineStore:
+    """
+    追加写入的专注记录存储
+
+    用法：
+        store = FocusTimelineStore(Path("data/focus_stats/xxx.timeline.jsonl"))
+        await store.sync(pomodoro_service, auth_token, csrf_token)
+        for record in store.iter_records(start_ms, end_ms):
+            ...
+    """
+
+    def __init__(self, path: Path, batch_size: int = 200):
+        """
+        Args:
+            path: JSONL 文件路径
+            batch_size: 回填历史时每积累多少条写一次文件
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self._state_path = path.with_suffix(".state")
+        self.newest: Optional[int] = None
+        self.oldest: Optional[int] = None
+        self.count = 0
+        self.complete = False
+        self._scanned = False
+        self._lock = asyncio.Lock()
+
+    def _repair_tail(self):
+        """截掉写入中途退出留下的不完整最后一行，之后追加的记录从新的一行开始"""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb+") as f:
+            size = f.seek(0, 2)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # 从末尾往前找最后一个换行
+            end = size
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                index = f.read(end - start).rfind(b"\n")
+                if index >= 0:
+                    f.truncate(start + index + 1)
+                    return
+                end = start
+            f.truncate(0)
+
+    def _scan(self):
+        """流式扫描文件，得到记录数和首尾时间"""
+        self._repair_tail()
+        newest = oldest = None
+        count = 0
+        for record in self.iter_records():
+            count += 1
+            newest = record.start if newest is None else max(newest, record.start)
+            oldest = record.start if oldest is None else min(oldest, record.start)
+        self.newest, self.oldest, self.count = newest, oldest, count
+        try:
+            self.complete = bool(json.loads(self._state_path.read_text(encoding="utf-8")).get("complete"))
+        except (OSError, ValueError):
+            self.complete = False
+        self._scanned = True
+
+    def iter_records(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[FocusRecord]:
+        """
+        流式读取记录（文件中的顺序，不保证按时间排序）
+
+        Args:
+            start: 只返回开始时间不早于此值的记录（毫秒时间戳）
+            end: 只返回开始时间早于此值的记录（毫秒时间戳）
+        """
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = FocusRecord.from_row(json.loads(line))
+                except (ValueError, TypeError):
+                    # 写入中途退出留下的半行
+                    continue
+                if start is not None and record.start < start:
+                    continue
+                if end is not None and record.start >= end:
+                    continue
+                yield record
+
+    def task_titles(self, task_ids: Iterable[str]) -> Dict[str, str]:
+        """查找任务标题（取最近一次专注时的标题）"""
+        wanted = set(task_ids)
+        titles: Dict[str, str] = {}
+        latest: Dict[str, int] = {}
+        for record in self.iter_records():
+            if record.task_id in wanted and record.task_title and record.start >= latest.get(record.task_id, 0):
+                titles[record.task_id] = record.task_title
+                latest[record.task_id] = record.start
+        return titles
+
+    def _append(self, records: List[FocusRecord]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = "".join(json.dumps(record.to_row(), ensure_ascii=False) + "\n" for record in records)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+    async def _write(self, records: List[FocusRecord]):
+        if not records:
+            return
+        await asyncio.to_thread(self._append, records)
+        self.count += len(records)
+        starts = [record.start for record in records]
+        self.newest = max(starts) if self.newest is None else max(self.newest, *starts)
+        self.oldest = min(starts) if self.oldest is None else min(self.oldest, *starts)
+
+    def _mark_complete(self):
+        self.complete = True
+        self._state_path.parent.mkdir(parents=True, exist_ok=True)
+        self._state_path.write_text(json.dumps({"complete": True}), encoding="utf-8")
+
+    async def sync(
+        self,
+        service: PomodoroService,
+        auth_token: str,
+        csrf_token: str,
+        max_records: Optional[int] = None,
+    ) -> int:
+        """
+        拉取新记录并继续回填历史
+
+        Args:
+            max_records: 本次最多回填的历史记录数（None 表示不限制），超过后下次调用继续
+
+        Returns:
+            新写入的记录数
+        """
+        async with self._lock:
+            if not self._scanned:
+                await asyncio.to_thread(self._scan)
+            written = 0
+
+            # 1. 比已有记录新的部分（上次同步以来产生的记录，数量不多，读完后一次写入）
+            if self.newest is not None:
+                fresh: List[FocusRecord] = []
+                async with aclosing(service.iter_focus_timeline(auth_token, csrf_token)) as records:
+                    async for record in records:
+                        if record.start <= self.newest:
+                            break
+                        fresh.append(record)
+                await self._write(fresh)
+                written += len(fresh)
+
+            # 2. 回填更早的历史：从最早的记录继续往前翻页，按批写入
+            if not self.complete:
+                batch: List[FocusRecord] = []
+                backfilled = 0
+                exhausted = True
+                records = service.iter_focus_timeline(auth_token, csrf_token, before=self.oldest)
+                async with aclosing(records):
+                    async for record in records:
+                        batch.append(record)
+                        backfilled += 1
+                        if len(batch) >= self.batch_size:
+                            await self._write(batch)
+                            batch = []
+                        if max_records is not None and backfilled >= max_records:
+                            exhausted = False
+                            break
+                await self._write(batch)
+                written += backfilled
+                if exhausted:
+                    await asyncio.to_thread(self._mark_complete)
+                    logger.info("专注时间线历史已全部回填（%d 条）", self.count)
+
+            return written
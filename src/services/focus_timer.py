@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+番茄钟本地计时
+根据同步到的番茄会话状态（endTime、暂停/继续）在本地计算阶段切换时间，到点时回调：
+专注结束、休息结束（附带剩余番茄数），由调用方发送 Telegram 通知
+
+- 所有会话共用一个最小堆，事件循环上只挂一个定时回调（对应最早到期的会话），
+  上千个会话也只占一个 TimerHandle，不为每个会话创建任务
+- 会话状态变化（操作响应、后台同步）时按服务器 current 中的 endTime 重新计算，修正本地计时漂移；
+  暂停、结束后取消计时
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, Hashable, List, Optional
+
+from src.models.pomodoro_models import FocusSessionState
+from src.utils.time_utils import TimeUtils
+
+logger = logging.getLogger(__name__)
+
+FOCUS_FINISHED = "focus_finished"
+BREAK_FINISHED = "break_finished"
+
+
+@dataclass
+class FocusTimerEvent:
+    """一次阶段切换"""
+    key: Hashable
+    kind: str                    # FOCUS_FINISHED / BREAK_FINISHED
+    focus_id: str
+    title: Optional[str] = None
+    pomos_left: int = 0          # 之后还会自动开始的番茄数
+
+
+@dataclass(order=True)
+class _TimerEntry:
+    when: float                  # 事件循环时间（loop.time()）
+    seq: int
+    event: FocusTimerEvent = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class FocusTimer:
+    """
+    番茄阶段计时器
+
+    用法：
+        timer = FocusTimer(on_event, break_minutes=5)
+        timer.update(account, state)   # 每次会话状态变化后调用
+        ...
+        timer.close()
+
+    每个 key（账号）同时最多有一个待触发的阶段切换；专注结束且还有剩余番茄时接着安排休息结束
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[FocusTimerEvent], None],
+        break_minutes: float = 5.0,
+        resync_tolerance: float = 1.0,
+        missed_grace: float = 60.0,
+    ):
+        """
+        Args:
+            callback: 阶段切换回调（在事件循环中同步调用，不应阻塞）
+            break_minutes: 番茄之间的休息时长（分钟）
+            resync_tolerance: 服务器时间与本地计时相差超过此值（秒）时重新安排
+            missed_grace: 结束时间已过去超过此值（秒）的会话不再通知（如重启前就已结束）
+        """
+        self.callback = callback
+        self.break_seconds = break_minutes * 60
+        self.resync_tolerance = resync_tolerance
+        self.missed_grace = missed_grace
+        self._heap: List[_TimerEntry] = []
+        self._entries: Dict[Hashable, _TimerEntry] = {}
+        # 已通知过专注结束的番茄，服务器状态尚未更新时不重复安排
+        self._finished: Dict[Hashable, str] = {}
+        self._cancelled = 0
+        self._seq = itertools.count()
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        """待触发的会话数"""
+        return len(self._entries)
+
+    def pending(self, key: Hashable) -> bool:
+        """该会话是否有待触发的阶段切换"""
+        return key in self._entries
+
+    def update(self, key: Hashable, state: FocusSessionState) -> None:
+        """根据会话状态安排（或取消）该会话的下一次阶段切换"""
+        entry = self._entries.get(key)
+        end_time = state.raw_current.get("endTime") if state.raw_current else None
+        if not state.focus_id or state.status != 0 or not end_time:
+            # 暂停、结束或没有会话：取消专注计时，已经进入休息阶段的保留
+            if entry is not None and entry.event.kind == FOCUS_FINISHED:
+                self.cancel(key)
+            return
+        if self._finished.get(key) == state.focus_id:
+            return
+
+        try:
+            end = TimeUtils.parse_dida_datetime(end_time)
+        except ValueError:
+            logger.debug("番茄结束时间无法解析: %s", end_time)
+            return
+        remaining = (end - datetime.now(timezone.utc)).total_seconds()
+        if remaining < -self.missed_grace:
+            return
+        when = asyncio.get_running_loop().time() + remaining
+
+        if (
+            entry is not None
+            and entry.event.kind == FOCUS_FINISHED
+            and entry.event.focus_id == state.focus_id
+            and abs(entry.when - when) <= self.resync_tolerance
+        ):
+            return
+        self._push(key, when, FocusTimerEvent(
+            key=key,
+            kind=FOCUS_FINISHED,
+            focus_id=state.focus_id,
+            title=state.focus_on_title,
+            pomos_left=state.auto_pomo_left,
+        ))
+
+    def cancel(self, key: Hashable) -> None:
+        """取消会话的待触发事件（堆中的条目延迟删除）"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        entry.cancelled = True
+        self._cancelled += 1
+        # 已取消的条目过多时重建堆，避免长期占用内存
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            self._heap = [e for e in self._heap if not e.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def close(self) -> None:
+        """取消所有计时"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._heap.clear()
+        self._entries.clear()
+        self._finished.clear()
+        self._cancelled = 0
+
+    def _push(self, key: Hashable, when: float, event: FocusTimerEvent):
+        self.cancel(key)
+        entry = _TimerEntry(when, next(self._seq), event)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._arm()
+
+    def _arm(self):
+        """把唯一的定时回调挂到最早到期的条目上"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._heap:
+            self._handle = asyncio.get_running_loop().call_at(self._heap[0].when, self._run)
+
+    def _run(self):
+        self._handle = None
+        now = asyncio.get_running_loop().time()
+        while self._heap and (self._heap[0].cancelled or self._heap[0].when <= now):
+            entry = heapq.heappop(self._heap)
+            if entry.cancelled:
+                self._cancelled -= 1
+                continue
+            event = entry.event
+            del self._entries[event.key]
+
+            if event.kind == FOCUS_FINISHED:
+                self._finished[event.key] = event.focus_id
+                if event.pomos_left > 0:
+                    self._push(event.key, entry.when + self.break_seconds, FocusTimerEvent(
+                        key=event.key,
+                        kind=BREAK_FINISHED,
+                        focus_id=event.focus_id,
+                        title=event.title,
+                        pomos_left=event.pomos_left,
+                    ))
+            try:
+                self.callback(event)
+            except Exception:
+                logger.exception("番茄阶段通知失败")
+        self._arm()
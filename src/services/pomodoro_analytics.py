@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+番茄专注统计
+按天缓存滴答清单统计接口的数据，在本地计算周报/月报需要的汇总：
+总时长、连续专注天数、按任务/项目的时长、按小时的分布
+
+- 最近几天的记录还可能被补录或修改，每次统计都重新请求；更早的日期拉取一次后写入磁盘缓存，
+  之后只请求缺失的日期
+- 每日时长来自 heatmap、每小时分布来自 dist/clockByDay，两者对缺失日期所在区间各请求一次；
+  按任务/项目的时长来自 dist（接口只返回区间汇总），对缺失的日期逐天请求
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from src.services.focus_timeline import FocusTimelineStore
+from src.services.pomodoro_service import PomodoroService, pomodoro_service
+
+logger = logging.getLogger(__name__)
+
+# 统计接口的日期格式
+DAY_FORMAT = "%Y%m%d"
+
+# 一次统计最多覆盖的天数
+MAX_RANGE_DAYS = 366
+
+# 每次统计时最多回填的时间线历史记录数（首次使用时分多次回填）
+TIMELINE_BACKFILL_PER_CALL = 1000
+
+# 最近几天（含今天）的数据每次统计都重新拉取：滴答清单允许补录和修改过去几天的专注记录
+REFRESH_DAYS = 3
+
+
+def _to_minutes(value: Any) -> int:
+    try:
+        return max(0, int(round(float(value))))
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass
+class DailyFocus:
+    """一天的专注数据（本地日期）"""
+    day: str                                                  # yyyyMMdd
+    minutes: int = 0
+    hours: List[int] = field(default_factory=lambda: [0] * 24)
+    tasks: Dict[str, int] = field(default_factory=dict)       # 任务ID -> 分钟
+    projects: Dict[str, int] = field(default_factory=dict)    # 项目ID -> 分钟
+    final: bool = False                                       # 在刷新窗口之后拉取，之后不再请求
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DailyFocus":
+        return cls(
+            day=data["day"],
+            minutes=data.get("minutes", 0),
+            hours=list(data.get("hours") or [0] * 24),
+            tasks=dict(data.get("tasks") or {}),
+            projects=dict(data.get("projects") or {}),
+            final=bool(data.get("final")),
+        )
+
+
+@dataclass
+class FocusStats:
+    """一段日期的专注汇总"""
+    start: str                                   # YYYY-MM-DD
+    end: str
+    total_minutes: int
+    active_days: int
+    days: int
+    current_streak: int                          # 截至结束日期的连续专注天数（按全部已缓存的日期计算）
+    longest_streak: int                          # 截至结束日期的最长连续天数（同上）
+    daily: List[Tuple[str, int]]                 # (YYYY-MM-DD, 分钟)
+    hours: List[int]                             # 每小时累计分钟（0-23点）
+    top_tasks: List[Tuple[str, int]]             # (任务ID, 分钟)，按时长降序
+    top_projects: List[Tuple[str, int]]
+    task_names: Dict[str, str] = field(default_factory=dict)   # 任务ID -> 标题（来自本地时间线）
+
+    @property
+    def average_minutes(self) -> float:
+        """日均专注分钟（按全部天数计）"""
+        return self.total_minutes / self.days if self.days else 0.0
+
+    @property
+    def peak_hour(self) -> Optional[int]:
+        """专注最多的小时"""
+        if not any(self.hours):
+            return None
+        return max(range(24), key=lambda hour: self.hours[hour])
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["average_minutes"] = round(self.average_minutes, 1)
+        data["peak_hour"] = self.peak_hour
+        return data
+
+
+def _day_range(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def _parse_heatmap(data: Any) -> Dict[str, int]:
+    """heatmap 响应：[{"day": "20251019", "duration": 分钟}, ...]，也兼容 {day: 分钟}"""
+    result: Dict[str, int] = {}
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict) and item.get("day"):
+                result[str(item["day"])] = _to_minutes(item.get("duration"))
+    elif isinstance(data, dict) and "error" not in data:
+        for day, minutes in data.items():
+            result[str(day)] = _to_minutes(minutes)
+    return result
+
+
+def _parse_hours(value: Any) -> List[int]:
+    """一天的小时分布：{"0": 分钟, ...} 或长度为 24 的列表"""
+    hours = [0] * 24
+    if isinstance(value, list):
+        for hour, minutes in enumerate(value[:24]):
+            hours[hour] = _to_minutes(minutes)
+    elif isinstance(value, dict):
+        for hour, minutes in value.items():
+            try:
+                index = int(hour)
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < 24:
+                hours[index] = _to_minutes(minutes)
+    return hours
+
+
+def _parse_clock_by_day(data: Any) -> Dict[str, List[int]]:
+    """clockByDay 响应：{day: 小时分布}，也兼容 [{"day": ..., "clock": 小时分布}, ...]"""
+    result: Dict[str, List[int]] = {}
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict) and item.get("day"):
+                result[str(item["day"])] = _parse_hours(item.get("clock") or item.get("hours"))
+    elif isinstance(data, dict) and "error" not in data:
+        for day, value in data.items():
+            result[str(day)] = _parse_hours(value)
+    return result
+
+
+def _parse_distribution(data: Any) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """dist 响应：{"taskDurations": {任务ID: 分钟}, "projectDurations": {项目ID: 分钟}, ...}"""
+    if not isinstance(data, dict):
+        return {}, {}
+    tasks = {str(key): _to_minutes(value) for key, value in (data.get("taskDurations") or {}).items()}
+    projects = {str(key): _to_minutes(value) for key, value in (data.get("projectDurations") or {}).items()}
+    return tasks, projects
+
+
+def _streaks(minutes: Iterable[int], allow_last_empty: bool) -> Tuple[int, int]:
+    """
+    计算连续专注天数
+
+    Args:
+        minutes: 按日期顺序的每日分钟数
+        allow_last_empty: 最后一天（今天）还没有专注时不打断当前连续天数
+
+    Returns:
+        (截至最后一天的连续天数, 最长连续天数)
+    """
+    values = list(minutes)
+    longest = run = 0
+    for value in values:
+        run = run + 1 if value > 0 else 0
+        longest = max(longest, run)
+    current = run
+    if current == 0 and allow_last_empty and len(values) > 1:
+        for value in reversed(values[:-1]):
+            if value <= 0:
+                break
+            current += 1
+    return current, longest
+
+
+def _settled(day: date, today: date) -> bool:
+    """这一天已经在刷新窗口之外，缓存的数据不再变化"""
+    return day <= today - timedelta(days=REFRESH_DAYS)
+
+
+class PomodoroAnalytics:
+    """
+    番茄专注统计服务
+
+    用法：
+        pomodoro_analytics.configure(cache_dir=Path("data/focus_stats"))
+        stats = await pomodoro_analytics.get_stats(auth_token, csrf_token, start, end)
+    """
+
+    def __init__(
+        self,
+        service: PomodoroService,
+        cache_dir: Optional[Path] = None,
+        timezone: str = "Asia/Shanghai",
+        concurrency: int = 4,
+    ):
+        """
+        Args:
+            service: 番茄服务（负责请求接口）
+            cache_dir: 每日数据的缓存目录（None 表示只缓存在内存中）
+            timezone: 统计使用的时区（与请求头 X-Tz 一致）
+            concurrency: 逐天请求 dist 时的并发数
+        """
+        self.service = service
+        self.cache_dir = cache_dir
+        self.timezone = ZoneInfo(timezone)
+        self.concurrency = concurrency
+        # 账号 -> {yyyyMMdd: DailyFocus}
+        self._days: Dict[str, Dict[str, DailyFocus]] = {}
+        self._timelines: Dict[str, FocusTimelineStore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def configure(self, cache_dir: Optional[Path] = None, timezone: Optional[str] = None):
+        """设置缓存目录和时区"""
+        self.cache_dir = cache_dir
+        if timezone:
+            self.timezone = ZoneInfo(timezone)
+        self._days.clear()
+        self._timelines.clear()
+
+    def today(self) -> date:
+        """统计时区的今天"""
+        return datetime.now(self.timezone).date()
+
+    @staticmethod
+    def _account_key(auth_token: str) -> str:
+        """缓存文件名使用 t cookie 的摘要，不把凭证写到磁盘"""
+        return hashlib.sha256(auth_token.encode()).hexdigest()[:16]
+
+    def _path_for(self, account: str) -> Optional[Path]:
+        return self.cache_dir / f"{account}.json" if self.cache_dir else None
+
+    def timeline(self, auth_token: str) -> Optional[FocusTimelineStore]:
+        """账号的本地专注时间线（未设置缓存目录时为 None）"""
+        if self.cache_dir is None:
+            return None
+        account = self._account_key(auth_token)
+        store = self._timelines.get(account)
+        if store is None:
+            store = self._timelines[account] = FocusTimelineStore(self.cache_dir / f"{account}.timeline.jsonl")
+        return store
+
+    async def _task_names(self, auth_token: str, csrf_token: str, task_ids: List[str]) -> Dict[str, str]:
+        """同步本地时间线（只拉取新记录，历史分批回填）并查找任务标题"""
+        store = self.timeline(auth_token)
+        if store is None or not task_ids:
+            return {}
+        try:
+            await store.sync(self.service, auth_token, csrf_token, max_records=TIMELINE_BACKFILL_PER_CALL)
+        except RuntimeError as e:
+            logger.warning("同步专注时间线失败: %s", e)
+        return await asyncio.to_thread(store.task_titles, task_ids)
+
+    async def _load(self, account: str) -> Dict[str, DailyFocus]:
+        days = self._days.get(account)
+        if days is not None:
+            return days
+        days = {}
+        path = self._path_for(account)
+        if path is not None and path.exists():
+            try:
+                raw = await asyncio.to_thread(path.read_text, encoding="utf-8")
+                for item in json.loads(raw).get("days", []):
+                    daily = DailyFocus.from_dict(item)
+                    days[daily.day] = daily
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("读取专注统计缓存失败，将重新拉取: %s", e)
+                days = {}
+        self._days[account] = days
+        return days
+
+    def _write(self, path: Path, days: Dict[str, DailyFocus]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"days": [asdict(days[day]) for day in sorted(days)]}
+        temp = path.with_suffix(".tmp")
+        temp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp, path)
+
+    async def _fetch(
+        self,
+        auth_token: str,
+        csrf_token: str,
+        missing: List[date],
+        days: Dict[str, DailyFocus],
+    ):
+        """拉取缺失日期的数据并合并到 days"""
+        today = self.today()
+        first, last = missing[0].strftime(DAY_FORMAT), missing[-1].strftime(DAY_FORMAT)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def distribution(day: date):
+            key = day.strftime(DAY_FORMAT)
+            async with semaphore:
+                return await self.service.get_focus_statistics(
+                    auth_token, csrf_token, "focus_distribution", key, key
+                )
+
+        heatmap, clock, *distributions = await asyncio.gather(
+            self.service.get_focus_statistics(auth_token, csrf_token, "focus_heatmap", first, last),
+            self.service.get_focus_statistics(auth_token, csrf_token, "focus_time_distribution", first, last),
+            *(distribution(day) for day in missing),
+        )
+        for response in (heatmap, clock, *distributions):
+            if isinstance(response, dict) and "error" in response:
+                raise RuntimeError(f"获取专注统计失败: {response['error']}")
+
+        minutes = _parse_heatmap(heatmap)
+        hours = _parse_clock_by_day(clock)
+        for day, response in zip(missing, distributions):
+            key = day.strftime(DAY_FORMAT)
+            tasks, projects = _parse_distribution(response)
+            days[key] = DailyFocus(
+                day=key,
+                minutes=minutes.get(key, 0),
+                hours=hours.get(key, [0] * 24),
+                tasks=tasks,
+                projects=projects,
+                final=_settled(day, today),
+            )
+
+    async def get_stats(
+        self,
+        auth_token: str,
+        csrf_token: str,
+        start: date,
+        end: Optional[date] = None,
+        top: int = 5,
+    ) -> FocusStats:
+        """
+        获取一段日期（含首尾）的专注汇总
+
+        Args:
+            start: 开始日期
+            end: 结束日期（默认今天，不能晚于今天）
+            top: 返回时长最多的任务/项目数量
+
+        Raises:
+            ValueError: 日期范围不合法
+            RuntimeError: 接口请求失败
+        """
+        today = self.today()
+        end = min(end or today, today)
+        if start > end:
+            raise ValueError("开始日期不能晚于结束日期")
+        if (end - start).days + 1 > MAX_RANGE_DAYS:
+            raise ValueError(f"统计范围不能超过 {MAX_RANGE_DAYS} 天")
+
+        account = self._account_key(auth_token)
+        lock = self._locks.setdefault(account, asyncio.Lock())
+        async with lock:
+            days = await self._load(account)
+            dates = _day_range(start, end)
+            missing = [
+                day for day in dates
+                if not (
+                    day.strftime(DAY_FORMAT) in days
+                    and days[day.strftime(DAY_FORMAT)].final
+                    and _settled(day, today)
+                )
+            ]
+            if missing:
+                logger.debug("专注统计拉取 %d 天（%s ~ %s）", len(missing), missing[0], missing[-1])
+                await self._fetch(auth_token, csrf_token, missing, days)
+                path = self._path_for(account)
+                if path is not None:
+                    try:
+                        await asyncio.to_thread(self._write, path, dict(days))
+                    except OSError as e:
+                        logger.warning("写入专注统计缓存失败: %s", e)
+
+            selected = [days[day.strftime(DAY_FORMAT)] for day in dates]
+
+            # 连续天数不局限于所选区间（否则周报最多 7 天），使用全部已缓存的日期，
+            # 没有缓存的日期按没有专注处理
+            first = min(datetime.strptime(key, DAY_FORMAT).date() for key in days)
+            history = [days.get(day.strftime(DAY_FORMAT)) for day in _day_range(first, end)]
+            current_streak, longest_streak = _streaks(
+                (daily.minutes if daily else 0 for daily in history), allow_last_empty=end == today
+            )
+
+        hours = [0] * 24
+        tasks: Dict[str, int] = {}
+        projects: Dict[str, int] = {}
+        for daily in selected:
+            for hour, minutes in enumerate(daily.hours):
+                hours[hour] += minutes
+            for task_id, minutes in daily.tasks.items():
+                tasks[task_id] = tasks.get(task_id, 0) + minutes
+            for project_id, minutes in daily.projects.items():
+                projects[project_id] = projects.get(project_id, 0) + minutes
+
+        top_tasks = sorted(tasks.items(), key=lambda item: item[1], reverse=True)[:top]
+        task_names = await self._task_names(auth_token, csrf_token, [task_id for task_id, _ in top_tasks])
+
+        return FocusStats(
+            start=start.isoformat(),
+            end=end.isoformat(),
+            total_minutes=sum(daily.minutes for daily in selected),
+            active_days=sum(1 for daily in selected if daily.minutes > 0),
+            days=len(selected),
+            current_streak=current_streak,
+            longest_streak=longest_streak,
+            daily=[(f"{d.day[:4]}-{d.day[4:6]}-{d.day[6:]}", d.minutes) for d in selected],
+            hours=hours,
+            top_tasks=top_tasks,
+            top_projects=sorted(projects.items(), key=lambda item: item[1], reverse=True)[:top],
+            task_names=task_names,
+        )
+
+    async def get_period_stats(self, auth_token: str, csrf_token: str, days: int = 7) -> FocusStats:
+        """获取截至今天的最近 days 天的专注汇总"""
+        today = self.today()
+        return await self.get_stats(auth_token, csrf_token, today - timedelta(days=days - 1), today)
+
+
+# 全局番茄统计实例
+pomodoro_analytics = PomodoroAnalytics(pomodoro_service)
@@ -1,26 +1,49 @@
 """番茄专注服务模块"""
+import asyncio
+import logging
 import time
 import uuid
-from dataclasses import asdict
-from threading import Lock
-from typing import Any, Dict, List, Optional
+from collections import deque
+from dataclasses import asdict, dataclass, replace
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
 
 import httpx
 from datetime import datetime, timezone, timedelta
 
 from src.core import pomodoro_urls
-from src.models.pomodoro_models import FocusOperation, FocusOperationRequest, FocusSessionState
+from src.core.http_clients import http_clients
+from src.models.pomodoro_models import FocusOperation, FocusRecord, FocusSessionState
+from src.services.focus_timer import FocusTimer
 from src.utils import id_utils
+from src.utils.time_utils import TimeUtils
+
+logger = logging.getLogger(__name__)
 
 
 class PomodoroService:
     """番茄专注服务类"""
 
     def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # HTTP 客户端在首次请求时由 http_clients 创建（此时连接池配置已加载）
+        self._client: Optional[httpx.AsyncClient] = None
         self.web_domain = pomodoro_urls.DIDA_API_BASE.get("web_domain", "https://dida365.com")
-        self._focus_state = FocusSessionState()
-        self._state_lock = Lock()
+        # 每个滴答账号（按 t cookie 区分）一个会话 actor
+        self._sessions: Dict[str, "FocusSessionActor"] = {}
+        # 状态查询可直接使用内存状态的最长时间（秒），超过后重新同步
+        self.status_max_age = 60.0
+        self._sync_task: Optional[asyncio.Task] = None
+        # 本地阶段计时（设置后每次会话状态变化都会重新安排）
+        self.timer: Optional[FocusTimer] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = http_clients.create("dida_web")
+        return self._client
+
+    @client.setter
+    def client(self, client: httpx.AsyncClient):
+        self._client = client
 
     def _validate_tokens(self, auth_token: str, csrf_token: str) -> bool:
         """验证令牌格式和有效性"""
@@ -95,6 +118,118 @@ class PomodoroService:
         except Exception as e:
             return {"error": str(e)}
 
+    async def get_focus_statistics(
+        self,
+        auth_token: str,
+        csrf_token: str,
+        api_name: str,
+        start_date: str,
+        end_date: str,
+    ) -> Any:
+        """
+        获取番茄统计数据，直接返回原始响应
+
+        Args:
+            api_name: DIDA_POMODORO_APIS 中的统计接口名（focus_distribution、focus_heatmap、
+                focus_time_distribution、focus_hour_distribution）
+            start_date: 开始日期（yyyyMMdd，含）
+            end_date: 结束日期（yyyyMMdd，含）
+        """
+        try:
+            endpoint = f"{pomodoro_urls.DIDA_POMODORO_APIS[api_name]}/{start_date}/{end_date}"
+            url = pomodoro_urls.build_dida_api_url(endpoint)
+            headers = self._build_auth_headers(auth_token, csrf_token)
+            cookies = self._build_auth_cookies(auth_token, csrf_token)
+
+            response = await self.client.get(url, headers=headers, cookies=cookies)
+
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.warning("番茄统计请求失败 %s，状态码: %s", api_name, response.status_code)
+                return {"error": f"HTTP {response.status_code}", "text": response.text}
+        except Exception as e:
+            logger.error("番茄统计请求异常 %s: %s", api_name, e)
+            return {"error": str(e)}
+
+    @staticmethod
+    def _parse_timeline_record(item: Dict[str, Any]) -> Optional[FocusRecord]:
+        """把时间线接口的一条记录转换为 FocusRecord（缺少时间的记录返回 None）"""
+        try:
+            start = TimeUtils.parse_dida_datetime(item["startTime"])
+            end = TimeUtils.parse_dida_datetime(item["endTime"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        pause = item.get("pauseDuration") or 0
+        minutes = max(0, round(((end - start).total_seconds() - pause) / 60))
+
+        task: Dict[str, Any] = {}
+        longest = -1.0
+        for candidate in item.get("tasks") or []:
+            try:
+                length = (
+                    TimeUtils.parse_dida_datetime(candidate["endTime"])
+                    - TimeUtils.parse_dida_datetime(candidate["startTime"])
+                ).total_seconds()
+            except (KeyError, TypeError, ValueError):
+                length = 0.0
+            if length > longest:
+                task, longest = candidate, length
+
+        return FocusRecord(
+            id=str(item.get("id", "")),
+            start=int(start.timestamp() * 1000),
+            end=int(end.timestamp() * 1000),
+            minutes=minutes,
+            task_id=task.get("taskId") or "",
+            task_title=task.get("title") or "",
+            project_name=task.get("projectName") or "",
+        )
+
+    async def iter_focus_timeline(
+        self,
+        auth_token: str,
+        csrf_token: str,
+        *,
+        before: Optional[int] = None,
+    ) -> AsyncIterator[FocusRecord]:
+        """
+        从新到旧分页读取专注时间线，逐条产出精简记录（同一时间只在内存中保留一页）
+
+        Args:
+            before: 只读取开始时间早于此值（毫秒时间戳）的记录，用于从上次中断处继续
+
+        Raises:
+            RuntimeError: 接口请求失败
+        """
+        url = pomodoro_urls.build_dida_api_url(pomodoro_urls.DIDA_POMODORO_APIS["focus_timeline"])
+        headers = self._build_auth_headers(auth_token, csrf_token)
+        cookies = self._build_auth_cookies(auth_token, csrf_token)
+        cursor = before
+        while True:
+            params = {"to": cursor} if cursor is not None else None
+            try:
+                response = await self.client.get(url, headers=headers, cookies=cookies, params=params)
+            except Exception as e:
+                raise RuntimeError(f"获取专注时间线失败: {e}") from e
+            if response.status_code != 200:
+                raise RuntimeError(f"获取专注时间线失败: HTTP {response.status_code}")
+
+            page = response.json()
+            if not isinstance(page, list) or not page:
+                return
+            oldest = cursor
+            for item in page:
+                record = self._parse_timeline_record(item) if isinstance(item, dict) else None
+                if record is None or (cursor is not None and record.start >= cursor):
+                    continue
+                oldest = record.start if oldest is None else min(oldest, record.start)
+                yield record
+            # 游标没有前进（整页都是已读过的记录）时结束，避免死循环
+            if oldest is None or oldest == cursor:
+                return
+            cursor = oldest
+
     def _build_focus_operation_headers(self, auth_token: str, csrf_token: str) -> dict:
         """构建番茄钟操作请求头"""
         headers = {
@@ -143,10 +278,10 @@ class PomodoroService:
             if response.status_code == 200:
                 return response.json()
             else:
-                print(f"番茄钟操作请求失败，状态码: {response.status_code}, 响应: {response.text}")
+                logger.warning("番茄钟操作请求失败，状态码: %s, 响应: %s", response.status_code, response.text)
                 return {"error": f"HTTP {response.status_code}", "text": response.text}
         except Exception as e:
-            print(f"番茄钟操作请求异常: {e}")
+            logger.error("番茄钟操作请求异常: %s", e)
             return {"error": str(e)}
 
     # ================================
@@ -158,55 +293,36 @@ class PomodoroService:
         now = datetime.utcnow()
         return now.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "+0000"
 
-    def _build_request_payload(
-        self,
-        operations: List[FocusOperation],
-        last_point: Optional[int] = None,
-    ) -> dict:
+    def _build_request_payload(self, operations: List[FocusOperation], last_point: int) -> dict:
         """构造番茄操作请求体"""
-        with self._state_lock:
-            point = self._focus_state.last_point if last_point is None else last_point
-        request = FocusOperationRequest(lastPoint=point, opList=operations)
         # 手动构建请求体以支持字段别名
-        payload = {
-            "lastPoint": point,
+        return {
+            "lastPoint": last_point,
             "opList": [asdict(op) for op in operations]
         }
-        return payload
 
+    @staticmethod
     def _update_local_state(
-        self,
+        state: FocusSessionState,
         *,
         manual: Optional[bool] = None,
-        duration: Optional[int] = None,
-        auto_pomo_left: Optional[int] = None,
-        pomo_count: Optional[int] = None,
         note: Optional[str] = None,
-        focus_on_id: Optional[str] = None,
         focus_on_type: Optional[int] = None,
         focus_on_title: Optional[str] = None,
     ) -> None:
         """更新本地缓存的会话属性"""
-        with self._state_lock:
-            if manual is not None:
-                self._focus_state.manual = manual
-            if duration is not None:
-                self._focus_state.duration = duration
-            if auto_pomo_left is not None:
-                self._focus_state.auto_pomo_left = auto_pomo_left
-            if pomo_count is not None:
-                self._focus_state.pomo_count = pomo_count
-            if note is not None:
-                self._focus_state.note = note
-            if focus_on_id is not None:
-                self._focus_state.focus_on_id = focus_on_id
-            if focus_on_type is not None:
-                self._focus_state.focus_on_type = focus_on_type
-            if focus_on_title is not None:
-                self._focus_state.focus_on_title = focus_on_title
+        if manual is not None:
+            state.manual = manual
+        if note is not None:
+            state.note = note
+        if focus_on_type is not None:
+            state.focus_on_type = focus_on_type
+        if focus_on_title is not None:
+            state.focus_on_title = focus_on_title
 
     def _compose_operation(
         self,
+        state: FocusSessionState,
         op: str,
         *,
         manual: Optional[bool] = None,
@@ -218,133 +334,234 @@ class PomodoroService:
         time_str: Optional[str] = None,
     ) -> FocusOperation:
         """根据当前会话状态构造番茄操作项"""
-        with self._state_lock:
-            focus_id = self._focus_state.focus_id
-            if not focus_id:
-                raise ValueError("no_active_focus")
-
-            first_focus_id = self._focus_state.first_focus_id or focus_id
-            base_manual = self._focus_state.manual
-            base_duration = self._focus_state.duration
-            base_auto = self._focus_state.auto_pomo_left
-            base_pomo = self._focus_state.pomo_count
-            base_note = self._focus_state.note
-            base_focus_on_id = self._focus_state.focus_on_id
+        focus_id = state.focus_id
+        if not focus_id:
+            raise ValueError("no_active_focus")
 
         return FocusOperation(
             id=id_utils.generate_object_id(),
             oId=focus_id,
             oType=0,
             op=op,
-            duration=duration if duration is not None else base_duration,
-            firstFocusId=first_focus_id,
-            focusOnId=(focus_on_id if focus_on_id is not None else base_focus_on_id),
-            focusOnType=self._focus_state.focus_on_type,
-            focusOnTitle=self._focus_state.focus_on_title,
-            autoPomoLeft=auto_pomo_left if auto_pomo_left is not None else base_auto,
-            pomoCount=pomo_count if pomo_count is not None else base_pomo,
-            manual=manual if manual is not None else base_manual,
-            note=note if note is not None else base_note,
+            duration=duration if duration is not None else state.duration,
+            firstFocusId=state.first_focus_id or focus_id,
+            focusOnId=(focus_on_id if focus_on_id is not None else state.focus_on_id),
+            focusOnType=state.focus_on_type,
+            focusOnTitle=state.focus_on_title,
+            autoPomoLeft=auto_pomo_left if auto_pomo_left is not None else state.auto_pomo_left,
+            pomoCount=pomo_count if pomo_count is not None else state.pomo_count,
+            manual=manual if manual is not None else state.manual,
+            note=note if note is not None else state.note,
             time=time_str or self._current_utc_time_string(),
             createdTime=int(datetime.utcnow().timestamp() * 1000),
         )
 
-    def _update_focus_state_from_response(self, response: Dict[str, Any]) -> None:
-        """根据接口响应刷新本地会话状态"""
+    @classmethod
+    def _update_focus_state_from_response(cls, state: FocusSessionState, response: Dict[str, Any]) -> None:
+        """根据接口响应刷新本地会话状态：先按顺序回放 lastPoint 之后的变更，再以 current 为准"""
         if not isinstance(response, dict):
             return
 
-        with self._state_lock:
-            point = response.get("point")
-            if isinstance(point, int):
-                self._focus_state.last_point = point
-
-            current = response.get("current")
-            if isinstance(current, dict) and current:
-                self._focus_state.raw_current = current
-                status = current.get("status")
-                if status is not None:
-                    self._focus_state.status = status
-
-                focus_id = current.get("id")
-                if focus_id:
-                    self._focus_state.focus_id = focus_id
-
-                first_focus_id = (
-                    current.get("firstId")
-                    or current.get("firstID")
-                    or current.get("firstFocusId")
-                )
-                if first_focus_id:
-                    self._focus_state.first_focus_id = first_focus_id
-
-                duration = current.get("duration")
-                if isinstance(duration, int):
-                    self._focus_state.duration = duration
-
-                auto_pomo_left = current.get("autoPomoLeft")
-                if isinstance(auto_pomo_left, int):
-                    self._focus_state.auto_pomo_left = auto_pomo_left
-
-                pomo_count = current.get("pomoCount")
-                if isinstance(pomo_count, int):
-                    self._focus_state.pomo_count = pomo_count
-
-                note = current.get("note")
-                if isinstance(note, str):
-                    self._focus_state.note = note
-
-                focus_on_logs = current.get("focusOnLogs")
-                if isinstance(focus_on_logs, list) and focus_on_logs:
-                    focus_on_id = focus_on_logs[-1].get("id") or ""
-                    if focus_on_id is not None:
-                        self._focus_state.focus_on_id = focus_on_id
-
-                focus_tasks = current.get("focusTasks")
-                if isinstance(focus_tasks, list) and focus_tasks:
-                    last_task = focus_tasks[-1]
-                    task_type = last_task.get("type")
-                    if task_type is not None:
-                        try:
-                            self._focus_state.focus_on_type = int(task_type)
-                        except (TypeError, ValueError):
-                            self._focus_state.focus_on_type = None
-                    title = last_task.get("title")
-                    if title is not None:
-                        self._focus_state.focus_on_title = title
-
-                if current.get("exited") or current.get("status") in (2, 3):
-                    self._focus_state.reset_session()
-
-    def get_focus_state_snapshot(self) -> FocusSessionState:
-        """获取当前会话状态副本"""
-        with self._state_lock:
-            return FocusSessionState(
-                last_point=self._focus_state.last_point,
-                focus_id=self._focus_state.focus_id,
-                first_focus_id=self._focus_state.first_focus_id,
-                duration=self._focus_state.duration,
-                auto_pomo_left=self._focus_state.auto_pomo_left,
-                pomo_count=self._focus_state.pomo_count,
-                manual=self._focus_state.manual,
-                note=self._focus_state.note,
-                focus_on_id=self._focus_state.focus_on_id,
-                focus_on_type=self._focus_state.focus_on_type,
-                focus_on_title=self._focus_state.focus_on_title,
-                status=self._focus_state.status,
-                raw_current=dict(self._focus_state.raw_current),
-            )
+        point = response.get("point")
+        if isinstance(point, int):
+            state.last_point = point
+
+        # updates 为 lastPoint 之后变化过的番茄记录，只回放当前会话的记录（如在其他设备上暂停、结束）
+        updates = response.get("updates")
+        if isinstance(updates, list):
+            for record in updates:
+                if not isinstance(record, dict) or not state.focus_id:
+                    continue
+                record_id = record.get("id")
+                first_id = record.get("firstId") or record.get("firstFocusId")
+                if record_id == state.focus_id or (first_id and first_id == state.first_focus_id):
+                    cls._apply_focus_snapshot(state, record)
+
+        current = response.get("current")
+        if isinstance(current, dict) and current:
+            cls._apply_focus_snapshot(state, current)
+
+    @staticmethod
+    def _apply_focus_snapshot(state: FocusSessionState, current: Dict[str, Any]) -> None:
+        """用一条番茄记录更新本地会话状态"""
+        state.raw_current = current
+        status = current.get("status")
+        if status is not None:
+            state.status = status
+
+        focus_id = current.get("id")
+        if focus_id:
+            state.focus_id = focus_id
+
+        first_focus_id = (
+            current.get("firstId")
+            or current.get("firstID")
+            or current.get("firstFocusId")
+        )
+        if first_focus_id:
+            state.first_focus_id = first_focus_id
+
+        duration = current.get("duration")
+        if isinstance(duration, int):
+            state.duration = duration
+
+        auto_pomo_left = current.get("autoPomoLeft")
+        if isinstance(auto_pomo_left, int):
+            state.auto_pomo_left = auto_pomo_left
 
-    def set_last_point(self, point: int) -> None:
+        pomo_count = current.get("pomoCount")
+        if isinstance(pomo_count, int):
+            state.pomo_count = pomo_count
+
+        note = current.get("note")
+        if isinstance(note, str):
+            state.note = note
+
+        focus_on_logs = current.get("focusOnLogs")
+        if isinstance(focus_on_logs, list) and focus_on_logs:
+            focus_on_id = focus_on_logs[-1].get("id") or ""
+            if focus_on_id is not None:
+                state.focus_on_id = focus_on_id
+
+        focus_tasks = current.get("focusTasks")
+        if isinstance(focus_tasks, list) and focus_tasks:
+            last_task = focus_tasks[-1]
+            task_type = last_task.get("type")
+            if task_type is not None:
+                try:
+                    state.focus_on_type = int(task_type)
+                except (TypeError, ValueError):
+                    state.focus_on_type = None
+            title = last_task.get("title")
+            if title is not None:
+                state.focus_on_title = title
+
+        if current.get("exited") or current.get("status") in (2, 3):
+            state.reset_session()
+
+    # ================================
+    # 会话管理
+    # ================================
+
+    def _session(self, auth_token: str, csrf_token: str) -> "FocusSessionActor":
+        """获取账号对应的会话 actor（按 t cookie 区分账号，不存在时创建）"""
+        session = self._sessions.get(auth_token)
+        if session is None:
+            session = self._sessions[auth_token] = FocusSessionActor(self, auth_token, csrf_token)
+        else:
+            session.csrf_token = csrf_token
+        return session
+
+    def get_focus_state_snapshot(self, auth_token: str) -> FocusSessionState:
+        """获取账号当前会话状态副本"""
+        session = self._sessions.get(auth_token)
+        if session is None:
+            return FocusSessionState()
+        return replace(session.state, raw_current=dict(session.state.raw_current))
+
+    def set_last_point(self, auth_token: str, csrf_token: str, point: int) -> None:
         """手动设置同步指针"""
-        with self._state_lock:
-            self._focus_state.last_point = max(0, int(point))
+        self._session(auth_token, csrf_token).state.last_point = max(0, int(point))
 
-    def reset_focus_session(self) -> None:
+    def reset_focus_session(self, auth_token: str) -> None:
         """手动重置番茄会话缓存"""
-        with self._state_lock:
-            current_point = self._focus_state.last_point
-            self._focus_state = FocusSessionState(last_point=current_point)
+        session = self._sessions.get(auth_token)
+        if session is not None:
+            session.state = FocusSessionState(last_point=session.state.last_point)
+            session.synced_at = 0.0
+            if self.timer is not None:
+                self.timer.cancel(auth_token)
+
+    def drop_focus_session(self, auth_token: str) -> None:
+        """丢弃账号的会话（账号不再使用时释放内存，下次使用时重新同步）"""
+        self._sessions.pop(auth_token, None)
+        if self.timer is not None:
+            self.timer.cancel(auth_token)
+
+    def watch(self, auth_token: str, csrf_token: str) -> None:
+        """登记需要后台同步的账号（首次使用番茄钟前即可保持状态最新）"""
+        self._session(auth_token, csrf_token)
+
+    def start_sync(self, interval: float = 30.0, idle_interval: float = 300.0, max_age: float = 60.0) -> None:
+        """
+        启动后台增量同步
+
+        Args:
+            interval: 有活跃番茄钟时的同步间隔（秒）
+            idle_interval: 没有活跃番茄钟时的同步间隔（秒）
+            max_age: 状态查询可直接使用内存状态的最长时间（秒）
+        """
+        self.status_max_age = max_age
+        if self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync_loop(interval, idle_interval))
+
+    async def stop_sync(self) -> None:
+        """停止后台同步"""
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+
+    async def _sync_loop(self, interval: float, idle_interval: float):
+        """
+        后台定期带上 lastPoint 同步各账号的番茄状态
+
+        操作请求的响应同样会刷新状态，最近同步过的账号本轮跳过；同步作为空操作进入账号的 actor，
+        与用户操作按顺序执行，正好排在操作之后时合并进同一次请求
+        """
+        tick = max(1.0, min(interval, idle_interval) / 2)
+        while True:
+            await asyncio.sleep(tick)
+            now = time.monotonic()
+            due = [
+                session for session in self._sessions.values()
+                if now - session.synced_at >= (interval if session.state.focus_id else idle_interval)
+            ]
+            if not due:
+                continue
+            results = await asyncio.gather(
+                *(session.submit(_FocusCommand("sync", lambda state: [], requires_focus=False)) for session in due),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, BaseException) or "error" in result:
+                    logger.warning("番茄状态后台同步失败: %s", result if isinstance(result, BaseException) else result["error"])
+
+    async def get_focus_status(self, auth_token: str, csrf_token: str) -> Dict[str, Any]:
+        """
+        获取当前番茄状态：内存状态在 status_max_age 内同步过时直接返回，否则同步一次
+
+        Returns:
+            与 query_focus_state 相同格式的结果（来自内存时带 cached 字段）
+        """
+        session = self._session(auth_token, csrf_token)
+        if session.fresh(self.status_max_age) and not session.busy:
+            return {
+                "point": session.state.last_point,
+                "current": dict(session.state.raw_current),
+                "cached": True,
+            }
+        return await self.query_focus_state(auth_token, csrf_token)
+
+    async def _submit(
+        self,
+        auth_token: str,
+        csrf_token: str,
+        name: str,
+        compose: Callable[[FocusSessionState], List[FocusOperation]],
+        *,
+        requires_focus: bool = True,
+        no_focus_message: str = "当前没有正在运行的番茄钟",
+        last_point: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        command = _FocusCommand(
+            name=name,
+            compose=compose,
+            requires_focus=requires_focus,
+            no_focus_message=no_focus_message,
+            last_point=last_point,
+        )
+        return await self._session(auth_token, csrf_token).submit(command)
 
     # ================================
     # 高阶番茄钟操作
@@ -366,47 +583,76 @@ class PomodoroService:
         last_point: Optional[int] = None,
     ) -> Dict[str, Any]:
         """启动番茄钟"""
-        focus_id = id_utils.generate_object_id()
-        operation_id = id_utils.generate_object_id()
-        time_str = self._current_utc_time_string()
-
-        with self._state_lock:
-            self._focus_state.focus_id = focus_id
-            self._focus_state.first_focus_id = focus_id
-            self._focus_state.duration = duration
-            self._focus_state.auto_pomo_left = auto_pomo_left
-            self._focus_state.pomo_count = pomo_count
-            self._focus_state.manual = manual
-            self._focus_state.note = note or ""
-            self._focus_state.focus_on_id = focus_on_id or ""
-            self._focus_state.focus_on_type = focus_on_type
-            self._focus_state.focus_on_title = focus_on_title
-
-        print(f"[focus_start] focusId={focus_id} firstFocusId={focus_id} duration={duration} autoPomoLeft={auto_pomo_left} pomoCount={pomo_count} focusOnId={focus_on_id} focusOnType={focus_on_type} focusOnTitle={focus_on_title}")
-
-        operation = FocusOperation(
-            id=operation_id,
-            oId=focus_id,
-            oType=0,
-            op="start",
-            duration=duration,
-            firstFocusId=focus_id,
-            focusOnId=focus_on_id or "",
-            focusOnType=focus_on_type,
-            focusOnTitle=focus_on_title,
-            autoPomoLeft=auto_pomo_left,
-            pomoCount=pomo_count,
-            manual=manual,
-            note=note or "",
-            time=time_str,
-            createdTime=int(datetime.utcnow().timestamp() * 1000),
+
+        def compose(state: FocusSessionState) -> List[FocusOperation]:
+            focus_id = id_utils.generate_object_id()
+            state.focus_id = focus_id
+            state.first_focus_id = focus_id
+            state.duration = duration
+            state.auto_pomo_left = auto_pomo_left
+            state.pomo_count = pomo_count
+            state.manual = manual
+            state.note = note or ""
+            state.focus_on_id = focus_on_id or ""
+            state.focus_on_type = focus_on_type
+            state.focus_on_title = focus_on_title
+
+            logger.debug(
+                "[focus_start] focusId=%s duration=%s autoPomoLeft=%s pomoCount=%s focusOnId=%s focusOnType=%s focusOnTitle=%s",
+                focus_id, duration, auto_pomo_left, pomo_count, focus_on_id, focus_on_type, focus_on_title,
+            )
+            return [FocusOperation(
+                id=id_utils.generate_object_id(),
+                oId=focus_id,
+                oType=0,
+                op="start",
+                duration=duration,
+                firstFocusId=focus_id,
+                focusOnId=focus_on_id or "",
+                focusOnType=focus_on_type,
+                focusOnTitle=focus_on_title,
+                autoPomoLeft=auto_pomo_left,
+                pomoCount=pomo_count,
+                manual=manual,
+                note=note or "",
+                time=self._current_utc_time_string(),
+                createdTime=int(datetime.utcnow().timestamp() * 1000),
+            )]
+
+        return await self._submit(
+            auth_token, csrf_token, "start", compose, requires_focus=False, last_point=last_point
         )
 
-        payload = self._build_request_payload([operation], last_point)
-        print(f"[focus_start] 请求 payload: {payload}")
-        result = await self.perform_focus_operations(auth_token, csrf_token, payload)
-        self._update_focus_state_from_response(result)
-        return result
+    async def _control_focus(
+        self,
+        auth_token: str,
+        csrf_token: str,
+        op: str,
+        *,
+        manual: Optional[bool],
+        note: Optional[str],
+        focus_on_type: Optional[int],
+        focus_on_title: Optional[str],
+        last_point: Optional[int],
+        no_focus_message: str = "当前没有正在运行的番茄钟",
+    ) -> Dict[str, Any]:
+        """暂停/继续/完成：基于当前会话生成一个操作项"""
+
+        def compose(state: FocusSessionState) -> List[FocusOperation]:
+            operation = self._compose_operation(state, op, manual=manual, note=note)
+            self._update_local_state(
+                state,
+                manual=manual,
+                note=note,
+                focus_on_type=focus_on_type,
+                focus_on_title=focus_on_title,
+            )
+            return [operation]
+
+        return await self._submit(
+            auth_token, csrf_token, op, compose,
+            no_focus_message=no_focus_message, last_point=last_point,
+        )
 
     async def finish_focus(
         self,
@@ -420,27 +666,12 @@ class PomodoroService:
         last_point: Optional[int] = None,
     ) -> Dict[str, Any]:
         """完成番茄钟（finish 操作）"""
-        if not await self._ensure_focus_context(auth_token, csrf_token, last_point):
-            return {"error": "no_active_focus", "message": "当前没有正在运行的番茄钟"}
-
-        try:
-            operation = self._compose_operation("finish", manual=manual, note=note)
-        except ValueError:
-            return {"error": "no_active_focus", "message": "当前没有正在运行的番茄钟"}
-
-        self._update_local_state(
-            manual=manual,
-            note=note,
-            focus_on_type=focus_on_type,
-            focus_on_title=focus_on_title,
+        return await self._control_focus(
+            auth_token, csrf_token, "finish",
+            manual=manual, note=note, focus_on_type=focus_on_type,
+            focus_on_title=focus_on_title, last_point=last_point,
         )
 
-        payload = self._build_request_payload([operation], last_point)
-        print(f"[focus_finish] 请求 payload: {payload}")
-        result = await self.perform_focus_operations(auth_token, csrf_token, payload)
-        self._update_focus_state_from_response(result)
-        return result
-
     async def pause_focus(
         self,
         auth_token: str,
@@ -453,25 +684,11 @@ class PomodoroService:
         last_point: Optional[int] = None,
     ) -> Dict[str, Any]:
         """暂停当前番茄钟"""
-        if not await self._ensure_focus_context(auth_token, csrf_token, last_point):
-            return {"error": "no_active_focus", "message": "当前没有正在运行的番茄钟"}
-
-        try:
-            operation = self._compose_operation("pause", manual=manual, note=note)
-        except ValueError:
-            return {"error": "no_active_focus", "message": "当前没有正在运行的番茄钟"}
-
-        self._update_local_state(
-            manual=manual,
-            note=note,
-            focus_on_type=focus_on_type,
-            focus_on_title=focus_on_title,
+        return await self._control_focus(
+            auth_token, csrf_token, "pause",
+            manual=manual, note=note, focus_on_type=focus_on_type,
+            focus_on_title=focus_on_title, last_point=last_point,
         )
-        payload = self._build_request_payload([operation], last_point)
-        print(f"[focus_pause] 请求 payload: {payload}")
-        result = await self.perform_focus_operations(auth_token, csrf_token, payload)
-        self._update_focus_state_from_response(result)
-        return result
 
     async def continue_focus(
         self,
@@ -485,25 +702,12 @@ class PomodoroService:
         last_point: Optional[int] = None,
     ) -> Dict[str, Any]:
         """继续已暂停的番茄钟"""
-        if not await self._ensure_focus_context(auth_token, csrf_token, last_point):
-            return {"error": "no_active_focus", "message": "当前没有可继续的番茄钟"}
-
-        try:
-            operation = self._compose_operation("continue", manual=manual, note=note)
-        except ValueError:
-            return {"error": "no_active_focus", "message": "当前没有可继续的番茄钟"}
-
-        self._update_local_state(
-            manual=manual,
-            note=note,
-            focus_on_type=focus_on_type,
-            focus_on_title=focus_on_title,
+        return await self._control_focus(
+            auth_token, csrf_token, "continue",
+            manual=manual, note=note, focus_on_type=focus_on_type,
+            focus_on_title=focus_on_title, last_point=last_point,
+            no_focus_message="当前没有可继续的番茄钟",
         )
-        payload = self._build_request_payload([operation], last_point)
-        print(f"[focus_continue] 请求 payload: {payload}")
-        result = await self.perform_focus_operations(auth_token, csrf_token, payload)
-        self._update_focus_state_from_response(result)
-        return result
 
     async def stop_focus(
         self,
@@ -523,41 +727,22 @@ class PomodoroService:
         Args:
             include_exit: 是否在 drop 之后追加 exit 操作
         """
-        if not await self._ensure_focus_context(auth_token, csrf_token, last_point):
-            return {"error": "no_active_focus", "message": "当前没有正在运行的番茄钟"}
 
-        try:
-            drop_operation = self._compose_operation(
-                "drop",
-                manual=manual,
-                note=note,
-                duration=0,
-            )
-        except ValueError:
-            return {"error": "no_active_focus", "message": "当前没有正在运行的番茄钟"}
-
-        operations: List[FocusOperation] = [drop_operation]
-
-        if include_exit:
-            try:
-                exit_operation = self._compose_operation(
+        def compose(state: FocusSessionState) -> List[FocusOperation]:
+            operations = [self._compose_operation(state, "drop", manual=manual, note=note, duration=0)]
+            if include_exit:
+                operations.append(self._compose_operation(
+                    state,
                     "exit",
                     manual=manual,
                     note=note,
                     duration=0,
                     auto_pomo_left=0,
                     pomo_count=0,
-                )
-                operations.append(exit_operation)
-            except ValueError:
-                # 如果 drop 之后状态已经清空，这里忽略
-                pass
-
-        payload = self._build_request_payload(operations, last_point)
-        print(f"[focus_stop] 请求 payload: {payload}")
-        result = await self.perform_focus_operations(auth_token, csrf_token, payload)
-        self._update_focus_state_from_response(result)
-        return result
+                ))
+            return operations
+
+        return await self._submit(auth_token, csrf_token, "stop", compose, last_point=last_point)
 
     async def query_focus_state(
         self,
@@ -567,37 +752,159 @@ class PomodoroService:
         last_point: Optional[int] = None,
     ) -> Dict[str, Any]:
         """查询当前番茄状态（不发送操作，仅同步最新信息）"""
-        payload = self._build_request_payload([], last_point)
-        print(f"[focus_current] 请求 payload: {payload}")
-        result = await self.perform_focus_operations(auth_token, csrf_token, payload)
-        self._update_focus_state_from_response(result)
-        return result
+        return await self._submit(
+            auth_token, csrf_token, "query", lambda state: [],
+            requires_focus=False, last_point=last_point,
+        )
 
-    async def _ensure_focus_context(
-        self,
-        auth_token: str,
-        csrf_token: str,
-        last_point: Optional[int] = None,
-    ) -> bool:
-        """确保本地缓存中存在当前番茄会话信息，无则主动同步"""
-        with self._state_lock:
-            if self._focus_state.focus_id:
-                return True
-
-        print("[ensure_context] 缓存缺失，尝试同步当前番茄状态")
-        await self.query_focus_state(auth_token, csrf_token, last_point=last_point)
-
-        with self._state_lock:
-            if self._focus_state.focus_id:
-                print(f"[ensure_context] 同步成功，focusId={self._focus_state.focus_id}")
-            else:
-                print("[ensure_context] 同步失败，仍未获取到 focusId")
-            return self._focus_state.focus_id is not None
+    async def ping(self, auth_token: str, csrf_token: str) -> None:
+        """
+        检查两个番茄接口的连接和 Cookie：专注概览（api 域名）和一次不带操作的同步（ms 域名）
+
+        Raises:
+            RuntimeError: 任一请求失败
+        """
+        overview, focus = await asyncio.gather(
+            self.get_general_for_desktop(auth_token, csrf_token),
+            self.query_focus_state(auth_token, csrf_token),
+        )
+        for result in (overview, focus):
+            if isinstance(result, dict) and "error" in result:
+                raise RuntimeError(result["error"])
 
     async def close(self):
         """关闭HTTP客户端"""
-        await self.client.aclose()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+@dataclass
+class _FocusCommand:
+    """一次番茄钟操作（在会话 actor 中按提交顺序执行）"""
+    name: str
+    # 基于当前会话状态生成操作项（可同时更新本地状态），没有活跃番茄钟时抛出 ValueError
+    compose: Callable[[FocusSessionState], List[FocusOperation]]
+    requires_focus: bool = True
+    no_focus_message: str = "当前没有正在运行的番茄钟"
+    last_point: Optional[int] = None
+    future: Optional[asyncio.Future] = None
+
+
+class FocusSessionActor:
+    """
+    单个滴答账号的番茄会话 actor
+
+    所有操作进入队列，由一个协程按提交顺序执行，"读取会话状态 → 生成操作 → 请求接口 → 更新状态"
+    之间不会穿插其他操作；请求进行中积压的操作在下一次合并成一个 focusOp 请求（如暂停后紧接着改备注）。
+    队列空时协程退出，不活跃的账号不占用任务
+    """
+
+    def __init__(self, service: "PomodoroService", auth_token: str, csrf_token: str, max_batch: int = 10):
+        self.service = service
+        self.auth_token = auth_token
+        self.csrf_token = csrf_token
+        self.max_batch = max_batch
+        self.state = FocusSessionState()
+        # 最近一次成功同步的时间（time.monotonic），操作请求的响应也算同步
+        self.synced_at = 0.0
+        self._queue: Deque[_FocusCommand] = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def busy(self) -> bool:
+        """有正在执行或排队的操作（此时内存状态可能即将变化）"""
+        return self._task is not None
+
+    def fresh(self, max_age: float) -> bool:
+        """内存状态在 max_age 秒内同步过"""
+        return self.synced_at > 0 and time.monotonic() - self.synced_at <= max_age
+
+    def submit(self, command: _FocusCommand) -> "asyncio.Future[Dict[str, Any]]":
+        """提交操作，返回在操作完成后得到接口响应的 Future"""
+        command.future = asyncio.get_running_loop().create_future()
+        self._queue.append(command)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return command.future
+
+    async def _run(self):
+        try:
+            while self._queue:
+                await self._execute(self._take_batch())
+        finally:
+            self._task = None
+            # 异常退出时不让排队的操作一直等待
+            while self._queue:
+                command = self._queue.popleft()
+                if not command.future.done():
+                    command.future.set_result({"error": "session_aborted"})
+
+    def _take_batch(self) -> List[_FocusCommand]:
+        """取出可以合并发送的操作；指定了 last_point 的操作单独发送"""
+        batch = [self._queue.popleft()]
+        if batch[0].last_point is not None:
+            return batch
+        while self._queue and len(batch) < self.max_batch and self._queue[0].last_point is None:
+            batch.append(self._queue.popleft())
+        return batch
+
+    async def _execute(self, batch: List[_FocusCommand]):
+        last_point = batch[0].last_point
+        try:
+            # 本地没有会话信息且内存状态已过期时先同步一次（在 actor 内执行，不会与其他操作交错）；
+            # 刚同步过则确实没有活跃番茄钟，不再请求
+            if (
+                any(command.requires_focus for command in batch)
+                and not self.state.focus_id
+                and not self.fresh(self.service.status_max_age)
+            ):
+                logger.debug("[ensure_context] 缓存缺失，尝试同步当前番茄状态")
+                await self._request([], last_point)
+                if not self.state.focus_id:
+                    logger.warning("[ensure_context] 同步失败，仍未获取到 focusId")
+
+            operations: List[FocusOperation] = []
+            members: List[_FocusCommand] = []
+            for command in batch:
+                try:
+                    operations.extend(command.compose(self.state))
+                except ValueError:
+                    command.future.set_result(
+                        {"error": "no_active_focus", "message": command.no_focus_message}
+                    )
+                    continue
+                members.append(command)
+            if not members:
+                return
+
+            if len(members) > 1:
+                logger.debug("[focus_batch] 合并 %d 个操作: %s", len(members), [c.name for c in members])
+            result = await self._request(operations, last_point)
+            for command in members:
+                if not command.future.done():
+                    command.future.set_result(result)
+        except Exception as e:
+            for command in batch:
+                if not command.future.done():
+                    command.future.set_exception(e)
+
+    async def _request(self, operations: List[FocusOperation], last_point: Optional[int]) -> Dict[str, Any]:
+        service = self.service
+        point = self.state.last_point if last_point is None else last_point
+        payload = service._build_request_payload(operations, point)
+        logger.debug("[focus_op] 请求 payload: %s", payload)
+        result = await service.perform_focus_operations(self.auth_token, self.csrf_token, payload)
+        service._update_focus_state_from_response(self.state, result)
+        if isinstance(result, dict) and "error" not in result:
+            self.synced_at = time.monotonic()
+            if not operations and not result.get("current"):
+                # 纯同步返回空的 current：番茄钟已在其他设备上结束
+                self.state.reset_session()
+            if service.timer is not None:
+                service.timer.update(self.auth_token, self.state)
+        return result
 
 
 # 全局番茄专注服务实例
-pomodoro_service = PomodoroService()
\ No newline at end of file
+pomodoro_service = PomodoroService()
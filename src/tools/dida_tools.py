@@ -31,7 +31,8 @@ except ImportError:
     ToolReturnType = Any
     JsonType = Any
     KOSONG_AVAILABLE = False
-import os
+from src.services.account_pool import pomodoro_tokens
+from src.services.pomodoro_analytics import pomodoro_analytics
 from src.services.pomodoro_service import pomodoro_service
 from src.utils.time_utils import TimeUtils
 
@@ -883,8 +884,7 @@ class StartTaskPomodoroTool(CallableTool2):
     async def __call__(self, params: StartTaskPomodoroParams) -> ToolReturnType:
         try:
             # 获取认证令牌
-            auth_token = os.getenv('DIDA_T_COOKIE')
-            csrf_token = os.getenv('DIDA_CSRF_TOKEN')
+            auth_token, csrf_token = pomodoro_tokens()
 
             if not auth_token or not csrf_token:
                 return ToolOk(output={"error": "番茄钟认证令牌未配置"})
@@ -941,3 +941,54 @@ class StartTaskPomodoroTool(CallableTool2):
         except Exception as e:
             return ToolOk(output={"error": f"启动任务番茄钟失败: {str(e)}"})
 
+
+class GetFocusStatsParams(BaseModel):
+    """专注统计参数"""
+    days: Optional[int] = 7
+    """统计截至今天的最近天数（如 7 为本周报告、30 为月度报告），指定 start_date 时忽略"""
+    start_date: Optional[str] = None
+    """开始日期（YYYY-MM-DD，可选）"""
+    end_date: Optional[str] = None
+    """结束日期（YYYY-MM-DD，可选，默认今天）"""
+
+
+class GetFocusStatsTool(CallableTool2):
+    """获取番茄专注统计"""
+
+    name: str = "get_focus_stats"
+    description: str = """获取番茄专注统计：总专注时长、日均时长、专注天数、连续专注天数、
+按项目和任务的专注时长、按小时的专注分布（高峰时段）。
+适用于"这周专注了多久"、"本月专注报告"、"我一般几点最专注"等问题。
+已统计过的日期会缓存，重复查询不会重新下载。"""
+    params: type[GetFocusStatsParams] = GetFocusStatsParams
+
+    def __init__(self, dida_client: DidaClient):
+        super().__init__()
+        object.__setattr__(self, 'dida_client', dida_client)
+
+    async def __call__(self, params: GetFocusStatsParams) -> ToolReturnType:
+        try:
+            auth_token, csrf_token = pomodoro_tokens()
+
+            if not auth_token or not csrf_token:
+                return ToolOk(output={"error": "番茄钟认证令牌未配置"})
+
+            if params.start_date:
+                from datetime import date
+                start = date.fromisoformat(params.start_date)
+                end = date.fromisoformat(params.end_date) if params.end_date else None
+                stats = await pomodoro_analytics.get_stats(auth_token, csrf_token, start, end)
+            else:
+                days = min(max(params.days or 7, 1), 366)
+                stats = await pomodoro_analytics.get_period_stats(auth_token, csrf_token, days)
+
+            output = stats.to_dict()
+            try:
+                projects = await self.dida_client.get_projects()
+                output["project_names"] = {project.id: project.name for project in projects}
+            except Exception:
+                pass
+            return ToolOk(output=output)
+
+        except Exception as e:
+            return ToolOk(output={"error": f"获取专注统计失败: {str(e)}"})
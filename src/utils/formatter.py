@@ -3,7 +3,7 @@
 用于将滴答清单的数据格式化为适合 Telegram 显示的格式
 """
 
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 from src.dida_client import Task, Project
 from src.utils.time_utils import TimeUtils
 
@@ -289,7 +289,10 @@ AI 助手（智能对话）：
 • /start - 启动机器人
 • /help - 显示此帮助信息
 • /reset - 重置AI对话历史
+• /stats - 查看AI用量统计（/stats export 导出JSON）
 • /projects - 查看所有项目
+• /register 访问令牌 [t_cookie csrf_token] - 绑定自己的滴答清单账号（私聊）
+• /unregister - 解绑账号
 
 任务管理：
 • /addtask 项目ID 标题 - 添加任务
@@ -317,4 +320,70 @@ AI 助手（智能对话）：
 提示：使用 /projects 查看项目ID
 """.strip()
 
-    return help_text
\ No newline at end of file
+    return help_text
+
+
+def _format_seconds(value: Optional[float]) -> str:
+    return f"{value:.2f}s" if value is not None else "-"
+
+
+def _format_usage_block(title: str, usage: Dict[str, Any]) -> List[str]:
+    """格式化一组用量聚合数据"""
+    latency = usage["turn_latency"]
+    ttft = usage["ttft"]
+    cache_ratio = usage["cache_hit_ratio"]
+    lines = [
+        f"{title}:",
+        f"• 对话轮数: {usage['turns']}（失败 {usage['errors']}，用满循环上限 {usage['exhausted_iterations']}）",
+        f"• LLM调用: {usage['steps']} 次，工具调用: {usage['tool_calls']} 次",
+        f"• Token: 输入 {usage['input_tokens']} / 缓存读 {usage['cache_read_tokens']} / "
+        f"缓存写 {usage['cache_creation_tokens']} / 输出 {usage['output_tokens']}",
+        f"• 缓存命中率: {cache_ratio:.1%}" if cache_ratio is not None else "• 缓存命中率: -",
+        f"• 费用: {usage['cost']:.4f}",
+        f"• 单轮耗时 p50/p95: {_format_seconds(latency['p50'])} / {_format_seconds(latency['p95'])}",
+        f"• 首token p50/p95: {_format_seconds(ttft['p50'])} / {_format_seconds(ttft['p95'])}",
+    ]
+    return lines
+
+
+def format_usage_stats(snapshot: Dict[str, Any], today: str, chat_id: int, chat_only: bool = False) -> str:
+    """
+    格式化AI用量统计（纯文本格式）
+
+    Args:
+        snapshot: 用量账本导出的数据（TurnLedger.snapshot()）
+        today: 今天的日期（YYYY-MM-DD）
+        chat_id: 当前聊天ID
+        chat_only: 只显示当前聊天的用量（snapshot 由 TurnLedger.snapshot(chat_only=True) 导出）
+
+    Returns:
+        格式化后的字符串
+    """
+    if not snapshot["total"]["turns"]:
+        return "暂无AI用量数据"
+
+    lines = ["AI 用量统计", ""]
+    if chat_only:
+        lines += _format_usage_block("当前聊天（本次运行）", snapshot["total"])
+        return "\n".join(lines)
+    if today in snapshot["per_day"]:
+        lines += _format_usage_block(f"今天（{today}）", snapshot["per_day"][today])
+        lines.append("")
+    if str(chat_id) in snapshot["per_chat"]:
+        lines += _format_usage_block("当前聊天", snapshot["per_chat"][str(chat_id)])
+        lines.append("")
+    lines += _format_usage_block("累计（本次运行）", snapshot["total"])
+
+    tools = snapshot["per_tool"]
+    if tools:
+        lines.append("")
+        lines.append("工具耗时 p50/p95（调用次数）:")
+        ranked = sorted(tools.items(), key=lambda item: item[1]["latency"]["p95"] or 0, reverse=True)
+        for name, tool in ranked:
+            latency = tool["latency"]
+            lines.append(
+                f"• {name}: {_format_seconds(latency['p50'])} / {_format_seconds(latency['p95'])}"
+                f"（{tool['calls']}次，失败{tool['errors']}，返回 {tool['payload_bytes'] // 1024}KB）"
+            )
+
+    return "\n".join(lines)
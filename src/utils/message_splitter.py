@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+长消息分割
+Telegram 单条消息上限为 4096 个 UTF-16 码元（emoji 等 BMP 以外的字符占 2 个），
+按行打包成尽量接近上限的分段，减少发送条数：
+- 优先在换行处分割，超长的单行在空白处分割，不会切开字符
+- ``` 代码块跨段时在段尾补上结束标记、下一段开头重新打开（保留语言标注，开始行过长时只保留标记）
+- 每段都有空白以外的内容，且不超过上限
+- 一次遍历完成
+"""
+
+import re
+from typing import List, Tuple
+
+# Telegram 单条消息最大长度（UTF-16 码元）
+TELEGRAM_MAX_LENGTH = 4096
+
+# 分页发送时为每段的页码标题（如 "第 2/5 部分:"）预留的长度
+PAGE_HEADER_RESERVE = 64
+
+FENCE = "```"
+
+# 段尾补 "\n```" 的长度
+_CLOSE_SIZE = 1 + len(FENCE)
+
+# 每段至少能放下的码元数（一个 BMP 以外的字符）
+_MIN_UNITS = 2
+
+_MARKER = re.compile(r"```\w*")
+_MARKUP = re.compile(r"```\w*|\s")
+
+
+def utf16_len(text: str) -> int:
+    """文本的 UTF-16 码元数（Telegram 计算消息长度的方式）"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _cut(line: str, max_units: int) -> Tuple[str, str]:
+    """把超长的行切成不超过 max_units 码元的前半段和剩余部分，尽量在空白处切开"""
+    index = min(len(line), max_units)
+    excess = utf16_len(line[:index]) - max_units
+    while excess > 0 and index > 1:
+        # 每去掉一个字符减少 1 或 2 个码元
+        index = max(1, index - (excess + 1) // 2)
+        excess = utf16_len(line[:index]) - max_units
+    # 在后半段内找最后一个空白，找不到则直接按长度切
+    space = max(line.rfind(" ", index // 2, index), line.rfind("\t", index // 2, index))
+    if space > 0:
+        index = space + 1
+    return line[:index], line[index:]
+
+
+def _has_text(line: str) -> bool:
+    """除代码块标记（含语言标注）和空白外是否还有文字"""
+    return bool(_MARKUP.sub("", line))
+
+
+def _fence_marker(line: str, limit: int) -> str:
+    """代码块在下一段重新打开时使用的开始行：只保留 ``` 和语言标注，放不下时去掉语言标注"""
+    marker = _MARKER.match(line.lstrip()).group()
+    if utf16_len(marker) + 1 + _MIN_UNITS + _CLOSE_SIZE > limit:
+        return FENCE
+    return marker
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_LENGTH) -> List[str]:
+    """
+    把文本分割成不超过 limit 个 UTF-16 码元的分段
+
+    只包含空白（和代码块标记）的分段不会发出；limit 太小、放不下重新打开的代码块时
+    不再补代码块标记
+
+    Args:
+        text: 原始文本
+        limit: 每段的最大长度（调用方要给分段加页码等前缀时，应预留前缀长度）
+
+    Returns:
+        分段列表（文本为空时返回空列表）
+
+    Raises:
+        ValueError: limit 小于 2（放不下一个 BMP 以外的字符）
+    """
+    if limit < _MIN_UNITS:
+        raise ValueError(f"limit 不能小于 {_MIN_UNITS}")
+    if not text:
+        return []
+    if len(text) <= limit // 2 or utf16_len(text) <= limit:
+        return [text]
+
+    track_fences = limit >= len(FENCE) + 1 + _MIN_UNITS + _CLOSE_SIZE
+    # 不处理代码块时 ``` 也是普通文字
+    is_text = _has_text if track_fences else str.strip
+    chunks: List[str] = []
+    current: List[str] = []
+    size = -1              # 当前段的码元数（-1 表示空段，加第一行时不计换行）
+    has_text = False       # 当前段是否有空白以外的内容
+    fresh = True           # 当前段是否刚开始（为空，或只有重新打开的开始行）
+    reopen = ""            # 当前所在代码块在下一段重新打开时的开始行，不在代码块中为空
+
+    def add(line: str):
+        nonlocal size, has_text, fresh
+        current.append(line)
+        fresh = False
+        size += 1 + utf16_len(line)
+        has_text = has_text or bool(is_text(line))
+
+    def flush():
+        """发出当前段（在代码块中时补上结束标记），下一段以重新打开的开始行开头"""
+        nonlocal current, size, has_text, fresh
+        if has_text:
+            chunks.append("\n".join(current + [FENCE] if reopen else current))
+        current = [reopen] if reopen else []
+        size = utf16_len(reopen) if reopen else -1
+        has_text = False
+        fresh = True
+
+    for line in text.split("\n"):
+        is_fence = track_fences and line.lstrip().startswith(FENCE)
+        while True:
+            line_size = utf16_len(line)
+            if is_fence and reopen:
+                # 代码块结束行
+                if size + 1 + line_size <= limit:
+                    add(line)
+                    reopen = ""
+                    break
+                # 放不下：flush 会补上结束标记，结束行后面的文字作为普通文字放到后续段中
+                flush()
+                reopen = ""
+                current, size = [], -1
+                line = line.lstrip()[_MARKER.match(line.lstrip()).end():].lstrip()
+                is_fence = line.startswith(FENCE)
+                if not line:
+                    break
+                continue
+
+            if is_fence:
+                # 代码块开始行，加入后需要为段尾的结束标记预留位置
+                if size + 1 + line_size + _CLOSE_SIZE <= limit:
+                    add(line)
+                    reopen = _fence_marker(line, limit)
+                    break
+                if not fresh:
+                    flush()
+                    continue
+                # 空段也放不下：开始行只保留标记，后面的文字作为代码块的第一行
+                marker = _fence_marker(line, limit)
+                add(marker)
+                reopen = marker
+                line = line.lstrip()[_MARKER.match(line.lstrip()).end():].lstrip()
+                is_fence = False
+                if not line:
+                    break
+                continue
+
+            reserve = _CLOSE_SIZE if reopen else 0
+            if size + 1 + line_size + reserve <= limit:
+                add(line)
+                break
+            if not fresh:
+                flush()
+                continue
+            # 空段也放不下：这一行本身超长，切出能放下的部分（空段至少能放下 _MIN_UNITS 个码元）
+            head, line = _cut(line, limit - reserve - (size + 1))
+            add(head)
+            flush()
+
+    if has_text:
+        chunks.append("\n".join(current))
+    return chunks
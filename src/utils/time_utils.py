@@ -4,8 +4,46 @@
 用于处理滴答清单API返回的UTC时间，转换为本地时间显示
 """
 
-from datetime import datetime, date
-from typing import Dict, Any, Optional
+from datetime import datetime, date, timezone
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# 缓存容量：按原始字符串缓存，同一批任务的时间在每次列表/格式化时都会重复出现
+PARSE_CACHE_SIZE = 16384
+FORMAT_CACHE_SIZE = 16384
+
+
+def _parse_dida_datetime(value: str) -> datetime:
+    """
+    解析滴答清单时间字符串（不带缓存）
+
+    Python 3.11 起 fromisoformat 可以直接解析毫秒、"Z" 和 "+0000" 等格式，
+    不再需要先做字符串替换；没有时区信息的按UTC处理
+    """
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+
+# 解析结果和本地时间都是不可变对象，可以安全地共享
+_parse_cached = lru_cache(maxsize=PARSE_CACHE_SIZE)(_parse_dida_datetime)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _local_datetime(value: str) -> datetime:
+    """解析并转换为本地时区（astimezone() 需要查询系统时区，结果一并缓存）"""
+    return _parse_cached(value).astimezone()
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _local_epoch_ordinal(value: str) -> Tuple[float, int]:
+    """本地时间的Unix时间戳和日期序号（date.toordinal()）"""
+    local = _local_datetime(value)
+    return local.timestamp(), local.toordinal()
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format_local(value: str, format_str: str) -> str:
+    return _local_datetime(value).strftime(format_str)
 
 
 class TimeUtils:
@@ -15,38 +53,71 @@ class TimeUtils:
     def parse_dida_datetime(utc_str: str) -> datetime:
         """解析滴答清单UTC时间字符串为datetime对象
 
+        支持的格式：
+        - "2025-11-11T16:00:00.000+0000"（带毫秒）
+        - "2025-11-11T16:00:00+0000" / "2025-11-11T16:00:00+00:00" / "2025-11-11T16:00:00Z"
+        - "2025-11-11T16:00:00"（无时区，按UTC处理）
+        - 其他带时区偏移的 ISO 8601 格式
+
+        结果按原始字符串缓存（LRU，容量 PARSE_CACHE_SIZE）
+
         Args:
-            utc_str: 时间字符串，如 "2025-11-11T16:00:00.000+0000" 或 "2025-11-11T16:00:00+0000"
+            utc_str: 时间字符串
 
         Returns:
-            datetime对象（会自动转换为本地时区）
+            带时区信息的datetime对象
 
         Raises:
             ValueError: 如果时间格式不正确
         """
         if not utc_str:
             raise ValueError("时间字符串不能为空")
+        return _parse_cached(utc_str)
 
-        # 处理带毫秒的格式
-        if "." in utc_str:
-            # 移除毫秒部分以兼容 fromisoformat
-            if utc_str.endswith("+0000"):
-                # 格式：2025-11-11T16:00:00.000+0000
-                base_str = utc_str.replace(".000", "")
-            else:
-                # 其他格式
-                base_str = utc_str
-        else:
-            base_str = utc_str
+    @staticmethod
+    def parse_dida_column(values: Iterable[Optional[str]]) -> Tuple[List[Optional[float]], List[Optional[int]]]:
+        """批量转换一列时间字符串
 
-        # 统一添加时区信息
-        if base_str.endswith("+0000"):
-            base_str = base_str.replace("+0000", "+00:00")
-        elif not base_str.endswith("Z"):
-            # 如果没有时区信息，添加UTC
-            base_str = base_str + "+00:00"
+        一次遍历同时得到时间戳和本地日期序号（date.toordinal()），
+        用于对整批任务做排序、按天分组和"今天"判断，避免逐条创建date对象；
+        每个字符串的结果同样按原始字符串缓存
 
-        return datetime.fromisoformat(base_str)
+        Args:
+            values: 时间字符串序列（空值或无法解析的值对应结果为None）
+
+        Returns:
+            (Unix时间戳列表, 本地日期序号列表)
+        """
+        epochs: List[Optional[float]] = []
+        ordinals: List[Optional[int]] = []
+        for value in values:
+            epoch = ordinal = None
+            if value:
+                try:
+                    epoch, ordinal = _local_epoch_ordinal(value)
+                except (ValueError, TypeError):
+                    pass
+            epochs.append(epoch)
+            ordinals.append(ordinal)
+        return epochs, ordinals
+
+    @staticmethod
+    def cache_info() -> Dict[str, Any]:
+        """解析和格式化缓存的命中情况"""
+        return {
+            "parse": _parse_cached.cache_info()._asdict(),
+            "local": _local_datetime.cache_info()._asdict(),
+            "column": _local_epoch_ordinal.cache_info()._asdict(),
+            "format": _format_local.cache_info()._asdict(),
+        }
+
+    @staticmethod
+    def clear_cache():
+        """清空缓存（系统时区变化后调用）"""
+        _parse_cached.cache_clear()
+        _local_datetime.cache_clear()
+        _local_epoch_ordinal.cache_clear()
+        _format_local.cache_clear()
 
     @staticmethod
     def utc_to_local_str(utc_str: str, format_str: str = "%Y-%m-%d %H:%M") -> str:
@@ -60,9 +131,7 @@ class TimeUtils:
             本地时间字符串
         """
         try:
-            dt_utc = TimeUtils.parse_dida_datetime(utc_str)
-            dt_local = dt_utc.astimezone()
-            return dt_local.strftime(format_str)
+            return _format_local(utc_str, format_str)
         except Exception as e:
             # 如果解析失败，返回原始字符串
             return utc_str
@@ -78,9 +147,7 @@ class TimeUtils:
             本地日期对象
         """
         try:
-            dt_utc = TimeUtils.parse_dida_datetime(utc_str)
-            dt_local = dt_utc.astimezone()
-            return dt_local.date()
+            return _local_datetime(utc_str).date()
         except Exception as e:
             # 如果解析失败，返回今天的日期
             return date.today()
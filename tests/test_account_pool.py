@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""多用户账号池：按最近使用顺序回收、空闲回收、正在使用的账号不回收、凭据变化后重新加载"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.services import account_pool as account_pool_module
+from src.services.account_pool import Account, AccountPool, get_current_account
+from src.services.credential_store import UserCredentials
+
+
+class _FakeStore:
+    """内存中的凭据存储；version 在每次修改后递增"""
+
+    def __init__(self, user_ids=()):
+        self.users = {user_id: UserCredentials(user_id=user_id, dida_access_token=f"token-{user_id}")
+                      for user_id in user_ids}
+        self._version = 0
+
+    def get(self, user_id):
+        return self.users.get(user_id)
+
+    def version(self):
+        return self._version
+
+    async def put(self, credentials):
+        self.users[credentials.user_id] = credentials
+        self._version += 1
+
+    async def remove(self, user_id):
+        self._version += 1
+        return self.users.pop(user_id, None) is not None
+
+
+class _FakeClient:
+    def __init__(self, access_token):
+        self.access_token = access_token
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class _FakePool(AccountPool):
+    def create_client(self, access_token):
+        return _FakeClient(access_token)
+
+
+def _pool(user_ids, **kwargs) -> AccountPool:
+    admin = Account(credentials=UserCredentials(user_id=0, dida_access_token="admin"), dida_client=_FakeClient("admin"))
+    pool = _FakePool()
+    pool.configure(admin, store=_FakeStore(user_ids), **kwargs)
+    return pool
+
+
+async def _use(pool: AccountPool, user_id: int) -> Account:
+    async with pool.scope(user_id) as account:
+        assert get_current_account() is account
+    return account
+
+
+@pytest.mark.asyncio
+async def test_capacity_evicts_least_recently_used():
+    pool = _pool([1, 2, 3], max_size=2)
+    first = await _use(pool, 1)
+    await _use(pool, 2)
+    await _use(pool, 1)
+    await _use(pool, 3)
+
+    # 管理员常驻且不计入上限；2 最久未使用，被回收并关闭客户端
+    assert pool.get_loaded(2) is None
+    assert pool.get_loaded(1) is first and pool.get_loaded(3) is not None
+    assert pool.get_loaded(0).pinned and len(pool) == 3
+    assert not first.dida_client.closed
+    assert await pool.acquire(4) is None
+
+
+@pytest.mark.asyncio
+async def test_active_accounts_are_kept_until_released():
+    pool = _pool([1, 2, 3], max_size=1)
+    async with pool.scope(1) as first:
+        async with pool.scope(2) as second:
+            # 全部在用时暂时超过上限
+            assert len(pool) == 3
+            await _use(pool, 3)
+            assert pool.get_loaded(3) is None
+            assert pool.get_loaded(1) is first and pool.get_loaded(2) is second
+        # 2 用完后仍超过上限，回收（1 仍在使用）
+        assert pool.get_loaded(2) is None and second.dida_client.closed
+        assert pool.get_loaded(1) is first
+    assert pool.get_loaded(1) is first and len(pool) == 2
+
+
+@pytest.mark.asyncio
+async def test_idle_accounts_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(account_pool_module.time, "monotonic", lambda: now[0])
+    pool = _pool([1, 2, 3], idle_seconds=60)
+    idle = await _use(pool, 1)
+    now[0] += 30
+    await _use(pool, 2)
+    busy = await pool.acquire(3)
+    now[0] += 45
+
+    # 1 空闲 75 秒被回收；2 只空闲 45 秒；3 正在使用；管理员常驻
+    assert await pool.evict_idle() == 1
+    assert idle.dida_client.closed and pool.get_loaded(1) is None
+    assert pool.get_loaded(2) is not None and pool.get_loaded(3) is busy
+
+    now[0] += 120
+    assert await pool.evict_idle() == 1
+    # 释放时刷新最近使用时间，重新计算空闲
+    pool.release(busy)
+    assert await pool.evict_idle() == 0
+    now[0] += 61
+    assert await pool.evict_idle() == 1
+    assert len(pool) == 1 and pool.get_loaded(0) is not None
+
+
+@pytest.mark.asyncio
+async def test_changed_credentials_reload_and_retire_the_old_client():
+    pool = _pool([1])
+    async with pool.scope(1) as old:
+        # 其他进程更换了凭据：正在使用的旧客户端在用完后关闭
+        await pool.store.put(UserCredentials(user_id=1, dida_access_token="new-token"))
+        new = await _use(pool, 1)
+        assert new is not old and new.dida_client.access_token == "new-token"
+        assert old.retired and not old.dida_client.closed
+    assert old.dida_client.closed
+
+    # 凭据文件变化但本用户凭据未变：保留已加载的账号
+    await pool.store.put(UserCredentials(user_id=2, dida_access_token="token-2"))
+    assert await _use(pool, 1) is new
+
+    assert await pool.unregister(1)
+    assert new.dida_client.closed and pool.get_loaded(1) is None
+    assert await pool.acquire(1) is None
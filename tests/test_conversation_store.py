@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""对话持久化存储：懒加载、空闲卸载后从磁盘重新加载"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "kosong" / "src"))
+
+from kosong.message import Message
+
+from src.context.conversation_store import ConversationStore
+
+
+async def _add_turn(store: ConversationStore, chat_id: int, text: str, token_count: int):
+    async with store.session(chat_id) as context:
+        await context.add_message(Message(role="user", content=text))
+        await context.add_message(Message(role="assistant", content=f"re: {text}"))
+        await context.mark_token_count(token_count)
+
+
+@pytest.mark.asyncio
+async def test_load_is_lazy_and_persists_across_stores(tmp_path):
+    store = ConversationStore(tmp_path)
+    assert not store.has_history(1)
+    assert store.loaded_count == 0
+
+    await _add_turn(store, 1, "hello", 42)
+    assert store.loaded_count == 1
+    assert store.has_history(1)
+    await store.close()
+
+    reopened = ConversationStore(tmp_path)
+    assert reopened.loaded_count == 0
+    assert reopened.has_history(1)
+    context = await reopened.get(1)
+    assert [m.content for m in context.history] == ["hello", "re: hello"]
+    assert context.token_count == 42
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_idle_offload_and_reload(tmp_path):
+    store = ConversationStore(tmp_path, idle_offload_seconds=0)
+    await _add_turn(store, 1, "first", 10)
+    await _add_turn(store, 2, "other chat", 20)
+
+    assert await store.offload_idle() == 2
+    assert store.loaded_count == 0
+    assert store.has_history(1)
+
+    # 卸载后再次使用时从磁盘加载，继续追加
+    await _add_turn(store, 1, "second", 30)
+    context = await store.get(1)
+    assert [m.content for m in context.history] == ["first", "re: first", "second", "re: second"]
+    assert context.token_count == 30
+    await store.close()
+
+    reopened = ConversationStore(tmp_path)
+    assert len((await reopened.get(1)).history) == 4
+    assert [m.content for m in (await reopened.get(2)).history] == ["other chat", "re: other chat"]
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_session_in_use_is_not_offloaded(tmp_path):
+    store = ConversationStore(tmp_path, idle_offload_seconds=0)
+    async with store.session(1) as context:
+        await context.add_message(Message(role="user", content="busy"))
+        assert await store.offload_idle() == 0
+        assert not await store.offload(1)
+        assert store.loaded_count == 1
+
+    assert await store.offload(1)
+    assert store.loaded_count == 0
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_clear_removes_history(tmp_path):
+    store = ConversationStore(tmp_path)
+    await _add_turn(store, 1, "forget me", 5)
+    await store.clear(1)
+    assert not store.has_history(1)
+    assert (await store.get(1)).history == []
+    await store.close()
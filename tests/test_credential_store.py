@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""用户凭据存储：加密保存、解密读取、多进程共用文件"""
+
+import json
+import stat
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.services.credential_store import CredentialStore, UserCredentials, generate_key
+
+
+def _credentials(user_id: int, token: str = "open-api-token") -> UserCredentials:
+    return UserCredentials(
+        user_id=user_id,
+        dida_access_token=token,
+        dida_t_cookie="t" * 40,
+        dida_csrf_token="csrf-token-value",
+    )
+
+
+@pytest.mark.asyncio
+async def test_round_trip_is_encrypted_on_disk(tmp_path):
+    path = tmp_path / "credentials.json"
+    key = generate_key()
+    store = CredentialStore(path, key)
+    await store.put(_credentials(1))
+    await store.put(UserCredentials(user_id=2, dida_access_token="second-token"))
+
+    assert store.get(1) == _credentials(1)
+    assert store.get(1).has_pomodoro
+    assert not store.get(2).has_pomodoro
+    assert store.get(3) is None
+    assert sorted(store.user_ids()) == [1, 2] and 1 in store
+
+    content = path.read_text(encoding="utf-8")
+    assert "open-api-token" not in content and "second-token" not in content
+    assert set(json.loads(content)["users"]) == {"1", "2"}
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+    # 同一密钥的新实例可以解密，其他密钥不能
+    assert CredentialStore(path, key).get(2).dida_access_token == "second-token"
+    assert CredentialStore(path, generate_key()).get(1) is None
+
+
+@pytest.mark.asyncio
+async def test_remove_and_replace(tmp_path):
+    store = CredentialStore(tmp_path / "credentials.json", generate_key())
+    await store.put(_credentials(1))
+    await store.put(_credentials(1, token="new-token"))
+    assert store.get(1).dida_access_token == "new-token"
+
+    assert await store.remove(1)
+    assert not await store.remove(1)
+    assert store.get(1) is None and store.user_ids() == []
+
+
+@pytest.mark.asyncio
+async def test_changes_from_another_instance_are_seen_and_kept(tmp_path):
+    path = tmp_path / "credentials.json"
+    key = generate_key()
+    first = CredentialStore(path, key)
+    second = CredentialStore(path, key)
+    assert first.version() is None
+
+    await first.put(_credentials(1))
+    version = first.version()
+    # 另一个进程写入时重新读取文件，不覆盖这里的修改
+    await second.put(_credentials(2))
+    assert sorted(first.user_ids()) == [1, 2]
+    assert first.version() != version
+
+    await first.remove(2)
+    assert second.user_ids() == [1]
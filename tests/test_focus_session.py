@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""番茄会话 actor：操作按顺序执行、请求进行中积压的操作合并发送、同步返回空 current 时重置会话"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.services.pomodoro_service import PomodoroService
+
+AUTH = "a" * 32
+CSRF = "c" * 16
+
+
+class _FakeFocusService(PomodoroService):
+    """记录 focusOp 请求体的番茄服务；gate 未置位时请求挂起"""
+
+    def __init__(self):
+        super().__init__()
+        self.payloads = []
+        self.responses = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.point = 0
+
+    async def perform_focus_operations(self, auth_token, csrf_token, payload):
+        self.payloads.append(payload)
+        await self.gate.wait()
+        if self.responses:
+            return self.responses.pop(0)
+        self.point += 1
+        ops = payload["opList"]
+        if not ops:
+            return {"point": self.point, "current": {}}
+        last = ops[-1]
+        status = {"start": 0, "continue": 0, "pause": 1, "finish": 2, "exit": 3}.get(last["op"], 0)
+        return {
+            "point": self.point,
+            "current": {"id": last["oId"], "firstId": last["firstFocusId"], "status": status, "note": last["note"]},
+        }
+
+
+def _ops(payload):
+    return [op["op"] for op in payload["opList"]]
+
+
+@pytest.mark.asyncio
+async def test_operations_queued_during_a_request_are_batched():
+    service = _FakeFocusService()
+    service.gate.clear()
+    start = asyncio.create_task(service.start_focus(AUTH, CSRF, duration=25))
+    await asyncio.sleep(0)
+    pause = asyncio.create_task(service.pause_focus(AUTH, CSRF))
+    note = asyncio.create_task(service.continue_focus(AUTH, CSRF, note="写测试"))
+    await asyncio.sleep(0)
+    service.gate.set()
+    results = await asyncio.gather(start, pause, note)
+
+    assert [_ops(p) for p in service.payloads] == [["start"], ["pause", "continue"]]
+    # 合并发送的操作基于同一个会话，lastPoint 使用上一次响应的指针
+    focus_id = service.payloads[0]["opList"][0]["oId"]
+    assert {op["oId"] for op in service.payloads[1]["opList"]} == {focus_id}
+    assert service.payloads[1]["lastPoint"] == 1
+    assert results[1] is results[2]
+    state = service.get_focus_state_snapshot(AUTH)
+    assert state.focus_id == focus_id and state.note == "写测试" and state.last_point == 2
+
+
+@pytest.mark.asyncio
+async def test_explicit_last_point_is_sent_alone():
+    service = _FakeFocusService()
+    await service.start_focus(AUTH, CSRF)
+    service.gate.clear()
+    first = asyncio.create_task(service.pause_focus(AUTH, CSRF))
+    await asyncio.sleep(0)
+    tasks = [
+        asyncio.create_task(service.continue_focus(AUTH, CSRF, last_point=0)),
+        asyncio.create_task(service.pause_focus(AUTH, CSRF)),
+        asyncio.create_task(service.continue_focus(AUTH, CSRF)),
+    ]
+    await asyncio.sleep(0)
+    service.gate.set()
+    await asyncio.gather(first, *tasks)
+
+    assert [_ops(p) for p in service.payloads] == [["start"], ["pause"], ["continue"], ["pause", "continue"]]
+    assert service.payloads[2]["lastPoint"] == 0
+
+
+@pytest.mark.asyncio
+async def test_control_without_focus_syncs_once_then_reports_no_focus():
+    service = _FakeFocusService()
+    result = await service.pause_focus(AUTH, CSRF)
+    assert result["error"] == "no_active_focus"
+    assert [_ops(p) for p in service.payloads] == [[]]
+
+    # 刚同步过，确实没有活跃番茄钟，不再请求
+    result = await service.finish_focus(AUTH, CSRF)
+    assert result["error"] == "no_active_focus"
+    assert len(service.payloads) == 1
+
+
+@pytest.mark.asyncio
+async def test_sync_with_empty_current_resets_the_session():
+    service = _FakeFocusService()
+    await service.start_focus(AUTH, CSRF)
+    assert service.get_focus_state_snapshot(AUTH).focus_id
+
+    # 同步出错时保留本地会话
+    service.responses.append({"error": "HTTP 500"})
+    await service.query_focus_state(AUTH, CSRF)
+    assert service.get_focus_state_snapshot(AUTH).focus_id
+
+    # 番茄钟在其他设备上结束：同步返回空的 current
+    service.responses.append({"point": 10, "current": {}})
+    await service.query_focus_state(AUTH, CSRF)
+    state = service.get_focus_state_snapshot(AUTH)
+    assert state.focus_id is None and state.raw_current == {}
+    assert state.last_point == 10
+
+
+@pytest.mark.asyncio
+async def test_status_is_served_from_memory_while_fresh():
+    service = _FakeFocusService()
+    await service.start_focus(AUTH, CSRF)
+    status = await service.get_focus_status(AUTH, CSRF)
+    assert status["cached"] is True
+    assert status["current"]["id"] == service.get_focus_state_snapshot(AUTH).focus_id
+    assert len(service.payloads) == 1
+
+    service.reset_focus_session(AUTH)
+    status = await service.get_focus_status(AUTH, CSRF)
+    assert "cached" not in status
+    assert [_ops(p) for p in service.payloads] == [["start"], []]
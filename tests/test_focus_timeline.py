@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""专注时间线本地存储：回填中断后从文件推出的游标继续，不丢记录也不重复"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.models.pomodoro_models import FocusRecord
+from src.services.focus_timeline import FocusTimelineStore
+
+MINUTE = 60_000
+
+
+def _record(i: int) -> FocusRecord:
+    start = 1_700_000_000_000 + i * 30 * MINUTE
+    return FocusRecord(id=f"r{i}", start=start, end=start + 25 * MINUTE, minutes=25, task_id=f"t{i % 3}",
+                       task_title=f"任务 {i}")
+
+
+class _FakeTimeline:
+    """按从新到旧的顺序产出记录的时间线接口；fail_after 条之后抛出 RuntimeError"""
+
+    def __init__(self, records):
+        self.records = list(records)
+        self.fail_after = None
+        self.requests = []
+
+    async def iter_focus_timeline(self, auth_token, csrf_token, *, before=None):
+        self.requests.append(before)
+        produced = 0
+        for record in sorted(self.records, key=lambda r: r.start, reverse=True):
+            if before is not None and record.start >= before:
+                continue
+            if self.fail_after is not None and produced >= self.fail_after:
+                raise RuntimeError("获取专注时间线失败: HTTP 500")
+            produced += 1
+            yield record
+
+
+def _ids(store: FocusTimelineStore):
+    return sorted(record.id for record in store.iter_records())
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_across_instances_with_max_records(tmp_path):
+    path = tmp_path / "acc.timeline.jsonl"
+    service = _FakeTimeline(_record(i) for i in range(25))
+
+    store = FocusTimelineStore(path, batch_size=4)
+    assert await store.sync(service, "t", "c", max_records=10) == 10
+    assert not store.complete
+    assert store.count == 10
+
+    # 新实例从文件推出游标：只请求比已写入最早记录更早的部分
+    resumed = FocusTimelineStore(path, batch_size=4)
+    assert await resumed.sync(service, "t", "c", max_records=10) == 10
+    assert service.requests[-1] == _record(15).start
+    assert await resumed.sync(service, "t", "c") == 5
+    assert resumed.complete
+    assert _ids(resumed) == sorted(f"r{i}" for i in range(25))
+    assert (resumed.count, resumed.oldest, resumed.newest) == (25, _record(0).start, _record(24).start)
+
+
+@pytest.mark.asyncio
+async def test_backfill_interrupted_by_an_error_keeps_committed_batches(tmp_path):
+    path = tmp_path / "acc.timeline.jsonl"
+    service = _FakeTimeline(_record(i) for i in range(20))
+    service.fail_after = 7
+
+    store = FocusTimelineStore(path, batch_size=3)
+    with pytest.raises(RuntimeError):
+        await store.sync(service, "t", "c")
+    # 已写满的两批已提交，未写满的一条丢弃，下次重新读取
+    assert _ids(store) == sorted(f"r{i}" for i in range(14, 20))
+    # 写入中途退出留下的半行
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('["r13", 17')
+
+    service.fail_after = None
+    resumed = FocusTimelineStore(path, batch_size=3)
+    assert await resumed.sync(service, "t", "c") == 14
+    assert resumed.complete
+    assert _ids(resumed) == sorted(f"r{i}" for i in range(20))
+
+
+@pytest.mark.asyncio
+async def test_sync_after_complete_only_fetches_new_records(tmp_path):
+    path = tmp_path / "acc.timeline.jsonl"
+    service = _FakeTimeline(_record(i) for i in range(5))
+    store = FocusTimelineStore(path)
+    assert await store.sync(service, "t", "c") == 5
+
+    service.records.extend(_record(i) for i in range(5, 8))
+    reopened = FocusTimelineStore(path)
+    assert await reopened.sync(service, "t", "c") == 3
+    assert service.requests[-1] is None
+    assert reopened.count == 8 and reopened.complete
+    assert _ids(reopened) == sorted(f"r{i}" for i in range(8))
+    assert [r.id for r in reopened.iter_records(_record(6).start, _record(7).start)] == ["r6"]
+    assert reopened.task_titles(["t1"]) == {"t1": "任务 7"}
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""番茄钟本地计时：共用一个最小堆按到期顺序触发、取消和按服务器时间重新安排"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.models.pomodoro_models import FocusSessionState
+from src.services.focus_timer import BREAK_FINISHED, FOCUS_FINISHED, FocusTimer
+
+
+def _end_time(seconds: float) -> str:
+    end = datetime.now(timezone.utc) + timedelta(seconds=seconds)
+    return end.strftime("%Y-%m-%dT%H:%M:%S.%f+0000")
+
+
+def _state(focus_id: str, seconds: float, status: int = 0, pomos_left: int = 0) -> FocusSessionState:
+    return FocusSessionState(
+        focus_id=focus_id,
+        status=status,
+        auto_pomo_left=pomos_left,
+        focus_on_title=f"task {focus_id}",
+        raw_current={"id": focus_id, "endTime": _end_time(seconds)},
+    )
+
+
+def _timer(events, **kwargs) -> FocusTimer:
+    return FocusTimer(lambda event: events.append((event.key, event.kind)), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_sessions_fire_in_end_time_order_from_one_handle():
+    events = []
+    timer = _timer(events)
+    timer.update("a", _state("fa", 0.09))
+    timer.update("b", _state("fb", 0.03))
+    timer.update("c", _state("fc", 0.06))
+    assert len(timer) == 3
+    # 只挂一个定时回调，对应最早到期的会话
+    assert timer._handle is not None
+    assert timer._handle.when() == timer._heap[0].when
+    assert timer._heap[0].event.key == "b"
+
+    await asyncio.sleep(0.15)
+    assert events == [("b", FOCUS_FINISHED), ("c", FOCUS_FINISHED), ("a", FOCUS_FINISHED)]
+    assert len(timer) == 0
+    timer.close()
+
+
+@pytest.mark.asyncio
+async def test_pause_and_cancel_remove_the_pending_event():
+    events = []
+    timer = _timer(events)
+    timer.update("a", _state("fa", 0.03))
+    timer.update("b", _state("fb", 0.03))
+    timer.update("a", _state("fa", 0.03, status=1))   # 暂停
+    timer.cancel("b")
+    assert not timer.pending("a") and not timer.pending("b")
+
+    await asyncio.sleep(0.06)
+    assert events == []
+    timer.close()
+
+
+@pytest.mark.asyncio
+async def test_resync_moves_the_event_only_beyond_tolerance():
+    events = []
+    timer = _timer(events, resync_tolerance=0.5)
+    timer.update("a", _state("fa", 0.05))
+    entry = timer._entries["a"]
+
+    # 与本地计时相差不到 0.5 秒：不重新安排
+    timer.update("a", _state("fa", 0.1))
+    assert timer._entries["a"] is entry
+
+    # 服务器时间延后（如在其他设备上暂停后继续）：按新的结束时间重新安排
+    timer.update("a", _state("fa", 1.0))
+    assert timer._entries["a"] is not entry
+    await asyncio.sleep(0.1)
+    assert events == []
+
+    timer.update("a", _state("fa", 0.0))
+    timer.update("a", _state("fa", -0.01))
+    await asyncio.sleep(0.05)
+    assert events == [("a", FOCUS_FINISHED)]
+    timer.close()
+
+
+@pytest.mark.asyncio
+async def test_break_follows_focus_and_finished_focus_is_not_rescheduled():
+    events = []
+    timer = _timer(events, break_minutes=0.05 / 60)
+    timer.update("a", _state("fa", 0.02, pomos_left=2))
+    await asyncio.sleep(0.04)
+    assert events == [("a", FOCUS_FINISHED)]
+    assert timer.pending("a")
+
+    # 服务器状态尚未更新（仍是刚结束的番茄）：不重复安排专注结束，也不取消休息
+    timer.update("a", _state("fa", 0.01))
+    timer.update("a", _state("fa", 0.01, status=1))
+    await asyncio.sleep(0.06)
+    assert events == [("a", FOCUS_FINISHED), ("a", BREAK_FINISHED)]
+    timer.close()
+
+
+@pytest.mark.asyncio
+async def test_long_finished_sessions_are_not_notified():
+    events = []
+    timer = _timer(events, missed_grace=60)
+    timer.update("a", _state("fa", -120))
+    timer.update("b", _state("fb", -1))
+    assert not timer.pending("a")
+    await asyncio.sleep(0.01)
+    assert events == [("b", FOCUS_FINISHED)]
+    timer.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_entries_are_compacted():
+    timer = _timer([])
+    for i in range(200):
+        timer.update(i, _state(f"f{i}", 60))
+    for i in range(150):
+        timer.cancel(i)
+    assert len(timer) == 50
+    # 已取消的条目过半时重建堆
+    assert len(timer._heap) < 200
+    assert len(timer._heap) - timer._cancelled == 50
+    timer.close()
+    assert timer._handle is None and len(timer) == 0
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""对话用量账本：按聊天、按天、按工具聚合"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "kosong" / "src"))
+
+from kosong.chat_provider import TokenUsage
+
+from src.observability import ledger as ledger_module
+from src.observability.ledger import RollingWindow, TurnLedger
+
+
+def _usage(input_other: int, output: int, cache_read: int = 0) -> TokenUsage:
+    return TokenUsage(input_other=input_other, output=output, input_cache_read=cache_read)
+
+
+def test_rolling_window_percentiles():
+    window = RollingWindow(size=100)
+    assert window.percentile(50) is None
+    for value in range(1, 201):
+        window.add(value)
+    # 只保留最近 100 个样本（101-200）
+    assert len(window) == 100
+    assert window.percentile(0) == 101
+    assert window.percentile(50) == 151
+    assert window.percentile(100) == 200
+
+
+@pytest.mark.asyncio
+async def test_turns_are_aggregated_per_chat_and_in_total(tmp_path):
+    ledger = TurnLedger()
+    ledger.configure(path=tmp_path / "ledger.jsonl", price_input=1.0, price_output=2.0, price_cache_read=0.5)
+
+    async with ledger.turn(1, max_iterations=3):
+        ledger.record_step(0.2, 1.0, _usage(1000, 100, cache_read=1000))
+        ledger.record_step(None, 0.5, _usage(500, 50))
+        ledger.record_iterations(3)
+    async with ledger.turn(2, max_iterations=3) as turn:
+        ledger.record_step(0.4, 2.0, _usage(200, 20))
+        ledger.record_iterations(1)
+    with pytest.raises(RuntimeError):
+        async with ledger.turn(1, max_iterations=3):
+            raise RuntimeError("boom")
+
+    assert turn.ttft == 0.4
+    assert ledger.total.turns == 3
+    assert ledger.total.errors == 1
+    assert ledger.total.exhausted == 1
+    assert ledger.total.input_tokens == 1700
+    assert ledger.total.output_tokens == 170
+    assert ledger.per_chat[1].turns == 2
+    assert ledger.per_chat[1].cache_hit_ratio == pytest.approx(1000 / 2500)
+    assert ledger.per_chat[2].turns == 1
+    # (1500 * 1.0 + 1000 * 0.5 + 150 * 2.0) / 1e6
+    assert ledger.per_chat[1].cost == pytest.approx(2300 / 1_000_000)
+    assert sum(agg.turns for agg in ledger.per_day.values()) == 3
+
+    lines = (tmp_path / "ledger.jsonl").read_text(encoding="utf-8").splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [r["chat_id"] for r in records] == [1, 2, 1]
+    assert records[0]["input_tokens"] == 1500
+    assert records[2]["error"] == "RuntimeError"
+
+
+@pytest.mark.asyncio
+async def test_tool_payload_is_recorded_on_the_matching_call():
+    ledger = TurnLedger()
+    async with ledger.turn(1, max_iterations=3) as turn:
+        ledger.record_tool("get_tasks", 0.1, tool_call_id="a")
+        ledger.record_tool("get_tasks", 0.3, ok=False, tool_call_id="b")
+        ledger.record_tool_payload("a", 120)
+        ledger.record_tool_payload("unknown", 999)
+
+    assert [tool.payload_bytes for tool in turn.tools] == [120, 0]
+    tool = ledger.per_tool["get_tasks"]
+    assert (tool.calls, tool.errors, tool.payload_bytes) == (2, 1, 120)
+
+
+@pytest.mark.asyncio
+async def test_per_chat_keeps_the_most_recently_active_chats(monkeypatch):
+    monkeypatch.setattr(ledger_module, "MAX_CHATS", 2)
+    ledger = TurnLedger()
+    for chat_id in (1, 2, 1, 3):
+        async with ledger.turn(chat_id, max_iterations=3):
+            pass
+
+    assert list(ledger.per_chat) == [1, 3]
+    assert ledger.total.turns == 4
+
+
+@pytest.mark.asyncio
+async def test_chat_only_snapshot_hides_global_aggregates():
+    ledger = TurnLedger()
+    for chat_id in (1, 2):
+        async with ledger.turn(chat_id, max_iterations=3):
+            ledger.record_tool("get_projects", 0.1)
+
+    snapshot = ledger.snapshot(chat_id=1, chat_only=True)
+    assert list(snapshot["per_chat"]) == ["1"]
+    assert snapshot["total"]["turns"] == 1
+    assert snapshot["per_day"] == {} and snapshot["per_tool"] == {}
+
+    full = ledger.snapshot()
+    assert full["total"]["turns"] == 2
+    assert full["per_tool"]["get_projects"]["calls"] == 2
+    json.dumps(full)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""长消息分割：分段后拼接不丢内容，每段不超过上限"""
+
+import random
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.message_splitter import TELEGRAM_MAX_LENGTH, split_message, utf16_len
+
+
+def _content(text: str) -> str:
+    """去掉代码块标记和空白后的文字（分割时会补上或调整这些部分）"""
+    return re.sub(r"```\w*|\s", "", text)
+
+
+CASES = [
+    ("```\n" + "code line\n" * 402 + "``` 以上是代码\nafter", 4032),
+    ("see:\n```\ncode\n``` and then …" + "word " * 1000, TELEGRAM_MAX_LENGTH),
+    ("```python\n" + "print('😀')\n" * 800 + "```\n结尾", TELEGRAM_MAX_LENGTH),
+    ("段落 " * 3000, TELEGRAM_MAX_LENGTH),
+    ("intro\n```\n" + "x" * 9000 + "\n```tail", 1000),
+]
+
+
+@pytest.mark.parametrize("text,limit", CASES, ids=range(len(CASES)))
+def test_split_join_keeps_content(text, limit):
+    chunks = split_message(text, limit)
+    assert _content("\n".join(chunks)) == _content(text)
+    assert all(utf16_len(chunk) <= limit for chunk in chunks)
+
+
+@pytest.mark.parametrize("text,limit", CASES, ids=range(len(CASES)))
+def test_code_fences_balanced(text, limit):
+    for chunk in split_message(text, limit):
+        fences = [line for line in chunk.split("\n") if line.lstrip().startswith("```")]
+        assert len(fences) % 2 == 0, chunk[:80]
+
+
+def _fuzz_cases(count: int = 300):
+    """代码块标记密集的随机文本，配合很小的上限"""
+    rng = random.Random(0)
+    pieces = ["```", "```python", "``` 以上是代码", "", "code line", "😀😀", "word " * 7, "x" * 37, "  ```js", "中文段落"]
+    while count:
+        text = "\n".join(rng.choice(pieces) for _ in range(rng.randint(1, 30)))
+        if _content(text):
+            count -= 1
+            yield text, rng.randint(10, 60)
+
+
+EDGE_CASES = [
+    # 开始行正好占满 limit-4（重新打开后放不下任何内容），后面是空行
+    ("```" + "p" * 4025 + "\n\n" + "x\n" * 3000, 4032),
+    *(("```" + "p" * (n - 3) + "\n" + "code\n" * 2000 + "```", 4032) for n in range(4020, 4030)),
+    ("```\n" + "\n" * 50 + "code\n```", 10),
+    *_fuzz_cases(),
+]
+
+
+@pytest.mark.parametrize("text,limit", EDGE_CASES, ids=range(len(EDGE_CASES)))
+def test_split_edge_cases(text, limit):
+    chunks = split_message(text, limit)
+    assert all(utf16_len(chunk) <= limit for chunk in chunks)
+    assert all(_content(chunk) for chunk in chunks)
+    assert _content("\n".join(chunks)) == _content(text)
+
+
+@pytest.mark.parametrize("limit", [2, 3, 5, 9])
+def test_split_tiny_limit_treats_fences_as_text(limit):
+    text = "```python\n😀😀 code\n```\n" * 5
+    chunks = split_message(text, limit)
+    assert all(utf16_len(chunk) <= limit and chunk.strip() for chunk in chunks)
+    assert re.sub(r"\s", "", "".join(chunks)) == re.sub(r"\s", "", text)
+
+
+def test_split_rejects_limit_below_one_character():
+    with pytest.raises(ValueError):
+        split_message("😀" * 10, 1)
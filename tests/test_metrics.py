@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""进程内指标：Prometheus 文本格式导出"""
+
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.observability.metrics import MetricsRegistry, normalize_endpoint
+
+
+def test_counter_and_gauge_rendering():
+    registry = MetricsRegistry()
+    requests = registry.counter("app_requests_total", "请求数", ["status"])
+    depth = registry.gauge("app_queue_depth", "队列长度")
+    requests.labels(status="ok").inc()
+    requests.labels("ok").inc(2)
+    requests.labels(status='a"b\\c\nd').inc()
+    depth.set(3)
+    depth.dec(0.5)
+
+    assert registry.render() == (
+        "# HELP app_requests_total 请求数\n"
+        "# TYPE app_requests_total counter\n"
+        'app_requests_total{status="ok"} 3\n'
+        'app_requests_total{status="a\\"b\\\\c\\nd"} 1\n'
+        "# HELP app_queue_depth 队列长度\n"
+        "# TYPE app_queue_depth gauge\n"
+        "app_queue_depth 2.5\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("app_latency_seconds", "耗时", ["op"], buckets=(0.5, 0.1))
+    for value in (0.05, 0.2, 0.3, 5.0):
+        latency.labels(op="get").observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'app_latency_seconds_bucket{op="get",le="0.1"} 1',
+        'app_latency_seconds_bucket{op="get",le="0.5"} 3',
+        'app_latency_seconds_bucket{op="get",le="+Inf"} 4',
+        'app_latency_seconds_sum{op="get"} 5.55',
+        'app_latency_seconds_count{op="get"} 4',
+    ]
+
+
+def test_gauge_function_is_read_at_render_time():
+    registry = MetricsRegistry()
+    items = []
+    registry.gauge("app_items", "条数").set_function(lambda: len(items))
+    items.extend([1, 2])
+    assert "app_items 2" in registry.render()
+
+    broken = MetricsRegistry()
+    broken.gauge("app_broken", "读取失败").set_function(lambda: 1 / 0)
+    value = broken.render().splitlines()[-1].split()[-1]
+    assert math.isnan(float(value))
+
+
+def test_label_and_registration_errors():
+    registry = MetricsRegistry()
+    counter = registry.counter("app_total", "计数", ["kind"])
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+    with pytest.raises(ValueError):
+        counter.labels(kind="a").inc(-1)
+    with pytest.raises(ValueError):
+        registry.gauge("app_total", "重复")
+
+
+def test_normalize_endpoint_replaces_ids():
+    assert (
+        normalize_endpoint("/open/v1/project/5f1a2b3c4d5e6f7a8b9c0d1e/task/123")
+        == "/open/v1/project/{id}/task/{id}"
+    )
+    assert normalize_endpoint("/open/v1/project/inbox118/data") == "/open/v1/project/{id}/data"
+    assert normalize_endpoint("/api/v2/user/status") == "/api/v2/user/status"
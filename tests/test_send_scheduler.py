@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Telegram 发送调度：令牌桶限流、RetryAfter 重试和通知合并"""
+
+import asyncio
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import RetryAfter
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import send_scheduler
+from src.core.send_scheduler import NotificationSender, TelegramRateLimiter, TokenBucket
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(send_scheduler, "time", clock)
+    return clock
+
+
+def test_token_bucket_burst_then_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    # 先用掉积攒的令牌，之后按每秒 2 个排队（预约允许透支）
+    assert [bucket.reserve() for _ in range(5)] == [0.0, 0.0, 0.0, 0.5, 1.0]
+    assert not bucket.idle()
+
+    clock.now += 1.0
+    assert bucket.reserve() == 0.5
+    clock.now += 10.0
+    assert bucket.idle()
+    assert bucket.tokens == 3
+
+
+async def _send_times(limiter: TelegramRateLimiter, requests):
+    """并发发送请求，返回每个请求实际发出的时间（相对开始时间）"""
+    start = time.monotonic()
+    sent = {}
+
+    async def callback(name):
+        sent[name] = time.monotonic() - start
+
+    await asyncio.gather(*(
+        limiter.process_request(callback, (name,), {}, endpoint, {"chat_id": chat_id}, None)
+        for name, endpoint, chat_id in requests
+    ))
+    return sent
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_messages_per_chat():
+    limiter = TelegramRateLimiter(per_chat_rate=20.0, per_chat_burst=1, global_rate=1000.0)
+    sent = await _send_times(limiter, [
+        ("a1", "sendMessage", 1),
+        ("a2", "sendMessage", 1),
+        ("a3", "sendMessage", 1),
+        ("b1", "sendMessage", 2),
+        ("typing", "sendChatAction", 1),
+    ])
+
+    # 同一聊天每 50ms 一条；其他聊天和不限流的接口不用等
+    assert sent["a1"] < 0.02
+    assert 0.04 <= sent["a2"] < 0.09
+    assert 0.09 <= sent["a3"] < 0.14
+    assert sent["b1"] < 0.02
+    assert sent["typing"] < 0.02
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_global_bucket():
+    limiter = TelegramRateLimiter(per_chat_rate=100.0, per_chat_burst=10, global_rate=20.0)
+    limiter._global = TokenBucket(20.0, capacity=1)
+    sent = await _send_times(limiter, [(f"c{i}", "sendMessage", i) for i in range(3)])
+
+    assert sorted(sent.values())[-1] >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_pauses_and_retries_after_flood_control():
+    limiter = TelegramRateLimiter(max_retries=2)
+    calls = []
+
+    async def flaky():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RetryAfter(timedelta(milliseconds=50))
+        return "ok"
+
+    async def other():
+        calls.append(time.monotonic())
+        return "other"
+
+    result = await limiter.process_request(flaky, (), {}, "sendMessage", {"chat_id": 1}, None)
+    assert result == "ok"
+    assert calls[1] - calls[0] >= 0.045
+    # 暂停结束后其他聊天照常发送
+    assert await limiter.process_request(other, (), {}, "sendMessage", {"chat_id": 2}, None) == "other"
+
+    async def always_limited():
+        raise RetryAfter(timedelta(milliseconds=10))
+
+    with pytest.raises(RetryAfter):
+        await limiter.process_request(always_limited, (), {}, "sendMessage", {"chat_id": 3}, None)
+
+
+class _FakeBot:
+    def __init__(self):
+        self.calls = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def send_message(self, chat_id, text):
+        await self.gate.wait()
+        self.calls.append(("send", chat_id, text))
+        return SimpleNamespace(message_id=len(self.calls))
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        await self.gate.wait()
+        self.calls.append(("edit", chat_id, text))
+
+
+@pytest.mark.asyncio
+async def test_notifications_are_coalesced_into_one_message():
+    bot = _FakeBot()
+    sender = NotificationSender(bot)
+    bot.gate.clear()
+    sender.notify(1, "tools", "  • get_tasks", title="调用工具:")
+    await asyncio.sleep(0)
+    # 第一条还在发送时到达的内容合并为一次编辑
+    sender.notify(1, "tools", "  • get_projects", title="调用工具:")
+    sender.notify(1, "tools", "  • complete_task", title="调用工具:")
+    bot.gate.set()
+    await sender.close()
+
+    assert bot.calls == [
+        ("send", 1, "调用工具:\n  • get_tasks"),
+        ("edit", 1, "调用工具:\n  • get_tasks\n  • get_projects\n  • complete_task"),
+    ]
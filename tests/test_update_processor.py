@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""更新处理器：不同聊天并发处理，同一聊天内按到达顺序处理"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from telegram import Update
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.update_processor import PerChatUpdateProcessor, ordering_key, raw_ordering_key
+
+
+def _data(update_id: int, chat_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "u"},
+            "text": "hi",
+        },
+    }
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    return Update.de_json(_data(update_id, chat_id), None)
+
+
+class _Recorder:
+    """记录每个更新开始和结束的顺序，以及同时处理的更新数"""
+
+    def __init__(self):
+        self.events = []
+        self.running = 0
+        self.max_running = 0
+
+    async def handle(self, name: str, delay: float, fail: bool = False):
+        self.events.append(("start", name))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(delay)
+            if fail:
+                raise RuntimeError(name)
+        finally:
+            self.running -= 1
+            self.events.append(("end", name))
+
+
+async def _submit(processor: PerChatUpdateProcessor, recorder: _Recorder, jobs):
+    """按顺序把更新交给处理器（与 Application 的调用方式一致：不等待处理完）"""
+    tasks = []
+    for update_id, (chat_id, delay, *fail) in enumerate(jobs, 1):
+        name = f"{chat_id}:{update_id}"
+        coroutine = recorder.handle(name, delay, fail=bool(fail))
+        tasks.append(asyncio.create_task(processor.process_update(_update(update_id, chat_id), coroutine)))
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _order(recorder: _Recorder, chat_id: int):
+    return [event for event in recorder.events if event[1].startswith(f"{chat_id}:")]
+
+
+@pytest.mark.asyncio
+async def test_same_chat_is_processed_in_arrival_order():
+    processor = PerChatUpdateProcessor(concurrency=8)
+    recorder = _Recorder()
+    # 同一聊天的第一个更新最慢，后面的更新仍要等它处理完
+    await _submit(processor, recorder, [(1, 0.05), (1, 0.0), (1, 0.01)])
+
+    assert recorder.events == [
+        ("start", "1:1"), ("end", "1:1"),
+        ("start", "1:2"), ("end", "1:2"),
+        ("start", "1:3"), ("end", "1:3"),
+    ]
+    assert processor.active_chats == 0
+
+
+@pytest.mark.asyncio
+async def test_different_chats_run_concurrently():
+    processor = PerChatUpdateProcessor(concurrency=8)
+    recorder = _Recorder()
+    await _submit(processor, recorder, [(1, 0.05), (2, 0.01), (1, 0.01), (2, 0.01)])
+
+    # 聊天 2 不等聊天 1 的慢更新
+    assert recorder.events.index(("end", "2:2")) < recorder.events.index(("end", "1:1"))
+    assert _order(recorder, 1) == [("start", "1:1"), ("end", "1:1"), ("start", "1:3"), ("end", "1:3")]
+    assert _order(recorder, 2) == [("start", "2:2"), ("end", "2:2"), ("start", "2:4"), ("end", "2:4")]
+    assert recorder.max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_failures_do_not_block_the_chat():
+    processor = PerChatUpdateProcessor(concurrency=2)
+    recorder = _Recorder()
+    results = await _submit(
+        processor, recorder, [(1, 0.01, "fail"), (2, 0.01), (3, 0.01), (4, 0.01), (1, 0.0)]
+    )
+
+    assert recorder.max_running == 2
+    # 同一聊天前一个更新失败后，后一个更新照常处理
+    assert _order(recorder, 1)[-2:] == [("start", "1:5"), ("end", "1:5")]
+    assert isinstance(results[0], RuntimeError)
+    assert results[1:] == [None] * 4
+
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_update_does_not_break_the_chain():
+    processor = PerChatUpdateProcessor(concurrency=8)
+    recorder = _Recorder()
+    first = asyncio.create_task(processor.process_update(_update(1, 1), recorder.handle("1:1", 0.05)))
+    second = asyncio.create_task(processor.process_update(_update(2, 1), recorder.handle("1:2", 0.0)))
+    third = asyncio.create_task(processor.process_update(_update(3, 1), recorder.handle("1:3", 0.0)))
+    await asyncio.sleep(0.01)
+    second.cancel()
+    await asyncio.gather(first, second, third, return_exceptions=True)
+
+    assert recorder.events == [("start", "1:1"), ("end", "1:1"), ("start", "1:3"), ("end", "1:3")]
+    assert processor.active_chats == 0
+
+
+def test_raw_ordering_key_matches_ordering_key():
+    callback = {
+        "update_id": 3,
+        "callback_query": {
+            "id": "q",
+            "chat_instance": "c",
+            "from": {"id": 9, "is_bot": False, "first_name": "u"},
+            "message": _data(2, -100)["message"],
+        },
+    }
+    inline = {"update_id": 4, "inline_query": {
+        "id": "q", "query": "", "offset": "", "from": {"id": 9, "is_bot": False, "first_name": "u"},
+    }}
+    for data in (_data(1, 42), callback, inline):
+        assert raw_ordering_key(data) == ordering_key(Update.de_json(data, None))
+    assert raw_ordering_key(callback) == ("chat", -100)
+    assert raw_ordering_key(inline) == ("user", 9)
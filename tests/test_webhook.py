@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Webhook 接收：密钥校验、背压（503）和更新记录"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.http_server import HttpRequest, HttpServer
+from src.core.webhook import SECRET_HEADER, ForwardingWebhookReceiver, WebhookReceiver
+
+SECRET = "s3cret"
+PATH = "/telegram/webhook"
+
+
+def _update(update_id: int, chat_id: int = 5) -> bytes:
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "text": "hi",
+        },
+    }).encode()
+
+
+def _request(body: bytes, secret: str = SECRET) -> HttpRequest:
+    return HttpRequest(method="POST", path=PATH, query={}, headers={SECRET_HEADER: secret}, body=body)
+
+
+class _BlockingProcessor:
+    """在 release 之前不处理完任何更新的更新处理器"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.processed = []
+
+    async def process_update(self, update, coroutine):
+        await self.release.wait()
+        await coroutine
+        self.processed.append(update.update_id)
+
+
+def _application(processor: _BlockingProcessor) -> SimpleNamespace:
+    async def process_update(update):
+        pass
+
+    return SimpleNamespace(bot=None, update_processor=processor, process_update=process_update)
+
+
+@pytest.mark.asyncio
+async def test_rejects_bad_secret_and_invalid_body():
+    processor = _BlockingProcessor()
+    receiver = WebhookReceiver(_application(processor), HttpServer("127.0.0.1", 0), PATH, SECRET)
+
+    assert (await receiver.handle(_request(_update(1), secret="wrong"))).status == 403
+    assert (await receiver.handle(HttpRequest("POST", PATH, {}, {}, _update(1)))).status == 403
+    assert (await receiver.handle(_request(b"not json"))).status == 400
+    assert not receiver._pending
+
+
+@pytest.mark.asyncio
+async def test_returns_503_when_queue_is_full_and_drains_on_close(tmp_path):
+    processor = _BlockingProcessor()
+    record_path = tmp_path / "updates.jsonl"
+    receiver = WebhookReceiver(
+        _application(processor), HttpServer("127.0.0.1", 0), PATH, SECRET,
+        queue_size=2, record_path=record_path,
+    )
+
+    assert (await receiver.handle(_request(_update(1)))).status == 200
+    assert (await receiver.handle(_request(_update(2)))).status == 200
+    response = await receiver.handle(_request(_update(3)))
+    assert response.status == 503
+    assert response.headers["Retry-After"] == "1"
+
+    processor.release.set()
+    await receiver.close()
+    assert processor.processed == [1, 2]
+    # 只记录接收的更新
+    recorded = [json.loads(line)["update_id"] for line in record_path.read_text().splitlines()]
+    assert recorded == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_forwarding_receiver_returns_503_without_a_worker():
+    dispatched = []
+    accept = True
+
+    def dispatch(body, key):
+        if accept:
+            dispatched.append(key)
+        return accept
+
+    pool = SimpleNamespace(workers=[], dispatch=dispatch)
+    receiver = ForwardingWebhookReceiver(pool, HttpServer("127.0.0.1", 0), PATH, SECRET)
+
+    assert (await receiver.handle(_request(_update(1), secret=""))).status == 403
+    assert (await receiver.handle(_request(_update(1, chat_id=7)))).status == 200
+    accept = False
+    assert (await receiver.handle(_request(_update(2, chat_id=7)))).status == 503
+    assert len(dispatched) == 1
+    await receiver.close()
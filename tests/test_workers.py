@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""多进程分片：工作进程退出时只迁移它负责的聊天，迁移的聊天等原进程处理完再转发"""
+
+import asyncio
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.workers import _FRAME, WorkerPool, shard_owner
+
+KEYS = [("chat", chat_id) for chat_id in range(-500, 1500)]
+
+
+def test_shard_owner_is_deterministic_and_balanced():
+    workers = [0, 1, 2, 3]
+    owners = [shard_owner(key, workers) for key in KEYS]
+    assert owners == [shard_owner(key, list(reversed(workers))) for key in KEYS]
+    counts = Counter(owners)
+    assert set(counts) == set(workers)
+    assert min(counts.values()) > len(KEYS) / len(workers) * 0.8
+
+
+def test_only_the_missing_workers_keys_move():
+    workers = [0, 1, 2, 3]
+    before = {key: shard_owner(key, workers) for key in KEYS}
+    after = {key: shard_owner(key, [0, 1, 3]) for key in KEYS}
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert moved and all(before[key] == 2 for key in moved)
+    assert len(moved) == sum(1 for owner in before.values() if owner == 2)
+    # 接管的聊天分散到其余进程
+    assert set(after[key] for key in moved) == {0, 1, 3}
+    # 恢复后迁回原进程
+    assert {key: shard_owner(key, workers) for key in KEYS} == before
+
+
+class _FakeWriter:
+    def __init__(self):
+        self.seqs = []
+
+    def write(self, data: bytes):
+        self.seqs.append(_FRAME.unpack_from(data)[0])
+
+
+def _pool(tmp_path, count=3) -> WorkerPool:
+    pool = WorkerPool(count, tmp_path, ["worker"])
+    for worker in pool.workers:
+        worker.writer = _FakeWriter()
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_moved_chat_waits_for_the_previous_update(tmp_path):
+    pool = _pool(tmp_path)
+    key = KEYS[0]
+    owner = pool.workers[shard_owner(key, pool.live_workers())]
+    assert pool.dispatch(b"{}", key)
+    (first,) = owner.writer.seqs
+
+    # 原进程开始排空：新的更新分给其他进程，但要等前一个更新确认后才写入
+    owner.draining = True
+    assert pool.dispatch(b"{}", key)
+    target = pool.workers[shard_owner(key, pool.live_workers())]
+    assert target is not owner
+    await asyncio.sleep(0)
+    assert target.writer.seqs == [] and len(target.pending) == 1
+
+    pool._finish(owner, first, ok=True)
+    await asyncio.sleep(0.01)
+    assert len(target.writer.seqs) == 1
+    pool._finish(target, target.writer.seqs[0], ok=True)
+    await asyncio.sleep(0)
+    assert pool._tails == {}
+
+
+@pytest.mark.asyncio
+async def test_dispatch_refuses_without_live_workers_or_when_full(tmp_path):
+    pool = WorkerPool(2, tmp_path, ["worker"], queue_size=1)
+    assert not pool.dispatch(b"{}", KEYS[0])
+
+    pool.workers[0].writer = _FakeWriter()
+    assert pool.dispatch(b"{}", KEYS[0])
+    # 唯一可用的进程队列已满
+    assert not pool.dispatch(b"{}", KEYS[1])